@@ -0,0 +1,223 @@
+"""
+全天相机图像分析基准测试
+
+生成一串 --size×--size 的合成全天图像（等距鱼眼视场、随天顶角变亮的背景、--stars 颗高斯星点、
+随机形状的云：遮挡星光并抬高背景），第一帧晴天用于建立参考星数，之后各帧云量依次增加。统计：
+  - 每帧后台线程耗时：解码、缩小到 analysis_size、分析；以及按原尺寸分析（不缩小）的耗时
+  - 在 --interval 秒刷新间隔下通过 AllSkyImagePipeline 运行：占用一个核心的比例、从文件替换到
+    analysis_ready 的延迟、界面线程每次检查的耗时
+  - 各帧估计云量与真实云量（云覆盖的视场像素比例）的误差，全天和各天区
+
+用法:
+    python benchmarks/bench_allsky_analysis.py --size 4000 --frames 6 --interval 5
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+from PyQt5.QtCore import QCoreApplication, QEventLoop, QTimer  # noqa: E402
+from PyQt5.QtGui import QImage, QImageReader  # noqa: E402
+
+from src.services.allsky_analysis import AllSkyAnalyzer, downsample_image  # noqa: E402
+from src.services.allsky_pipeline import AllSkyImagePipeline  # noqa: E402
+
+# 合成图像使用的分析设置（视场充满短边，地平 15° 以下不分析；第一帧晴天即作为参考，不读写保存的参考）
+SETTINGS = {'analysis_size': 1024, 'center_x': 0.5, 'center_y': 0.5, 'radius': 0.5, 'horizon_altitude': 15.0,
+            'horizon_mask': '', 'sky_zero_point': None, 'reference_frames': 1, 'reference_path': ''}
+
+
+def star_field(size, count, seed):
+    """视场内均匀分布的星点位置 (y, x) 和亮度（ADU）"""
+    rng = np.random.default_rng(seed)
+    radius = size / 2 * np.sqrt(rng.uniform(0, 1, count))
+    angle = rng.uniform(0, 2 * np.pi, count)
+    y = size / 2 + radius * np.sin(angle)
+    x = size / 2 + radius * np.cos(angle)
+    flux = 25 + rng.exponential(80, count)
+    return y, x, flux
+
+
+def cloud_mask(size, coverage, seed):
+    """平滑随机场按分位数截取的云区（True 为云），覆盖视场约 coverage 比例"""
+    if coverage <= 0:
+        return np.zeros((size, size), dtype=bool)
+    rng = np.random.default_rng(seed)
+    coarse = rng.normal(0, 1, (9, 9))
+    # 双线性放大到全尺寸
+    grid = np.linspace(0, 8, size)
+    i0 = np.minimum(grid.astype(int), 7)
+    t = grid - i0
+    rows = coarse[i0] * (1 - t)[:, None] + coarse[i0 + 1] * t[:, None]
+    field = rows[:, i0] * (1 - t)[None, :] + rows[:, i0 + 1] * t[None, :]
+    y, x = np.ogrid[0:size, 0:size]
+    inside = np.hypot(x + 0.5 - size / 2, y + 0.5 - size / 2) <= size / 2
+    return field >= np.quantile(field[inside], 1 - coverage)
+
+
+def render_frame(size, stars, clouds, seed):
+    """渲染一帧 8 位 RGB 合成图像"""
+    rng = np.random.default_rng(seed)
+    y, x = np.ogrid[0:size, 0:size]
+    r = np.hypot(x + 0.5 - size / 2, y + 0.5 - size / 2) / (size / 2)
+    sky = (30.0 + 25.0 * r ** 2).astype(np.float32) + rng.normal(0, 2.5, (size, size)).astype(np.float32)
+    sky[clouds] += 20.0
+
+    # 高斯星点（sigma 约为边长的 1/1300），用 np.add.at 一次叠加全部星点的小块
+    sy, sx, flux = stars
+    sigma = max(1.0, size / 1300)
+    half = int(np.ceil(3 * sigma))
+    offsets = np.arange(-half, half + 1)
+    cy, cx = np.round(sy).astype(int), np.round(sx).astype(int)
+    ys = np.clip(cy[:, None, None] + offsets[None, :, None], 0, size - 1)
+    xs = np.clip(cx[:, None, None] + offsets[None, None, :], 0, size - 1)
+    weight = np.exp(-(((ys - sy[:, None, None]) ** 2 + (xs - sx[:, None, None]) ** 2) / (2 * sigma ** 2)))
+    # 云中的星点几乎完全被遮挡
+    transmission = np.where(clouds[np.clip(cy, 0, size - 1), np.clip(cx, 0, size - 1)], 0.05, 1.0)
+    np.add.at(sky, (ys, xs), (flux * transmission)[:, None, None] * weight)
+    sky[r > 1] = 0
+    gray = np.clip(sky, 0, 255).astype(np.uint8)
+    return np.ascontiguousarray(np.repeat(gray[:, :, None], 3, axis=2))
+
+
+def save_png(rgb, path):
+    height, width = rgb.shape[:2]
+    image = QImage(rgb.data, width, height, 3 * width, QImage.Format_RGB888)
+    image.save(path, 'PNG')
+
+
+def true_cover(analyzer, clouds, shape):
+    """按分析尺寸的天区统计真实云量（%）：(全天, 各天区)"""
+    # 按分析尺寸最近邻取样
+    rows = ((np.arange(shape[0]) + 0.5) * clouds.shape[0] / shape[0]).astype(int)
+    cols = ((np.arange(shape[1]) + 0.5) * clouds.shape[1] / shape[1]).astype(int)
+    small = clouds[rows[:, None], cols[None, :]].astype(np.float64)
+    geometry = analyzer.geometry(shape)
+    valid = geometry.valid
+    sector = geometry.sector[valid]
+    cloudy = np.bincount(sector, weights=small[valid], minlength=len(geometry.names))
+    total = float(small[valid].sum() / valid.sum() * 100)
+    return total, cloudy / np.maximum(geometry.sector_pixels, 1) * 100
+
+
+def wait_events(ms):
+    loop = QEventLoop()
+    QTimer.singleShot(ms, loop.quit)
+    loop.exec_()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='全天相机图像分析基准测试')
+    parser.add_argument('--size', type=int, default=4000, help='合成图像边长（像素）')
+    parser.add_argument('--frames', type=int, default=6, help='帧数（第一帧晴天）')
+    parser.add_argument('--stars', type=int, default=4000, help='视场内的星点数')
+    parser.add_argument('--interval', type=float, default=5.0, help='管线刷新间隔（秒）')
+    parser.add_argument('--full-resolution', action='store_true', help='同时按原尺寸分析（内存占用约为图像的 30 倍）')
+    args = parser.parse_args()
+
+    app = QCoreApplication([sys.argv[0]])
+    workdir = tempfile.mkdtemp(prefix='allsky_bench_')
+    coverages = [0.0] + [min(0.9, 0.1 + 0.8 * i / max(1, args.frames - 2)) for i in range(args.frames - 1)]
+    stars = star_field(args.size, args.stars, 1)
+    frames, masks = [], []
+    try:
+        for index, coverage in enumerate(coverages):
+            clouds = cloud_mask(args.size, coverage, 100 + index)
+            path = os.path.join(workdir, f"frame{index}.png")
+            save_png(render_frame(args.size, stars, clouds, 200 + index), path)
+            frames.append(path)
+            masks.append(clouds)
+        print(f"合成图像: {args.frames} 帧 {args.size}x{args.size} RGB PNG，{args.stars} 颗星，"
+              f"约 {os.path.getsize(frames[0]) / 1e6:.1f} MB/帧")
+
+        # 逐帧计时（单线程，与后台线程中的处理相同）
+        analyzer = AllSkyAnalyzer(SETTINGS)
+        rows = []
+        for path, clouds in zip(frames, masks):
+            cpu = time.process_time()
+            start = time.perf_counter()
+            image = QImageReader(path).read()
+            decoded = time.perf_counter()
+            gray, full_scale = downsample_image(image, SETTINGS['analysis_size'])
+            reduced = time.perf_counter()
+            result = analyzer.analyze(gray, None, full_scale)
+            done = time.perf_counter()
+            cpu = time.process_time() - cpu
+            total, sectors = true_cover(analyzer, clouds, gray.shape)
+            estimated = np.array([np.nan if value is None else value
+                                  for value in result['sector_cloud_cover'].values()])
+            rows.append({'decode': decoded - start, 'downsample': reduced - decoded, 'analyze': done - reduced,
+                         'cpu': cpu, 'true': total, 'estimated': result['cloud_cover'],
+                         'sector_error': float(np.nanmean(np.abs(estimated - sectors))),
+                         'stars': result['star_count']})
+        full = None
+        if args.full_resolution:
+            full_analyzer = AllSkyAnalyzer(dict(SETTINGS, analysis_size=0))
+            samples = []
+            for path in frames:
+                gray, full_scale = downsample_image(QImageReader(path).read(), 0)
+                start = time.perf_counter()
+                full_analyzer.analyze(gray, None, full_scale)
+                samples.append(time.perf_counter() - start)
+            full = statistics.median(samples)
+
+        # 通过管线运行：文件按刷新间隔依次替换
+        target = os.path.join(workdir, 'allsky.png')
+        shutil.copyfile(frames[0], target)
+        pipeline = AllSkyImagePipeline(target, refresh_interval=args.interval, analyzer=AllSkyAnalyzer(SETTINGS))
+        arrivals = []
+        pipeline.analysis_ready.connect(lambda device, result: arrivals.append(time.perf_counter()))
+        checks = []
+        original_check = pipeline.check
+
+        def timed_check():
+            start = time.perf_counter()
+            original_check()
+            checks.append(time.perf_counter() - start)
+        pipeline._timer.timeout.disconnect()
+        pipeline._timer.timeout.connect(timed_check)
+        replaced = []
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        pipeline.start()
+        for path in frames[1:]:
+            wait_events(int(args.interval * 1000))
+            staging = target + '.tmp'
+            shutil.copyfile(path, staging)
+            os.replace(staging, target)
+            replaced.append(time.perf_counter())
+        wait_events(int(args.interval * 1000) + 500)
+        cpu_used, wall = time.process_time() - cpu_start, time.perf_counter() - wall_start
+        pipeline.stop()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    del app
+
+    median = {key: statistics.median(row[key] for row in rows) * 1000
+              for key in ('decode', 'downsample', 'analyze', 'cpu')}
+    print(f"每帧（中位数）: 解码 {median['decode']:.0f} ms，缩小到 {SETTINGS['analysis_size']} "
+          f"{median['downsample']:.0f} ms，分析 {median['analyze']:.0f} ms，CPU {median['cpu']:.0f} ms"
+          f"（{args.interval:.0f} s 刷新时约 {median['cpu'] / (args.interval * 1000) * 100:.1f}% 个核心）")
+    if full is not None:
+        print(f"按原尺寸 {args.size}x{args.size} 分析: {full * 1000:.0f} ms/帧"
+              f"（x{full * 1000 / median['analyze']:.0f}）")
+    latencies = [arrival - replace for replace in replaced
+                 for arrival in [next((a for a in arrivals if a > replace), None)] if arrival is not None]
+    print(f"管线 {wall:.0f} s（{len(replaced)} 次替换，刷新间隔 {args.interval:.0f} s）: "
+          f"进程 CPU {cpu_used / wall * 100:.1f}% 个核心，分析 {len(arrivals)} 帧，"
+          f"替换到结果 最长 {max(latencies) if latencies else float('nan'):.2f} s（含等待下一次检查），"
+          f"界面线程每次检查 {statistics.median(checks) * 1e6:.0f} us")
+    print(f"{'帧':>3} | {'真实云量':>8} | {'估计云量':>8} | {'天区平均误差':>12} | {'星数':>5}")
+    for index, row in enumerate(rows):
+        estimated = f"{row['estimated']:.1f}%" if row['estimated'] is not None else '--'
+        print(f"{index:>3} | {row['true']:>7.1f}% | {estimated:>8} | {row['sector_error']:>10.1f} 点 | {row['stars']:>5}")
+
+
+if __name__ == '__main__':
+    main()
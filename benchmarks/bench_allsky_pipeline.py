@@ -0,0 +1,117 @@
+"""
+全天相机刷新开销基准测试
+
+生成一张大尺寸合成全天图像，对比界面线程上的耗时：
+  - 原做法：每次刷新/resize 都 QPixmap(路径) 读盘解码并平滑缩放
+  - 管线：界面线程只做 stat 和最终的 setPixmap，解码缩放在后台线程完成
+同时统计一串连续 resize 事件触发的缩放次数。
+
+用法:
+    python benchmarks/bench_allsky_pipeline.py --size 4000 --refreshes 10 --resizes 30
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+from PyQt5.QtCore import QEventLoop, Qt, QTimer  # noqa: E402
+from PyQt5.QtGui import QImage, QPixmap  # noqa: E402
+from PyQt5.QtWidgets import QApplication, QLabel  # noqa: E402
+
+from src.services.allsky_pipeline import AllSkyImagePipeline  # noqa: E402
+
+
+def make_frame(path, size):
+    """生成带噪声和圆形视场的合成全天图像"""
+    rng = np.random.default_rng(1)
+    y, x = np.mgrid[0:size, 0:size]
+    r = np.hypot(x - size / 2, y - size / 2) / (size / 2)
+    sky = np.clip(40 + 30 * r + rng.normal(0, 8, (size, size)), 0, 255)
+    sky[r > 1] = 0
+    rgb = np.ascontiguousarray(np.repeat(sky.astype(np.uint8)[:, :, None], 3, axis=2))
+    image = QImage(rgb.data, size, size, 3 * size, QImage.Format_RGB888)
+    image.save(path)
+
+
+def wait_events(app, ms):
+    loop = QEventLoop()
+    QTimer.singleShot(ms, loop.quit)
+    loop.exec_()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='全天相机刷新开销基准测试')
+    parser.add_argument('--size', type=int, default=4000, help='合成图像边长（像素）')
+    parser.add_argument('--refreshes', type=int, default=10, help='刷新次数')
+    parser.add_argument('--resizes', type=int, default=30, help='连续 resize 事件数')
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    path = os.path.join(tempfile.mkdtemp(), 'allsky.png')
+    make_frame(path, args.size)
+    label = QLabel()
+    label.resize(600, 600)
+    label.show()
+    print(f"合成图像: {args.size}x{args.size}, {os.path.getsize(path) / 1e6:.1f} MB")
+
+    # 原做法：每次刷新都在界面线程读盘解码缩放
+    legacy = []
+    for _ in range(args.refreshes):
+        start = time.perf_counter()
+        pixmap = QPixmap(path)
+        label.setPixmap(pixmap.scaled(label.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation))
+        legacy.append(time.perf_counter() - start)
+    legacy_resize_start = time.perf_counter()
+    for i in range(args.resizes):
+        label.resize(600 + i, 600 + i)
+        pixmap = QPixmap(path)
+        label.setPixmap(pixmap.scaled(label.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation))
+    legacy_resize = time.perf_counter() - legacy_resize_start
+
+    # 管线：界面线程只做 stat 和交付
+    label.resize(600, 600)
+    pipeline = AllSkyImagePipeline(path, refresh_interval=3600)
+    worker_stats = []
+    pipeline.frame_stats.connect(worker_stats.append)
+    pipeline.attach(label)
+    pipeline.start()
+    wait_events(app, 200)
+    while pipeline.handoffs == 0:
+        wait_events(app, 50)
+
+    unchanged = []
+    for _ in range(args.refreshes):
+        start = time.perf_counter()
+        pipeline.check()
+        unchanged.append(time.perf_counter() - start)
+
+    handoffs_before = pipeline.handoffs
+    resize_gui = 0.0
+    for i in range(args.resizes):
+        start = time.perf_counter()
+        label.resize(600 + i, 600 + i)
+        app.processEvents()
+        resize_gui += time.perf_counter() - start
+    wait_events(app, 1000)
+    rescales = pipeline.handoffs - handoffs_before
+    pipeline.stop()
+
+    print(f"{'':>20} | {'界面线程耗时':>14}")
+    print(f"{'原做法 每次刷新':>20} | {statistics.mean(legacy) * 1000:>11.1f} ms")
+    print(f"{'管线 文件未变化':>20} | {statistics.mean(unchanged) * 1e6:>11.1f} us")
+    print(f"{args.resizes} 次连续 resize: 原做法界面线程 {legacy_resize * 1000:.0f} ms / {args.resizes} 次缩放；"
+          f"管线界面线程 {resize_gui * 1000:.1f} ms / {rescales} 次缩放")
+    decode = [s['decode_ms'] for s in worker_stats if s['decode_ms']]
+    scale = [s['scale_ms'] for s in worker_stats if s['scale_ms']]
+    if decode and scale:
+        print(f"后台线程: 解码 {statistics.mean(decode):.0f} ms, 缩放 {statistics.mean(scale):.0f} ms（不占用界面线程）")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+"""
+角度可视化重绘基准测试
+
+生成一张 --image-size×--image-size 的合成 DSS 星图（JPEG），在 --width×--width 的控件上模拟：
+消旋器以 --rate 次/秒轮询并调用 set_angles（角度持续变化），DSSImageFetcher 每 --dss-interval 秒
+对同一文件触发一次 image_ready，中途按 --resizes 次改变控件尺寸。比较两种控件：
+  - 原控件：每次 image_ready 重新解码并缩放，每次 set_angles 立即 update()，每次重绘整幅 drawImage
+    背景（与 components.AngleVisualizer 一致）
+  - 分层缓存：CachedAngleVisualizer
+统计：
+  - 重绘次数、每次重绘耗时（中位数）、界面线程用于重绘和 set_background 的总时间、背景解码和缩放次数
+  - 单次重绘的组成：强制同步重绘 --repeat 次的平均耗时，以及只画矢量层的耗时
+
+用法:
+    python benchmarks/bench_angle_visualizer.py --rate 200 --duration 5 --image-size 1500
+    QT_SCALE_FACTOR=2 python benchmarks/bench_angle_visualizer.py   # 高分屏（设备像素比 2）
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+from PyQt5.QtCore import QEventLoop, Qt, QTimer  # noqa: E402
+from PyQt5.QtGui import QColor, QImage, QPainter, QPixmap  # noqa: E402
+from PyQt5.QtWidgets import QApplication  # noqa: E402
+
+from src.ui.angle_visualizer import CachedAngleVisualizer  # noqa: E402
+
+
+class LegacyAngleVisualizer(CachedAngleVisualizer):
+    """与 components.AngleVisualizer 相同的行为：每次解码、立即重绘、每次绘制整幅背景"""
+
+    def set_background(self, image_path):
+        if image_path and os.path.exists(image_path):
+            self.original_image = QImage(image_path)
+            self.stats['decodes'] += 1
+            if not self.original_image.isNull():
+                self.update_background_image()
+            self.update()
+
+    def update_background_image(self):
+        if self.original_image is None or self.original_image.isNull():
+            return
+        _, _, available_size = self._geometry()
+        self.background_image = self.original_image.scaled(available_size, available_size, Qt.KeepAspectRatio,
+                                                           Qt.SmoothTransformation)
+        self.stats['scales'] += 1
+
+    def resizeEvent(self, event):
+        super(CachedAngleVisualizer, self).resizeEvent(event)
+        self.update_background_image()
+        self.update()
+
+    def set_angles(self, dec_angle, rotator_angle):
+        self.stats['angle_updates'] += 1
+        self.rotator_angle = rotator_angle
+        self.last_rotator_angle = rotator_angle
+        self.dec_angle = dec_angle
+        self.update()
+
+    def paintEvent(self, event):
+        start = time.perf_counter()
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        center_x, center_y, size = self._geometry()
+        margins = self.contentsMargins()
+        if self.background_image is not None:
+            painter.drawImage(int(center_x - self.background_image.width() / 2),
+                              int(center_y - self.background_image.height() / 2), self.background_image)
+        else:
+            painter.fillRect(margins.left(), margins.top(), self.width() - margins.left() - margins.right(),
+                             self.height() - margins.top() - margins.bottom(), QColor(240, 240, 240))
+        painter.setOpacity(0.7)
+        painter.save()
+        painter.setBrush(QColor(100, 100, 100))
+        painter.setPen(Qt.NoPen)
+        painter.drawEllipse(int(center_x - 3), int(center_y - 3), 6, 6)
+        painter.restore()
+        self._draw_overlay(painter, center_x, center_y, size)
+        painter.end()
+        self.stats['paints'] += 1
+        self.stats['paint_seconds'] += time.perf_counter() - start
+
+
+def synthetic_dss(size, path):
+    """带噪声背景、星点和一个星系的灰度 JPEG"""
+    rng = np.random.default_rng(3)
+    sky = rng.normal(40, 6, (size, size))
+    y, x = np.ogrid[0:size, 0:size]
+    sky += 120 * np.exp(-(((x - size * 0.45) / (size * 0.08)) ** 2 + ((y - size * 0.55) / (size * 0.03)) ** 2))
+    stars = rng.integers(0, size, (size // 2, 2))
+    sky[stars[:, 0], stars[:, 1]] += rng.exponential(120, len(stars))
+    gray = np.ascontiguousarray(np.clip(sky, 0, 255).astype(np.uint8))
+    QImage(gray.data, size, size, size, QImage.Format_Grayscale8).save(path, 'JPEG', 90)
+
+
+def wait_events(ms):
+    loop = QEventLoop()
+    QTimer.singleShot(ms, loop.quit)
+    loop.exec_()
+
+
+def track_paints(widget):
+    """记录每次 paintEvent 的耗时"""
+    samples = []
+    paint = widget.paintEvent
+
+    def timed(event):
+        start = time.perf_counter()
+        paint(event)
+        samples.append(time.perf_counter() - start)
+    widget.paintEvent = timed
+    return samples
+
+
+def scenario(widget_cls, args, image_path):
+    """按轮询频率驱动控件；返回 (控件, 每次重绘耗时, set_background 总耗时, 实际时长)"""
+    widget = widget_cls()
+    widget.resize(args.width, args.width)
+    widget.show()
+    widget.set_background(image_path)
+    wait_events(300)
+    samples = track_paints(widget)
+    background_time = [0.0]
+    polls = [0]
+    sizes = [args.width + 40 * (index % 2 == 0) - 20 for index in range(args.resizes)]
+
+    def poll():
+        polls[0] += 1
+        # 消旋器角度持续变化，赤纬方向缓慢变化
+        widget.set_angles(30.0 + polls[0] * 0.001, (polls[0] * 0.37) % 360)
+
+    def image_ready():
+        start = time.perf_counter()
+        widget.set_background(image_path)
+        background_time[0] += time.perf_counter() - start
+
+    def resize():
+        if sizes:
+            side = sizes.pop()
+            widget.resize(side, side)
+
+    timers = []
+    for interval, slot in ((1000.0 / args.rate, poll), (args.dss_interval * 1000, image_ready),
+                           (args.duration * 1000 / (args.resizes + 1), resize)):
+        timer = QTimer()
+        timer.setTimerType(Qt.PreciseTimer)
+        timer.timeout.connect(slot)
+        timer.start(max(1, int(interval)))
+        timers.append(timer)
+    start = time.perf_counter()
+    wait_events(int(args.duration * 1000))
+    elapsed = time.perf_counter() - start
+    for timer in timers:
+        timer.stop()
+    widget.paintEvent = type(widget).paintEvent.__get__(widget)
+    return widget, samples, background_time[0], elapsed, polls[0]
+
+
+def forced_paint_cost(widget, repeat):
+    """强制同步重绘 repeat 次的平均耗时（毫秒）"""
+    start = time.perf_counter()
+    for index in range(repeat):
+        widget.dec_angle, widget.rotator_angle = 30.0, index * 0.5
+        widget.repaint()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def overlay_cost(widget, repeat):
+    """只画矢量层的平均耗时（毫秒），画到与控件同尺寸的透明 QPixmap 上"""
+    ratio = widget.devicePixelRatioF()
+    target = QPixmap(int(widget.width() * ratio), int(widget.height() * ratio))
+    target.setDevicePixelRatio(ratio)
+    target.fill(Qt.transparent)
+    center_x, center_y, size = widget._geometry()
+    start = time.perf_counter()
+    for index in range(repeat):
+        widget.rotator_angle = index * 0.5
+        painter = QPainter(target)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setOpacity(0.7)
+        widget._draw_overlay(painter, center_x, center_y, size)
+        painter.end()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='角度可视化重绘基准测试')
+    parser.add_argument('--rate', type=float, default=200.0, help='消旋器轮询频率（次/秒）')
+    parser.add_argument('--duration', type=float, default=5.0, help='每种控件的运行时长（秒）')
+    parser.add_argument('--image-size', type=int, default=1500, help='合成 DSS 星图边长（像素）')
+    parser.add_argument('--width', type=int, default=500, help='控件边长（逻辑像素）')
+    parser.add_argument('--dss-interval', type=float, default=1.0, help='image_ready 触发间隔（秒）')
+    parser.add_argument('--resizes', type=int, default=4, help='运行期间改变控件尺寸的次数')
+    parser.add_argument('--repeat', type=int, default=200, help='强制重绘计时的次数')
+    args = parser.parse_args()
+
+    app = QApplication([sys.argv[0]])
+    workdir = tempfile.mkdtemp(prefix='angle_bench_')
+    try:
+        image_path = os.path.join(workdir, 'dss.jpg')
+        synthetic_dss(args.image_size, image_path)
+        screen = app.primaryScreen()
+        print(f"合成 DSS 星图 {args.image_size}x{args.image_size} JPEG（{os.path.getsize(image_path) / 1e3:.0f} KB），"
+              f"控件 {args.width}x{args.width}，设备像素比 {app.devicePixelRatio():.0f}，"
+              f"屏幕刷新率 {screen.refreshRate():.0f} Hz")
+        print(f"消旋器轮询 {args.rate:.0f} 次/秒，image_ready 每 {args.dss_interval:.1f} s，"
+              f"运行 {args.duration:.0f} s，改变尺寸 {args.resizes} 次")
+        print(f"{'':>8} | {'重绘/秒':>7} | {'每次重绘 中位数':>14} | {'强制重绘':>8} | {'只画矢量层':>10} | "
+              f"{'重绘总时间':>10} | {'set_background':>14} | 解码 | 缩放")
+        for name, widget_cls in (('原控件', LegacyAngleVisualizer), ('分层缓存', CachedAngleVisualizer)):
+            widget, samples, background_time, elapsed, polls = scenario(widget_cls, args, image_path)
+            forced = forced_paint_cost(widget, args.repeat)
+            overlay = overlay_cost(widget, args.repeat)
+            median = statistics.median(samples) * 1000 if samples else float('nan')
+            print(f"{name:>8} | {len(samples) / elapsed:>7.0f} | {median:>11.2f} ms | {forced:>5.2f} ms | "
+                  f"{overlay:>7.2f} ms | {sum(samples) * 1000:>7.0f} ms | {background_time * 1000:>11.1f} ms | "
+                  f"{widget.stats['decodes']:>4} | {widget.stats['scales']:>4}")
+            if widget_cls is CachedAngleVisualizer:
+                print(f"分层缓存: set_angles {polls} 次，合并 {widget.stats['coalesced']} 次，"
+                      f"背景层重建 {widget.stats['layer_builds']} 次，跳过重复解码 {widget.stats['decode_skipped']} 次")
+            widget.close()
+            widget.deleteLater()
+            wait_events(100)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
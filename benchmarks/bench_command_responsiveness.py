@@ -0,0 +1,134 @@
+"""
+命令执行期间界面事件循环响应性基准测试
+
+在 Qt 事件循环中运行一个 10ms 定时器，同时向故意放慢的桩服务器发送开圆顶、开镜头盖命令：
+  - 同步：在界面线程中直接调用客户端（原 MainWindow 的做法）
+  - 执行器：通过 CommandExecutor 在工作线程中发送并等待设备到达目标状态
+比较定时器的抖动（实际间隔与设定间隔之差）。
+
+用法:
+    python benchmarks/bench_command_responsiveness.py --command-latency 1500 --motion-time 3
+"""
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt5.QtCore import QCoreApplication, QTimer  # noqa: E402
+
+from src.services.alpaca_registry import AlpacaClientRegistry  # noqa: E402
+from src.services.command_executor import CommandExecutor, DeviceCommand  # noqa: E402
+from src.simulators.alpaca_server import AlpacaStubServer  # noqa: E402
+
+TICK_MS = 10
+
+
+class JitterProbe:
+    """记录定时器实际触发间隔"""
+
+    def __init__(self):
+        self.intervals = []
+        self._last = None
+        self.timer = QTimer()
+        self.timer.setInterval(TICK_MS)
+        self.timer.timeout.connect(self._tick)
+
+    def _tick(self):
+        now = time.perf_counter()
+        if self._last is not None:
+            self.intervals.append(now - self._last)
+        self._last = now
+
+    def start(self):
+        self._last = None
+        self.intervals = []
+        self.timer.start()
+
+    def stop(self):
+        self.timer.stop()
+
+    def jitter(self):
+        """返回 (最大抖动, P99 抖动)，单位毫秒"""
+        jitters = sorted(max(0.0, i * 1000 - TICK_MS) for i in self.intervals)
+        if not jitters:
+            return 0.0, 0.0
+        return jitters[-1], jitters[int(0.99 * (len(jitters) - 1))]
+
+
+def run_sync(app, probe, client):
+    """在界面线程中同步发送命令"""
+    def fire():
+        client.open_dome_shutter(0)
+        client.open_cover(0)
+        QTimer.singleShot(200, app.quit)
+
+    probe.start()
+    QTimer.singleShot(100, fire)
+    app.exec_()
+    probe.stop()
+    return probe.jitter()
+
+
+def run_executor(app, probe, executor, base_url):
+    """通过命令执行器发送命令并等待设备到达目标状态"""
+    finished = []
+
+    def on_finished(command_id, result):
+        finished.append(result)
+        if len(finished) == 2:
+            QTimer.singleShot(200, app.quit)
+
+    def fire():
+        executor.submit(DeviceCommand('dome', 'openshutter', base_url=base_url, poll_interval=0.1))
+        executor.submit(DeviceCommand('covercalibrator', 'opencover', base_url=base_url, poll_interval=0.1))
+
+    executor.command_finished.connect(on_finished)
+    probe.start()
+    QTimer.singleShot(100, fire)
+    app.exec_()
+    probe.stop()
+    return probe.jitter(), finished
+
+
+def main():
+    parser = argparse.ArgumentParser(description='命令执行期间事件循环响应性基准测试')
+    parser.add_argument('--command-latency', type=float, default=1500.0, help='命令请求的人为延迟（毫秒）')
+    parser.add_argument('--latency', type=float, default=30.0, help='状态读取的人为延迟（毫秒）')
+    parser.add_argument('--motion-time', type=float, default=3.0, help='圆顶/镜头盖动作耗时（秒）')
+    args = parser.parse_args()
+
+    app = QCoreApplication(sys.argv)
+    server = AlpacaStubServer(latency=args.latency / 1000.0, motion_time=args.motion_time).start()
+    for action in ('openshutter', 'closeshutter', 'opencover', 'closecover'):
+        server.endpoint_latency[action] = args.command_latency / 1000.0
+    registry = AlpacaClientRegistry(config={'client_id': 123, 'devices': {}})
+    client = registry.get_client(server.base_url)
+    executor = CommandExecutor(registry)
+    probe = JitterProbe()
+    print(f"桩服务器: {server.base_url}, 命令延迟 {args.command_latency:.0f}ms, "
+          f"动作耗时 {args.motion_time:.1f}s, 定时器间隔 {TICK_MS}ms")
+    try:
+        sync_max, sync_p99 = run_sync(app, probe, client)
+        # 等同步阶段的模拟动作结束后再复位状态
+        time.sleep(args.motion_time)
+        server.set_value('dome', 'shutterstatus', 1)
+        server.set_value('covercalibrator', 'coverstate', 1)
+        (exec_max, exec_p99), results = run_executor(app, probe, executor, server.base_url)
+    finally:
+        executor.shutdown()
+        registry.close_all()
+        server.stop()
+
+    print(f"{'方式':>8} | {'最大抖动 (ms)':>12} | {'P99 抖动 (ms)':>12}")
+    print(f"{'同步':>8} | {sync_max:>12.1f} | {sync_p99:>12.1f}")
+    print(f"{'执行器':>8} | {exec_max:>12.1f} | {exec_p99:>12.1f}")
+    for result in results:
+        print(f"  {result['device']}.{result['action']}: 成功={result['success']} 状态={result['state']} "
+              f"往返 {result['rtt'] * 1000:.0f}ms, 到达目标共 {result['elapsed']:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
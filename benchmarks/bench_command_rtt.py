@@ -0,0 +1,94 @@
+"""
+命令往返时间基准测试
+
+对比两种发送圆顶/镜头盖命令的方式：
+  - 每次点击：解析 config.yaml、新建带重试的 requests 会话、建立新连接后发送（原 MainWindow 的做法）
+  - 共享客户端：通过 alpaca_registry 复用长连接会话直接发送
+
+请求发往本地 Alpaca 桩服务器，--latency 模拟单次请求往返，--connect-latency 模拟建立 TCP 连接的握手开销。
+
+用法:
+    python benchmarks/bench_command_rtt.py --latency 30 --connect-latency 30 --clicks 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import requests
+import yaml
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.services.alpaca_registry import AlpacaClientRegistry  # noqa: E402
+from src.simulators.alpaca_server import AlpacaStubServer  # noqa: E402
+
+COMMANDS = [('dome', 'openshutter'), ('dome', 'closeshutter'),
+            ('covercalibrator', 'opencover'), ('covercalibrator', 'closecover')]
+
+
+def per_click_command(base_url, device_type, action):
+    """按原做法发送一次命令：读配置、建会话、发请求"""
+    with open(os.path.join(ROOT, 'config.yaml'), 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    session = requests.Session()
+    retry = Retry(total=5, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504])
+    session.mount('http://', HTTPAdapter(max_retries=retry))
+    params = {'ClientID': int(config['client_id']), 'ClientTransactionID': int(config['transaction_id'])}
+    response = session.put(f"{base_url}/api/v1/{device_type}/0/{action}", params=params, timeout=(5, 30))
+    response.raise_for_status()
+    session.close()
+    return response.json().get('ErrorNumber', 0) == 0
+
+
+def measure(clicks, send):
+    samples = []
+    for i in range(clicks):
+        device_type, action = COMMANDS[i % len(COMMANDS)]
+        start = time.perf_counter()
+        if not send(device_type, action):
+            raise RuntimeError(f"{device_type}/{action} 命令失败")
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return statistics.mean(samples) * 1000, samples[int(0.95 * (len(samples) - 1))] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='命令往返时间基准测试')
+    parser.add_argument('--latency', type=float, default=30.0, help='模拟单次请求延迟（毫秒）')
+    parser.add_argument('--connect-latency', type=float, default=30.0, help='模拟建立连接的延迟（毫秒）')
+    parser.add_argument('--clicks', type=int, default=20, help='模拟点击次数')
+    args = parser.parse_args()
+
+    server = AlpacaStubServer(latency=args.latency / 1000.0, motion_time=0.0,
+                              connect_latency=args.connect_latency / 1000.0).start()
+    registry = AlpacaClientRegistry(config={'client_id': 123, 'devices': {}})
+    print(f"桩服务器: {server.base_url}, 请求延迟 {args.latency:.0f}ms, 连接延迟 {args.connect_latency:.0f}ms")
+    try:
+        server.reset_counters()
+        fresh_mean, fresh_p95 = measure(
+            args.clicks, lambda device_type, action: per_click_command(server.base_url, device_type, action))
+        fresh_connections = server.connection_count
+
+        client = registry.get_client(server.base_url)
+        client.find_devices()  # 预热连接
+        server.reset_counters()
+        shared_mean, shared_p95 = measure(
+            args.clicks, lambda device_type, action: client.put(device_type, 0, action))
+        shared_connections = server.connection_count
+    finally:
+        registry.close_all()
+        server.stop()
+
+    print(f"{'方式':>10} | {'平均 (ms)':>10} | {'P95 (ms)':>10} | {'新建连接数':>10}")
+    print(f"{'每次点击':>10} | {fresh_mean:>10.1f} | {fresh_p95:>10.1f} | {fresh_connections:>10}")
+    print(f"{'共享客户端':>10} | {shared_mean:>10.1f} | {shared_p95:>10.1f} | {shared_connections:>10}")
+    print(f"网络往返下限: {args.latency:.0f}ms")
+
+
+if __name__ == '__main__':
+    main()
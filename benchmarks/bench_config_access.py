@@ -0,0 +1,58 @@
+"""
+配置读取开销基准测试
+
+对比热路径上每次调用 load_config()（重新读取并解析 config.yaml）与读取配置服务快照的耗时，
+例如全天相机每 5 秒刷新、每次 resizeEvent 读取 refresh_interval 和图片路径。
+
+用法:
+    python benchmarks/bench_config_access.py --calls 2000
+"""
+import argparse
+import os
+import sys
+import time
+
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.config.config_service import ConfigService  # noqa: E402
+
+CONFIG_PATH = os.path.join(ROOT, 'config.yaml')
+
+
+def load_config():
+    """与 utils.load_config() 相同的读取方式"""
+    with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
+        return yaml.safe_load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='配置读取开销基准测试')
+    parser.add_argument('--calls', type=int, default=2000, help='调用次数')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    for _ in range(args.calls):
+        load_config()['devices']['allsky_camera'].get('refresh_interval', 5)
+    parse_us = (time.perf_counter() - start) / args.calls * 1e6
+
+    service = ConfigService(CONFIG_PATH, watch=False)
+    start = time.perf_counter()
+    for _ in range(args.calls):
+        service.get('devices.allsky_camera.refresh_interval', 5)
+    snapshot_us = (time.perf_counter() - start) / args.calls * 1e6
+
+    start = time.perf_counter()
+    for _ in range(args.calls):
+        service.check_for_changes()
+    stat_us = (time.perf_counter() - start) / args.calls * 1e6
+
+    print(f"load_config() 每次调用: {parse_us:10.1f} us")
+    print(f"配置快照读取每次调用: {snapshot_us:10.2f} us  ({parse_us / snapshot_us:.0f}x)")
+    print(f"文件变化检查（stat）每次: {stat_us:10.2f} us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+设备发现基准测试
+
+在本机回环地址上启动几台 Alpaca 桩服务器，模拟站点上常见的情况：
+  - 127.0.0.4：配置中排第一，接受连接但长时间不应答（服务进程卡住）
+  - 127.0.0.5：配置中有，没有服务（连接被拒绝）
+  - 127.0.0.3：正常，配置中有
+  - 127.0.0.2：正常，只能通过 UDP 发现广播找到（配置中没有）
+比较：
+  - 原做法：像 AlpacaClient.find_devices() 一样逐台查询配置中的服务器（10 s 超时，不做广播发现）
+  - 发现服务：UDP 广播与所有服务器的并行查询同时进行，每台服务器有短超时
+报告首个设备到达时间、完成时间、找到的设备数，以及从磁盘缓存读取上次结果的耗时。
+
+用法:
+    python benchmarks/bench_discovery.py --hang 15
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests  # noqa: E402
+from PyQt5.QtCore import Qt  # noqa: E402
+
+from src.services.discovery_service import DiscoveryService  # noqa: E402
+from src.simulators.alpaca_server import AlpacaDiscoveryResponder, AlpacaStubServer  # noqa: E402
+
+DISCOVERY_PORT = 32227
+
+
+def run_legacy(urls):
+    """逐台查询，返回 (首个设备到达时间, 完成时间, 设备数)"""
+    start = time.perf_counter()
+    first = None
+    devices = []
+    for url in urls:
+        try:
+            response = requests.get(f"{url}/management/v1/configureddevices", timeout=10)
+            found = response.json().get('Value') or []
+        except (requests.exceptions.RequestException, ValueError):
+            found = []
+        if found and first is None:
+            first = time.perf_counter() - start
+        devices += found
+    return first, time.perf_counter() - start, len(devices)
+
+
+def run_service(service):
+    """返回 (首个设备到达时间, 完成时间, 设备数, 失败的服务器数)"""
+    arrivals = []
+    start = time.perf_counter()
+    service.devices_found.connect(lambda url, devices: arrivals.append(time.perf_counter() - start),
+                                  Qt.DirectConnection)
+    devices = service.discover()
+    elapsed = time.perf_counter() - start
+    return (min(arrivals) if arrivals else None), elapsed, len(devices), len(service.last_errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='设备发现基准测试')
+    parser.add_argument('--hang', type=float, default=15.0, help='卡住的服务器应答前等待的秒数')
+    parser.add_argument('--read-timeout', type=float, default=3.0, help='发现服务每台服务器的读取超时（秒）')
+    args = parser.parse_args()
+
+    udp_only = AlpacaStubServer(host='127.0.0.2').start()
+    healthy = AlpacaStubServer(host='127.0.0.3').start()
+    hung = AlpacaStubServer(host='127.0.0.4', connect_latency=args.hang).start()
+    responders = [AlpacaDiscoveryResponder(server.port, host=server.host, port=DISCOVERY_PORT).start()
+                  for server in (udp_only, healthy)]
+    configured = [hung.base_url, 'http://127.0.0.5:11111', healthy.base_url]
+    workdir = tempfile.mkdtemp(prefix='discovery-bench-')
+    try:
+        service = DiscoveryService({
+            'servers': configured, 'include_config': False, 'broadcast': False,
+            'udp_targets': ['127.0.0.2', '127.0.0.3', '127.0.0.4', '127.0.0.5'], 'port': DISCOVERY_PORT,
+            'read_timeout': args.read_timeout, 'deadline': args.read_timeout + 1.0,
+            'cache_path': os.path.join(workdir, 'discovery_cache.json'),
+        })
+        rows = [('原做法 逐台查询',) + run_legacy(configured) + (None,)]
+        rows.append(('发现服务',) + run_service(service))
+        start = time.perf_counter()
+        cached = service.cached_devices()
+        cache_ms = (time.perf_counter() - start) * 1000
+    finally:
+        for responder in responders:
+            responder.stop()
+        for server in (udp_only, healthy, hung):
+            server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"4 台服务器（1 台仅广播可见、1 台卡住 {args.hang:.0f} s、1 台拒绝连接），"
+          f"发现服务读取超时 {args.read_timeout:.1f} s")
+    print(f"{'':>14} | {'首个设备':>8} | {'完成':>8} | 设备数 | 失败服务器")
+    for name, first, elapsed, count, failed in rows:
+        first_text = f"{first * 1000:>7.0f} ms" if first is not None else f"{'-':>10}"
+        failed_text = '-' if failed is None else str(failed)
+        print(f"{name:>14} | {first_text} | {elapsed:>8.2f} s | {count:>6} | {failed_text}")
+    print(f"启动时从磁盘缓存读取上次结果: {len(cached)} 个设备，耗时 {cache_ms:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+DSS 图像缓存基准测试
+
+模拟长期观测中的指向序列：从一组常用目标中反复选取，每次指向带有几角秒到一角分的误差，
+跟踪过程中坐标还会多次小幅变化。对比：
+  - 旧做法：坐标保留两位小数作为文件名，文件名不同就重新下载，目录无上限增长
+  - 缓存：空间索引复用视场内的图像，磁盘 LRU 限额，重启后清单仍然有效
+
+请求发往本地 DSS 桩服务器。
+
+用法:
+    python benchmarks/bench_dss_cache.py --pointings 2000 --targets 150 --max-mb 16
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.dss_cache import DSSImageCache  # noqa: E402
+from src.simulators.survey_server import SurveyStubServer  # noqa: E402
+
+
+def pointing_sequence(count, targets, seed=7):
+    """生成 (赤经小时, 赤纬度) 的指向序列"""
+    rng = random.Random(seed)
+    fields = [(rng.uniform(0, 24), rng.uniform(-20, 85)) for _ in range(targets)]
+    weights = [1.0 / (i + 1) for i in range(targets)]  # 少数目标被频繁观测
+    sequence = []
+    while len(sequence) < count:
+        ra, dec = rng.choices(fields, weights)[0]
+        ra += rng.gauss(0, 20 / 3600 / 15)
+        dec += rng.gauss(0, 20 / 3600)
+        for _ in range(rng.randint(1, 4)):
+            # 跟踪/微调过程中的坐标变化
+            sequence.append((ra + rng.gauss(0, 10 / 3600 / 15), dec + rng.gauss(0, 10 / 3600)))
+    return sequence[:count]
+
+
+def directory_bytes(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def run_legacy(sequence, url, directory):
+    session = requests.Session()
+    downloads = 0
+    for ra, dec in sequence:
+        path = os.path.join(directory, f"dss_image_{ra:.2f}_{dec:.2f}.gif")
+        if os.path.exists(path):
+            continue
+        response = session.get(url, params={'r': ra * 15, 'd': dec}, timeout=30)
+        with open(path, 'wb') as f:
+            f.write(response.content)
+        downloads += 1
+    return downloads
+
+
+def main():
+    parser = argparse.ArgumentParser(description='DSS 图像缓存基准测试')
+    parser.add_argument('--pointings', type=int, default=2000, help='指向次数')
+    parser.add_argument('--targets', type=int, default=150, help='目标数量')
+    parser.add_argument('--max-mb', type=float, default=16.0, help='缓存磁盘上限（MB）')
+    parser.add_argument('--latency', type=float, default=20.0, help='DSS 桩服务器延迟（毫秒）')
+    args = parser.parse_args()
+
+    server = SurveyStubServer(latency=args.latency / 1000.0).start()
+    workdir = tempfile.mkdtemp()
+    sequence = pointing_sequence(args.pointings, args.targets)
+    try:
+        legacy_dir = os.path.join(workdir, 'legacy')
+        os.makedirs(legacy_dir)
+        start = time.perf_counter()
+        legacy_downloads = run_legacy(sequence, server.url, legacy_dir)
+        legacy_time = time.perf_counter() - start
+        legacy_bytes = directory_bytes(legacy_dir)
+
+        settings = {'cache_dir': os.path.join(workdir, 'cache'), 'url': server.url,
+                    'max_bytes': int(args.max_mb * 1024 * 1024)}
+        cache = DSSImageCache(settings)
+        start = time.perf_counter()
+        for ra, dec in sequence:
+            cache.get_path(ra, dec)
+        cache.flush()
+        cache_time = time.perf_counter() - start
+        cache_bytes = directory_bytes(cache.cache_dir)
+        stats = dict(cache.stats)
+
+        # 模拟重启：重新加载清单后重复最近的 200 次指向
+        restarted = DSSImageCache(settings)
+        for ra, dec in sequence[-200:]:
+            restarted.get_path(ra, dec)
+    finally:
+        server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"指向次数 {args.pointings}，目标 {args.targets} 个，缓存上限 {args.max_mb:.0f} MB")
+    print(f"{'':>8} | {'下载次数':>8} | {'磁盘占用 (MB)':>12} | {'总耗时 (s)':>10}")
+    print(f"{'旧做法':>8} | {legacy_downloads:>8} | {legacy_bytes / 1e6:>12.1f} | {legacy_time:>10.1f}")
+    print(f"{'缓存':>8} | {stats['downloads']:>8} | {cache_bytes / 1e6:>12.1f} | {cache_time:>10.1f}")
+    print(f"缓存命中 {stats['hits']}，未命中 {stats['misses']}，淘汰 {stats['evictions']}")
+    print(f"重启后重复最近 200 次指向: 下载 {restarted.stats['downloads']} 次，命中 {restarted.stats['hits']} 次")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+DSS 预取基准测试
+
+本地 Alpaca 桩服务器模拟望远镜指向，本地 DSS 桩服务器模拟较慢的巡天服务。测量：
+  1. 指向结束后到目标视场图像可用的等待时间：到位后才请求 vs 指向开始时按目标坐标预取
+  2. 目标列表预热期间（队列中有大量任务）当前视场请求的延迟，验证不会排在预取之后
+
+用法:
+    python benchmarks/bench_dss_prefetch.py --survey-latency 1500 --slew-time 4 --targets 30
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.alpaca_registry import AlpacaClientRegistry  # noqa: E402
+from src.services.dss_cache import DSSImageCache  # noqa: E402
+from src.services.dss_prefetch import PrefetchingDSSImageFetcher  # noqa: E402
+from src.simulators.alpaca_server import AlpacaStubServer  # noqa: E402
+from src.simulators.survey_server import SurveyStubServer  # noqa: E402
+
+
+def wait_for(predicate, timeout=60.0, step=0.01):
+    start = time.perf_counter()
+    while not predicate():
+        if time.perf_counter() - start > timeout:
+            raise TimeoutError
+        time.sleep(step)
+    return time.perf_counter() - start
+
+
+def slew_and_measure(alpaca, client, cache, fetcher, ra, dec, prefetch):
+    """发起一次指向，返回到位后目标图像可用的等待时间（秒）"""
+    client.put('telescope', 0, 'slewtocoordinatesasync', {'RightAscension': ra, 'Declination': dec})
+    while True:
+        snapshot = client.get_multiple('telescope', 0, ['slewing', 'targetrightascension', 'targetdeclination'])
+        if prefetch:
+            fetcher.on_telescope_snapshot(snapshot)
+        if not snapshot['slewing']:
+            break
+        time.sleep(0.5)
+    # 到位：界面请求当前视场
+    fetcher.set_coordinates(ra, dec)
+    return wait_for(lambda: cache.lookup(ra, dec) is not None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='DSS 预取基准测试')
+    parser.add_argument('--survey-latency', type=float, default=1500.0, help='DSS 桩服务器延迟（毫秒）')
+    parser.add_argument('--slew-time', type=float, default=4.0, help='模拟指向耗时（秒）')
+    parser.add_argument('--slews', type=int, default=3, help='每种模式的指向次数')
+    parser.add_argument('--targets', type=int, default=30, help='预热目标列表长度')
+    parser.add_argument('--parallel', type=int, default=3, help='预取并发数')
+    args = parser.parse_args()
+
+    alpaca = AlpacaStubServer(motion_time=args.slew_time).start()
+    survey = SurveyStubServer(latency=args.survey_latency / 1000.0).start()
+    registry = AlpacaClientRegistry(config={'client_id': 1, 'devices': {'telescope': {'api_url': alpaca.base_url}}})
+    client = registry.client_for_device('telescope')
+    workdir = tempfile.mkdtemp()
+    rng = random.Random(3)
+    results = {}
+    try:
+        for mode in ('到位后请求', '指向时预取'):
+            cache = DSSImageCache({'cache_dir': os.path.join(workdir, mode), 'url': survey.url})
+            fetcher = PrefetchingDSSImageFetcher(cache, max_parallel=args.parallel, registry=registry)
+            waits = [slew_and_measure(alpaca, client, cache, fetcher, rng.uniform(0, 24), rng.uniform(0, 80),
+                                      prefetch=(mode == '指向时预取'))
+                     for _ in range(args.slews)]
+            fetcher.stop()
+            results[mode] = waits
+
+        # 预热目标列表的同时请求当前视场
+        target_file = os.path.join(workdir, 'targets.txt')
+        with open(target_file, 'w', encoding='utf-8') as f:
+            for i in range(args.targets):
+                f.write(f"T{i} {rng.uniform(0, 24):.5f} {rng.uniform(-10, 80):.5f}\n")
+        cache = DSSImageCache({'cache_dir': os.path.join(workdir, 'warm'), 'url': survey.url})
+        fetcher = PrefetchingDSSImageFetcher(cache, max_parallel=args.parallel, registry=registry)
+        survey.reset_counters()
+        start = time.perf_counter()
+        queued = fetcher.warm_from_target_list(target_file)
+        time.sleep(0.2)
+        current = (rng.uniform(0, 24), rng.uniform(0, 80))
+        fetcher.set_coordinates(*current)
+        current_wait = wait_for(lambda: cache.lookup(*current) is not None)
+        wait_for(lambda: fetcher.queue_size == 0 and fetcher.stats['prefetched'] >= queued, timeout=600)
+        warm_time = time.perf_counter() - start
+        max_concurrent = survey.max_concurrent
+        fetcher.stop()
+    finally:
+        alpaca.stop()
+        survey.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"DSS 延迟 {args.survey_latency:.0f}ms，指向耗时 {args.slew_time:.1f}s，预取并发 {args.parallel}")
+    for mode, waits in results.items():
+        print(f"  {mode}: 到位后等待图像 平均 {sum(waits) / len(waits) * 1000:.0f} ms，最大 {max(waits) * 1000:.0f} ms")
+    print(f"  预热 {queued} 个目标共 {warm_time:.1f}s（服务器最大并发 {max_concurrent}），"
+          f"期间当前视场请求等待 {current_wait * 1000:.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
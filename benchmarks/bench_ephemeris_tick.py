@@ -0,0 +1,119 @@
+"""
+1 Hz 时钟刷新的星历计算开销基准测试
+
+对比每次时钟刷新（get_sun_info + get_twilight_info + calculate_moon_phase）的耗时：
+  - 原做法：每次刷新都重新计算（安装了 astropy/astroplan 时测量 astroplan 的逐次计算，
+    否则测量每次重算整张星历表的耗时）
+  - 星历缓存：每天计算一次，刷新时只做插值
+并给出网格插值相对逐点直接计算的误差，以及（安装了 astropy 时）相对 astropy 的误差。
+
+用法:
+    python benchmarks/bench_ephemeris_tick.py --ticks 2000
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+from src.services.ephemeris_cache import (EphemerisCache, compare_with_astropy, julian_date,  # noqa: E402
+                                          moon_elongation, sun_altitude)
+
+
+def time_calls(func, count):
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def astroplan_tick_factory(cache):
+    """与原 astronomy_service 相同思路的 astroplan 逐次计算，未安装时返回 None"""
+    try:
+        import astropy.units as u
+        from astroplan import Observer
+        from astropy.coordinates import AltAz, EarthLocation, get_sun
+        from astropy.time import Time
+    except ImportError:
+        return None
+
+    location = EarthLocation(lat=cache.latitude * u.deg, lon=cache.longitude * u.deg, height=4300 * u.m)
+    observer = Observer(location=location)
+
+    def tick():
+        now = Time.now()
+        observer.sun_rise_time(now, which='nearest')
+        observer.sun_set_time(now, which='nearest')
+        observer.twilight_morning_astronomical(now, which='nearest')
+        observer.twilight_evening_astronomical(now, which='nearest')
+        get_sun(now).transform_to(AltAz(obstime=now, location=location)).alt.deg
+        observer.moon_phase(now)
+
+    return tick
+
+
+def main():
+    parser = argparse.ArgumentParser(description='1 Hz 时钟刷新的星历计算开销基准测试')
+    parser.add_argument('--ticks', type=int, default=2000, help='缓存路径的刷新次数')
+    parser.add_argument('--slow-ticks', type=int, default=20, help='原做法的刷新次数')
+    args = parser.parse_args()
+
+    cache = EphemerisCache()
+    cache.day()
+
+    def cached_tick():
+        cache.get_sun_info()
+        cache.get_twilight_info()
+        cache.calculate_moon_phase()
+
+    uncached = EphemerisCache()
+
+    def recompute_tick():
+        uncached.invalidate()
+        uncached.get_sun_info()
+        uncached.get_twilight_info()
+        uncached.calculate_moon_phase()
+
+    cached_us = time_calls(cached_tick, args.ticks) * 1e6
+    recompute_us = time_calls(recompute_tick, args.slow_ticks) * 1e6
+    rows = [('每次刷新重算星历表', recompute_us)]
+
+    astroplan_tick = astroplan_tick_factory(cache)
+    if astroplan_tick is not None:
+        astroplan_tick()
+        rows.insert(0, ('astroplan 逐次计算', time_calls(astroplan_tick, args.slow_ticks) * 1e6))
+    else:
+        print("未安装 astropy/astroplan，跳过 astroplan 逐次计算的对比")
+
+    print(f"{'':>18} | {'每次刷新耗时':>12}")
+    for name, us in rows:
+        print(f"{name:>18} | {us / 1000:>9.2f} ms  ({us / cached_us:.0f}x)")
+    print(f"{'星历缓存':>18} | {cached_us:>9.2f} us")
+
+    # 插值误差：与逐点直接计算比较
+    day = cache.day()
+    times = np.linspace(day.start, day.end, 5000, endpoint=False)
+    jd = julian_date(times)
+    direct_altitude = sun_altitude(jd, cache.latitude, cache.longitude)
+    direct_elongation = moon_elongation(jd)
+    altitude_error = max(abs(day.sun_altitude(t) - a) for t, a in zip(times, direct_altitude))
+    elongation_error = max(abs((day.moon_elongation(t) - e + 180.0) % 360.0 - 180.0)
+                           for t, e in zip(times, direct_elongation))
+    print(f"网格插值误差（步长 {cache.grid_step:.0f} s）: 太阳高度 {altitude_error:.4f}°, "
+          f"日月角距 {elongation_error:.4f}°")
+    print(f"{day.date}: 日出 {day.sunrise} 日落 {day.sunset} 晨光始 {day.dawn} 昏影终 {day.dusk}")
+
+    reference = compare_with_astropy(cache)
+    if reference is not None:
+        print(f"相对 astropy: 太阳高度 {reference['max_altitude_error']:.3f}°, "
+              f"日月角距 {reference['max_elongation_error']:.3f}°")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""
+热路径日志开销基准测试
+
+模拟主窗口每个周期的输出（update_weather_info 逐项打印气象数据、update_cooler_status 打印状态、
+偶发异常打印堆栈），比较调用方线程每个周期的耗时和最终写出的行数：
+  - 原做法：print 到控制台（以行缓冲的文件代替）
+  - 日志服务，print 级别未启用：sys.stdout 被接管，只做级别判断
+  - 日志服务，print 级别启用：经队列由后台线程写入轮转文件，重复行限流
+  - 对照：logging.FileHandler 在调用方线程同步写文件
+  - 下限：print 的参数照常格式化，但输出被丢弃
+
+用法:
+    python benchmarks/bench_logging.py --cycles 5000
+"""
+import argparse
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+import traceback
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.log_service import LogService  # noqa: E402
+
+WEATHER = {
+    'cloudcover': 12.0, 'dewpoint': -3.2, 'humidity': 41.0, 'pressure': 612.0, 'rainrate': 0.0,
+    'skybrightness': 0.1, 'skyquality': 21.3, 'skytemperature': -31.5, 'starfwhm': 1.2,
+    'temperature': 4.1, 'winddirection': 250.0, 'windspeed': 3.0, 'windgust': 4.2,
+}
+
+
+def cycle_output(cycle):
+    """与主窗口每个周期相同的 print 输出"""
+    for key, value in WEATHER.items():
+        print(f"  {key}: {value + cycle * 0.001:.3f}")
+    status = {'temperature': 18.5, 'running': True, 'flow_alarm': False, 'raw_value': 0xA9}
+    print(f"水冷机状态更新接收：{status}")
+    print("水冷机状态更新完成")
+    print(f"已更新旁行角(PA): {cycle * 0.01:.6f}°, 赤纬: 22.01°, 消旋器角度: 30.0°")
+    if cycle % 50 == 0:
+        try:
+            raise ValueError("模拟的图像解码错误")
+        except ValueError:
+            traceback.print_exc()
+
+
+def count_lines(directory):
+    total = 0
+    for name in os.listdir(directory):
+        with open(os.path.join(directory, name), encoding='utf-8', errors='replace') as f:
+            total += sum(1 for _ in f)
+    return total
+
+
+def run_print(root, cycles):
+    path = os.path.join(root, 'console.txt')
+    original = sys.stdout, sys.stderr
+    with open(path, 'w', buffering=1, encoding='utf-8') as console:
+        sys.stdout = sys.stderr = console
+        try:
+            start = time.perf_counter()
+            for cycle in range(cycles):
+                cycle_output(cycle)
+            elapsed = time.perf_counter() - start
+        finally:
+            sys.stdout, sys.stderr = original
+    with open(path, encoding='utf-8') as f:
+        lines = sum(1 for _ in f)
+    return elapsed, lines
+
+
+class NullStream:
+    def write(self, text):
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def run_formatting_only(cycles):
+    """只格式化不输出：print 参数本身的开销，作为下限"""
+    original = sys.stdout, sys.stderr
+    sys.stdout = sys.stderr = NullStream()
+    try:
+        start = time.perf_counter()
+        for cycle in range(cycles):
+            cycle_output(cycle)
+        elapsed = time.perf_counter() - start
+    finally:
+        sys.stdout, sys.stderr = original
+    return elapsed, 0
+
+
+def run_service(root, cycles, print_level):
+    directory = os.path.join(root, f"service-{print_level}")
+    service = LogService()
+    service.setup({'dir': directory, 'console_level': 'CRITICAL', 'levels': {'stdout': print_level}},
+                  watch=False)
+    try:
+        start = time.perf_counter()
+        for cycle in range(cycles):
+            cycle_output(cycle)
+        elapsed = time.perf_counter() - start
+    finally:
+        service.shutdown()
+    return elapsed, count_lines(directory), service.rate_limit.suppressed
+
+
+def run_sync_file_handler(root, cycles):
+    path = os.path.join(root, 'sync.log')
+    handler = logging.FileHandler(path, encoding='utf-8')
+    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    log = logging.getLogger('bench.sync')
+    log.propagate = False
+    log.setLevel(logging.DEBUG)
+    log.addHandler(handler)
+    start = time.perf_counter()
+    for cycle in range(cycles):
+        for key, value in WEATHER.items():
+            log.debug("  %s: %.3f", key, value + cycle * 0.001)
+        log.debug("水冷机状态更新接收：%s", {'temperature': 18.5, 'running': True})
+        log.debug("水冷机状态更新完成")
+        log.debug("已更新旁行角(PA): %.6f°", cycle * 0.01)
+    elapsed = time.perf_counter() - start
+    handler.close()
+    log.removeHandler(handler)
+    with open(path, encoding='utf-8') as f:
+        lines = sum(1 for _ in f)
+    return elapsed, lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description='热路径日志开销基准测试')
+    parser.add_argument('--cycles', type=int, default=5000, help='模拟的更新周期数')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='logging-bench-')
+    try:
+        rows = [('原做法 print 到控制台',) + run_print(root, args.cycles) + (0,)]
+        rows.append(('日志服务 print 级别未启用',) + run_service(root, args.cycles, 'WARNING'))
+        rows.append(('日志服务 print 级别启用',) + run_service(root, args.cycles, 'DEBUG'))
+        rows.append(('对照 同步 FileHandler',) + run_sync_file_handler(root, args.cycles) + (0,))
+        rows.append(('下限 只格式化不输出',) + run_formatting_only(args.cycles) + (0,))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    print(f"{args.cycles} 个周期，每周期约 17 行输出，每 50 个周期一次异常堆栈")
+    print(f"{'':>24} | {'每周期耗时':>10} | {'写出行数':>8} | 限流省略")
+    for name, elapsed, lines, suppressed in rows:
+        print(f"{name:>24} | {elapsed / args.cycles * 1e6:>9.1f} us | {lines:>10} | {suppressed}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+"""
+内存跟踪基准测试
+
+  - 回收停顿：先建立 --heap 个长寿对象（模拟启动后常驻的界面和设备对象），再按轮询节奏不断产生
+    状态字典和少量循环引用垃圾，运行 --duration 秒，比较
+      原做法：默认阈值 (700, 10, 10)，每 --gc-interval 秒调用一次 gc.collect()
+      调优：gc.freeze() 冻结长寿对象，GcTuner 按回收频率和停顿调整第 0 代阈值
+    报告各代回收次数、最长停顿和总停顿
+  - 泄漏定位：在一个函数中持续保留状态字典和 QImage，比较前后两个 tracemalloc 快照和对象类型统计，
+    看增长最多的位置是否就是泄漏的那一行
+  - 开销：同样的分配负载在不跟踪、tracemalloc 1 帧、10 帧下的耗时，以及取快照的耗时
+
+用法:
+    python benchmarks/bench_memory_tracker.py --heap 300000 --duration 10 --gc-interval 2
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt5.QtGui import QImage  # noqa: E402
+
+from src.services.memory_tracker import GcTuner, count_objects, diff_counts, take_snapshot, top_growth  # noqa: E402
+
+
+class Node:
+    """长寿对象：带属性字典和相互引用"""
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.children = []
+        self.values = {'name': 'node', 'items': []}
+
+
+def build_heap(count):
+    root = Node()
+    nodes = [root]
+    for i in range(count):
+        node = Node(nodes[i // 8])
+        nodes[i // 8].children.append(node)
+        nodes.append(node)
+    return nodes
+
+
+def poll_cycle(i):
+    """一次轮询：若干状态字典和一个带循环引用的回调闭包"""
+    statuses = []
+    for device in ('telescope', 'focuser', 'rotator', 'dome', 'observingconditions'):
+        statuses.append({'device': device, 'connected': True, 'values': [i * 0.1, i * 0.2, i * 0.3],
+                         'timestamp': time.time()})
+    holder = {'statuses': statuses}
+    holder['self'] = holder
+    return len(statuses)
+
+
+class Stats:
+    def __init__(self):
+        self.pauses = {0: [], 1: [], 2: []}
+        self.manual = []
+        self._start = None
+
+    def callback(self, phase, info):
+        if phase == 'start':
+            self._start = time.perf_counter()
+        elif self._start is not None:
+            self.pauses[info['generation']].append(time.perf_counter() - self._start)
+            self._start = None
+
+
+def run_workload(duration, gc_interval=None, tuner=None):
+    stats = Stats()
+    gc.callbacks.append(stats.callback)
+    deadline = time.perf_counter() + duration
+    next_gc = time.perf_counter() + (gc_interval or 0)
+    next_adjust = time.perf_counter() + 0.5
+    cycles = 0
+    try:
+        while time.perf_counter() < deadline:
+            poll_cycle(cycles)
+            cycles += 1
+            now = time.perf_counter()
+            if gc_interval and now >= next_gc:
+                start = time.perf_counter()
+                gc.collect()
+                stats.manual.append(time.perf_counter() - start)
+                next_gc = now + gc_interval
+            if tuner is not None and now >= next_adjust:
+                tuner.adjust()
+                next_adjust = now + 0.5
+    finally:
+        gc.callbacks.remove(stats.callback)
+    return cycles, stats
+
+
+def compare_pauses(heap_size, duration, gc_interval):
+    heap = build_heap(heap_size)
+    rows = []
+    gc.set_threshold(700, 10, 10)
+    gc.collect()
+    cycles, stats = run_workload(duration, gc_interval=gc_interval)
+    rows.append(('原做法', cycles, stats, gc.get_threshold()))
+
+    tuner = GcTuner(min_threshold=700, max_threshold=20000, target_rate=2.0, pause_budget=0.010)
+    tuner.install()
+    start = time.perf_counter()
+    frozen = tuner.freeze()
+    freeze_time = time.perf_counter() - start
+    try:
+        cycles, stats = run_workload(duration, tuner=tuner)
+        rows.append(('调优', cycles, stats, gc.get_threshold()))
+    finally:
+        tuner.uninstall()
+        gc.unfreeze()
+        gc.set_threshold(700, 10, 10)
+    del heap
+    return rows, frozen, freeze_time
+
+
+def leaky_cache(store, i):
+    store.append({'device': 'telescope', 'rightascension': i * 0.001, 'declination': 20.0,
+                  'history': [float(i)] * 16})
+
+
+def locate_leak(iterations):
+    tracemalloc.start(1)
+    store, images = [], []
+    before_types = count_objects(['QImage'], track_project_types=False)
+    before = take_snapshot()
+    for i in range(iterations):
+        leaky_cache(store, i)
+        poll_cycle(i)
+        if i % 100 == 0:
+            images.append(QImage(320, 240, QImage.Format_RGB32))
+    after = take_snapshot()
+    after_types = count_objects(['QImage'], track_project_types=False)
+    tracemalloc.stop()
+    return top_growth(after, before, 3), diff_counts(before_types, after_types)
+
+
+def measure_overhead(iterations):
+    results = []
+    for frames in (0, 1, 10):
+        if frames:
+            tracemalloc.start(frames)
+        start = time.perf_counter()
+        keep = [poll_cycle(i) for i in range(iterations)]
+        elapsed = time.perf_counter() - start
+        snapshot_time = None
+        if frames:
+            start = time.perf_counter()
+            take_snapshot()
+            snapshot_time = time.perf_counter() - start
+            tracemalloc.stop()
+        results.append((frames, elapsed, snapshot_time))
+        del keep
+    return results
+
+
+def describe(values):
+    if not values:
+        return '0 次'
+    return f"{len(values)} 次，最长 {max(values) * 1000:.1f} ms，合计 {sum(values) * 1000:.0f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='内存跟踪基准测试')
+    parser.add_argument('--heap', type=int, default=300000, help='长寿对象数量')
+    parser.add_argument('--duration', type=float, default=10.0, help='每种做法的运行时长（秒）')
+    parser.add_argument('--gc-interval', type=float, default=2.0, help='原做法调用 gc.collect() 的间隔（秒）')
+    parser.add_argument('--iterations', type=int, default=50000, help='泄漏定位和开销测试的循环次数')
+    args = parser.parse_args()
+
+    rows, frozen, freeze_time = compare_pauses(args.heap, args.duration, args.gc_interval)
+    print(f"{args.heap} 个长寿对象，每种做法运行 {args.duration:g} s（原做法每 {args.gc_interval:g} s 完整回收一次）")
+    for name, cycles, stats, threshold in rows:
+        print(f"  {name}: {cycles} 次轮询，结束时阈值 {threshold}")
+        for generation in (0, 1, 2):
+            print(f"      第 {generation} 代: {describe(stats.pauses[generation])}")
+        if stats.manual:
+            print(f"      定时 gc.collect(): {describe(stats.manual)}")
+    print(f"  冻结 {frozen} 个对象用时 {freeze_time * 1000:.0f} ms（启动完成后只做一次）")
+
+    sites, types = locate_leak(args.iterations)
+    print(f"泄漏定位（{args.iterations} 次循环）增长最多的位置:")
+    for row in sites:
+        print(f"  {row['size_diff'] / 1024:>9.1f} KB {row['count_diff']:>+8} 块  {row['site']}")
+    for row in types:
+        print(f"  {row['type']}: {row['delta']:+d} 个，像素数据 {row['bytes_delta'] / 1048576:+.1f} MB")
+
+    print("tracemalloc 开销:")
+    base = None
+    for frames, elapsed, snapshot_time in measure_overhead(args.iterations):
+        base = base or elapsed
+        label = '不跟踪' if not frames else f'{frames} 帧'
+        extra = f"，取快照 {snapshot_time * 1000:.0f} ms" if snapshot_time is not None else ''
+        print(f"  {label:>5}: {elapsed * 1000:>7.0f} ms（x{elapsed / base:.2f}）{extra}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""
+整夜规划基准测试
+
+对 --targets 个随机目标（按固定种子生成，赤纬 -30°~+89°）规划一夜：
+  - 原做法：逐个目标调用 astroplan（升起、落下、中天时刻，网格上的大气质量、月距和旁行角），
+    取前 --astroplan-targets 个目标计时后按目标数外推
+  - 规划器：站址星历首次计算、缓存后的规划（含排程）和不排程时的耗时
+并用这些 astroplan 结果核对规划器的升起/落下/中天时刻、高度角、月距和旁行角误差
+（大气质量和旁行角只比较 20°~80° 高度的采样）。
+
+用法:
+    python benchmarks/bench_night_planner.py --targets 500 --night 2026-10-17 --astroplan-targets 10
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import warnings
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+from src.services.night_planner import NightPlanner  # noqa: E402
+
+
+def random_targets(count, seed):
+    rng = np.random.default_rng(seed)
+    ra = rng.uniform(0, 24, count)
+    dec = np.degrees(np.arcsin(rng.uniform(np.sin(np.radians(-30)), np.sin(np.radians(89)), count)))
+    priority = rng.choice([1.0, 1.0, 1.0, 2.0, 3.0], count)
+    return [{'name': f"T{i:04d}", 'ra': float(ra[i]), 'dec': float(dec[i]), 'priority': float(priority[i])}
+            for i in range(count)]
+
+
+def astroplan_reference(planner, night, targets):
+    """逐个目标调用 astroplan，返回 (每个目标耗时, 结果列表)；未安装时返回 None"""
+    try:
+        import astropy.units as u
+        from astroplan import FixedTarget, Observer
+        from astropy.coordinates import FK5, EarthLocation, NonRotationTransformationWarning, SkyCoord, get_body
+        from astropy.time import Time
+    except ImportError:
+        return None
+
+    warnings.simplefilter('ignore', NonRotationTransformationWarning)
+    location = EarthLocation(lat=planner.latitude * u.deg, lon=planner.longitude * u.deg, height=4300 * u.m)
+    observer = Observer(location=location)
+    noon = Time(night.times[0], format='unix')
+    grid = Time(night.times, format='unix')
+    # observer.parallactic_angle 直接使用目标坐标的赤经赤纬，J2000 坐标配视恒星时在中天附近有约 1° 的偏差，
+    # 旁行角按观测日期的坐标（与规划器相同）计算
+    equinox = FK5(equinox=grid[len(grid) // 2])
+    results = []
+    start = time.perf_counter()
+    for target in targets:
+        fixed = FixedTarget(SkyCoord(target['ra'] * u.hourangle, target['dec'] * u.deg), name=target['name'])
+        rise = observer.target_rise_time(noon, fixed, which='next', horizon=0 * u.deg)
+        set_ = observer.target_set_time(noon, fixed, which='next', horizon=0 * u.deg)
+        transit = observer.target_meridian_transit_time(noon, fixed, which='next')
+        altaz = observer.altaz(grid, fixed)
+        moon = get_body('moon', grid, location)
+        apparent = FixedTarget(fixed.coord.transform_to(equinox))
+        results.append({
+            'rise': None if rise.masked else rise.unix,
+            'set': None if set_.masked else set_.unix,
+            'transit': transit.unix,
+            'altitude': altaz.alt.deg,
+            'airmass': altaz.secz.value,
+            'moon_separation': moon.separation(fixed.coord).deg,
+            'parallactic_angle': observer.parallactic_angle(grid, apparent).deg,
+        })
+    return (time.perf_counter() - start) / len(targets), results
+
+
+def max_time_error(plan_values, reference, key):
+    errors = [abs(value - ref[key]) for value, ref in zip(plan_values, reference)
+              if ref[key] is not None and np.isfinite(value)]
+    return max(errors) if errors else float('nan')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='整夜规划基准测试')
+    parser.add_argument('--targets', type=int, default=500, help='目标数')
+    parser.add_argument('--night', default='2026-10-17', help='观测夜日期 YYYY-MM-DD')
+    parser.add_argument('--astroplan-targets', type=int, default=10, help='用 astroplan 逐个计算的目标数')
+    parser.add_argument('--repeat', type=int, default=20, help='规划器计时的重复次数')
+    parser.add_argument('--seed', type=int, default=1, help='随机目标的种子')
+    args = parser.parse_args()
+
+    night_date = datetime.strptime(args.night, '%Y-%m-%d').date()
+    targets = random_targets(args.targets, args.seed)
+    planner = NightPlanner()
+
+    start = time.perf_counter()
+    night = planner.night(night_date)
+    first_night = time.perf_counter() - start
+    start = time.perf_counter()
+    planner.night(night_date)
+    cached_night = time.perf_counter() - start
+
+    def timed(schedule):
+        samples = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            plan = planner.plan(targets, night_date, schedule=schedule)
+            samples.append(time.perf_counter() - start)
+        return statistics.median(samples), plan
+
+    plan_time, plan = timed(True)
+    grid_time, _ = timed(False)
+
+    print(f"{night.date} 夜：天文夜 {night.format_time(night.dusk)} ~ {night.format_time(night.dawn)}，"
+          f"网格 {len(night.times)} 点（{planner.settings['grid_step']} s）")
+    print(f"站址星历: 首次 {first_night * 1000:.1f} ms，缓存后 {cached_night * 1e6:.1f} us")
+    print(f"{args.targets} 个目标: 规划并排程 {plan_time * 1000:.1f} ms，只算网格 {grid_time * 1000:.1f} ms，"
+          f"排入 {len(plan.schedule)} 个观测块，{int((plan.observable_hours > 0).sum())} 个目标今晚可观测")
+
+    reference = astroplan_reference(planner, night, targets[:args.astroplan_targets])
+    if reference is None:
+        print("未安装 astropy/astroplan，跳过对比")
+        return
+    per_target, results = reference
+    count = len(results)
+    print(f"astroplan 逐个目标: {per_target * 1000:.0f} ms/目标，{args.targets} 个目标约 "
+          f"{per_target * args.targets:.0f} s（x{per_target * args.targets / plan_time:.0f}）")
+
+    rows = range(count)
+    altitude_error = max(float(np.max(np.abs(plan.altitude[i] - results[i]['altitude']))) for i in rows)
+    # 旁行角在天顶附近变化极快，只比较 20°~80° 高度的采样
+    up = [(results[i]['altitude'] > 20) & (results[i]['altitude'] < 80) for i in rows]
+    airmass_error = max(float(np.max(np.abs(plan.airmass[i][up[i]] - results[i]['airmass'][up[i]])
+                                     / results[i]['airmass'][up[i]])) if up[i].any() else 0.0 for i in rows)
+    moon_error = max(float(np.max(np.abs(plan.moon_separation[i] - results[i]['moon_separation']))) for i in rows)
+    pa_error = max(float(np.max(np.abs((plan.parallactic_angle[i][up[i]] - results[i]['parallactic_angle'][up[i]]
+                                        + 180.0) % 360.0 - 180.0))) if up[i].any() else 0.0 for i in rows)
+    print(f"与 astroplan 的最大误差（{count} 个目标）:")
+    print(f"  升起 {max_time_error(plan.rise[:count], results, 'rise'):.0f} s，"
+          f"落下 {max_time_error(plan.set[:count], results, 'set'):.0f} s，"
+          f"中天 {max_time_error(plan.transit[:count], results, 'transit'):.0f} s")
+    print(f"  高度角 {altitude_error * 3600:.0f}\"，大气质量 {airmass_error * 100:.2f}%，"
+          f"月距 {moon_error:.2f}°，旁行角 {pa_error * 3600:.0f}\"")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+旁行角计算开销与精度基准测试
+
+对比每次消旋器状态更新时计算旁行角的耗时：
+  - 原做法（安装了 astropy 时）：解析六十进制字符串、构造 SkyCoord/EarthLocation、变换到 AltAz、计算视恒星时
+  - 快速路径：浮点坐标 + 闭式公式（单点和数组批量）
+并用 astroplan 核对精度，给出一个目标整夜旁行角轨迹和消旋器动作规划的耗时。
+
+用法:
+    python benchmarks/bench_parallactic.py --calls 5000 --track-step 60
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+from src.services.parallactic import ParallacticCalculator, compare_with_astroplan, plan_rotator_moves  # noqa: E402
+
+RA_TEXT, DEC_TEXT = '05:35:17.3', '+22:00:52.0'
+RA_HOURS, DEC_DEG = 5 + 35 / 60 + 17.3 / 3600, 22 + 0 / 60 + 52.0 / 3600
+
+
+def time_calls(func, count):
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def astropy_call_factory(calculator):
+    """与 astronomy_service.calculate_parallactic_angle 相同步骤的逐次计算，未安装 astropy 时返回 None"""
+    try:
+        import math
+
+        import astropy.units as u
+        from astropy.coordinates import AltAz, EarthLocation, SkyCoord
+        from astropy.time import Time
+    except ImportError:
+        return None
+
+    def call():
+        now = Time.now()
+        coord = SkyCoord(RA_TEXT, DEC_TEXT, unit=(u.hourangle, u.deg), frame='icrs')
+        location = EarthLocation(lon=calculator.longitude * u.deg, lat=calculator.latitude * u.deg, height=4300 * u.m)
+        coord.transform_to(AltAz(obstime=now, location=location))
+        lst = now.sidereal_time('apparent', longitude=location.lon)
+        h = (lst - coord.ra).wrap_at(180 * u.deg).rad
+        lat, delta = location.lat.rad, coord.dec.rad
+        q = math.degrees(math.atan2(math.sin(h), math.tan(lat) * math.cos(delta) - math.sin(delta) * math.cos(h)))
+        return abs(30.0 - q) % 360
+
+    return call
+
+
+def main():
+    parser = argparse.ArgumentParser(description='旁行角计算开销与精度基准测试')
+    parser.add_argument('--calls', type=int, default=5000, help='快速路径的调用次数')
+    parser.add_argument('--slow-calls', type=int, default=20, help='原做法的调用次数')
+    parser.add_argument('--batch', type=int, default=10000, help='批量计算的数组长度')
+    parser.add_argument('--track-step', type=float, default=60.0, help='整夜轨迹的采样步长（秒）')
+    args = parser.parse_args()
+
+    calculator = ParallacticCalculator()
+    snapshot = {'rightascension': RA_HOURS, 'declination': DEC_DEG}
+    rotator = {'position': 30.0}
+
+    fast_us = time_calls(lambda: calculator.from_snapshot(snapshot, rotator), args.calls) * 1e6
+    text_us = time_calls(lambda: calculator.calculate_parallactic_angle(RA_TEXT, DEC_TEXT, 30.0),
+                         args.calls) * 1e6
+
+    ra = np.random.default_rng(0).uniform(0, 24, args.batch)
+    dec = np.random.default_rng(1).uniform(-30, 89, args.batch)
+    start = time.perf_counter()
+    calculator.parallactic_angle(ra, dec)
+    batch_us = (time.perf_counter() - start) / args.batch * 1e6
+
+    print(f"{'':>22} | {'每次耗时':>12}")
+    slow = astropy_call_factory(calculator)
+    if slow is not None:
+        slow()
+        slow_us = time_calls(slow, args.slow_calls) * 1e6
+        print(f"{'原做法 astropy 逐次':>22} | {slow_us / 1000:>9.2f} ms")
+    else:
+        print("未安装 astropy，跳过原做法的对比")
+    print(f"{'快速路径 字符串输入':>22} | {text_us:>9.2f} us")
+    print(f"{'快速路径 快照浮点输入':>22} | {fast_us:>9.2f} us")
+    print(f"{'快速路径 批量(每点)':>22} | {batch_us * 1000:>9.2f} ns")
+
+    now = time.time()
+    start = time.perf_counter()
+    track = calculator.night_track(RA_HOURS, DEC_DEG, now, now + 12 * 3600, args.track_step)
+    moves = plan_rotator_moves(track, tolerance=1.0, min_altitude=20.0)
+    track_ms = (time.perf_counter() - start) * 1000
+    print(f"12 小时轨迹（{len(track['time'])} 点）+ 动作规划: {track_ms:.2f} ms，"
+          f"容差 1° 需转动 {len(moves)} 次")
+
+    reference = compare_with_astroplan(calculator, RA_HOURS, DEC_DEG, track['time'][::10])
+    if reference is not None:
+        print(f"相对 astroplan: 公式误差 {reference['formula_arcsec']:.4f}\"，"
+              f"快速路径误差 {reference['fast_path_arcsec']:.3f}\"（dut1=0），"
+              f"{reference['fast_path_dut1_arcsec']:.3f}\"（dut1={reference['dut1']:+.3f} s）")
+    else:
+        print("未安装 astroplan，跳过精度核对")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+自适应轮询速率基准测试
+
+在本地 Alpaca 桩服务器上模拟一段观测：望远镜静止跟踪，中途发起一次指向（slew），
+分别用统一轮询（所有端点每 --interval 秒读一次）和按层级自适应轮询运行同样时长，
+比较每台设备的请求速率，以及指向期间望远镜坐标两次刷新之间的最大间隔。
+
+用法:
+    python benchmarks/bench_poll_rates.py --duration 30 --slew-at 10 --slew-time 6
+"""
+import argparse
+import os
+import sys
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.polling_engine import PollingEngine, PollTarget  # noqa: E402
+from src.simulators.alpaca_server import AlpacaStubServer  # noqa: E402
+from bench_polling_cycle import CONFIG_ENDPOINTS  # noqa: E402
+
+# 桩服务器设备类型 -> config.yaml 设备键
+DEVICE_KEYS = {
+    'telescope': 'telescope',
+    'observingconditions': 'ObservingConditions',
+    'focuser': 'focuser',
+    'rotator': 'rotator',
+    'dome': 'dome',
+    'covercalibrator': 'covercalibrator',
+}
+
+
+def make_targets(base_url):
+    return [PollTarget(DEVICE_KEYS[device], device, base_url, endpoints)
+            for device, endpoints in CONFIG_ENDPOINTS.items()]
+
+
+def run_scenario(server, adaptive, args):
+    """运行一次模拟观测，返回 (每设备请求速率, 指向期间坐标最大刷新间隔)"""
+    engine = PollingEngine(make_targets(server.base_url), max_workers=args.workers)
+    server.reset_counters()
+    start = time.monotonic()
+    slew_start = start + args.slew_at
+    slew_end = slew_start + args.slew_time
+    slewed = False
+    coord_refreshes = []
+
+    while True:
+        now = time.monotonic()
+        if now - start >= args.duration:
+            break
+        if not slewed and now >= slew_start:
+            requests.put(f"{server.base_url}/api/v1/telescope/0/slewtocoordinatesasync",
+                         data={'RightAscension': 12.0, 'Declination': 45.0,
+                               'ClientID': 1, 'ClientTransactionID': 1}, timeout=5)
+            slewed = True
+
+        if adaptive:
+            snapshots = engine.poll_due(now)
+        else:
+            snapshots = engine.poll_cycle()
+        if 'telescope' in snapshots:
+            # 统一轮询每次都读坐标；自适应模式下只有坐标到期时才算一次刷新
+            if not adaptive or ('telescope', 'rightascension') in engine.last_polled:
+                coord_refreshes.append(time.monotonic())
+        if adaptive:
+            wait_time = min(engine.seconds_until_due(), 0.05)
+        else:
+            wait_time = args.interval - (time.monotonic() - now)
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+    elapsed = time.monotonic() - start
+    rates = {device: server.request_count(device) / elapsed for device in CONFIG_ENDPOINTS}
+    engine.close()
+
+    # 指向期间（含首个刷新前的等待）相邻两次坐标刷新的最大间隔
+    window = [slew_start] + [t for t in coord_refreshes if slew_start <= t <= slew_end] + [slew_end]
+    max_gap = max(b - a for a, b in zip(window, window[1:]))
+    return rates, max_gap
+
+
+def main():
+    parser = argparse.ArgumentParser(description='自适应轮询速率基准测试')
+    parser.add_argument('--latency', type=float, default=30.0, help='模拟单次请求延迟（毫秒）')
+    parser.add_argument('--duration', type=float, default=30.0, help='每种模式的运行时长（秒）')
+    parser.add_argument('--slew-at', type=float, default=10.0, help='开始指向的时刻（秒）')
+    parser.add_argument('--slew-time', type=float, default=6.0, help='指向持续时间（秒）')
+    parser.add_argument('--interval', type=float, default=1.0, help='统一轮询的周期（秒）')
+    parser.add_argument('--workers', type=int, default=16, help='轮询引擎并发数')
+    args = parser.parse_args()
+
+    server = AlpacaStubServer(latency=args.latency / 1000.0, motion_time=args.slew_time).start()
+    print(f"桩服务器: {server.base_url}, 模拟延迟 {args.latency:.0f}ms, "
+          f"运行 {args.duration:.0f}s, 第 {args.slew_at:.0f}s 起指向 {args.slew_time:.0f}s")
+    try:
+        flat_rates, flat_gap = run_scenario(server, False, args)
+        adaptive_rates, adaptive_gap = run_scenario(server, True, args)
+    finally:
+        server.stop()
+
+    print(f"{'设备':>20} | {'统一轮询 (次/秒)':>14} | {'自适应 (次/秒)':>14}")
+    for device in CONFIG_ENDPOINTS:
+        print(f"{device:>20} | {flat_rates[device]:>14.2f} | {adaptive_rates[device]:>14.2f}")
+    flat_total = sum(flat_rates.values())
+    adaptive_total = sum(adaptive_rates.values())
+    print(f"{'合计':>20} | {flat_total:>14.2f} | {adaptive_total:>14.2f}"
+          f"  (减少 {100 * (1 - adaptive_total / flat_total):.0f}%)")
+    print(f"指向期间坐标最大刷新间隔: 统一轮询 {flat_gap * 1000:.0f}ms, 自适应 {adaptive_gap * 1000:.0f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+轮询周期延迟基准测试
+
+对比逐个端点顺序读取（原 TelescopeMonitor 的方式）与批量轮询引擎在不同端点数量下的周期耗时。
+请求发往本地 Alpaca 桩服务器，--latency 用于模拟站点链路的单次往返延迟。
+
+用法:
+    python benchmarks/bench_polling_cycle.py --latency 30 --cycles 10
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.polling_engine import PollingEngine, PollTarget  # noqa: E402
+from src.simulators.alpaca_server import AlpacaStubServer  # noqa: E402
+
+# 与 config.yaml 一致的真实端点组合（共 48 个）
+CONFIG_ENDPOINTS = {
+    'telescope': ['rightascension', 'declination', 'altitude', 'azimuth', 'alignmentmode',
+                  'aperturediameter', 'athome', 'atpark', 'doesrefraction', 'ispulseguiding',
+                  'siteelevation', 'sitelatitude', 'sitelongitude', 'slewing', 'tracking',
+                  'trackingrate', 'utcdate'],
+    'observingconditions': ['cloudcover', 'dewpoint', 'humidity', 'pressure', 'skybrightness',
+                            'rainrate', 'skyquality', 'skytemperature', 'starfwhm', 'temperature',
+                            'winddirection', 'windgust', 'windspeed'],
+    'focuser': ['absolute', 'ismoving', 'maxincrement', 'maxstep', 'position', 'stepsize'],
+    'rotator': ['ismoving', 'position', 'reverse', 'stepsize', 'targetposition'],
+    'dome': ['azimuth', 'athome', 'atpark', 'slewing', 'shutter_status'],
+    'covercalibrator': ['coverstate', 'calibratorstate'],
+}
+
+
+def make_targets(base_url, endpoint_count):
+    """生成指定端点总数的轮询目标，超出真实端点部分用合成属性补足"""
+    flat = [(device, ep) for device, eps in CONFIG_ENDPOINTS.items() for ep in eps]
+    while len(flat) < endpoint_count:
+        flat.append(('telescope', f"synthetic{len(flat)}"))
+    flat = flat[:endpoint_count]
+
+    grouped = {}
+    for device, ep in flat:
+        grouped.setdefault(device, []).append(ep)
+    return [PollTarget(device, device, base_url, eps) for device, eps in grouped.items()]
+
+
+def sequential_cycle(targets, session):
+    """逐个端点顺序读取一次"""
+    start = time.perf_counter()
+    for target in targets:
+        for field in target.endpoints:
+            response = session.get(target.url_for(field),
+                                   params={'ClientID': 1, 'ClientTransactionID': 1}, timeout=(2, 5))
+            response.json()
+    return time.perf_counter() - start
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(round(0.95 * (len(samples) - 1))))]
+    return statistics.mean(samples) * 1000, p95 * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='轮询周期延迟基准测试')
+    parser.add_argument('--latency', type=float, default=30.0, help='模拟单次请求延迟（毫秒）')
+    parser.add_argument('--cycles', type=int, default=10, help='每组测量的周期数')
+    parser.add_argument('--workers', type=int, default=16, help='轮询引擎并发数')
+    parser.add_argument('--counts', default='6,12,24,48,96', help='端点数量列表，逗号分隔')
+    args = parser.parse_args()
+
+    counts = [int(c) for c in args.counts.split(',')]
+    server = AlpacaStubServer(latency=args.latency / 1000.0).start()
+    print(f"桩服务器: {server.base_url}, 模拟延迟 {args.latency:.0f}ms, 并发数 {args.workers}")
+    print(f"{'端点数':>6} | {'顺序 平均/P95 (ms)':>20} | {'批量 平均/P95 (ms)':>20} | {'加速比':>6}")
+    try:
+        for count in counts:
+            targets = make_targets(server.base_url, count)
+
+            session = requests.Session()
+            sequential = [sequential_cycle(targets, session) for _ in range(max(1, args.cycles // 2))]
+            session.close()
+
+            engine = PollingEngine(targets, max_workers=args.workers)
+            engine.poll_cycle()  # 预热连接池
+            batched = []
+            for _ in range(args.cycles):
+                engine.poll_cycle()
+                batched.append(engine.last_cycle_duration)
+            engine.close()
+
+            seq_mean, seq_p95 = summarize(sequential)
+            bat_mean, bat_p95 = summarize(batched)
+            print(f"{count:>6} | {seq_mean:>9.1f} / {seq_p95:>8.1f} | {bat_mean:>9.1f} / {bat_p95:>8.1f} | "
+                  f"{seq_mean / bat_mean:>5.1f}x")
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
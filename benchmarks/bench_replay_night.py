@@ -0,0 +1,274 @@
+"""
+整夜回放基准测试
+
+在本机回放一整夜的设备通信（--recording 指定 traffic_recorder 记录的文件；不指定时按固定种子合成
+一夜：望远镜每 20 分钟换目标并指向 1 分钟，气象缓慢变化，水冷机和 UPS 每 5 秒应答一次，
+0.2% 的望远镜读数记录为超时），按 --duration 秒压缩回放，同时运行程序的数据链路：
+    PollingMonitor（自适应轮询）→ StateStore（含旁行角、DSS 派生值）← SerialTransport（水冷机、UPS）
+指定 --gui 时再创建主窗口并连接各状态更新槽（需要可导入主窗口的完整环境）。报告：
+  - 每个轮询周期的 CPU 时间（进程 CPU 时间 / 周期数）和平均 CPU 占用
+  - Alpaca 请求延迟、界面事件循环延迟（qt.loop_lag）、状态从发布到界面线程收到的延迟
+  - RSS 起止、峰值和按模拟时间换算的增长速率
+  - 回放命中、回退到桩服务器默认值和注入故障的次数
+种子、速度和故障参数相同的两次运行使用相同的回放数据，结果可以直接比较；--output 把结果写成 JSON。
+
+用法:
+    python benchmarks/bench_replay_night.py --hours 12 --duration 180
+    python benchmarks/bench_replay_night.py --recording logs/traffic_2026-10-16.jsonl.gz --duration 600 --fault-rate 0.01
+"""
+import argparse
+import gzip
+import json
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt5.QtCore import QTimer  # noqa: E402
+
+from src.services.memory_tracker import current_rss, growth_rate  # noqa: E402
+from src.services.polling_engine import PollingMonitor  # noqa: E402
+from src.services.profiler import (  # noqa: E402
+    EventLoopLagProbe, LatencyHistogram, get_instrumentation, install_instrumentation)
+from src.services.serial_transport import MegatecUpsProtocol, ModbusCoolerProtocol, SerialTransport  # noqa: E402
+from src.services.state_store import StateStore, connect_sources, register_default_derivations  # noqa: E402
+from src.services.traffic_recorder import FORMAT_NAME, FORMAT_VERSION  # noqa: E402
+from src.simulators.alpaca_server import DEFAULT_DEVICE_STATES  # noqa: E402
+from src.simulators.replay_server import ReplayHarness  # noqa: E402
+from src.simulators.serial_device import FakeSerialDevice  # noqa: E402
+from bench_polling_cycle import CONFIG_ENDPOINTS  # noqa: E402
+from bench_telemetry_server import DEVICE_KEYS  # noqa: E402
+
+RECORDED_URL = 'http://202.127.24.217:11111'
+SLEW_EVERY = 1200
+SLEW_TIME = 60
+
+
+def synthesize_night(path, hours, seed=1):
+    """按固定种子合成一夜的通信记录，返回事件数"""
+    rng = random.Random(seed)
+    seconds = int(hours * 3600)
+    states = {device: dict(values) for device, values in DEFAULT_DEVICE_STATES.items()}
+    states['dome']['shutter_status'] = 0
+    cadence = {'telescope': 10, 'observingconditions': 60, 'focuser': 60, 'rotator': 30, 'dome': 60,
+               'covercalibrator': 60}
+    cooler = FakeSerialDevice('cooler')
+    ups = FakeSerialDevice('ups')
+    cooler_request = ModbusCoolerProtocol().status_request()
+    ups_request = MegatecUpsProtocol().status_request()
+    events = 0
+    ra, dec, target = 5.5, 22.0, (5.5, 22.0)
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        f.write(json.dumps({'format': FORMAT_NAME, 'version': FORMAT_VERSION, 'started': '2026-10-16T19:00:00',
+                            'label': f'synthetic seed={seed}'}) + '\n')
+
+        def write(event):
+            nonlocal events
+            f.write(json.dumps(event, separators=(',', ':')) + '\n')
+            events += 1
+
+        for t in range(seconds):
+            phase = t % SLEW_EVERY
+            if phase == 0:
+                target = (rng.uniform(0, 24), rng.uniform(-20, 70))
+            telescope = states['telescope']
+            if phase < SLEW_TIME:
+                fraction = (phase + 1) / SLEW_TIME
+                ra, dec = ra + (target[0] - ra) * fraction, dec + (target[1] - dec) * fraction
+            telescope.update(rightascension=ra, declination=dec, slewing=phase < SLEW_TIME,
+                             altitude=30 + 50 * abs(math.sin(t / 7200.0)), azimuth=(t * 0.01) % 360)
+            weather = states['observingconditions']
+            weather.update(temperature=-5 + 3 * math.sin(t / 10800.0), windspeed=4 + rng.uniform(-1, 1),
+                           humidity=35 + 10 * math.sin(t / 5400.0))
+            states['rotator']['position'] = round((t // 600) * 15.0 % 360, 2)
+            for device, endpoints in CONFIG_ENDPOINTS.items():
+                fast = device == 'telescope' and phase < SLEW_TIME
+                if t % (1 if fast else cadence[device]):
+                    continue
+                for endpoint in endpoints:
+                    event = {'t': t + rng.random() * 0.5, 'k': 'http', 'm': 'GET',
+                             'u': f"{RECORDED_URL}/api/v1/{device}/0/{endpoint}", 'd': 0.02 + rng.random() * 0.03}
+                    if device == 'telescope' and rng.random() < 0.002:
+                        event['e'] = 'ReadTimeout: timed out'
+                        event['d'] = 5.0
+                    else:
+                        event['s'] = 200
+                        event['r'] = {'Value': states[device].get(endpoint, 0.0), 'ErrorNumber': 0,
+                                      'ErrorMessage': ''}
+                    write(event)
+            if t % 5 == 0:
+                cooler.set_state(temperature=round(18.0 + 2 * math.sin(t / 3600.0), 1))
+                ups.set_state(load=10 + (t // 600) % 5)
+                for port, device, request in (('COM20', cooler, cooler_request), ('COM4', ups, ups_request)):
+                    write({'t': t + 0.1, 'k': 'serial', 'p': port, 'w': request.hex(' ')})
+                    write({'t': t + 0.15, 'k': 'serial', 'p': port, 'r': device._respond(request).hex(' ')})
+    return events
+
+
+def gui_window(monitor, transport):
+    """按分阶段启动的方式创建主窗口并连接状态更新槽；环境不完整时返回 None"""
+    try:
+        from src.services.startup import install_lazy_modules, install_staged_startup
+        from src.services.telemetry_server import SERIAL_SLOTS, WINDOW_SLOTS
+        install_lazy_modules()
+        from src.ui.main_window import MainWindow
+        from src.ui.state_binding import attach_state_store, install_state_binding
+        from src.ui.ui_binding import install_ui_binding
+        install_ui_binding(MainWindow)
+        install_state_binding(MainWindow)
+        install_staged_startup(MainWindow)
+        window = MainWindow([])
+        attach_state_store(window)
+    except Exception as e:
+        print(f"无法创建主窗口（{type(e).__name__}: {e}），只运行数据链路")
+        return None
+    for signal_name, slot_name in WINDOW_SLOTS:
+        slot = getattr(window, slot_name, None)
+        if slot is not None:
+            getattr(monitor, signal_name).connect(slot)
+    transport.status_changed.connect(
+        lambda device, status: getattr(window, SERIAL_SLOTS.get(device, ''), lambda _status: None)(status))
+    window.show()
+    return window
+
+
+def merged(instrumentation, prefix):
+    histogram = LatencyHistogram()
+    for name in instrumentation.names():
+        if name.startswith(prefix):
+            histogram.merge(instrumentation.histogram(name))
+    return histogram
+
+
+def describe(histogram):
+    if not histogram.count:
+        return '无数据'
+    return (f"{histogram.count} 次，中位 {histogram.percentile(50) * 1000:.1f} ms，"
+            f"p99 {histogram.percentile(99) * 1000:.1f} ms，最大 {histogram.max * 1000:.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='整夜回放基准测试')
+    parser.add_argument('--recording', help='traffic_recorder 记录的文件（不指定时合成一夜）')
+    parser.add_argument('--hours', type=float, default=12.0, help='合成记录的时长（小时）')
+    parser.add_argument('--duration', type=float, default=180.0, help='回放用的真实时长（秒）')
+    parser.add_argument('--seed', type=int, default=1, help='合成记录和故障注入的随机数种子')
+    parser.add_argument('--latency', type=float, default=0.0, help='每个 HTTP 请求额外的延迟（毫秒）')
+    parser.add_argument('--jitter', type=float, default=0.0, help='每个 HTTP 请求额外的随机延迟上限（毫秒）')
+    parser.add_argument('--fault-rate', type=float, default=0.0, help='返回 HTTP 500 的请求比例')
+    parser.add_argument('--drop-rate', type=float, default=0.0, help='直接断开连接 / 串口不响应的请求比例')
+    parser.add_argument('--gui', action='store_true', help='同时创建主窗口')
+    parser.add_argument('--output', help='把结果写入 JSON 文件')
+    args = parser.parse_args()
+
+    if args.gui:
+        from PyQt5.QtWidgets import QApplication
+        app = QApplication([sys.argv[0]])
+    else:
+        from PyQt5.QtCore import QCoreApplication
+        app = QCoreApplication([sys.argv[0]])
+
+    path = args.recording
+    if path is None:
+        path = os.path.join('temp', f"replay_synthetic_{args.hours:g}h_seed{args.seed}.jsonl.gz")
+        os.makedirs('temp', exist_ok=True)
+        if not os.path.exists(path):
+            start = time.perf_counter()
+            count = synthesize_night(path, args.hours, args.seed)
+            print(f"合成 {args.hours:g} 小时记录 {count} 条，用时 {time.perf_counter() - start:.1f} s: {path}")
+
+    harness = ReplayHarness(path, speed=1.0, latency=args.latency / 1000.0, jitter=args.jitter / 1000.0,
+                            fault_rate=args.fault_rate, drop_rate=args.drop_rate, stall_time=6.0,
+                            seed=args.seed)
+    night = harness.index.duration
+    harness.clock.speed = night / args.duration
+    harness.start()
+    print(f"回放 {night / 3600:.2f} 小时的记录，压缩到 {args.duration:g} s（x{harness.clock.speed:.0f}）")
+
+    instrumentation = get_instrumentation()
+    instrumentation.enabled = True
+    install_instrumentation(instrumentation=instrumentation)
+
+    config = {'devices': {DEVICE_KEYS[device]: {'enabled': True, 'api_url': harness.base_url, 'endpoints': endpoints}
+                          for device, endpoints in CONFIG_ENDPOINTS.items()},
+              'polling': {'adaptive': True}}
+    monitor = PollingMonitor(config=config)
+    transport = SerialTransport()
+    store = StateStore()
+    register_default_derivations(store)
+    connect_sources(store, monitor=monitor, transport=transport)
+    cycles = [0]
+    monitor.cycle_finished.connect(lambda _duration: cycles.__setitem__(0, cycles[0] + 1))
+    serial_updates = [0]
+    transport.status_changed.connect(lambda _device, _status: serial_updates.__setitem__(0, serial_updates[0] + 1))
+
+    def on_state(snapshot, changed):
+        instrumentation.record('ui.state_latency', max(0.0, time.time() - snapshot.timestamp))
+    store.subscribe(None, on_state)
+
+    window = gui_window(monitor, transport) if args.gui else None
+    probe = EventLoopLagProbe(instrumentation, interval_ms=100, warning=0.5)
+    rss = []
+
+    def sample():
+        rss.append((harness.clock.now(), current_rss()))
+    sampler = QTimer()
+    sampler.timeout.connect(sample)
+
+    for recorded_port, (kind, pty_path) in harness.serial_ports.items():
+        transport.open_device(kind, pty_path)
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    monitor.start()
+    probe.start()
+    sample()
+    sampler.start(1000)
+    QTimer.singleShot(int(args.duration * 1000), app.quit)
+    app.exec_()
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    probe.stop()
+    sampler.stop()
+    sample()
+    monitor.stop()
+    monitor.wait(5000)
+    transport.shutdown()
+    harness.stop()
+    if window is not None:
+        window.close()
+
+    alpaca = merged(instrumentation, 'alpaca.get.')
+    loop_lag = instrumentation.histogram('qt.loop_lag')
+    latency = instrumentation.histogram('ui.state_latency')
+    rate = growth_rate(rss)
+    start_rss, end_rss, peak_rss = rss[0][1], rss[-1][1], max(value for _, value in rss)
+    per_cycle = cpu / cycles[0] if cycles[0] else 0.0
+    print(f"轮询周期 {cycles[0]} 次，每周期 CPU {per_cycle * 1000:.2f} ms，平均 CPU 占用 {cpu / wall * 100:.1f}%")
+    print(f"Alpaca 请求: {describe(alpaca)}")
+    print(f"事件循环延迟: {describe(loop_lag)}")
+    print(f"状态到达界面线程: {describe(latency)}")
+    print(f"串口状态更新 {serial_updates[0]} 次，状态中心统计 {store.stats}")
+    print(f"RSS {start_rss / 1048576:.1f} MB -> {end_rss / 1048576:.1f} MB，峰值 {peak_rss / 1048576:.1f} MB"
+          + (f"，按模拟时间 {rate:+.2f} MB/小时" if rate is not None else ''))
+    print(f"回放: HTTP {dict(harness.server.replay_counts)}，注入故障 {dict(harness.server.fault_counts)}，"
+          f"串口 {({name: dict(device.replay_counts) for name, device in harness.devices.items()})}")
+
+    if args.output:
+        result = {
+            'recording': path, 'speed': harness.clock.speed, 'duration': wall, 'cycles': cycles[0],
+            'cpu_per_cycle_ms': per_cycle * 1000, 'cpu_percent': cpu / wall * 100,
+            'alpaca_get': alpaca.summary(), 'loop_lag': loop_lag.summary(), 'state_latency': latency.summary(),
+            'rss_start': start_rss, 'rss_end': end_rss, 'rss_peak': peak_rss, 'rss_growth_mb_per_hour': rate,
+            'serial_updates': serial_updates[0], 'replay': dict(harness.server.replay_counts),
+            'faults': dict(harness.server.fault_counts),
+        }
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.output}")
+
+
+if __name__ == '__main__':
+    main()
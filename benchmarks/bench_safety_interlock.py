@@ -0,0 +1,205 @@
+"""
+安全联锁延迟基准测试
+
+在本地 Alpaca 桩服务器上运行批量轮询（PollingMonitor）→ StateStore，开天窗、开镜头盖命令正在执行
+（天窗动作耗时 --motion-time 秒）时，于随机时刻开始下雨（rainrate 0 → 2.5）。界面线程每 500 ms
+卡顿 --ui-stall 毫秒（模拟解码图像、重绘等）。比较两种做法：
+  - 界面订阅：界面线程订阅 StateStore 的 ObservingConditions，看到下雨后向 CommandExecutor 提交关闭命令
+    （没有联锁时自行添加保护的通常做法，关闭命令排在同一设备的开启命令之后）
+  - 安全联锁：SafetyInterlock 在轮询线程发布状态时同步判断，经独立命令通道发出关闭命令
+统计：
+  - 读到触发值 → 关闭命令到达设备：桩服务器返回第一份 rainrate > 0 的读数到收到 closeshutter/closecover
+  - 开始下雨 → 关闭命令到达设备：另含等待下一次安全档轮询（1 s）的时间
+  - 每次发布的判断开销：有规则的气象状态和无关设备（望远镜）各一次 evaluate()
+
+用法:
+    python benchmarks/bench_safety_interlock.py --trials 5 --motion-time 20 --ui-stall 300
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt5.QtCore import QCoreApplication, QObject, Qt, QTimer, pyqtSignal  # noqa: E402
+
+from src.services.alpaca_registry import AlpacaClientRegistry  # noqa: E402
+from src.services.command_executor import CommandExecutor, DeviceCommand  # noqa: E402
+from src.services.polling_engine import PollingMonitor  # noqa: E402
+from src.services.safety_interlock import DEFAULT_SETTINGS, SafetyInterlock  # noqa: E402
+from src.services.state_store import StateStore, connect_sources  # noqa: E402
+from src.simulators.alpaca_server import AlpacaStubServer  # noqa: E402
+from bench_polling_cycle import CONFIG_ENDPOINTS  # noqa: E402
+from bench_telemetry_server import DEVICE_KEYS  # noqa: E402
+
+CLOSE_ACTIONS = ('closeshutter', 'closecover')
+
+
+class TimingStub(AlpacaStubServer):
+    """记录第一份下雨读数的返回时刻和关闭命令的到达时刻"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.wet_served = None
+        self.close_received = {}
+
+    def reset_marks(self):
+        self.wet_served = None
+        self.close_received = {}
+
+    def handle_get(self, device_type, device_number, prop):
+        value, code, message = super().handle_get(device_type, device_number, prop)
+        if device_type == 'observingconditions' and prop == 'rainrate' and value and self.wet_served is None:
+            self.wet_served = time.perf_counter()
+        return value, code, message
+
+    def handle_put(self, device_type, device_number, action, form):
+        if action in CLOSE_ACTIONS:
+            self.close_received.setdefault(action, time.perf_counter())
+        return super().handle_put(device_type, device_number, action, form)
+
+
+class Quitter(QObject):
+    quit_requested = pyqtSignal()
+
+
+def trial(mode, stub, store, monitor, registry, base_url, settings, motion_time):
+    """一次下雨；返回 (读数 → 命令, 下雨 → 命令)，单位秒，取两个关闭命令中较晚的一个"""
+    stub.set_value('observingconditions', 'rainrate', 0.0)
+    stub.set_value('dome', 'shutterstatus', 1)
+    stub.set_value('covercalibrator', 'coverstate', 1)
+    time.sleep(1.5)
+    executor = CommandExecutor(registry)
+    detach = None
+    interlock = None
+    if mode == 'interlock':
+        interlock = SafetyInterlock(settings, executor, monitor.engine, registry)
+        interlock.attach(store).guard(executor).start()
+    else:
+        sent = []
+
+        def on_weather(snapshot, changed):
+            if snapshot.get('rainrate', 0.0) > 0 and not sent:
+                sent.append(True)
+                executor.submit(DeviceCommand('dome', 'closeshutter', base_url=base_url))
+                executor.submit(DeviceCommand('covercalibrator', 'closecover', base_url=base_url))
+        detach = store.subscribe('ObservingConditions', on_weather, fields=['rainrate'])
+
+    executor.submit(DeviceCommand('dome', 'openshutter', base_url=base_url))
+    executor.submit(DeviceCommand('covercalibrator', 'opencover', base_url=base_url))
+    time.sleep(random.uniform(0.3, 1.5))
+    stub.reset_marks()
+    onset = time.perf_counter()
+    stub.set_value('observingconditions', 'rainrate', 2.5)
+    deadline = onset + motion_time * 3 + 10
+    while len(stub.close_received) < len(CLOSE_ACTIONS) and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    received = max(stub.close_received.values()) if len(stub.close_received) == len(CLOSE_ACTIONS) else None
+
+    if interlock is not None:
+        interlock.stop()
+    if detach is not None:
+        detach()
+    executor.shutdown()
+    # 等模拟动作全部结束，下一次从关闭状态开始
+    time.sleep(motion_time + 0.5)
+    if received is None or stub.wet_served is None:
+        return None
+    return received - stub.wet_served, received - onset
+
+
+def evaluate_cost(settings, repeat):
+    """evaluate() 每次调用的耗时（微秒）：(气象状态, 无关设备)"""
+    interlock = SafetyInterlock(settings)
+    weather = {'cloudcover': 10.0, 'dewpoint': 2.0, 'humidity': 60.0, 'pressure': 620.0, 'rainrate': 0.0,
+               'skybrightness': 0.0, 'skyquality': 21.0, 'skytemperature': -30.0, 'starfwhm': 1.2,
+               'temperature': 5.0, 'winddirection': 270.0, 'windgust': 6.0, 'windspeed': 3.0}
+    telescope = {'rightascension': 12.0, 'declination': 30.0, 'altitude': 60.0, 'azimuth': 120.0}
+    costs = []
+    for device, values in (('ObservingConditions', weather), ('telescope', telescope)):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            interlock.evaluate(device, values, 0.0)
+        costs.append((time.perf_counter() - start) / repeat * 1e6)
+    interlock.stop()
+    return costs
+
+
+def summarize(samples):
+    if not samples:
+        return '-'
+    ordered = sorted(samples)
+    return (f"{statistics.median(ordered) * 1000:>7.0f} / {ordered[-1] * 1000:>7.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='安全联锁延迟基准测试')
+    parser.add_argument('--trials', type=int, default=5, help='每种做法的下雨次数')
+    parser.add_argument('--motion-time', type=float, default=20.0, help='天窗、镜头盖动作耗时（秒）')
+    parser.add_argument('--ui-stall', type=float, default=300.0, help='界面线程每 500 ms 的卡顿（毫秒）')
+    parser.add_argument('--latency', type=float, default=20.0, help='桩服务器每个请求的延迟（毫秒）')
+    parser.add_argument('--repeat', type=int, default=20000, help='evaluate() 计时的调用次数')
+    args = parser.parse_args()
+
+    random.seed(1)
+    app = QCoreApplication([sys.argv[0]])
+    stub = TimingStub(latency=args.latency / 1000.0, motion_time=args.motion_time).start()
+    config = {'client_id': 123,
+              'devices': {DEVICE_KEYS[device]: {'enabled': True, 'api_url': stub.base_url, 'endpoints': endpoints}
+                          for device, endpoints in CONFIG_ENDPOINTS.items()},
+              'polling': {'adaptive': True}}
+    # 恢复不需要等待，便于连续多次试验
+    rules = [dict(rule, clear_duration=0) for rule in DEFAULT_SETTINGS['rules']]
+    settings = dict(DEFAULT_SETTINGS, rules=rules, enabled=True)
+    registry = AlpacaClientRegistry(config=config)
+    store = StateStore()
+    monitor = PollingMonitor(config=config)
+    connect_sources(store, monitor=monitor)
+
+    def stall():
+        time.sleep(args.ui_stall / 1000.0)
+    stall_timer = QTimer()
+    stall_timer.timeout.connect(stall)
+    quitter = Quitter()
+    quitter.quit_requested.connect(app.quit, Qt.QueuedConnection)
+    results = {'subscriber': [], 'interlock': []}
+
+    def scenario():
+        try:
+            for mode in results:
+                for _ in range(args.trials):
+                    outcome = trial(mode, stub, store, monitor, registry, stub.base_url, settings,
+                                    args.motion_time)
+                    results[mode].append(outcome)
+        finally:
+            quitter.quit_requested.emit()
+
+    monitor.start()
+    stall_timer.start(500)
+    threading.Thread(target=scenario, daemon=True).start()
+    app.exec_()
+    stall_timer.stop()
+    monitor.stop()
+    monitor.wait(5000)
+    registry.close_all()
+    stub.stop()
+
+    weather_cost, other_cost = evaluate_cost(settings, args.repeat)
+    print(f"开天窗/开镜头盖执行中（动作 {args.motion_time:.0f} s）开始下雨，界面线程每 500 ms 卡顿 "
+          f"{args.ui_stall:.0f} ms，桩服务器延迟 {args.latency:.0f} ms，每种做法 {args.trials} 次")
+    print(f"{'':>10} | 读数 → 关闭命令 中位数 / 最大 | 下雨 → 关闭命令 中位数 / 最大 | 未发出")
+    names = {'subscriber': '界面订阅', 'interlock': '安全联锁'}
+    for mode, outcomes in results.items():
+        done = [item for item in outcomes if item is not None]
+        print(f"{names[mode]:>10} | {summarize([item[0] for item in done]):>28} | "
+              f"{summarize([item[1] for item in done]):>28} | {len(outcomes) - len(done)}")
+    print(f"evaluate(): 气象状态 {weather_cost:.1f} us/次，无关设备 {other_cost:.2f} us/次")
+
+
+if __name__ == '__main__':
+    main()
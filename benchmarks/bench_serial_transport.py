@@ -0,0 +1,205 @@
+"""
+水冷机 / UPS 串口轮询对界面线程的影响基准测试
+
+用伪终端模拟水冷机（Modbus RTU）和 UPS（Megatec Q1），在 Qt 事件循环中运行 10ms 定时器：
+  - 原做法：界面线程中每秒各轮询一次，写入后固定 sleep 再以 1 秒超时阻塞读取
+  - 传输层：每个串口一个收发线程，状态变化时才通过信号推送
+分别在两台设备都正常、UPS 无响应两种情况下比较定时器抖动、界面线程被阻塞的时间，
+以及 UPS 无响应时水冷机状态的更新间隔。
+
+用法:
+    python benchmarks/bench_serial_transport.py --duration 6 --device-delay 30
+"""
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import serial  # noqa: E402
+from PyQt5.QtCore import QCoreApplication, QTimer  # noqa: E402
+
+from src.services.serial_transport import ModbusCoolerProtocol, MegatecUpsProtocol, SerialTransport  # noqa: E402
+from src.simulators.serial_device import FakeSerialDevice  # noqa: E402
+
+TICK_MS = 10
+POLL_MS = 1000
+
+
+class JitterProbe:
+    """记录定时器实际触发间隔"""
+
+    def __init__(self):
+        self.intervals = []
+        self._last = None
+        self.timer = QTimer()
+        self.timer.setInterval(TICK_MS)
+        self.timer.timeout.connect(self._tick)
+
+    def _tick(self):
+        now = time.perf_counter()
+        if self._last is not None:
+            self.intervals.append(now - self._last)
+        self._last = now
+
+    def start(self):
+        self._last = None
+        self.intervals = []
+        self.timer.start()
+
+    def stop(self):
+        self.timer.stop()
+
+    def max_jitter(self):
+        return max((max(0.0, i * 1000 - TICK_MS) for i in self.intervals), default=0.0)
+
+
+class LegacyPoller:
+    """与原 DeviceControl.poll_cooler_status / poll_ups_status 相同的界面线程轮询"""
+
+    def __init__(self, cooler_port, ups_port):
+        self.cooler = serial.Serial(cooler_port, 9600, timeout=1)
+        self.ups = serial.Serial(ups_port, 2400, timeout=1)
+        self.cooler_protocol = ModbusCoolerProtocol()
+        self.ups_protocol = MegatecUpsProtocol()
+        self.blocked = 0.0
+        self.cooler_updates = []
+        self.timers = []
+        for poll in (self.poll_cooler, self.poll_ups):
+            timer = QTimer()
+            timer.setInterval(POLL_MS)
+            timer.timeout.connect(poll)
+            self.timers.append(timer)
+
+    def start(self):
+        for timer in self.timers:
+            timer.start()
+
+    def stop(self):
+        for timer in self.timers:
+            timer.stop()
+        self.cooler.close()
+        self.ups.close()
+
+    def poll_cooler(self):
+        start = time.perf_counter()
+        self.cooler.reset_input_buffer()
+        self.cooler.write(self.cooler_protocol.status_request())
+        time.sleep(0.1)
+        response = self.cooler.read(11)
+        if len(response) == 11:
+            self.cooler_protocol.decode_status(response)
+            self.cooler_updates.append(time.perf_counter())
+        self.blocked += time.perf_counter() - start
+
+    def poll_ups(self):
+        start = time.perf_counter()
+        self.ups.reset_input_buffer()
+        self.ups.write(b'Q1\r')
+        time.sleep(0.2)
+        response = self.ups.read_until(b'\r')
+        if response.endswith(b'\r'):
+            self.ups_protocol.decode_status(response)
+        self.blocked += time.perf_counter() - start
+
+
+def run_loop(app, seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        app.processEvents()
+        time.sleep(0.001)
+
+
+def update_gap(times):
+    gaps = [b - a for a, b in zip(times, times[1:])]
+    return max(gaps) if gaps else float('nan')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='水冷机 / UPS 串口轮询对界面线程的影响基准测试')
+    parser.add_argument('--duration', type=float, default=6.0, help='每种情况的运行时长（秒）')
+    parser.add_argument('--device-delay', type=float, default=30.0, help='模拟设备的响应延迟（毫秒）')
+    args = parser.parse_args()
+
+    app = QCoreApplication(sys.argv)
+    delay = args.device_delay / 1000.0
+    rows = []
+    for ups_silent in (False, True):
+        label = 'UPS 无响应' if ups_silent else '设备正常'
+
+        with FakeSerialDevice('cooler', delay) as cooler, FakeSerialDevice('ups', delay) as ups:
+            ups.silent = ups_silent
+            probe = JitterProbe()
+            legacy = LegacyPoller(cooler.port, ups.port)
+            probe.start()
+            legacy.start()
+            run_loop(app, args.duration)
+            legacy.stop()
+            probe.stop()
+            rows.append((f"原做法 {label}", probe.max_jitter(), legacy.blocked / args.duration * 100,
+                         update_gap(legacy.cooler_updates), None))
+
+        with FakeSerialDevice('cooler', delay) as cooler, FakeSerialDevice('ups', delay) as ups:
+            ups.silent = ups_silent
+            transport = SerialTransport()
+            cooler_updates = []
+            signals = []
+            gui_time = [0.0]
+
+            def on_status(device_key, status):
+                start = time.perf_counter()
+                signals.append(device_key)
+                gui_time[0] += time.perf_counter() - start
+
+            transport.status_changed.connect(on_status)
+            probe = JitterProbe()
+            probe.start()
+            transport.open_device('cooler', cooler.port, poll_interval=POLL_MS / 1000.0, baudrate=9600)
+            transport.open_device('ups', ups.port, poll_interval=POLL_MS / 1000.0, baudrate=2400)
+            channel = transport.channel('cooler')
+            last_received = 0
+
+            def watch_cooler():
+                nonlocal last_received
+                if channel.stats['received'] != last_received:
+                    last_received = channel.stats['received']
+                    cooler_updates.append(time.perf_counter())
+
+            watcher = QTimer()
+            watcher.setInterval(5)
+            watcher.timeout.connect(watch_cooler)
+            watcher.start()
+            cooler.set_state(temperature=18.5)
+            run_loop(app, args.duration / 2)
+            cooler.set_state(temperature=18.7)
+            run_loop(app, args.duration / 2)
+            watcher.stop()
+            probe.stop()
+            rows.append((f"传输层 {label}", probe.max_jitter(), gui_time[0] / args.duration * 100,
+                         update_gap(cooler_updates), (transport.stats['polls'], len(signals))))
+            transport.shutdown()
+
+    print(f"{'':>16} | {'定时器最大抖动':>12} | {'界面线程阻塞':>10} | {'水冷机最长更新间隔':>14} | 查询/推送")
+    for name, jitter, blocked, gap, counts in rows:
+        counts_text = f"{counts[0]}/{counts[1]}" if counts else '-'
+        print(f"{name:>16} | {jitter:>11.1f} ms | {blocked:>10.2f}% | {gap * 1000:>15.0f} ms | {counts_text}")
+
+    with FakeSerialDevice('cooler', delay) as cooler:
+        transport = SerialTransport()
+        request = ModbusCoolerProtocol().status_request()
+        for depth in (1, 4):
+            transport.open_device('cooler', cooler.port, poll_interval=0, pipeline_depth=depth)
+            start = time.perf_counter()
+            futures = [transport.request('cooler', request) for _ in range(20)]
+            for future in futures:
+                future.result()
+            elapsed = time.perf_counter() - start
+            print(f"连续 20 个请求（pipeline_depth={depth}）: {elapsed * 1000:.0f} ms"
+                  f"（原做法每个请求至少 sleep 100 ms: ≥2000 ms）")
+        transport.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+"""
+启动耗时基准测试
+
+每次在新的解释器进程中启动一个与主窗口结构相当的窗口（8 组、每组 12 个标签对，连接菜单），
+窗口模块像 main_window 一样在顶层导入天文模块（与 astronomy_service 相同的 astropy/astroplan 导入），
+设备从本地 Alpaca 桩服务器（建立连接带人为延迟，模拟较慢的站点链路）搜索。比较：
+  - 原做法：导入全部模块，同步搜索设备和枚举串口，构造窗口后显示，时钟刷新用 astropy 计算太阳高度
+  - 分阶段启动：天文模块以占位模块代替，空设备列表构造窗口并显示，首次绘制后后台搜索设备、
+    枚举串口、计算星历并预加载天文模块
+报告（多次运行的中位数，从进程启动算起）首次绘制、连接菜单填好、首次时钟刷新耗时、天文模块导入耗时，
+以及启动期间导入耗时最多的模块（分阶段启动中天文模块在后台线程导入）。
+
+用法:
+    python benchmarks/bench_startup.py --runs 5 --latency 800
+"""
+import argparse
+import importlib
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# 与 astronomy_service 顶层相同的第三方导入，以及一次太阳高度计算
+ASTRO_MODULE = '''
+from astropy.utils import iers
+iers.conf.auto_download = False
+from astropy.time import Time
+import astropy.units as u
+from astroplan import Observer
+from astropy.coordinates import EarthLocation, get_sun, SkyCoord, AltAz
+
+
+class AstronomyService:
+    def __init__(self):
+        self.location = EarthLocation(lat=38.6 * u.deg, lon=93.9 * u.deg, height=4200 * u.m)
+        self.observer = Observer(location=self.location)
+
+    def get_sun_info(self):
+        now = Time.now()
+        altaz = get_sun(now).transform_to(AltAz(obstime=now, location=self.location))
+        return {'sunrise': '--:--:--', 'sunset': '--:--:--', 'altitude': f"{altaz.alt.deg:.2f}°"}
+
+
+astronomy_service = AstronomyService()
+'''
+
+WINDOW_MODULE = '''
+from PyQt5.QtCore import QTimer
+from PyQt5.QtWidgets import QGridLayout, QGroupBox, QHBoxLayout, QLabel, QMainWindow, QWidget
+
+from bench_astro import astronomy_service
+
+
+class BenchWindow(QMainWindow):
+    def __init__(self, telescope_devices=None):
+        super().__init__()
+        self.setWindowTitle('startup bench')
+        central = QWidget()
+        layout = QHBoxLayout(central)
+        self.labels = []
+        for g in range(8):
+            box = QGroupBox(f'group {g}')
+            grid = QGridLayout(box)
+            for i in range(12):
+                grid.addWidget(QLabel(f'item {i}'), i, 0)
+                value = QLabel('--')
+                grid.addWidget(value, i, 1)
+                self.labels.append(value)
+            layout.addWidget(box)
+        self.setCentralWidget(central)
+        self.connect_menu = self.menuBar().addMenu('connect')
+        self.device_controls = []
+        self.menu_devices = 0
+        self.menu_ports = 0
+        self.tick_seconds = None
+        self.init_connect_menu(telescope_devices or [])
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.update_time_info)
+        self.timer.start(1000)
+        self.resize(1600, 600)
+
+    def init_connect_menu(self, telescope_devices):
+        self.connect_menu.clear()
+        for device in telescope_devices:
+            self.connect_menu.addAction(device.get('DeviceName', ''))
+        ports = self.get_available_serial_ports()
+        for port in ports:
+            self.connect_menu.addAction(port)
+        self.menu_devices = len(telescope_devices)
+        self.menu_ports = len(ports)
+
+    def get_available_serial_ports(self):
+        from serial.tools import list_ports
+        return [p.device for p in list_ports.comports()]
+
+    def update_time_info(self):
+        import time
+        start = time.perf_counter()
+        info = astronomy_service.get_sun_info()
+        self.labels[0].setText(info['altitude'])
+        if self.tick_seconds is None:
+            self.tick_seconds = time.perf_counter() - start
+'''
+
+
+def child(mode, workdir, base_url):
+    """子进程：启动窗口，打印一行 JSON 结果"""
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from src.services.discovery_service import DiscoveryService
+    from src.services.startup import (StagedStartup, format_report, get_startup_profiler,
+                                      install_lazy_module, install_staged_startup, ASTRONOMY_FAST_PATHS)
+    profiler = get_startup_profiler()
+    profiler.begin()
+    sys.path.insert(0, workdir)
+    from PyQt5.QtWidgets import QApplication
+    from src.services.alpaca_registry import alpaca_registry
+    app = QApplication([sys.argv[0]])
+    alpaca_registry.set_config({'default_api_base_url': base_url})
+    profiler.mark('qapplication')
+    settings = {'report_path': os.path.join(workdir, f'{mode}.json'),
+                'history_path': os.path.join(workdir, f'{mode}.jsonl'),
+                'preload': ['bench_astro'], 'defer_timers_ms': 0}
+    result = {}
+
+    def maybe_quit():
+        # 启动完成且第一次时钟刷新（1 s 定时器）已经执行
+        if 'report' in result and window.tick_seconds is not None:
+            app.quit()
+
+    if mode == 'eager':
+        start = time.perf_counter()
+        importlib.import_module('bench_astro')
+        result['astro_import'] = time.perf_counter() - start
+        from bench_window import BenchWindow
+        profiler.mark('imports')
+        devices = alpaca_registry.get_client().find_devices()
+        window = BenchWindow(devices)
+        profiler.mark('window')
+
+        def done():
+            profiler.mark('devices')
+            result.update(report=profiler.finish(settings), menu_devices=window.menu_devices)
+            maybe_quit()
+
+        profiler.watch_first_paint(window, done)
+        window.show()
+    else:
+        install_lazy_module('bench_astro', ('astronomy_service',), {'astronomy_service': ASTRONOMY_FAST_PATHS})
+        from bench_window import BenchWindow
+        install_staged_startup(BenchWindow)
+        profiler.mark('imports')
+        window = BenchWindow([])
+        discovery = DiscoveryService({'servers': [base_url], 'include_config': False, 'udp': False,
+                                      'cache_path': os.path.join(workdir, 'discovery_cache.json')})
+        startup = StagedStartup(window, profiler, settings, discovery)
+        window._staged_startup = startup
+        profiler.mark('window')
+
+        def done(report):
+            result.update(report=report, menu_devices=window.menu_devices)
+            result['astro_import'] = report['lazy_modules'].get('bench_astro', {}).get('seconds')
+            maybe_quit()
+
+        startup.ready.connect(done)
+        startup.begin()
+        window.show()
+    window.timer.timeout.connect(maybe_quit)
+    app.exec_()
+    result['tick'] = window.tick_seconds
+    report = result.pop('report')
+    result['phases'] = report['phases']
+    result['imports'] = report['imports']
+    if os.environ.get('BENCH_STARTUP_VERBOSE'):
+        print(format_report(report), file=sys.stderr)
+    print(json.dumps(result))
+
+
+def run_child(mode, workdir, base_url):
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', mode,
+                             '--workdir', workdir, '--url', base_url],
+                            cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='启动耗时基准测试')
+    parser.add_argument('--runs', type=int, default=5, help='每种方式启动的次数')
+    parser.add_argument('--latency', type=float, default=800.0, help='连接桩服务器的延迟（毫秒），模拟较慢的站点链路')
+    parser.add_argument('--child', choices=('eager', 'staged'), help=argparse.SUPPRESS)
+    parser.add_argument('--workdir', help=argparse.SUPPRESS)
+    parser.add_argument('--url', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child, args.workdir, args.url)
+        return
+
+    from src.simulators.alpaca_server import AlpacaStubServer
+    workdir = tempfile.mkdtemp(prefix='startup-bench-')
+    with open(os.path.join(workdir, 'bench_astro.py'), 'w', encoding='utf-8') as f:
+        f.write(ASTRO_MODULE)
+    with open(os.path.join(workdir, 'bench_window.py'), 'w', encoding='utf-8') as f:
+        f.write(WINDOW_MODULE)
+    server = AlpacaStubServer(connect_latency=args.latency / 1000.0).start()
+    results = {'eager': [], 'staged': []}
+    try:
+        run_child('eager', workdir, server.base_url)  # 预热磁盘缓存和 __pycache__
+        for _ in range(args.runs):
+            for mode in results:
+                results[mode].append(run_child(mode, workdir, server.base_url))
+    finally:
+        server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    def median(mode, getter):
+        values = [getter(r) for r in results[mode]]
+        values = [v for v in values if v is not None]
+        return statistics.median(values) if values else float('nan')
+
+    print(f"{args.runs} 次冷启动的中位数，连接延迟 {args.latency:.0f} ms，时刻从进程启动算起")
+    print(f"{'':>10} | {'首次绘制':>8} | {'菜单填好':>8} | {'首次时钟刷新':>10} | {'天文模块导入':>10} | 菜单设备数")
+    for mode, name in (('eager', '原做法'), ('staged', '分阶段启动')):
+        first_paint = median(mode, lambda r: r['phases']['first_paint'])
+        menu = median(mode, lambda r: r['phases'].get('devices'))
+        tick = median(mode, lambda r: r['tick'])
+        astro = median(mode, lambda r: r['astro_import'])
+        devices = results[mode][-1]['menu_devices']
+        print(f"{name:>10} | {first_paint:>9.2f} s | {menu:>9.2f} s | {tick * 1000:>12.1f} ms | "
+              f"{astro * 1000:>12.0f} ms | {devices}")
+    for mode, name in (('eager', '原做法'), ('staged', '分阶段启动')):
+        first_paint = results[mode][-1]['phases']['first_paint']
+        print(f"{name}（最后一次）导入耗时最多的模块（累计 / 自身），首次绘制 {first_paint:.2f} s:")
+        for item in results[mode][-1]['imports'][:6]:
+            print(f"    {item['module']:<36} {item['cumulative'] * 1000:>7.1f} ms / {item['self'] * 1000:>6.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+"""
+设备状态总线基准测试
+
+按模拟时钟重放一段观测（默认 1 小时）：望远镜和消旋器每秒轮询一次，跟踪时坐标不变，
+每隔一段时间指向新目标，消旋器每隔一段时间转动。比较：
+  - 原做法：每次收到消旋器状态都从标签文本读回赤经赤纬计算旁行角（update_rotator_status），
+    1 s 定时器在 int(t) % 30 == 0 时再读标签计算一次并判断 DSS 星图（calculate_frame_dec_angle）；
+    定时器间隔按 --jitter 随机变长，跳过整 30 秒那一秒时这一轮就不计算
+  - 状态总线：望远镜和消旋器状态发布到 StateStore，'pointing' 只在坐标或消旋器角度变化、
+    或超过 30 s 未计算时重新计算，'dss_target' 只在指向移动超过 0.5° 时更新
+分别报告有消旋器和没有消旋器（只剩 30 s 这条路径）两种情况下旁行角的计算次数、读取标签文本次数、
+DSS 星图请求次数、画幅夹角两次刷新之间的最长间隔和总耗时。
+
+用法:
+    python benchmarks/bench_state_store.py --hours 1 --jitter 0.02
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt5.QtCore import QCoreApplication  # noqa: E402
+
+from src.utils.coordinates import parse_dec_degrees, parse_ra_hours  # noqa: E402
+from src.services.parallactic import get_parallactic_calculator  # noqa: E402
+from src.services.state_store import StateStore, register_default_derivations  # noqa: E402
+from src.ui.state_binding import format_dec, format_ra  # noqa: E402
+
+SLEW_EVERY = 900
+ROTATE_EVERY = 600
+
+
+def scenario(seconds, seed=7):
+    """逐秒产生 (t, 望远镜状态, 消旋器状态)"""
+    rng = random.Random(seed)
+    ra, dec, rotator = 5.5, 22.0, 0.0
+    for t in range(seconds):
+        if t % SLEW_EVERY == 0:
+            ra, dec = rng.uniform(0, 24), rng.uniform(-20, 70)
+        if t % ROTATE_EVERY == 300:
+            rotator = round(rng.uniform(0, 180), 2)
+        telescope = {'rightascension': ra, 'declination': dec, 'altitude': 60.0, 'azimuth': 180.0,
+                     'siderealtime': (3.0 + t * 1.0027379 / 3600.0) % 24, 'tracking': True}
+        yield t, telescope, {'position': rotator}
+
+
+def timer_ticks(seconds, jitter, seed=11):
+    """1 s 定时器实际触发的时刻，每次间隔在 [1, 1 + jitter] 秒之间"""
+    rng = random.Random(seed)
+    t = 0.0
+    while t < seconds:
+        yield t
+        t += 1.0 + rng.uniform(0.0, jitter)
+
+
+class Labels:
+    """主窗口标签文本（只记录读取次数）"""
+
+    def __init__(self):
+        self.values = {}
+        self.reads = 0
+
+    def set(self, key, text):
+        self.values[key] = text
+
+    def text(self, key):
+        self.reads += 1
+        return self.values.get(key, '')
+
+
+def run_legacy(seconds, jitter, with_rotator):
+    calculator = get_parallactic_calculator()
+    labels = Labels()
+    counts = {'pa': 0, 'dss': 0}
+    refreshes = []
+    last_coords = None
+    states = list(scenario(seconds))
+    ticks = list(timer_ticks(seconds, jitter))
+    start = time.perf_counter()
+
+    def compute_pa(now, rotator_angle, lst):
+        counts['pa'] += 1
+        pa = calculator.calculate_parallactic_angle(labels.text('ra'), labels.text('dec'), rotator_angle, lst)
+        if pa is not None:
+            labels.set('frame_dec_angle', f"{pa:.6f}°")
+            refreshes.append(now)
+
+    tick_index = 0
+    for t, telescope, rotator in states:
+        labels.set('ra', format_ra(telescope['rightascension']))
+        labels.set('dec', format_dec(telescope['declination']))
+        lst = telescope['siderealtime']
+        if with_rotator:
+            # update_rotator_status：每次消旋器状态都读标签计算旁行角
+            labels.set('angle', f"{rotator['position']:.2f}°")
+            compute_pa(t, rotator['position'], lst)
+        while tick_index < len(ticks) and ticks[tick_index] < t + 1:
+            now = ticks[tick_index]
+            tick_index += 1
+            if int(now) % 30 != 0:
+                continue
+            # calculate_frame_dec_angle
+            ra_text, dec_text = labels.text('ra'), labels.text('dec')
+            ra_deg, dec_deg = parse_ra_hours(ra_text) * 15.0, parse_dec_degrees(dec_text)
+            if last_coords is None or abs(ra_deg - last_coords[0]) > 0.5 or abs(dec_deg - last_coords[1]) > 0.5:
+                last_coords = (ra_deg, dec_deg)
+                counts['dss'] += 1
+            angle_text = labels.text('angle')
+            rotator_angle = float(angle_text.replace('°', '')) if '°' in angle_text else 0.0
+            compute_pa(now, rotator_angle, lst)
+    elapsed = time.perf_counter() - start
+    return counts['pa'], labels.reads, counts['dss'], max_gap(refreshes, seconds), elapsed
+
+
+def run_store(seconds, jitter, with_rotator):
+    store = StateStore(coalesce_ms=0)
+    register_default_derivations(store, {'pointing_max_age': 30, 'dss_threshold': 0.5})
+    counts = {'dss': 0}
+    refreshes = []
+    labels = Labels()
+
+    def on_pointing(snapshot, changed):
+        labels.set('frame_dec_angle', f"{snapshot.get('frame_dec_angle', 0.0):.6f}°")
+        refreshes.append(current[0])
+
+    def on_dss(snapshot, changed):
+        counts['dss'] += 1
+
+    store.subscribe('pointing', on_pointing)
+    store.subscribe('dss_target', on_dss)
+    current = [0.0]
+    states = list(scenario(seconds))
+    ticks = list(timer_ticks(seconds, jitter))
+    start = time.perf_counter()
+    tick_index = 0
+    for t, telescope, rotator in states:
+        current[0] = t
+        store.publish('telescope', telescope, timestamp=t)
+        if with_rotator:
+            store.publish('rotator', rotator, timestamp=t)
+        store.flush(now=t)
+        while tick_index < len(ticks) and ticks[tick_index] < t + 1:
+            current[0] = ticks[tick_index]
+            store.tick(now=ticks[tick_index])
+            tick_index += 1
+    elapsed = time.perf_counter() - start
+    return store.stats['derived_runs'], labels.reads, counts['dss'], max_gap(refreshes, seconds), elapsed, store.stats
+
+
+def max_gap(refreshes, seconds):
+    points = [0.0] + sorted(refreshes) + [float(seconds)]
+    return max(b - a for a, b in zip(points, points[1:]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='设备状态总线基准测试')
+    parser.add_argument('--hours', type=float, default=1.0, help='模拟的观测时长（小时）')
+    parser.add_argument('--jitter', type=float, default=0.02, help='1 s 定时器每次最多推迟的秒数')
+    args = parser.parse_args()
+    app = QCoreApplication.instance() or QCoreApplication([sys.argv[0]])
+    seconds = int(args.hours * 3600)
+
+    print(f"模拟 {args.hours:g} 小时，每秒轮询一次，每 {SLEW_EVERY // 60} 分钟换目标、每 {ROTATE_EVERY // 60} 分钟转动消旋器，"
+          f"定时器每次最多推迟 {args.jitter * 1000:.0f} ms")
+    print(f"{'':>18} | 旁行角计算 | 读标签 | DSS 请求 | 最长刷新间隔 | 耗时")
+    for with_rotator in (True, False):
+        suffix = '有消旋器' if with_rotator else '无消旋器'
+        pa, reads, dss, gap, elapsed = run_legacy(seconds, args.jitter, with_rotator)
+        print(f"{'原做法 ' + suffix:>18} | {pa:>10} | {reads:>6} | {dss:>8} | {gap:>10.1f} s | {elapsed * 1000:>6.1f} ms")
+        pa, reads, dss, gap, elapsed, stats = run_store(seconds, args.jitter, with_rotator)
+        print(f"{'状态总线 ' + suffix:>18} | {pa:>10} | {reads:>6} | {dss:>8} | {gap:>10.1f} s | {elapsed * 1000:>6.1f} ms")
+    print(f"状态总线（无消旋器）: 发布 {stats['published']} 次，其中数值未变 {stats['unchanged']} 次，"
+          f"通知 {stats['notifications']} 次，派生值跳过 {stats['derived_skipped']} 次")
+    # 送达模拟结束时仍在排队的通知
+    app.processEvents()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+"""
+遥测服务负载测试
+
+在本地 Alpaca 桩服务器上运行批量轮询（PollingMonitor）→ StateStore → TelemetryServer，
+望远镜处于指向状态（坐标按 0.5 秒快速轮询）、坐标每 0.5 秒变化一次。先在没有订阅者时运行一段时间，再接入 --clients 个 WebSocket 订阅者
+（JSON / msgpack 各半，未安装 msgpack 时全部 JSON）和 --pollers 个 HTTP 长轮询客户端运行同样时长，比较：
+  - 上游 Alpaca 请求速率（应当不随订阅者数量变化）
+  - 各订阅者收到的消息数、从状态发布到订阅者收到的延迟（中位数 / 95%）
+  - 若每个订阅者都像主窗口一样直接轮询 Alpaca，上游请求速率的估计
+
+用法:
+    python benchmarks/bench_telemetry_server.py --clients 50 --duration 10
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt5.QtCore import QCoreApplication, QObject, Qt, pyqtSignal  # noqa: E402
+
+from src.services import telemetry_server  # noqa: E402
+from src.services.polling_engine import PollingMonitor  # noqa: E402
+from src.services.state_store import StateStore, connect_sources  # noqa: E402
+from src.services.telemetry_server import API_PREFIX, TelemetryServer, WebSocketClient, decode  # noqa: E402
+from src.simulators.alpaca_server import AlpacaStubServer  # noqa: E402
+from bench_polling_cycle import CONFIG_ENDPOINTS  # noqa: E402
+
+DEVICE_KEYS = {
+    'telescope': 'telescope',
+    'observingconditions': 'ObservingConditions',
+    'focuser': 'focuser',
+    'rotator': 'rotator',
+    'dome': 'dome',
+    'covercalibrator': 'covercalibrator',
+}
+
+
+class Subscriber(threading.Thread):
+    """WebSocket 订阅者：记录消息数和望远镜更新的延迟"""
+
+    def __init__(self, url, fmt):
+        super().__init__(daemon=True)
+        self.fmt = fmt
+        self.client = WebSocketClient(f"{url}?format={fmt}")
+        self.client.sock.settimeout(None)
+        self.messages = 0
+        self.latencies = []
+        self.running = True
+
+    def run(self):
+        try:
+            while self.running:
+                _opcode, payload = self.client.receive()
+                message = decode(payload, self.fmt)
+                self.messages += 1
+                if message.get('type') == 'update' and message.get('device') == 'telescope':
+                    self.latencies.append(time.time() - message['timestamp'])
+        except (ConnectionError, OSError):
+            pass
+
+    def stop(self):
+        self.running = False
+        self.client.close()
+
+
+class LongPoller(threading.Thread):
+    """HTTP 长轮询客户端"""
+
+    def __init__(self, base_url):
+        super().__init__(daemon=True)
+        self.base_url = base_url
+        self.messages = 0
+        self.running = True
+
+    def run(self):
+        seq = -1
+        while self.running:
+            try:
+                with urllib.request.urlopen(f"{self.base_url}{API_PREFIX}/changes?since={seq}&timeout=1",
+                                            timeout=5) as response:
+                    message = json.loads(response.read())
+            except OSError:
+                continue
+            seq = message['seq']
+            self.messages += 1
+
+
+class Quitter(QObject):
+    quit_requested = pyqtSignal()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='遥测服务负载测试')
+    parser.add_argument('--clients', type=int, default=50, help='WebSocket 订阅者数量')
+    parser.add_argument('--pollers', type=int, default=5, help='HTTP 长轮询客户端数量')
+    parser.add_argument('--duration', type=float, default=10.0, help='每个阶段的时长（秒）')
+    args = parser.parse_args()
+
+    app = QCoreApplication([sys.argv[0]])
+    stub = AlpacaStubServer().start()
+    config = {'devices': {DEVICE_KEYS[device]: {'enabled': True, 'api_url': stub.base_url, 'endpoints': endpoints}
+                          for device, endpoints in CONFIG_ENDPOINTS.items()},
+              'polling': {'adaptive': True}}
+    store = StateStore()
+    monitor = PollingMonitor(config=config)
+    monitor.telemetry = None
+    connect_sources(store, monitor=monitor)
+    server = TelemetryServer(store, {'port': 0}).start()
+    quitter = Quitter()
+    quitter.quit_requested.connect(app.quit, Qt.QueuedConnection)
+    results = []
+
+    def mover():
+        ra = 12.0
+        stub.set_value('telescope', 'slewing', True)
+        while len(results) < 2:
+            ra = (ra + 0.001) % 24
+            stub.set_value('telescope', 'rightascension', ra)
+            time.sleep(0.5)
+
+    def phase(name, subscribers, pollers):
+        time.sleep(1.0)
+        start_requests = stub.request_count()
+        for client in subscribers + pollers:
+            client.messages = 0
+        for client in subscribers:
+            client.latencies = []
+        start = time.monotonic()
+        time.sleep(args.duration)
+        elapsed = time.monotonic() - start
+        rate = (stub.request_count() - start_requests) / elapsed
+        latencies = sorted(v for client in subscribers for v in client.latencies)
+        results.append({
+            'name': name, 'clients': len(subscribers), 'pollers': len(pollers), 'rate': rate,
+            'messages': [client.messages for client in subscribers],
+            'poll_messages': sum(client.messages for client in pollers),
+            'p50': statistics.median(latencies) if latencies else None,
+            'p95': latencies[int(len(latencies) * 0.95)] if latencies else None,
+        })
+
+    def scenario():
+        subscribers, pollers = [], []
+        try:
+            phase('无订阅者', [], [])
+            formats = ['json', 'msgpack'] if telemetry_server.msgpack is not None else ['json']
+            subscribers = [Subscriber(server.stream_url, formats[i % len(formats)]) for i in range(args.clients)]
+            pollers = [LongPoller(server.base_url) for _ in range(args.pollers)]
+            for client in subscribers + pollers:
+                client.start()
+            phase(f'{args.clients} 个订阅者', subscribers, pollers)
+        finally:
+            for client in subscribers:
+                client.stop()
+            for client in pollers:
+                client.running = False
+            quitter.quit_requested.emit()
+
+    monitor.start()
+    threading.Thread(target=mover, daemon=True).start()
+    threading.Thread(target=scenario, daemon=True).start()
+    app.exec_()
+    monitor.stop()
+    monitor.wait(5000)
+    server.stop()
+    stub.stop()
+
+    print(f"每个阶段 {args.duration:.0f} s，望远镜指向中、坐标每 0.5 s 变化一次，"
+          f"msgpack {'可用' if telemetry_server.msgpack is not None else '未安装（全部使用 JSON）'}")
+    print(f"{'':>12} | 上游请求 | 每订阅者消息（最少/最多） | 长轮询响应 | 延迟 中位数 / 95%")
+    for item in results:
+        messages = f"{min(item['messages'])} / {max(item['messages'])}" if item['messages'] else '-'
+        latency = (f"{item['p50'] * 1000:.1f} / {item['p95'] * 1000:.1f} ms"
+                   if item['p50'] is not None else '-')
+        print(f"{item['name']:>12} | {item['rate']:>6.1f}/s | {messages:>24} | {item['poll_messages']:>10} | {latency}")
+    base, loaded = results
+    print(f"订阅者增加的上游请求: {loaded['rate'] - base['rate']:+.1f}/s；"
+          f"若 {args.clients} 个订阅者各自直接轮询 Alpaca，估计 {base['rate'] * (args.clients + 1):.0f}/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""
+设备读数时序存储基准测试
+
+模拟多台设备以 1 Hz 输出读数（气象 12 个字段、赤道仪 6 个、调焦器 3 个、水冷机 10 个、UPS 6 个），
+按存储的后台写入节拍手动推进时间，写入若干天的数据，报告：
+  - 每条读数的记录开销（调用方线程）和写入开销（后台线程）、fsync 次数、磁盘占用
+  - 查询一整夜（12 小时）数据在各层级上的耗时
+并与逐条追加并 fsync、把整夜数据写成 CSV 再扫描过滤两种朴素做法比较。
+
+用法:
+    python benchmarks/bench_telemetry_store.py --days 1 --flush-interval 5
+"""
+import argparse
+import math
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.telemetry_store import TelemetryStore, series_name  # noqa: E402
+
+DEVICES = {
+    'ObservingConditions': ['cloudcover', 'dewpoint', 'humidity', 'pressure', 'rainrate', 'skybrightness',
+                            'skyquality', 'skytemperature', 'starfwhm', 'temperature', 'winddirection',
+                            'windspeed'],
+    'telescope': ['rightascension', 'declination', 'altitude', 'azimuth', 'slewing', 'tracking'],
+    'focuser': ['position', 'temperature', 'ismoving'],
+    'cooler': ['temperature', 'raw_value', 'status_bits', 'running', 'heating', 'cooling', 'flow_alarm',
+               'pump', 'temp_alarm', 'power'],
+    'ups': ['input_voltage', 'output_voltage', 'load', 'battery', 'temperature', 'input_frequency'],
+}
+START = 1_767_225_600.0   # 2026-01-01 00:00 UTC
+
+
+def snapshot_at(device_key, fields, t):
+    phase = t / 3600.0
+    return {field: (i % 2 == 0) if field in ('slewing', 'tracking', 'running', 'pump') else
+            math.sin(phase + i) * 10 + i for i, field in enumerate(fields)}
+
+
+def fill_store(store, days, flush_interval, fsync_interval):
+    """按 1 Hz 写入，每 flush_interval 秒推进一次后台写入，每 fsync_interval 秒 fsync 一次（模拟时间）"""
+    record_time = 0.0
+    flush_time = 0.0
+    records = 0
+    t = START
+    end = START + days * 86400
+    next_flush = t + flush_interval
+    next_fsync = t + fsync_interval
+    while t < end:
+        snapshots = [(key, snapshot_at(key, fields, t)) for key, fields in DEVICES.items()]
+        start = time.perf_counter()
+        for key, snapshot in snapshots:
+            store.record_snapshot(key, snapshot, t)
+        record_time += time.perf_counter() - start
+        records += sum(len(fields) for fields in DEVICES.values())
+        t += 1.0
+        if t >= next_flush:
+            start = time.perf_counter()
+            fsync = t >= next_fsync
+            if fsync:
+                next_fsync += fsync_interval
+            store.flush(fsync=fsync, now=t)
+            flush_time += time.perf_counter() - start
+            next_flush += flush_interval
+    store.flush(fsync=True, now=t)
+    return records, record_time, flush_time, t
+
+
+def naive_per_sample_fsync(root, samples):
+    """逐条追加文本并 fsync 的朴素做法（只跑少量样本估算每条开销）"""
+    path = os.path.join(root, 'naive.log')
+    start = time.perf_counter()
+    with open(path, 'a') as f:
+        for i in range(samples):
+            f.write(f"{START + i},ObservingConditions.cloudcover,{i * 0.1}\n")
+            f.flush()
+            os.fsync(f.fileno())
+    return (time.perf_counter() - start) / samples
+
+
+def csv_night_scan(root, night_start, night_end):
+    """把一夜的全部读数写成 CSV，再扫描过滤出一个序列"""
+    path = os.path.join(root, 'night.csv')
+    with open(path, 'w') as f:
+        t = night_start
+        while t < night_end:
+            for key, fields in DEVICES.items():
+                for field, value in snapshot_at(key, fields, t).items():
+                    f.write(f"{t},{key}.{field},{float(value)}\n")
+            t += 1.0
+    start = time.perf_counter()
+    times, values = [], []
+    with open(path) as f:
+        for line in f:
+            stamp, series, value = line.rstrip('\n').split(',')
+            if series == 'ObservingConditions.cloudcover':
+                times.append(float(stamp))
+                values.append(float(value))
+    return time.perf_counter() - start, len(times)
+
+
+def time_query(store, series, start, end, tier, now, repeat=20):
+    samples = []
+    points = 0
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        result = store.query(series, start, end, tier=tier, now=now)
+        samples.append(time.perf_counter() - begin)
+        points = len(result['t'])
+    return statistics.median(samples), points
+
+
+def main():
+    parser = argparse.ArgumentParser(description='设备读数时序存储基准测试')
+    parser.add_argument('--days', type=float, default=1.0, help='模拟写入的天数')
+    parser.add_argument('--flush-interval', type=float, default=5.0, help='后台写入间隔（秒）')
+    parser.add_argument('--fsync-interval', type=float, default=60.0, help='fsync 间隔（秒）')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='telemetry-bench-')
+    try:
+        store = TelemetryStore(os.path.join(root, 'store'), flush_interval=args.flush_interval,
+                               fsync_interval=args.fsync_interval, autostart=False)
+        records, record_time, flush_time, now = fill_store(store, args.days, args.flush_interval,
+                                                           args.fsync_interval)
+        simulated = args.days * 86400
+        print(f"写入 {args.days:g} 天 × {len(store.series())} 个序列，共 {records} 条读数")
+        print(f"  记录开销（调用方）: {record_time / records * 1e9:.0f} ns/条")
+        print(f"  写入开销（后台）:   {flush_time / records * 1e9:.0f} ns/条，"
+              f"相当于 1 Hz 数据流 CPU 占用 {(record_time + flush_time) / simulated * 100:.4f}%")
+        print(f"  写入 {store.stats['flushes']} 批，fsync {store.stats['fsyncs']} 次"
+              f"（每秒 {store.stats['fsyncs'] / simulated:.2f} 次），磁盘占用 {store.disk_usage() / 1e6:.1f} MB")
+
+        naive = naive_per_sample_fsync(root, 200)
+        print(f"  逐条追加并 fsync: {naive * 1e6:.0f} us/条（1 Hz 数据流每秒 "
+              f"{records / simulated:.0f} 次 fsync）")
+
+        series = series_name('ObservingConditions', 'cloudcover')
+        night_end = now - 6 * 3600
+        night_start = night_end - 12 * 3600
+        print(f"\n查询一整夜（12 小时）{series}:")
+        for tier in ('raw', '1m', '10m'):
+            store._maps.clear()
+            cold, points = time_query(store, series, night_start, night_end, tier, now, repeat=1)
+            warm, _ = time_query(store, series, night_start, night_end, tier, now)
+            print(f"  {tier:>4}: {points:>6} 点，首次 {cold * 1000:.2f} ms，再次 {warm * 1000:.3f} ms")
+        auto = store.query(series, night_start, night_end, max_points=2000, now=now)
+        print(f"  自动选择（max_points=2000）: {auto['tier']}，{len(auto['t'])} 点")
+
+        scan, matched = csv_night_scan(root, night_start, night_end)
+        print(f"  对照：扫描一夜的 CSV（{matched} 点）: {scan * 1000:.0f} ms")
+        store.close()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
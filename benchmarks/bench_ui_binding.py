@@ -0,0 +1,179 @@
+"""
+状态显示差异更新的界面线程开销基准测试
+
+在离屏窗口中按主窗口的布局创建环境监测、调焦器、圆顶、水冷机、UPS 五组标签，
+套用带状态样式类的样式表，按 1 Hz 轮询的典型变化（风速、温度等少数字段在变，指示灯和 UPS 状态基本不变）
+生成若干轮状态，比较：
+  - 原做法：每次更新都 set_value、setProperty('class') 并 unpolish/polish
+  - 差异更新层：只修改变化的标签，一轮的修改统一提交
+报告每轮界面线程耗时（含重绘）、每轮 polish 次数、重绘事件数和跳过的控件更新比例。
+
+用法:
+    python benchmarks/bench_ui_binding.py --cycles 300 --rules 300
+"""
+import argparse
+import math
+import os
+import sys
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt5.QtCore import QEvent, QObject  # noqa: E402
+from PyQt5.QtWidgets import QApplication, QHBoxLayout, QWidget  # noqa: E402
+
+from src.ui.components import InfoGroup  # noqa: E402
+from src.ui.ui_binding import (StatusBinder, render_cooler, render_dome, render_focuser,  # noqa: E402
+                               render_ups, render_weather)
+
+GROUPS = {
+    'environment': ['cloud_cover', 'dew_point', 'humidity', 'pressure', 'rain', 'sky_brightness',
+                    'sky_temperature', 'seeing', 'air_temp', 'wind_direction', 'wind_speed', 'avg_wind_speed'],
+    'focuser_status': ['position', 'temperature', 'moving'],
+    'dome_status': ['dome_azimuth', 'dome_status'],
+    'cooler_status': ['cooler_temperature', 'cooler_running', 'cooler_flow_alarm', 'cooler_temp_alarm',
+                      'cooler_level_alarm', 'cooler_power'],
+    'ups_status': ['ups_status', 'ups_output_voltage', 'ups_battery', 'ups_temperature', 'ups_health',
+                   'running_status'],
+}
+RENDERERS = {
+    'environment': render_weather,
+    'focuser_status': render_focuser,
+    'dome_status': render_dome,
+    'cooler_status': render_cooler,
+    'ups_status': render_ups,
+}
+
+
+def build_stylesheet(rules):
+    """与主题样式表规模相当的样式表：状态样式类加上大量其他选择器"""
+    sheet = [
+        'QLabel[class~="status-success"] { color: #2e7d32; font-weight: bold; }',
+        'QLabel[class~="status-warning"] { color: #f9a825; font-weight: bold; }',
+        'QLabel[class~="status-error"] { color: #c62828; font-weight: bold; }',
+        'QLabel[class~="status-info"] { color: #1565c0; }',
+        'QLabel[class~="status-normal"] { color: #757575; }',
+        'QLabel[class~="medium-text"] { font-size: 14px; }',
+    ]
+    for i in range(rules):
+        sheet.append(f'QWidget#panel{i} QLabel[class~="extra-{i}"] {{ color: #{i % 256:02x}{i % 256:02x}80; }}')
+    return '\n'.join(sheet)
+
+
+def statuses(cycle):
+    """第 cycle 轮的各设备状态：少数连续量在变，其余基本不变"""
+    t = cycle / 60.0
+    weather = {
+        'cloudcover': 12.0, 'dewpoint': -3.2, 'humidity': 41.0, 'pressure': 612.0, 'rainrate': 0.0,
+        'skybrightness': 0.1, 'skytemperature': -31.5 + 0.2 * math.sin(t), 'starfwhm': 1.2 + 0.05 * math.sin(3 * t),
+        'temperature': 4.1 + 0.01 * (cycle // 30), 'winddirection': 250.0 + (cycle % 7),
+        'windspeed': 3.0 + 0.4 * math.sin(cycle), 'windgust': 4.2,
+    }
+    focuser = {'position': 31250, 'maxstep': 60000, 'temperature': 4.3, 'ismoving': False}
+    dome = {'azimuth': 121.5, 'athome': False, 'atpark': False, 'slewing': False, 'shutter_status': 0}
+    cooler = {'temperature': 18.5 + 0.1 * (cycle // 20 % 2), 'running': True, 'flow_alarm': False,
+              'temp_alarm': False, 'level_alarm': False, 'power': True}
+    ups = {'status': '市电正常', 'output_voltage': 229.8, 'battery': 100, 'temperature': 30.0,
+           'status_bits': [0] * 8}
+    return {'environment': weather, 'focuser_status': focuser, 'dome_status': dome,
+            'cooler_status': cooler, 'ups_status': ups}
+
+
+class PaintCounter(QObject):
+    """统计标签收到的重绘事件"""
+
+    def __init__(self):
+        super().__init__()
+        self.paints = 0
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint:
+            self.paints += 1
+        return False
+
+
+def build_window(stylesheet):
+    window = QWidget()
+    window.setStyleSheet(stylesheet)
+    layout = QHBoxLayout(window)
+    groups = {}
+    for name, keys in GROUPS.items():
+        group = InfoGroup(name)
+        for key in keys:
+            group.add_item(key, '--')
+        layout.addWidget(group.get_widget())
+        groups[name] = group
+    counter = PaintCounter()
+    for group in groups.values():
+        for pair in group.pairs.values():
+            pair.value_label.installEventFilter(counter)
+    window.resize(1600, 400)
+    window.show()
+    return window, groups, counter
+
+
+def legacy_apply(groups, name, rendered):
+    """与主窗口原 update_* 方法相同的控件操作：无条件写文本、设样式并重新 polish，返回 polish 次数"""
+    pairs = groups[name].pairs
+    polishes = 0
+    for key, (text, style_class) in rendered.items():
+        pair = pairs[key]
+        pair.set_value(text)
+        if style_class is not None:
+            label = pair.value_label
+            label.setProperty('class', style_class)
+            label.style().unpolish(label)
+            label.style().polish(label)
+            polishes += 1
+    return polishes
+
+
+def run(app, stylesheet, cycles, use_binder):
+    window, groups, counter = build_window(stylesheet)
+    app.processEvents()
+    counter.paints = 0
+    binder = StatusBinder(auto_commit=False)
+    elapsed = 0.0
+    polishes = 0
+    for cycle in range(cycles):
+        start = time.perf_counter()
+        for name, status in statuses(cycle).items():
+            rendered = RENDERERS[name](status)
+            if use_binder:
+                binder.apply(groups[name].pairs, rendered)
+            else:
+                polishes += legacy_apply(groups, name, rendered)
+        if use_binder:
+            binder.commit()
+        app.processEvents()
+        elapsed += time.perf_counter() - start
+    window.close()
+    if use_binder:
+        polishes = binder.stats['style_updates']
+    return elapsed / cycles, counter.paints / cycles, polishes / cycles, binder
+
+
+def main():
+    parser = argparse.ArgumentParser(description='状态显示差异更新的界面线程开销基准测试')
+    parser.add_argument('--cycles', type=int, default=300, help='模拟的轮询轮数')
+    parser.add_argument('--rules', type=int, default=300, help='样式表中额外规则的条数')
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    stylesheet = build_stylesheet(args.rules)
+    labels = sum(len(keys) for keys in GROUPS.values())
+    print(f"{labels} 个标签，样式表 {args.rules + 6} 条规则，{args.cycles} 轮")
+    print(f"{'':>10} | {'每轮耗时':>8} | {'标签重绘/轮':>10} | {'polish/轮':>9}")
+    for use_binder in (False, True):
+        per_cycle, paints, polishes, binder = run(app, stylesheet, args.cycles, use_binder)
+        name = '差异更新层' if use_binder else '原做法'
+        print(f"{name:>10} | {per_cycle * 1000:>8.3f} ms | {paints:>13.1f} | {polishes:>11.1f}")
+    stats = binder.stats
+    print(f"差异更新层: 文本修改 {stats['text_updates']} / 跳过 {stats['text_skipped']}，"
+          f"样式修改 {stats['style_updates']} / 跳过 {stats['style_skipped']}，"
+          f"跳过比例 {binder.skipped_ratio() * 100:.1f}%")
+
+
+if __name__ == '__main__':
+    main()
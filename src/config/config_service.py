@@ -0,0 +1,241 @@
+"""
+配置服务
+
+config.yaml 只解析一次，对外提供不可变的配置快照。文件的修改时间、inode 或大小变化时才重新解析，
+并通知订阅者（例如全天相机的 refresh_interval、设备地址），无需重启即可生效。
+
+定时器、resizeEvent 等高频路径读取快照时不做任何文件 I/O。
+"""
+import copy
+import logging
+import os
+import threading
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+import yaml
+from PyQt5.QtCore import QCoreApplication, QFileSystemWatcher, QObject, QThread, QTimer, pyqtSignal
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONFIG_PATH = 'config.yaml'
+
+# 文件监视失效时（例如编辑器以替换文件的方式保存）的兜底检查间隔（毫秒）
+FALLBACK_CHECK_INTERVAL = 2000
+
+_MISSING = object()
+
+
+def _freeze(value):
+    """把解析结果转换为只读结构：字典 -> MappingProxyType，列表 -> 元组"""
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _thaw(value):
+    """把只读结构还原为普通的字典和列表"""
+    if isinstance(value, Mapping):
+        return {k: _thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(v) for v in value]
+    return copy.copy(value)
+
+
+class ConfigSnapshot(Mapping):
+    """
+    不可变的配置快照
+
+    用法与 load_config() 返回的字典相同（snapshot['devices']、snapshot.get(...)），
+    另外支持点分路径：snapshot.value('devices.allsky_camera.refresh_interval', 5)
+    """
+
+    def __init__(self, data: Dict[str, Any], version: int = 0,
+                 file_key: Optional[Tuple[int, int, int]] = None):
+        self._data = _freeze(data or {})
+        self.version = version
+        self.file_key = file_key
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def value(self, path: str, default: Any = None) -> Any:
+        """按点分路径读取配置项，不存在时返回 default"""
+        node: Any = self._data
+        for part in path.split('.'):
+            if not isinstance(node, Mapping) or part not in node:
+                return default
+            node = node[part]
+        return node
+
+    def to_dict(self) -> Dict[str, Any]:
+        """返回可修改的深拷贝，供仍需要普通字典的旧代码使用"""
+        return _thaw(self._data)
+
+    def __repr__(self):
+        return f"ConfigSnapshot(version={self.version}, keys={list(self._data)})"
+
+
+class ConfigService(QObject):
+    """
+    配置服务
+
+    config_changed 信号在配置重新加载后发出，参数为新的 ConfigSnapshot。
+    subscribe() 可以只关注某个配置项，值真正变化时才回调。
+    """
+    config_changed = pyqtSignal(object)
+
+    def __init__(self, path: str = DEFAULT_CONFIG_PATH, watch: bool = True, parent=None):
+        """
+        初始化配置服务
+
+        Args:
+            path: 配置文件路径
+            watch: 是否监视文件变化（需要 Qt 事件循环）
+            parent: 父QObject
+        """
+        super().__init__(parent)
+        self.path = os.path.abspath(path)
+        self._lock = threading.Lock()
+        self._snapshot = ConfigSnapshot({})
+        self._subscribers: List[Tuple[str, Callable[[Any], None]]] = []
+        self.reload_count = 0
+        self._load(force=True)
+
+        self._watcher = None
+        self._timer = None
+        if watch:
+            self._watcher = QFileSystemWatcher(self)
+            self._watch_path()
+            self._watcher.fileChanged.connect(self._on_file_changed)
+            self._timer = QTimer(self)
+            self._timer.timeout.connect(self.check_for_changes)
+            self._timer.start(FALLBACK_CHECK_INTERVAL)
+
+    def snapshot(self) -> ConfigSnapshot:
+        """返回当前配置快照（不做文件 I/O）"""
+        return self._snapshot
+
+    def get(self, path: str, default: Any = None) -> Any:
+        """按点分路径读取当前配置项（不做文件 I/O）"""
+        return self._snapshot.value(path, default)
+
+    def subscribe(self, path: str, callback: Callable[[Any], None]) -> Callable[[], None]:
+        """
+        订阅某个配置项的变化
+
+        Args:
+            path: 点分路径，例如 'devices.allsky_camera.refresh_interval'
+            callback: 值变化时以新值调用
+
+        Returns:
+            取消订阅的函数
+        """
+        entry = (path, callback)
+        with self._lock:
+            self._subscribers.append(entry)
+
+        def unsubscribe():
+            with self._lock:
+                if entry in self._subscribers:
+                    self._subscribers.remove(entry)
+        return unsubscribe
+
+    def check_for_changes(self) -> bool:
+        """
+        检查文件是否变化，变化时重新加载
+
+        Returns:
+            是否重新加载了配置
+        """
+        return self._load(force=False)
+
+    def reload(self) -> bool:
+        """强制重新加载配置"""
+        return self._load(force=True)
+
+    def _file_key(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_ino, st.st_size
+
+    def _load(self, force: bool) -> bool:
+        file_key = self._file_key()
+        if file_key is None:
+            if force:
+                logger.error("配置文件不存在: %s", self.path)
+            return False
+        if not force and file_key == self._snapshot.file_key:
+            return False
+
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = yaml.safe_load(f) or {}
+        except (OSError, yaml.YAMLError) as e:
+            # 保存到一半或格式错误时保留旧配置，等下一次变化再试
+            logger.error("解析配置文件失败，继续使用旧配置: %s", e)
+            return False
+
+        old = self._snapshot
+        new = ConfigSnapshot(data, old.version + 1, file_key)
+        self._snapshot = new
+        self.reload_count += 1
+        if old.file_key is not None:
+            logger.info("配置文件已重新加载（版本 %d）", new.version)
+            self._notify(old, new)
+        return True
+
+    def _notify(self, old: ConfigSnapshot, new: ConfigSnapshot):
+        self.config_changed.emit(new)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for path, callback in subscribers:
+            value = new.value(path, _MISSING)
+            if value == old.value(path, _MISSING):
+                continue
+            try:
+                callback(None if value is _MISSING else value)
+            except Exception as e:
+                logger.error("配置订阅回调出错 (%s): %s", path, e)
+
+    def _watch_path(self):
+        if self._watcher is not None and os.path.exists(self.path) and self.path not in self._watcher.files():
+            self._watcher.addPath(self.path)
+
+    def _on_file_changed(self, _path: str):
+        self.check_for_changes()
+        # 以替换方式保存的文件会从监视列表中移除，需要重新添加
+        self._watch_path()
+
+
+# 全局配置服务实例（首次使用时在界面线程中创建）
+_config_service: Optional[ConfigService] = None
+_config_service_lock = threading.Lock()
+
+
+def get_config_service() -> ConfigService:
+    """获取全局配置服务实例"""
+    global _config_service
+    if _config_service is None:
+        with _config_service_lock:
+            if _config_service is None:
+                # 文件监视依赖界面线程的事件循环；无界面的脚本中只解析一次，可手动调用 check_for_changes()
+                app = QCoreApplication.instance()
+                watch = app is not None and QThread.currentThread() is app.thread()
+                _config_service = ConfigService(watch=watch)
+    return _config_service
+
+
+def get_config() -> ConfigSnapshot:
+    """返回当前配置快照，可直接替换热路径上的 load_config() 调用"""
+    return get_config_service().snapshot()
@@ -0,0 +1,487 @@
+"""
+全天相机图像分析
+
+全天相机图像原来只用于显示。本模块从每一帧中估计：
+  - 各天区的云量：天顶区和按高度分环、按方位分扇区的天区里，检测到的星数与该天区晴天参考星数之比
+    （参考星数取近期观测到的最大值，按 reference_half_life 衰减，随月光、季节自动调整；以配置的
+    clear_sky_stars 为下限。参考星数未确立之前该天区不给出云量：由配置或上次保存的参考
+    （reference_path）预置的天区立即确立，否则要积累 reference_frames 帧夜间图像）
+  - 天空背景：天顶区背景亮度（ADU），配置 sky_zero_point 后换算为 mag/arcsec²
+  - 星数：全天和各天区检测到的星点数
+
+每帧只解码一次：AllSkyImagePipeline 的后台线程把解码结果缩放到 analysis_size 后交给分析器，
+显示和分析共用同一次解码；.npy、.fits 帧以内存映射方式按块读取。分析在缩小后的数组上用向量化掩膜完成：
+地平掩膜、天顶角分环、方位分扇区的像素索引按图像尺寸缓存，背景和噪声按 tile×tile 块的中位数估计，
+星点是高于局部背景 star_sigma 倍噪声、且比周围 RING 像素处也高出同样阈值的 3×3 局部极大值
+（排除云边缘的亮度台阶），各天区统计用 np.bincount 一次完成。
+
+结果以设备键 'allsky' 发布到状态中心，与气象站的 cloudcover 一起显示在环境监测组中。
+
+用法:
+    pipeline = attach_allsky_pipeline(window)        # 主窗口标签和分析共用一条管线
+    start_allsky_analysis(get_state_store(), pipeline=pipeline)
+    python -m src.services.allsky_analysis frame.png --json
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import sys
+import time
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QImage, QImageReader
+
+from src.config.config_service import get_config_service
+
+logger = logging.getLogger(__name__)
+
+# 发布到状态中心时使用的设备键
+ALLSKY_DEVICE = 'allsky'
+
+DEFAULT_SETTINGS = {
+    'enabled': True,
+    'analysis_size': 1024,         # 分析用数组的长边（像素），0 表示按原尺寸分析
+    'center_x': 0.5,               # 视场圆心（图像宽度的比例）
+    'center_y': 0.5,               # 视场圆心（图像高度的比例）
+    'radius': 0.5,                 # 地平圈半径（图像短边的比例），按等距鱼眼投影换算天顶角
+    'north_angle': 0.0,            # 北方向相对图像上方的逆时针夹角（度）
+    'east_left': True,             # 北在上时东在左（从下往上看天空）
+    'horizon_altitude': 15.0,      # 低于此高度角的像素不参与分析（度）
+    'horizon_mask': '',            # 地平掩膜图像，非零像素为天空；为空时只按 horizon_altitude 截取
+    'ring_edges': [30.0, 60.0],    # 天顶角分环边界（度），第一环为天顶区
+    'azimuth_sectors': 8,          # 天顶区以外每一环的方位扇区数
+    'tile': 16,                    # 背景和噪声估计的块大小（分析分辨率下的像素）
+    'star_sigma': 5.0,             # 星点检测阈值（局部噪声的倍数）
+    'reference_half_life': 21600.0,  # 晴天参考星数的衰减半衰期（秒）
+    'reference_frames': 10,        # 没有预置参考的天区积累这么多帧夜间图像后才给出云量
+    'clear_sky_stars': {},         # 各天区晴天星数 {天区名（Z、N1、NE1…）: 星数}，作为参考下限并立即确立参考
+    'reference_path': 'logs/allsky_reference.json',  # 参考星数保存位置，启动时读回；为空时不保存
+    'reference_save_interval': 600.0,  # 保存参考星数的最短间隔（秒）
+    'min_reference_stars': 5,      # 参考星数少于此值的天区不给出云量
+    'max_background': 0.6,         # 天顶背景超过满量程的此比例时视为白天或曝光过度，不给出云量
+    'sky_zero_point': None,        # 天空亮度零点：mag/arcsec² = zero_point - 2.5·log10(背景 ADU)
+}
+
+# 8 个方位扇区的名称（以北为中心，北→东）
+SECTOR_DIRECTIONS = ('N', 'NE', 'E', 'SE', 'S', 'SW', 'W', 'NW')
+
+# 星点孤立性检查的取样距离（分析分辨率下的像素）
+RING = 3
+
+ARRAY_EXTENSIONS = ('.npy',)
+FITS_EXTENSIONS = ('.fits', '.fit', '.fts')
+
+
+def allsky_settings(overrides: Optional[Mapping[str, Any]] = None) -> Dict[str, Any]:
+    """合并默认值、config.yaml allsky_analysis 段和调用参数"""
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update(get_config_service().get('allsky_analysis', {}) or {})
+    settings.update(overrides or {})
+    return settings
+
+
+# ----------------------------------------------------------------------
+# 读取与缩小
+# ----------------------------------------------------------------------
+def full_scale_of(dtype) -> float:
+    """像素类型的满量程：整数类型取最大值，浮点类型为 1.0"""
+    dtype = np.dtype(dtype)
+    return float(np.iinfo(dtype).max) if dtype.kind in 'ui' else 1.0
+
+
+def downsample_image(image: QImage, size: int) -> Tuple[np.ndarray, float]:
+    """
+    把已解码的 QImage 平滑缩小到长边不超过 size 并转为灰度数组
+
+    Args:
+        image: 解码后的图像
+        size: 长边上限（像素），0 表示不缩小
+
+    Returns:
+        (灰度数组 uint8 或 uint16, 满量程)
+    """
+    if size and max(image.width(), image.height()) > size:
+        image = image.scaled(size, size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+    deep = image.format() in (QImage.Format_Grayscale16, QImage.Format_RGBX64,
+                              QImage.Format_RGBA64, QImage.Format_RGBA64_Premultiplied)
+    gray = image.convertToFormat(QImage.Format_Grayscale16 if deep else QImage.Format_Grayscale8)
+    dtype = np.uint16 if deep else np.uint8
+    pointer = gray.constBits()
+    pointer.setsize(gray.sizeInBytes())
+    rows = np.frombuffer(pointer, dtype).reshape(gray.height(), gray.bytesPerLine() // np.dtype(dtype).itemsize)
+    # 复制出与 QImage 生命周期无关的数组
+    return np.array(rows[:, :gray.width()]), full_scale_of(dtype)
+
+
+def downsample_array(data: np.ndarray, size: int) -> Tuple[np.ndarray, float]:
+    """
+    按整数倍块平均缩小二维（或 高×宽×通道）数组；对内存映射数组只顺序读取一遍
+
+    Args:
+        data: 图像数组
+        size: 长边上限（像素），0 表示不缩小
+
+    Returns:
+        (float32 灰度数组, 满量程)
+    """
+    full_scale = full_scale_of(data.dtype)
+    height, width = data.shape[:2]
+    factor = max(1, math.ceil(max(height, width) / size)) if size else 1
+    rows, cols = height // factor, width // factor
+    block = np.asarray(data[:rows * factor, :cols * factor], dtype=np.float32)
+    if factor > 1:
+        block = block.reshape(rows, factor, cols, factor, *block.shape[2:]).mean(axis=(1, 3))
+    if block.ndim == 3:
+        block = block.mean(axis=2)
+    return block, full_scale
+
+
+def read_frame(path: str, size: int) -> Tuple[np.ndarray, float]:
+    """
+    读取一帧并缩小：.npy 和 FITS 以内存映射方式读取，其余格式由 QImageReader 解码
+
+    Returns:
+        (灰度数组, 满量程)
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ARRAY_EXTENSIONS:
+        return downsample_array(np.load(path, mmap_mode='r'), size)
+    if extension in FITS_EXTENSIONS:
+        try:
+            from astropy.io import fits
+        except ImportError:
+            raise RuntimeError("读取 FITS 帧需要安装 astropy")
+        with fits.open(path, memmap=True) as hdul:
+            data = next(hdu.data for hdu in hdul if hdu.data is not None)
+            # FITS 的 3 维数据为 通道×高×宽
+            if data.ndim == 3:
+                data = np.moveaxis(data, 0, -1)
+            return downsample_array(data, size)
+    reader = QImageReader(path)
+    reader.setAutoTransform(True)
+    image = reader.read()
+    if image.isNull():
+        raise RuntimeError(f"读取全天相机图像失败: {reader.errorString()}")
+    return downsample_image(image, size)
+
+
+# ----------------------------------------------------------------------
+# 分析
+# ----------------------------------------------------------------------
+class SkyGeometry:
+    """某一分析尺寸下各像素的天顶角、方位、天区索引和地平掩膜（按尺寸缓存）"""
+
+    def __init__(self, shape: Tuple[int, int], settings: Mapping[str, Any], horizon_mask: Optional[np.ndarray]):
+        height, width = shape
+        tile = int(settings['tile'])
+        cx = float(settings['center_x']) * width
+        cy = float(settings['center_y']) * height
+        radius = float(settings['radius']) * min(width, height)
+        y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+        dx, dy = x + 0.5 - cx, cy - (y + 0.5)
+        # 等距鱼眼投影：到圆心的距离与天顶角成正比，地平圈为 90°
+        self.zenith = np.hypot(dx, dy) * (90.0 / radius)
+        angle = np.degrees(np.arctan2(-dx, dy)) - float(settings['north_angle'])
+        self.azimuth = np.mod(angle if settings['east_left'] else -angle, 360.0)
+        self.valid = self.zenith <= 90.0 - float(settings['horizon_altitude'])
+        if horizon_mask is not None:
+            self.valid &= horizon_mask
+
+        edges = [float(edge) for edge in settings['ring_edges']]
+        count = int(settings['azimuth_sectors'])
+        self.names = ['Z'] + [f"{direction}{ring}" for ring in range(1, len(edges) + 1)
+                              for direction in (SECTOR_DIRECTIONS if count == 8 else
+                                                [f"A{index}" for index in range(count)])]
+        ring = np.searchsorted(np.asarray(edges, dtype=np.float32), self.zenith, side='right')
+        width_deg = 360.0 / count
+        azimuth_bin = (np.mod(self.azimuth + width_deg / 2, 360.0) // width_deg).astype(np.int32)
+        sector = np.where(ring == 0, 0, 1 + (ring - 1) * count + azimuth_bin)
+        self.sector = np.where(self.valid, sector, -1).astype(np.int32)
+        self.sector_pixels = np.bincount(self.sector[self.valid], minlength=len(self.names))
+
+        # 块中心像素所在的天区，整块都在视场内的块才用于背景统计
+        rows, cols = height // tile, width // tile
+        self.tile_shape = (rows, cols)
+        blocks = self.valid[:rows * tile, :cols * tile].reshape(rows, tile, cols, tile)
+        centers = self.sector[tile // 2:rows * tile:tile, tile // 2:cols * tile:tile]
+        self.tile_sector = np.where(blocks.all(axis=(1, 3)), centers, -1)
+
+
+class AllSkyAnalyzer:
+    """
+    全天图像分析器
+
+    有状态（晴天参考星数随帧更新），应只在一个线程中调用 analyze()。
+    """
+
+    def __init__(self, settings: Optional[Mapping[str, Any]] = None):
+        """
+        Args:
+            settings: 覆盖 allsky_analysis 配置
+        """
+        self.settings = allsky_settings(settings)
+        self._geometry: Optional[SkyGeometry] = None
+        self._horizon_mask_image: Optional[QImage] = None
+        self._reference: Optional[np.ndarray] = None
+        self._reference_time: Optional[float] = None
+        self._reference_floor: Optional[np.ndarray] = None
+        self._established: Optional[np.ndarray] = None   # 各天区的参考星数是否已确立
+        self._night_frames = 0
+        self._saved_time: Optional[float] = None
+        self._use_saved = True
+        mask_path = self.settings['horizon_mask']
+        if mask_path:
+            image = QImage(mask_path)
+            if image.isNull():
+                logger.warning("无法读取地平掩膜 %s，只按高度角截取", mask_path)
+            else:
+                self._horizon_mask_image = image
+
+    @property
+    def sectors(self) -> List[str]:
+        """天区名称（分析过至少一帧之后可用）"""
+        return list(self._geometry.names) if self._geometry is not None else []
+
+    def reset_reference(self):
+        """丢弃晴天参考星数（例如相机或镜头调整之后），之后也不再读回保存的参考"""
+        self._clear_reference()
+        self._use_saved = False
+
+    def _clear_reference(self):
+        self._reference = None
+        self._reference_time = None
+        self._reference_floor = None
+        self._established = None
+        self._night_frames = 0
+
+    def load_reference(self, shape: Tuple[int, int]) -> Dict[str, float]:
+        """
+        读回保存的参考星数
+
+        Args:
+            shape: 分析数组尺寸，与保存时不同的参考不使用（星数随分辨率变化）
+
+        Returns:
+            {天区名: 参考星数}，没有可用的保存参考时为空
+        """
+        path = self.settings['reference_path']
+        if not path:
+            return {}
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            if list(data.get('shape') or []) != list(shape):
+                return {}
+            return {str(name): float(count) for name, count in (data.get('sectors') or {}).items()}
+        except (OSError, ValueError, TypeError, AttributeError):
+            return {}
+
+    def save_reference(self):
+        """保存已确立的参考星数（reference_path 为空或参考尚未确立时不做任何事）"""
+        path = self.settings['reference_path']
+        if not path or self._reference is None or not self._established.any():
+            return
+        sectors = {name: round(float(count), 1) for name, count, established in
+                   zip(self._geometry.names, self._reference, self._established) if established}
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'shape': list(self._geometry.valid.shape), 'time': self._reference_time,
+                           'sectors': sectors}, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("保存全天相机参考星数失败: %s", e)
+
+    def _seed_reference(self, names: List[str], shape: Tuple[int, int]):
+        # 配置的 clear_sky_stars 作为下限，上次保存的参考作为初值，两者覆盖的天区立即确立
+        configured = self.settings['clear_sky_stars'] or {}
+        saved = self.load_reference(shape) if self._use_saved else {}
+        self._reference_floor = np.array([float(configured.get(name, 0.0)) for name in names])
+        self._reference = np.maximum(np.array([saved.get(name, 0.0) for name in names]), self._reference_floor)
+        self._established = np.array([name in configured or name in saved for name in names])
+        self._night_frames = 0
+
+    def geometry(self, shape: Tuple[int, int]) -> SkyGeometry:
+        """取得某一分析尺寸的天区几何（尺寸不变时复用）"""
+        if self._geometry is None or self._geometry.valid.shape != tuple(shape):
+            mask = None
+            if self._horizon_mask_image is not None:
+                scaled = self._horizon_mask_image.scaled(shape[1], shape[0], Qt.IgnoreAspectRatio,
+                                                         Qt.FastTransformation)
+                mask = downsample_image(scaled, 0)[0] > 0
+            self._geometry = SkyGeometry(tuple(shape), self.settings, mask)
+            self._clear_reference()
+        return self._geometry
+
+    def analyze(self, gray: np.ndarray, timestamp: Optional[float] = None,
+                full_scale: Optional[float] = None) -> Dict[str, Any]:
+        """
+        分析一帧
+
+        Args:
+            gray: 缩小后的灰度数组
+            timestamp: 帧时刻（秒），用于参考星数衰减；为空时取当前时间
+            full_scale: 满量程，为空时按数组类型推断
+
+        Returns:
+            分析结果：cloud_cover（%）、sector_cloud_cover、star_count、sector_star_count、
+            sky_background（ADU）、sky_quality（mag/arcsec²）、daylight、analysis_ms
+        """
+        start = time.perf_counter()
+        timestamp = time.time() if timestamp is None else timestamp
+        full_scale = full_scale_of(gray.dtype) if full_scale is None else full_scale
+        geometry = self.geometry(gray.shape)
+        tile = int(self.settings['tile'])
+        rows, cols = geometry.tile_shape
+
+        image = np.asarray(gray[:rows * tile, :cols * tile], dtype=np.float32)
+        blocks = image.reshape(rows, tile, cols, tile)
+        flat = blocks.transpose(0, 2, 1, 3).reshape(rows, cols, tile * tile)
+        background = np.median(flat, axis=2)
+        noise = 1.4826 * np.median(np.abs(flat - background[:, :, None]), axis=2)
+        # 整数图像暗天区的 MAD 可能为 0，至少按 1 ADU 计
+        noise = np.maximum(noise, 1.0 if full_scale > 1.0 else 1.0 / 255.0)
+        contrast = float(self.settings['star_sigma']) * noise
+        candidate = (blocks > (background + contrast)[:, None, :, None]).reshape(rows * tile, cols * tile)
+        contrast = np.broadcast_to(contrast[:, None, :, None], blocks.shape).reshape(rows * tile, cols * tile)
+
+        # 3×3 局部极大值（左上方向取严格大于，避免平顶星点重复计数），并且比上下左右 RING 像素处
+        # 最亮的一点也高出阈值：云边缘、月晕等亮度台阶在块背景上同样会超过阈值，但不是孤立的点
+        height, width = rows * tile, cols * tile
+        inner = (slice(RING, height - RING), slice(RING, width - RING))
+        center = image[inner]
+        peak = candidate[inner] & geometry.valid[inner]
+        for dy, dx, strict in ((-1, -1, True), (-1, 0, True), (-1, 1, True), (0, -1, True),
+                               (0, 1, False), (1, -1, False), (1, 0, False), (1, 1, False)):
+            neighbour = image[RING + dy:height - RING + dy, RING + dx:width - RING + dx]
+            peak &= (center > neighbour) if strict else (center >= neighbour)
+        ring = np.maximum.reduce([image[RING + dy:height - RING + dy, RING + dx:width - RING + dx]
+                                  for dy, dx in ((-RING, 0), (RING, 0), (0, -RING), (0, RING))])
+        peak &= center - ring > contrast[inner]
+        ys, xs = np.nonzero(peak)
+        names = geometry.names
+        counts = np.bincount(geometry.sector[ys + RING, xs + RING], minlength=len(names))
+
+        tile_ok = geometry.tile_sector >= 0
+        tile_counts = np.bincount(geometry.tile_sector[tile_ok], minlength=len(names))
+        zenith_tiles = background[geometry.tile_sector == 0]
+        sky_background = float(np.median(zenith_tiles)) if zenith_tiles.size else float(np.median(background[tile_ok]))
+        daylight = sky_background > float(self.settings['max_background']) * full_scale
+
+        sector_cloud = np.full(len(names), np.nan)
+        if not daylight:
+            if self._reference is None:
+                self._seed_reference(names, gray.shape)
+            elapsed = max(0.0, timestamp - (self._reference_time or timestamp))
+            decay = 0.5 ** (elapsed / float(self.settings['reference_half_life']))
+            self._reference = np.maximum(np.maximum(self._reference * decay, counts), self._reference_floor)
+            self._reference_time = timestamp
+            self._night_frames += 1
+            if self._night_frames >= int(self.settings['reference_frames']):
+                self._established[:] = True
+            usable = self._established & (self._reference >= float(self.settings['min_reference_stars']))
+            sector_cloud[usable] = np.clip(1.0 - counts[usable] / self._reference[usable], 0.0, 1.0)
+            save_interval = float(self.settings['reference_save_interval'])
+            if self._established.any() and (self._saved_time is None or timestamp - self._saved_time >= save_interval):
+                self.save_reference()
+                self._saved_time = timestamp
+
+        measured = ~np.isnan(sector_cloud) & (geometry.sector_pixels > 0)
+        cloud_cover = None
+        if measured.any():
+            weights = geometry.sector_pixels[measured]
+            cloud_cover = round(float(np.dot(sector_cloud[measured], weights) / weights.sum()) * 100.0, 1)
+        zero_point = self.settings['sky_zero_point']
+        sky_quality = None
+        if zero_point is not None and sky_background > 0:
+            sky_quality = round(float(zero_point) - 2.5 * math.log10(sky_background), 2)
+
+        return {
+            'cloud_cover': cloud_cover,
+            'sector_cloud_cover': {name: (None if np.isnan(value) else round(float(value) * 100.0, 1))
+                                   for name, value in zip(names, sector_cloud)},
+            'star_count': int(counts.sum()),
+            'sector_star_count': {name: int(value) for name, value in zip(names, counts)},
+            'sky_background': round(sky_background, 2),
+            'sector_background': {name: (round(float(total / count), 2) if count else None)
+                                  for name, total, count in zip(
+                                      names, np.bincount(geometry.tile_sector[tile_ok], weights=background[tile_ok],
+                                                         minlength=len(names)), tile_counts)},
+            'sky_quality': sky_quality,
+            'daylight': bool(daylight),
+            'analysis_ms': round((time.perf_counter() - start) * 1000, 2),
+        }
+
+
+def start_allsky_analysis(store=None, settings: Optional[Mapping[str, Any]] = None, parent=None,
+                          pipeline=None):
+    """
+    按配置启动全天相机图像分析，结果发布到状态中心
+
+    传入主窗口的管线（allsky_pipeline.attach_allsky_pipeline）时把分析器接到这条管线上，显示和分析
+    共用同一次解码，管线由调用方启动；否则创建并启动一条只做分析的管线。
+
+    Args:
+        store: 状态中心，为空时不发布
+        settings: 覆盖 allsky_analysis 配置
+        parent: 父QObject（只在新建管线时使用）
+        pipeline: 已有的 AllSkyImagePipeline
+
+    Returns:
+        AllSkyImagePipeline，配置未启用时为 None
+    """
+    from src.services.allsky_pipeline import AllSkyImagePipeline
+    from src.services.state_store import connect_sources
+
+    merged = allsky_settings(settings)
+    camera = get_config_service().get('devices.allsky_camera', {}) or {}
+    if not merged['enabled'] or not camera.get('enabled', False):
+        return None
+    analyzer = AllSkyAnalyzer(merged)
+    if pipeline is None:
+        pipeline = AllSkyImagePipeline(analyzer=analyzer, parent=parent)
+        pipeline.start()
+    else:
+        pipeline.set_analyzer(analyzer)
+    if store is not None:
+        connect_sources(store, allsky=pipeline)
+    logger.info("全天相机图像分析已启动: %s", pipeline.image_path)
+    return pipeline
+
+
+def main():
+    parser = argparse.ArgumentParser(description='全天相机图像分析')
+    parser.add_argument('frames', nargs='+', help='图像文件（PNG/JPEG 等，或 .npy、.fits）；多帧按顺序分析')
+    parser.add_argument('--size', type=int, help='分析尺寸（默认取配置 analysis_size）')
+    parser.add_argument('--json', action='store_true', help='输出完整 JSON')
+    args = parser.parse_args()
+
+    # 离线分析不读写站点保存的参考星数
+    overrides = {'reference_path': ''}
+    if args.size is not None:
+        overrides['analysis_size'] = args.size
+    analyzer = AllSkyAnalyzer(overrides)
+    for path in args.frames:
+        start = time.perf_counter()
+        gray, full_scale = read_frame(path, analyzer.settings['analysis_size'])
+        read_ms = (time.perf_counter() - start) * 1000
+        result = analyzer.analyze(gray, os.path.getmtime(path), full_scale)
+        if args.json:
+            print(json.dumps(dict(result, path=path, read_ms=round(read_ms, 1)), ensure_ascii=False))
+            continue
+        cloud = f"{result['cloud_cover']:.0f}%" if result['cloud_cover'] is not None else '--'
+        print(f"{os.path.basename(path)}: 云量 {cloud}，星数 {result['star_count']}，"
+              f"天顶背景 {result['sky_background']:.1f} ADU"
+              f"{'（白天）' if result['daylight'] else ''}，读取 {read_ms:.0f} ms，分析 {result['analysis_ms']:.0f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,339 @@
+"""
+全天相机图像处理管线
+
+界面线程只负责检测文件变化（stat）和最终的 setPixmap；解码和缩放放在后台线程中完成。
+  - 文件的修改时间、大小、inode 都没有变化时不做任何处理
+  - 解码结果按文件版本缓存，窗口大小变化时只重新缩放，不重新解码
+  - 缩放结果按 (文件版本, 目标尺寸) 缓存
+  - 连续的 resize 事件合并为一次缩放
+  - 配置了分析器（allsky_analysis.AllSkyAnalyzer）时，每个文件版本在同一次解码结果上分析一次，
+    结果经 analysis_ready 信号在后台线程中发出；没有绑定标签时只解码和分析，不缩放
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from PyQt5.QtCore import QEvent, QObject, QSize, Qt, QThread, QTimer, pyqtSignal, pyqtSlot
+from PyQt5.QtGui import QImage, QImageReader, QPixmap
+
+from src.config.config_service import get_config_service
+from src.services.allsky_analysis import ALLSKY_DEVICE, downsample_image
+
+logger = logging.getLogger(__name__)
+
+# 连续 resize 事件的合并窗口（毫秒）
+RESIZE_DEBOUNCE_MS = 120
+# 缩放结果缓存条目数
+SCALED_CACHE_SIZE = 4
+
+FileKey = Tuple[str, int, int, int]
+
+
+def file_key_of(path: str) -> Optional[FileKey]:
+    """返回文件版本标识 (路径, 修改时间, 大小, inode)，文件不存在时返回 None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return path, st.st_mtime_ns, st.st_size, st.st_ino
+
+
+class _AllSkyWorker(QObject):
+    """在后台线程中解码、缩放和分析图像"""
+    finished = pyqtSignal(object, QImage, dict)   # (文件版本, 目标尺寸), 图像, 统计信息
+    analyzed = pyqtSignal(str, dict)              # ('allsky', 分析结果)
+    failed = pyqtSignal(str)
+
+    def __init__(self, analyzer=None):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._pending = None
+        self._decoded_key: Optional[FileKey] = None
+        self._decoded: Optional[QImage] = None
+        self._scaled = OrderedDict()
+        self._analyzer = analyzer
+        self._analyzed_key: Optional[FileKey] = None
+
+    def request(self, file_key: FileKey, size: Optional[QSize]):
+        """登记最新的处理请求，尚未处理的旧请求直接被覆盖；size 为 None 时只分析不缩放"""
+        with self._lock:
+            self._pending = (file_key, QSize(size) if size is not None else None)
+
+    def set_analyzer(self, analyzer):
+        with self._lock:
+            self._analyzer = analyzer
+
+    @pyqtSlot()
+    def process(self):
+        with self._lock:
+            pending, self._pending = self._pending, None
+        if pending is None:
+            return
+        file_key, size = pending
+        stats = {'path': file_key[0], 'decode_ms': 0.0, 'scale_ms': 0.0, 'cached': False}
+        if size is None:
+            if self._analyzed_key != file_key and self._decode(file_key, stats):
+                self._analyze(file_key)
+                # 没有显示需求时不保留全尺寸解码结果
+                self._decoded_key, self._decoded = None, None
+            return
+        cache_key = (file_key, size.width(), size.height())
+
+        image = self._scaled.get(cache_key)
+        if image is not None:
+            self._scaled.move_to_end(cache_key)
+            stats['cached'] = True
+            self.finished.emit(cache_key, image, stats)
+            return
+
+        if not self._decode(file_key, stats):
+            return
+        start = time.perf_counter()
+        image = self._decoded.scaled(size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        stats['scale_ms'] = (time.perf_counter() - start) * 1000
+        self._scaled[cache_key] = image
+        while len(self._scaled) > SCALED_CACHE_SIZE:
+            self._scaled.popitem(last=False)
+        self.finished.emit(cache_key, image, stats)
+        # 先交付显示，再分析
+        self._analyze(file_key)
+
+    def _decode(self, file_key: FileKey, stats: dict) -> bool:
+        """解码文件（同一文件版本只解码一次），失败时返回 False"""
+        if self._decoded_key == file_key:
+            return True
+        start = time.perf_counter()
+        reader = QImageReader(file_key[0])
+        reader.setAutoTransform(True)
+        decoded = reader.read()
+        if decoded.isNull():
+            # 相机软件可能仍在写入，等下一次变化再读
+            self.failed.emit(f"读取全天相机图像失败: {reader.errorString()}")
+            return False
+        self._decoded_key, self._decoded = file_key, decoded
+        self._scaled.clear()
+        stats['decode_ms'] = (time.perf_counter() - start) * 1000
+        return True
+
+    def _analyze(self, file_key: FileKey):
+        """在已解码的图像上分析（每个文件版本一次）"""
+        if self._analyzer is None or self._analyzed_key == file_key:
+            return
+        self._analyzed_key = file_key
+        start = time.perf_counter()
+        try:
+            gray, full_scale = downsample_image(self._decoded, int(self._analyzer.settings['analysis_size']))
+            downsample_ms = (time.perf_counter() - start) * 1000
+            # 帧时刻取文件修改时间
+            result = self._analyzer.analyze(gray, file_key[1] / 1e9, full_scale)
+        except Exception as e:
+            self.failed.emit(f"分析全天相机图像失败: {e}")
+            return
+        result['downsample_ms'] = round(downsample_ms, 2)
+        self.analyzed.emit(ALLSKY_DEVICE, result)
+
+
+class AllSkyImagePipeline(QObject):
+    """
+    全天相机图像管线
+
+    用法:
+        pipeline = AllSkyImagePipeline()
+        pipeline.attach(self.allsky_label)   # 自动跟随标签尺寸并在新帧到达时 setPixmap
+        pipeline.start()
+
+    图像路径和刷新间隔取自配置 devices.allsky_camera，修改配置后自动生效。
+    """
+    frame_ready = pyqtSignal(QImage)
+    frame_stats = pyqtSignal(dict)
+    analysis_ready = pyqtSignal(str, dict)   # ('allsky', 分析结果)，在后台线程中发出
+    _process_requested = pyqtSignal()
+
+    def __init__(self, image_path: Optional[str] = None, refresh_interval: Optional[float] = None,
+                 analyzer=None, parent=None):
+        """
+        初始化图像管线
+
+        Args:
+            image_path: 图像文件路径，为空时由配置 devices.allsky_camera 拼出
+            refresh_interval: 检查文件变化的间隔（秒），为空时取配置 refresh_interval
+            analyzer: AllSkyAnalyzer，为空时不分析
+            parent: 父QObject
+        """
+        super().__init__(parent)
+        self._fixed_path = image_path
+        self.image_path = image_path or self._path_from_config()
+        self._target_size = QSize(0, 0)
+        self._submitted = None      # 最近提交给工作线程的 (文件版本, 目标尺寸)
+        self._displayed = None      # 最近一次交给界面的 (文件版本, 宽, 高)
+        self._label = None
+        self.skipped_checks = 0
+        self.handoffs = 0
+
+        self._thread = QThread(self)
+        self.analyzer = analyzer
+        self._worker = _AllSkyWorker(analyzer)
+        self._worker.moveToThread(self._thread)
+        self._process_requested.connect(self._worker.process)
+        self._worker.finished.connect(self._on_worker_finished)
+        # 直接在后台线程中转发，接收方（状态中心）不经过界面线程
+        self._worker.analyzed.connect(self.analysis_ready, Qt.DirectConnection)
+        self._worker.failed.connect(lambda message: logger.warning(message))
+
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self.check)
+        if refresh_interval is None:
+            refresh_interval = get_config_service().get('devices.allsky_camera.refresh_interval', 5)
+            self._unsubscribe = get_config_service().subscribe('devices.allsky_camera', self._on_config_changed)
+        else:
+            self._unsubscribe = None
+        self._timer.setInterval(int(float(refresh_interval) * 1000))
+
+        self._resize_timer = QTimer(self)
+        self._resize_timer.setSingleShot(True)
+        self._resize_timer.setInterval(RESIZE_DEBOUNCE_MS)
+        self._resize_timer.timeout.connect(self.check)
+
+    @staticmethod
+    def _path_from_config() -> str:
+        camera = get_config_service().get('devices.allsky_camera', {})
+        return os.path.join(camera.get('image_path', ''),
+                            f"{camera.get('image_name', '')}{camera.get('image_extension', '.png')}")
+
+    def _on_config_changed(self, camera):
+        if camera is None:
+            return
+        self._timer.setInterval(int(float(camera.get('refresh_interval', 5)) * 1000))
+        if not self._fixed_path:
+            self.image_path = self._path_from_config()
+        self.check()
+
+    def set_analyzer(self, analyzer):
+        """
+        设置分析器（在 start() 之前调用）
+
+        已解码的当前帧不会补做分析，下一个文件版本开始分析。
+        """
+        self.analyzer = analyzer
+        self._worker.set_analyzer(analyzer)
+
+    def start(self):
+        """启动后台线程和定时检查"""
+        if not self._thread.isRunning():
+            self._thread.start()
+        self._timer.start()
+        self.check()
+
+    def stop(self):
+        """停止定时检查和后台线程"""
+        self._timer.stop()
+        self._resize_timer.stop()
+        if self._unsubscribe:
+            self._unsubscribe()
+            self._unsubscribe = None
+        self._thread.quit()
+        self._thread.wait(2000)
+
+    def attach(self, label):
+        """
+        绑定显示用的 QLabel
+
+        标签尺寸变化时自动重新缩放（连续变化合并为一次），新帧到达时更新 pixmap。
+        """
+        self._label = label
+        label.installEventFilter(self)
+        self.set_target_size(label.size())
+
+    def eventFilter(self, obj, event):
+        if obj is self._label and event.type() == QEvent.Resize:
+            self.set_target_size(event.size())
+        return False
+
+    def set_target_size(self, size: QSize):
+        """设置目标显示尺寸，短时间内的多次调用只触发一次缩放"""
+        if size == self._target_size:
+            return
+        self._target_size = QSize(size)
+        self._resize_timer.start()
+
+    def check(self):
+        """检查文件是否有新版本，需要时提交给后台线程（界面线程中只做一次 stat）"""
+        displayed = self._target_size.width() > 0 and self._target_size.height() > 0
+        if not displayed and self.analyzer is None:
+            return
+        file_key = file_key_of(self.image_path)
+        if file_key is None:
+            return
+        if displayed:
+            request = (file_key, self._target_size.width(), self._target_size.height())
+        else:
+            request = (file_key, 0, 0)
+        if request == self._submitted or request == self._displayed:
+            self.skipped_checks += 1
+            return
+        self._submitted = request
+        self._worker.request(file_key, self._target_size if displayed else None)
+        self._process_requested.emit()
+
+    def _on_worker_finished(self, cache_key, image: QImage, stats: dict):
+        if cache_key != self._submitted:
+            # 处理期间又有了更新的请求，丢弃过期结果
+            return
+        self._displayed = cache_key
+        self.handoffs += 1
+        self.frame_stats.emit(stats)
+        self.frame_ready.emit(image)
+        if self._label is not None:
+            self._label.setPixmap(QPixmap.fromImage(image))
+
+
+def _update_telescope_camera_image(self):
+    """检查全天相机图像是否有新版本（解码和缩放在管线的后台线程中完成）"""
+    pipeline = getattr(self, 'allsky_pipeline', None)
+    if pipeline is not None:
+        pipeline.check()
+
+
+def install_allsky_pipeline(window_cls):
+    """
+    让主窗口类的全天相机刷新改由 AllSkyImagePipeline 完成
+
+    原 update_telescope_camera_image 在界面线程中读取、解码和缩放整幅图像；替换后只检查管线，
+    构造期间和 resizeEvent 中的调用在管线绑定之前不做任何事。
+
+    Args:
+        window_cls: 主窗口类（MainWindow）
+
+    Returns:
+        传入的类，便于用作装饰器
+    """
+    window_cls.update_telescope_camera_image = _update_telescope_camera_image
+    return window_cls
+
+
+def attach_allsky_pipeline(window, analyzer=None) -> Optional[AllSkyImagePipeline]:
+    """
+    为主窗口创建全天相机管线并绑定到 telescope_camera_label
+
+    窗口自己的 telescope_camera_timer 被停止，由管线按配置的刷新间隔检查文件；管线尚未启动，
+    由调用方在合适的时机（首次绘制之后）调用 start()。
+
+    Args:
+        window: 主窗口
+        analyzer: AllSkyAnalyzer，为空时只显示
+
+    Returns:
+        AllSkyImagePipeline，配置 devices.allsky_camera 未启用时为 None
+    """
+    timer = getattr(window, 'telescope_camera_timer', None)
+    if isinstance(timer, QTimer):
+        timer.stop()
+    if not get_config_service().get('devices.allsky_camera.enabled', False):
+        return None
+    pipeline = AllSkyImagePipeline(analyzer=analyzer, parent=window)
+    pipeline.attach(window.telescope_camera_label)
+    window.allsky_pipeline = pipeline
+    return pipeline
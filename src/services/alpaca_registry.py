@@ -0,0 +1,269 @@
+"""
+Alpaca 客户端注册表
+
+按服务器地址（base_url）在进程内共享 Alpaca 客户端：每个服务器只有一个带连接池的
+requests 会话，界面按钮和各监控线程都复用它，命令往返时间只剩网络延迟，
+不再包含导入模块、解析配置和建立 TCP 连接的开销。
+
+ClientTransactionID 由注册表统一分配，可在多线程中安全使用。
+"""
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Mapping, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from src.config.config_service import get_config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_API_URL = 'http://202.127.24.217:11111'
+
+# 读取类请求的超时 (连接, 读取)，与 AlpacaClient 一致
+GET_TIMEOUT = (2, 5)
+# 命令类请求的超时，圆顶等设备可能要等动作受理后才返回
+PUT_TIMEOUT = (5, 30)
+
+
+class PooledAlpacaClient:
+    """
+    带连接池的 Alpaca 客户端
+
+    方法与 api_client.AlpacaClient 保持一致，可以直接替换原有调用。
+    实例由 AlpacaClientRegistry 创建和持有，不要自行构造。
+    """
+
+    def __init__(self, base_url: str, client_id: int, transaction_ids,
+                 pool_maxsize: int = 16, retries: int = 2):
+        """
+        初始化客户端
+
+        Args:
+            base_url: 服务器地址
+            client_id: Alpaca ClientID
+            transaction_ids: 返回下一个 ClientTransactionID 的可调用对象（由注册表提供）
+            pool_maxsize: 连接池大小，应不小于同时访问该服务器的线程数
+            retries: 读取请求在连接失败或 5xx 时的重试次数（命令不重试，避免重复执行）
+        """
+        self.base_url = base_url.rstrip('/')
+        self.client_id = client_id
+        self._next_transaction_id = transaction_ids
+        self.last_rtt = 0.0
+
+        retry = Retry(total=retries, backoff_factor=0.2,
+                      status_forcelist=[500, 502, 503, 504],
+                      allowed_methods=frozenset(['GET']))
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _params(self) -> Dict[str, int]:
+        return {'ClientID': self.client_id, 'ClientTransactionID': self._next_transaction_id()}
+
+    def _url(self, device_type: str, device_number: int, endpoint: str) -> str:
+        return f"{self.base_url}/api/v1/{device_type}/{device_number}/{endpoint}"
+
+    def get(self, device_type: str, device_number: int, endpoint: str):
+        """
+        读取设备属性
+
+        Returns:
+            属性值，请求失败或设备返回错误时为 None
+        """
+        try:
+            response = self.session.get(self._url(device_type, device_number, endpoint),
+                                        params=self._params(), timeout=GET_TIMEOUT)
+            response.raise_for_status()
+            data = response.json()
+            if data.get('ErrorNumber', 0) != 0:
+                logger.debug("读取 %s/%s 失败: %s", device_type, endpoint, data.get('ErrorMessage'))
+                return None
+            return data.get('Value')
+        except requests.exceptions.RequestException as e:
+            logger.debug("读取 %s/%s 出错: %s", device_type, endpoint, e)
+            return None
+
+    def get_multiple(self, device_type: str, device_number: int, endpoints: List[str]) -> Dict[str, Any]:
+        """并发读取多个属性"""
+        with ThreadPoolExecutor(max_workers=max(1, min(len(endpoints), 8))) as executor:
+            values = executor.map(lambda ep: self.get(device_type, device_number, ep), endpoints)
+            return dict(zip(endpoints, values))
+
+    def put(self, device_type: str, device_number: int, endpoint: str,
+            data: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        发送命令
+
+        Returns:
+            命令是否被设备接受
+        """
+        url = self._url(device_type, device_number, endpoint)
+        start = time.perf_counter()
+        try:
+            response = self.session.put(url, params=self._params(), data=data or {}, timeout=PUT_TIMEOUT)
+            self.last_rtt = time.perf_counter() - start
+            logger.info("PUT %s 耗时 %.3f 秒，状态码 %s", url, self.last_rtt, response.status_code)
+            response.raise_for_status()
+            result = response.json()
+            if result.get('ErrorNumber', 0) != 0:
+                logger.error("API 失败: %s，错误码：%s", result.get('ErrorMessage'), result.get('ErrorNumber'))
+                return False
+            return True
+        except requests.exceptions.Timeout as e:
+            logger.error("连接超时: %s", e)
+        except requests.exceptions.RequestException as e:
+            logger.error("请求失败: %s", e)
+        except ValueError as e:
+            logger.error("响应解析失败: %s", e)
+        self.last_rtt = time.perf_counter() - start
+        return False
+
+    def find_devices(self, device_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        获取服务器上已配置的设备列表
+
+        Args:
+            device_type: 只返回该类型的设备（不区分大小写），为空时返回全部
+        """
+        url = f"{self.base_url}/management/v1/configureddevices"
+        try:
+            response = self.session.get(url, params=self._params(), timeout=10)
+            response.raise_for_status()
+            devices = response.json().get('Value') or []
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.error("获取设备列表失败: %s", e)
+            return []
+        if device_type:
+            devices = [d for d in devices if str(d.get('DeviceType', '')).lower() == device_type.lower()]
+        return devices
+
+    def get_ra_dec(self):
+        """读取望远镜赤经、赤纬"""
+        values = self.get_multiple('telescope', 0, ['rightascension', 'declination'])
+        return values['rightascension'], values['declination']
+
+    def open_dome_shutter(self, device_number: int = 0) -> bool:
+        """打开圆顶天窗"""
+        return self.put('dome', device_number, 'openshutter')
+
+    def close_dome_shutter(self, device_number: int = 0) -> bool:
+        """关闭圆顶天窗"""
+        return self.put('dome', device_number, 'closeshutter')
+
+    def open_cover(self, device_number: int = 0) -> bool:
+        """打开镜头盖"""
+        return self.put('covercalibrator', device_number, 'opencover')
+
+    def close_cover(self, device_number: int = 0) -> bool:
+        """关闭镜头盖"""
+        return self.put('covercalibrator', device_number, 'closecover')
+
+    def move_focuser(self, device_number: int = 0, position: int = 0) -> bool:
+        """移动调焦器到绝对位置"""
+        return self.put('focuser', device_number, 'move', {'Position': int(position)})
+
+    def halt_focuser(self, device_number: int = 0) -> bool:
+        """停止调焦器"""
+        return self.put('focuser', device_number, 'halt')
+
+    def close(self):
+        self.session.close()
+
+
+class AlpacaClientRegistry:
+    """
+    进程级 Alpaca 客户端注册表
+
+    同一 base_url 只创建一个 PooledAlpacaClient；设备地址从配置服务的快照解析，不读文件。
+    """
+
+    def __init__(self, config: Optional[Mapping[str, Any]] = None, pool_maxsize: int = 16):
+        self._config = config
+        self.pool_maxsize = pool_maxsize
+        self._clients: Dict[str, PooledAlpacaClient] = {}
+        self._lock = threading.Lock()
+        self._transaction_ids = itertools.count(1)
+        self._transaction_lock = threading.Lock()
+
+    @property
+    def config(self) -> Mapping[str, Any]:
+        """当前配置；未显式指定时取配置服务的最新快照，设备地址修改后无需重启即可生效"""
+        if self._config is None:
+            return get_config()
+        return self._config
+
+    def set_config(self, config: Optional[Mapping[str, Any]]):
+        """替换配置，为 None 时恢复跟随配置服务（已创建的客户端保留）"""
+        self._config = config
+
+    def next_transaction_id(self) -> int:
+        """分配下一个 ClientTransactionID（线程安全）"""
+        with self._transaction_lock:
+            return next(self._transaction_ids)
+
+    def base_url_for(self, device_key: str) -> str:
+        """解析设备在配置中的服务器地址"""
+        device_config = self.config.get('devices', {}).get(device_key, {})
+        base_url = device_config.get('api_url')
+        if not base_url or not base_url.startswith(('http://', 'https://')):
+            base_url = DEFAULT_API_URL
+        return base_url.rstrip('/')
+
+    def device_number_for(self, device_key: str) -> int:
+        """解析设备在配置中的 Alpaca 设备号（与轮询目标一致，未配置时为 0）"""
+        device_config = self.config.get('devices', {}).get(device_key, {})
+        return int(device_config.get('device_number', 0) or 0)
+
+    def get_client(self, base_url: Optional[str] = None) -> PooledAlpacaClient:
+        """
+        获取某个服务器的共享客户端
+
+        Args:
+            base_url: 服务器地址，为空时使用配置中的 default_api_base_url
+        """
+        if not base_url:
+            base_url = self.config.get('default_api_base_url') or DEFAULT_API_URL
+        base_url = base_url.rstrip('/')
+        client = self._clients.get(base_url)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(base_url)
+                if client is None:
+                    client = PooledAlpacaClient(base_url, int(self.config.get('client_id', 123)),
+                                                self.next_transaction_id, self.pool_maxsize)
+                    self._clients[base_url] = client
+                    logger.debug("创建共享 Alpaca 客户端: %s", base_url)
+        return client
+
+    def client_for_device(self, device_key: str) -> PooledAlpacaClient:
+        """获取配置中某个设备（如 'dome'、'covercalibrator'）所在服务器的共享客户端"""
+        return self.get_client(self.base_url_for(device_key))
+
+    def close_all(self):
+        """关闭所有会话（程序退出时调用）"""
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            self._clients.clear()
+
+
+# 创建全局注册表实例
+alpaca_registry = AlpacaClientRegistry()
+
+
+def get_alpaca_client(device_key: Optional[str] = None) -> PooledAlpacaClient:
+    """
+    获取共享的 Alpaca 客户端
+
+    Args:
+        device_key: 配置中的设备键，为空时返回默认服务器的客户端
+    """
+    if device_key:
+        return alpaca_registry.client_for_device(device_key)
+    return alpaca_registry.get_client()
@@ -0,0 +1,480 @@
+"""
+设备命令执行器
+
+在工作线程中发送圆顶、镜头盖、调焦器、消旋器等设备命令，界面线程不再因 Alpaca 调用阻塞。
+命令受理后持续读取设备状态（shutterstatus、coverstate、ismoving 等），
+直到设备到达目标状态、超时或被取消，过程中通过 Qt 信号报告进度。
+
+同一设备的命令按提交顺序串行执行，不同设备之间互不等待。
+"""
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from src.services.alpaca_registry import AlpacaClientRegistry, alpaca_registry
+
+logger = logging.getLogger(__name__)
+
+# config.yaml 设备键 -> Alpaca 设备类型
+DEVICE_TYPES = {
+    'telescope': 'telescope',
+    'focuser': 'focuser',
+    'rotator': 'rotator',
+    'dome': 'dome',
+    'covercalibrator': 'covercalibrator',
+}
+
+# 命令 -> (状态端点, 到达目标的判定)
+COMMAND_TARGETS = {
+    ('dome', 'openshutter'): ('shutterstatus', lambda value: value == 0),
+    ('dome', 'closeshutter'): ('shutterstatus', lambda value: value == 1),
+    ('dome', 'slewtoazimuth'): ('slewing', lambda value: value is False),
+    ('covercalibrator', 'opencover'): ('coverstate', lambda value: value == 3),
+    ('covercalibrator', 'closecover'): ('coverstate', lambda value: value == 1),
+    ('focuser', 'move'): ('ismoving', lambda value: value is False),
+    ('rotator', 'move'): ('ismoving', lambda value: value is False),
+    ('rotator', 'moveabsolute'): ('ismoving', lambda value: value is False),
+    ('rotator', 'movemechanical'): ('ismoving', lambda value: value is False),
+    ('telescope', 'slewtocoordinatesasync'): ('slewing', lambda value: value is False),
+    ('telescope', 'slewtoaltazasync'): ('slewing', lambda value: value is False),
+}
+
+# 取消命令时发送的停止动作
+HALT_ACTIONS = {
+    'dome': 'abortslew',
+    'covercalibrator': 'haltcover',
+    'focuser': 'halt',
+    'rotator': 'halt',
+    'telescope': 'abortslew',
+}
+
+DEFAULT_TIMEOUT = 120.0
+DEFAULT_POLL_INTERVAL = 0.5
+
+
+class DeviceCommand:
+    """一条待执行的设备命令"""
+
+    def __init__(self, device_key: str, action: str, device_number: int = 0,
+                 data: Optional[Dict[str, Any]] = None, timeout: float = DEFAULT_TIMEOUT,
+                 poll_interval: float = DEFAULT_POLL_INTERVAL, base_url: Optional[str] = None,
+                 wait_for_target: bool = True):
+        """
+        Args:
+            device_key: config.yaml 中的设备键，如 'dome'、'covercalibrator'
+            action: Alpaca 动作名，如 'openshutter'
+            device_number: 设备号
+            data: PUT 表单参数
+            timeout: 从发送到设备到达目标状态的总超时（秒）
+            poll_interval: 等待目标状态时的读取间隔（秒）
+            base_url: 服务器地址，为空时按设备键从配置解析
+            wait_for_target: 为 False 时命令受理即完成，不等待状态
+        """
+        self.device_key = device_key
+        self.device_type = DEVICE_TYPES.get(device_key, device_key)
+        self.action = action
+        self.device_number = device_number
+        self.data = data or {}
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.base_url = base_url
+        self.target = COMMAND_TARGETS.get((self.device_type, action)) if wait_for_target else None
+
+    def __repr__(self):
+        return f"DeviceCommand({self.device_key}.{self.action}#{self.device_number})"
+
+
+class CommandHandle:
+    """已提交命令的句柄，可等待结果或取消"""
+
+    def __init__(self, command_id: int, command: DeviceCommand):
+        self.command_id = command_id
+        self.command = command
+        self.future: Future = Future()
+        self._cancel_event = threading.Event()
+        self.halt_on_cancel = True
+
+    def cancel(self, halt: bool = True):
+        """
+        取消命令
+
+        Args:
+            halt: 命令已发送时是否同时向设备发送停止动作
+        """
+        self.halt_on_cancel = halt
+        self._cancel_event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def done(self) -> bool:
+        return self.future.done()
+
+    def result(self, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """阻塞等待命令结果（不要在界面线程中调用）"""
+        return self.future.result(timeout)
+
+    def add_done_callback(self, callback: Callable[[Dict[str, Any]], None]):
+        self.future.add_done_callback(lambda future: callback(future.result()))
+
+
+class CommandExecutor(QObject):
+    """
+    设备命令执行器
+
+    信号在工作线程中发出，连接到界面对象的槽时由 Qt 自动排队到界面线程执行。
+    command_finished 的结果字典包含：
+        id, device, action, success, state, elapsed, rtt, error, cancelled, timed_out
+    """
+    command_started = pyqtSignal(int, str)
+    command_progress = pyqtSignal(int, str, object)   # 命令ID, 状态端点, 当前值
+    command_finished = pyqtSignal(int, dict)
+
+    def __init__(self, registry: Optional[AlpacaClientRegistry] = None,
+                 polling_engine=None, parent=None):
+        """
+        初始化命令执行器
+
+        Args:
+            registry: 客户端注册表，为空时使用全局 alpaca_registry
+            polling_engine: 可选的 PollingEngine，命令受理后让对应设备立即进入快速轮询
+            parent: 父QObject
+        """
+        super().__init__(parent)
+        self.registry = registry or alpaca_registry
+        self.polling_engine = polling_engine
+        self._ids = itertools.count(1)
+        self._executors: Dict[str, ThreadPoolExecutor] = {}
+        self._handles: Dict[int, CommandHandle] = {}
+        self._lock = threading.Lock()
+
+    def _executor_for(self, device_key: str) -> ThreadPoolExecutor:
+        with self._lock:
+            executor = self._executors.get(device_key)
+            if executor is None:
+                executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"cmd-{device_key}")
+                self._executors[device_key] = executor
+            return executor
+
+    def submit(self, command: DeviceCommand) -> CommandHandle:
+        """提交命令，立即返回句柄"""
+        handle = CommandHandle(next(self._ids), command)
+        with self._lock:
+            self._handles[handle.command_id] = handle
+        self._executor_for(command.device_key).submit(self._run, handle)
+        return handle
+
+    def cancel(self, command_id: int, halt: bool = True):
+        """按命令ID取消命令"""
+        handle = self._handles.get(command_id)
+        if handle:
+            handle.cancel(halt)
+
+    def cancel_device(self, device_key: str, halt: bool = True):
+        """取消某台设备上所有未完成的命令"""
+        for handle in list(self._handles.values()):
+            if handle.command.device_key == device_key and not handle.done():
+                handle.cancel(halt)
+
+    # 常用命令
+    def open_dome_shutter(self, device_number: int = 0) -> CommandHandle:
+        return self.submit(DeviceCommand('dome', 'openshutter', device_number))
+
+    def close_dome_shutter(self, device_number: int = 0) -> CommandHandle:
+        return self.submit(DeviceCommand('dome', 'closeshutter', device_number))
+
+    def open_cover(self, device_number: int = 0) -> CommandHandle:
+        return self.submit(DeviceCommand('covercalibrator', 'opencover', device_number))
+
+    def close_cover(self, device_number: int = 0) -> CommandHandle:
+        return self.submit(DeviceCommand('covercalibrator', 'closecover', device_number))
+
+    def move_focuser(self, position: int, device_number: int = 0) -> CommandHandle:
+        return self.submit(DeviceCommand('focuser', 'move', device_number, {'Position': int(position)}))
+
+    def halt_focuser(self, device_number: int = 0) -> CommandHandle:
+        return self.submit(DeviceCommand('focuser', 'halt', device_number))
+
+    def move_rotator(self, position: float, device_number: int = 0) -> CommandHandle:
+        return self.submit(DeviceCommand('rotator', 'moveabsolute', device_number, {'Position': float(position)}))
+
+    def _run(self, handle: CommandHandle):
+        """在工作线程中执行命令"""
+        command = handle.command
+        start = time.perf_counter()
+        result = {
+            'id': handle.command_id,
+            'device': command.device_key,
+            'action': command.action,
+            'success': False,
+            'state': None,
+            'elapsed': 0.0,
+            'rtt': 0.0,
+            'error': '',
+            'cancelled': False,
+            'timed_out': False,
+        }
+        try:
+            if handle.cancelled:
+                result['cancelled'] = True
+                return
+            self.command_started.emit(handle.command_id, f"{command.device_key}.{command.action}")
+
+            if command.base_url:
+                client = self.registry.get_client(command.base_url)
+            else:
+                client = self.registry.client_for_device(command.device_key)
+            accepted = client.put(command.device_type, command.device_number, command.action, command.data)
+            result['rtt'] = client.last_rtt
+            if not accepted:
+                result['error'] = '命令未被设备接受'
+                return
+            if self.polling_engine is not None:
+                self.polling_engine.boost(command.device_key)
+            if command.target is None:
+                result['success'] = True
+                return
+
+            field, reached = command.target
+            deadline = start + command.timeout
+            while True:
+                value = client.get(command.device_type, command.device_number, field)
+                result['state'] = value
+                self.command_progress.emit(handle.command_id, field, value)
+                if value is not None and reached(value):
+                    result['success'] = True
+                    return
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    result['timed_out'] = True
+                    result['error'] = f"等待 {field} 到达目标状态超时"
+                    return
+                if handle._cancel_event.wait(min(command.poll_interval, remaining)):
+                    result['cancelled'] = True
+                    halt_action = HALT_ACTIONS.get(command.device_type)
+                    if handle.halt_on_cancel and halt_action:
+                        client.put(command.device_type, command.device_number, halt_action)
+                    return
+        except Exception as e:
+            logger.error("执行命令 %s 出错: %s", command, e)
+            result['error'] = str(e)
+        finally:
+            result['elapsed'] = time.perf_counter() - start
+            with self._lock:
+                self._handles.pop(handle.command_id, None)
+            logger.info("命令 %s.%s 完成: 成功=%s 耗时 %.3f 秒（往返 %.3f 秒）",
+                        command.device_key, command.action, result['success'],
+                        result['elapsed'], result['rtt'])
+            self.command_finished.emit(handle.command_id, result)
+            handle.future.set_result(result)
+
+    def shutdown(self, wait: bool = False):
+        """取消所有命令并关闭工作线程"""
+        for handle in list(self._handles.values()):
+            handle.cancel(halt=False)
+        with self._lock:
+            executors = list(self._executors.values())
+            self._executors.clear()
+        for executor in executors:
+            executor.shutdown(wait=wait)
+
+
+# 全局命令执行器实例（首次使用时在界面线程中创建）
+_command_executor: Optional[CommandExecutor] = None
+
+
+def get_command_executor() -> CommandExecutor:
+    """获取全局命令执行器实例"""
+    global _command_executor
+    if _command_executor is None:
+        _command_executor = CommandExecutor()
+    return _command_executor
+
+
+# ----------------------------------------------------------------------
+# 主窗口接入
+# ----------------------------------------------------------------------
+
+# 主窗口方法 -> (设备控件 device_id, 设备键, 动作, 进行中文本, 失败文本)
+WINDOW_COMMANDS = {
+    'open_dome_shutter': ('dome', 'dome', 'openshutter', '正在打开圆顶...', '打开圆顶失败'),
+    'close_dome_shutter': ('dome', 'dome', 'closeshutter', '正在关闭圆顶...', '关闭圆顶失败'),
+    'open_cover': ('cover', 'covercalibrator', 'opencover', '正在打开镜头盖...', '打开镜头盖失败'),
+    'close_cover': ('cover', 'covercalibrator', 'closecover', '正在关闭镜头盖...', '关闭镜头盖失败'),
+}
+
+DEVICE_NAMES = {'dome': '圆顶', 'cover': '镜头盖'}
+
+MANUAL_COVER_DEVICE = {
+    'DeviceName': 'ASCOM CoverCalibrator (手动添加)',
+    'DeviceType': 'CoverCalibrator',
+    'DeviceNumber': 0,
+    'ApiVersion': '1.0',
+}
+
+# 手动添加镜头盖设备后查询设备列表的后台任务名
+COVER_DEVICES_TASK = 'cover_devices'
+
+BUTTON_ENABLED_STYLE = 'background-color: #4CAF50;'
+BUTTON_DISABLED_STYLE = 'background-color: #F44336;'
+
+
+def _connected_device_number(window, device_id: str) -> Optional[int]:
+    """已连接设备控件当前选中的设备号，没有已连接的设备时返回 None"""
+    for control in window.device_controls:
+        if getattr(control, 'device_id', None) == device_id and control.is_connected:
+            current_index = control.combo.currentIndex()
+            if current_index >= 0:
+                device_data = control.combo.itemData(current_index)
+                if device_data and 'DeviceNumber' in device_data:
+                    return device_data['DeviceNumber']
+            return 0
+    return None
+
+
+def _status_pair(window, device_id: str):
+    if device_id == 'dome':
+        return window.dome_status_group.pairs['dome_status']
+    return window.telescope_status.pairs['cover_status']
+
+
+def _set_status(pair, text: str, css_class: str):
+    pair.set_value(text)
+    pair.value_label.setProperty('class', css_class)
+    pair.value_label.style().unpolish(pair.value_label)
+    pair.value_label.style().polish(pair.value_label)
+
+
+def _set_buttons(window, device_id: str, enabled: bool):
+    """命令发送期间禁用开关按钮（镜头盖按钮同时变红）"""
+    if device_id == 'dome':
+        window.dome_open_button.setEnabled(enabled)
+        window.dome_close_button.setEnabled(enabled)
+        return
+    for button in (window.cover_open_button, window.cover_close_button):
+        button.setEnabled(enabled)
+        button.setStyleSheet(BUTTON_ENABLED_STYLE if enabled else BUTTON_DISABLED_STYLE)
+
+
+def _restore_cover_buttons(window):
+    """按最后一次读到的镜头盖状态恢复按钮（1 关闭、3 打开，其余两个都可用）"""
+    state = getattr(window, '_last_cover_state', None)
+    open_enabled = state != 3
+    close_enabled = state != 1
+    window.cover_open_button.setEnabled(open_enabled)
+    window.cover_open_button.setStyleSheet(BUTTON_ENABLED_STYLE if open_enabled else BUTTON_DISABLED_STYLE)
+    window.cover_close_button.setEnabled(close_enabled)
+    window.cover_close_button.setStyleSheet(BUTTON_ENABLED_STYLE if close_enabled else BUTTON_DISABLED_STYLE)
+
+
+def _command_slot(name: str, executor_of: Callable[[], CommandExecutor]):
+    device_id, device_key, action, busy_text, failed_text = WINDOW_COMMANDS[name]
+
+    def handler(self):
+        device_number = _connected_device_number(self, device_id)
+        if device_number is None:
+            logger.warning("未找到已连接的%s设备", DEVICE_NAMES[device_id])
+            return
+        _set_status(_status_pair(self, device_id), busy_text, 'medium-text status-warning')
+        _set_buttons(self, device_id, False)
+
+        executor = executor_of()
+        if not getattr(self, '_command_slot_connected', False):
+            # 连接到主窗口的绑定方法，工作线程发出的信号排队到界面线程执行
+            executor.command_finished.connect(self._on_device_command_finished)
+            self._command_slot_connected = True
+        pending = self.__dict__.setdefault('_pending_device_commands', {})
+        # 受理即完成：设备状态由轮询刷新，运动过程中仍可发送反向命令或停止
+        handle = executor.submit(DeviceCommand(device_key, action, device_number, wait_for_target=False))
+        pending[handle.command_id] = (device_id, failed_text)
+        if handle.done():
+            # 被安全联锁拒绝的命令在 submit 返回前就已完成
+            self._on_device_command_finished(handle.command_id, handle.result())
+    handler.__name__ = name
+    return handler
+
+
+def _on_device_command_finished(self, command_id: int, result: dict):
+    """命令完成后在界面线程恢复按钮和状态文本"""
+    entry = self.__dict__.get('_pending_device_commands', {}).pop(command_id, None)
+    if entry is None:
+        return
+    device_id, failed_text = entry
+    if result['success']:
+        if device_id == 'dome':
+            _set_buttons(self, device_id, True)
+        return
+    error = result.get('error') or ''
+    text = failed_text if error in ('', '命令未被设备接受') else f"错误: {error}"
+    _set_status(_status_pair(self, device_id), text, 'medium-text status-error')
+    if device_id == 'dome':
+        _set_buttons(self, device_id, True)
+    else:
+        _restore_cover_buttons(self)
+
+
+def _add_manual_cover_device_slot(executor_of: Callable[[], CommandExecutor]):
+    def add_manual_cover_device(self):
+        """手动添加镜头盖设备到设备列表，镜头盖服务器的设备列表在后台查询后更新连接菜单"""
+        for control in self.device_controls:
+            if getattr(control, 'device_id', None) == 'cover':
+                if control.is_connected:
+                    control.toggle_connection()
+                control.update_devices([dict(MANUAL_COVER_DEVICE)])
+                self.has_added_default_cover_device = True
+                logger.info("已手动添加镜头盖设备")
+
+                from src.services.startup import get_staged_startup
+                tasks = get_staged_startup(self).tasks
+                if not getattr(self, '_cover_devices_slot_connected', False):
+                    tasks.task_finished.connect(self._on_cover_devices_found)
+                    self._cover_devices_slot_connected = True
+                registry = executor_of().registry
+                tasks.submit(COVER_DEVICES_TASK, lambda: registry.client_for_device('covercalibrator').find_devices())
+                break
+    return add_manual_cover_device
+
+
+def _on_cover_devices_found(self, name: str, devices):
+    """后台查询到镜头盖服务器的设备列表后更新连接菜单（没有镜头盖设备时加入手动添加的设备）"""
+    if name != COVER_DEVICES_TASK:
+        return
+    devices = list(devices or [])
+    if not any(device.get('DeviceType') == 'CoverCalibrator' for device in devices):
+        devices.append(dict(MANUAL_COVER_DEVICE))
+    self.init_connect_menu(devices)
+
+
+def install_command_executor(window_cls, executor: Optional[CommandExecutor] = None):
+    """
+    让主窗口的圆顶、镜头盖开关按钮通过命令执行器发送命令
+
+    原方法在界面线程中新建 AlpacaClient 并同步发送 PUT，设备响应慢时界面卡住。
+    替换后按钮只提交 DeviceCommand，结果经 command_finished 回到界面线程，
+    按原方法的规则更新状态文本和按钮；客户端取自 alpaca_registry，
+    提交经过执行器，安全联锁的 guard() 对按钮同样生效。
+    add_manual_cover_device 同样改用注册表中镜头盖服务器的共享客户端，在分阶段启动的后台任务中查询设备列表。
+
+    必须在创建主窗口实例之前调用。
+
+    Args:
+        window_cls: 主窗口类（MainWindow）
+        executor: 命令执行器，为空时在点击时取全局 get_command_executor()
+
+    Returns:
+        传入的类，便于用作装饰器
+    """
+    executor_of = (lambda: executor) if executor is not None else get_command_executor
+    for name in WINDOW_COMMANDS:
+        setattr(window_cls, name, _command_slot(name, executor_of))
+    window_cls._on_device_command_finished = _on_device_command_finished
+    window_cls.add_manual_cover_device = _add_manual_cover_device_slot(executor_of)
+    window_cls._on_cover_devices_found = _on_cover_devices_found
+    logger.info("主窗口圆顶、镜头盖命令已改由命令执行器发送")
+    return window_cls
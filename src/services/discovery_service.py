@@ -0,0 +1,379 @@
+"""
+Alpaca 设备发现服务
+
+主窗口的 refresh_device_list 在界面线程中同步调用 AlpacaClient().find_devices()，只查询一个默认地址，
+服务器不可达时界面卡住整个超时时间。
+
+本服务：
+  - 发送 Alpaca UDP 发现广播（端口 32227，消息 "alpacadiscovery1"），收集应答的服务器
+  - 对应答的服务器和 config.yaml 中配置的所有服务器（default_api_base_url、devices.*.api_url、
+    discovery.servers）并行查询 /management/v1/configureddevices，每台服务器有独立的短超时，
+    整体有截止时间，不可达的服务器不会拖住其他服务器
+  - 每台服务器的结果一到就通过 devices_found 信号送出，界面可以逐步填充连接菜单
+  - 把各服务器最近一次的设备列表缓存到磁盘（data/discovery_cache.json），启动时可立即显示
+
+设备字典在 configureddevices 返回的字段之外增加 ServerUrl（所在服务器地址）。
+
+用法:
+    service = get_discovery_service()
+    service.devices_found.connect(on_server_devices)   # (base_url, devices)，在界面线程中送达
+    devices = service.discover()                        # 阻塞，应在后台线程中调用
+    cached = service.cached_devices()                   # 上次发现的结果，立即可用
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+import requests
+from PyQt5.QtCore import QObject, pyqtSignal
+from requests.adapters import HTTPAdapter
+
+from src.config.config_service import get_config_service
+
+logger = logging.getLogger(__name__)
+
+DISCOVERY_PORT = 32227
+DISCOVERY_MESSAGE = b'alpacadiscovery1'
+CACHE_VERSION = 1
+
+DEFAULT_SETTINGS = {
+    'udp': True,
+    'port': DISCOVERY_PORT,
+    'udp_timeout': 1.0,
+    'broadcast': True,
+    'udp_targets': [],
+    'servers': [],
+    'include_config': True,
+    'connect_timeout': 1.0,
+    'read_timeout': 3.0,
+    'deadline': 5.0,
+    'max_workers': 8,
+    'cache_path': os.path.join('data', 'discovery_cache.json'),
+    'cache_max_age': 30 * 86400,
+}
+
+
+def broadcast_addresses() -> List[str]:
+    """各网卡的 IPv4 广播地址，加上受限广播地址 255.255.255.255"""
+    addresses = []
+    try:
+        import psutil
+        for snics in psutil.net_if_addrs().values():
+            for snic in snics:
+                if snic.family == socket.AF_INET and snic.broadcast and snic.broadcast not in addresses:
+                    addresses.append(snic.broadcast)
+    except Exception as e:
+        logger.debug("获取网卡广播地址失败: %s", e)
+    addresses.append('255.255.255.255')
+    return addresses
+
+
+def udp_discover(targets: Iterable[str], port: int = DISCOVERY_PORT,
+                 timeout: float = 1.0) -> Iterator[Tuple[str, int]]:
+    """
+    发送 Alpaca 发现广播，逐个产出应答的服务器
+
+    广播在超时时间的开始和中途各发送一次，防止单个数据报丢失。
+
+    Args:
+        targets: 目标地址（广播地址或单个主机）
+        port: 发现端口
+        timeout: 等待应答的总时长（秒）
+
+    Yields:
+        (服务器地址, Alpaca HTTP 端口)，同一服务器只产出一次
+    """
+    targets = list(OrderedDict.fromkeys(targets))
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        sock.bind(('', 0))
+
+        def send():
+            for target in targets:
+                try:
+                    sock.sendto(DISCOVERY_MESSAGE, (target, port))
+                except OSError as e:
+                    logger.debug("发送发现广播到 %s 失败: %s", target, e)
+
+        seen = set()
+        start = time.monotonic()
+        deadline = start + timeout
+        resend_at = start + timeout / 2
+        send()
+        while True:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            if resend_at is not None and now >= resend_at:
+                send()
+                resend_at = None
+            wait_until = deadline if resend_at is None else resend_at
+            sock.settimeout(max(0.001, wait_until - now))
+            try:
+                data, (host, _) = sock.recvfrom(1024)
+            except socket.timeout:
+                continue
+            except OSError as e:
+                logger.debug("接收发现应答失败: %s", e)
+                break
+            try:
+                alpaca_port = int(json.loads(data.decode('utf-8'))['AlpacaPort'])
+            except (ValueError, KeyError, TypeError):
+                logger.debug("忽略无效的发现应答 %s: %r", host, data[:64])
+                continue
+            if (host, alpaca_port) not in seen:
+                seen.add((host, alpaca_port))
+                yield host, alpaca_port
+    finally:
+        sock.close()
+
+
+def configured_servers(config: Mapping[str, Any]) -> List[str]:
+    """配置中出现的所有 Alpaca 服务器地址（去重，保持顺序）"""
+    urls = [config.get('default_api_base_url')]
+    for device in (config.get('devices') or {}).values():
+        if isinstance(device, Mapping):
+            urls.append(device.get('api_url'))
+    return [url.rstrip('/') for url in OrderedDict.fromkeys(urls)
+            if isinstance(url, str) and url.startswith(('http://', 'https://'))]
+
+
+def merge_devices(by_server: Mapping[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    合并各服务器的设备列表
+
+    同一台服务器可能同时通过配置地址和广播应答的地址被查询到，按 UniqueID 去重（先出现的保留）。
+    """
+    devices = []
+    seen = set()
+    for url, server_devices in by_server.items():
+        for device in server_devices:
+            key = device.get('UniqueID') or (url, device.get('DeviceType'), device.get('DeviceNumber'))
+            if key in seen:
+                continue
+            seen.add(key)
+            devices.append(device)
+    return devices
+
+
+class DiscoveryService(QObject):
+    """
+    Alpaca 设备发现
+
+    信号在调用 discover() 的线程中发出，连接到界面对象的槽时自动排队到界面线程。
+    """
+
+    server_found = pyqtSignal(str)
+    devices_found = pyqtSignal(str, list)
+    server_failed = pyqtSignal(str, str)
+    finished = pyqtSignal(list)
+
+    def __init__(self, settings: Optional[Mapping[str, Any]] = None, parent=None):
+        """
+        初始化发现服务
+
+        Args:
+            settings: 覆盖默认设置和配置 discovery 段的项目
+        """
+        super().__init__(parent)
+        self._overrides = dict(settings or {})
+        self._lock = threading.Lock()
+        self._running = False
+        self.last_result: List[Dict[str, Any]] = []
+        self.last_errors: Dict[str, str] = {}
+
+    @property
+    def settings(self) -> Dict[str, Any]:
+        """当前设置（每次读取配置服务的最新快照）"""
+        settings = dict(DEFAULT_SETTINGS)
+        settings.update(get_config_service().get('discovery', {}) or {})
+        settings.update(self._overrides)
+        return settings
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def servers(self, settings: Optional[Mapping[str, Any]] = None) -> List[str]:
+        """需要直接查询的服务器（不含广播应答的服务器）"""
+        settings = settings or self.settings
+        urls = [url.rstrip('/') for url in settings['servers']]
+        if settings['include_config']:
+            urls += configured_servers(get_config_service().snapshot())
+        return list(OrderedDict.fromkeys(urls))
+
+    def udp_targets(self, settings: Optional[Mapping[str, Any]] = None) -> List[str]:
+        settings = settings or self.settings
+        targets = list(settings['udp_targets'])
+        if settings['broadcast']:
+            targets += broadcast_addresses()
+        return targets
+
+    # ------------------------------------------------------------------
+    # 发现
+    # ------------------------------------------------------------------
+    def _session(self, settings: Mapping[str, Any]) -> requests.Session:
+        # 不重试：不可达的服务器应在一个超时内放弃
+        adapter = HTTPAdapter(pool_connections=int(settings['max_workers']), pool_maxsize=1, max_retries=0)
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def _query(self, session: requests.Session, url: str, timeout: Tuple[float, float],
+               results: Dict[str, List[Dict[str, Any]]], errors: Dict[str, str]):
+        from src.services.alpaca_registry import alpaca_registry
+        params = {
+            'ClientID': int(get_config_service().get('client_id', 123)),
+            'ClientTransactionID': alpaca_registry.next_transaction_id(),
+        }
+        start = time.perf_counter()
+        try:
+            response = session.get(f"{url}/management/v1/configureddevices", params=params, timeout=timeout)
+            response.raise_for_status()
+            devices = response.json().get('Value') or []
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.info("查询 %s 的设备失败: %s", url, e)
+            with self._lock:
+                errors[url] = str(e)
+            self.server_failed.emit(url, str(e))
+            return
+        devices = [dict(device, ServerUrl=url) for device in devices if isinstance(device, Mapping)]
+        logger.info("%s: %d 个设备，耗时 %.0f ms", url, len(devices), (time.perf_counter() - start) * 1000)
+        with self._lock:
+            results[url] = devices
+        self.devices_found.emit(url, devices)
+
+    def discover(self) -> List[Dict[str, Any]]:
+        """
+        广播发现并并行查询所有服务器（阻塞，应在后台线程中调用）
+
+        Returns:
+            截止时间内查询成功的所有服务器的设备列表（合并去重）
+        """
+        settings = self.settings
+        timeout = (float(settings['connect_timeout']), float(settings['read_timeout']))
+        start = time.monotonic()
+        deadline = start + float(settings['deadline'])
+        results: Dict[str, List[Dict[str, Any]]] = {}
+        errors: Dict[str, str] = {}
+        order: List[str] = []
+        futures = []
+        session = self._session(settings)
+        executor = ThreadPoolExecutor(max_workers=int(settings['max_workers']), thread_name_prefix='discovery')
+        self._running = True
+        try:
+            def submit(url):
+                if url not in order:
+                    order.append(url)
+                    futures.append(executor.submit(self._query, session, url, timeout, results, errors))
+
+            for url in self.servers(settings):
+                submit(url)
+            if settings['udp']:
+                udp_timeout = min(float(settings['udp_timeout']), float(settings['deadline']))
+                for host, port in udp_discover(self.udp_targets(settings), int(settings['port']), udp_timeout):
+                    url = f"http://{host}:{port}"
+                    logger.info("发现 Alpaca 服务器: %s", url)
+                    self.server_found.emit(url)
+                    submit(url)
+            _, pending = wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+            for future in pending:
+                future.cancel()
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+            self._running = False
+
+        with self._lock:
+            by_server = OrderedDict((url, results[url]) for url in order if url in results)
+            timed_out = [url for url in order if url not in results and url not in errors]
+            errors = dict(errors)
+        for url in timed_out:
+            errors[url] = '超过发现截止时间'
+            logger.info("%s 未在截止时间内应答", url)
+        devices = merge_devices(by_server)
+        self.last_result = devices
+        self.last_errors = errors
+        self._save_cache(settings, by_server)
+        logger.info("设备发现完成: %d 台服务器应答，%d 个设备，%d 台失败，耗时 %.2f s",
+                    len(by_server), len(devices), len(errors), time.monotonic() - start)
+        self.finished.emit(devices)
+        return devices
+
+    def start(self) -> bool:
+        """在后台线程中执行 discover()，已在执行时返回 False"""
+        with self._lock:
+            if self._running:
+                return False
+            self._running = True
+        threading.Thread(target=self.discover, name='AlpacaDiscovery', daemon=True).start()
+        return True
+
+    # ------------------------------------------------------------------
+    # 磁盘缓存
+    # ------------------------------------------------------------------
+    def load_cache(self) -> 'OrderedDict[str, List[Dict[str, Any]]]':
+        """缓存中各服务器最近一次的设备列表（过期条目已去除）"""
+        settings = self.settings
+        try:
+            with open(settings['cache_path'], encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return OrderedDict()
+        except (OSError, ValueError) as e:
+            logger.warning("读取设备缓存失败: %s", e)
+            return OrderedDict()
+        if data.get('version') != CACHE_VERSION:
+            return OrderedDict()
+        oldest = time.time() - float(settings['cache_max_age'])
+        return OrderedDict((url, entry['devices']) for url, entry in (data.get('servers') or {}).items()
+                           if entry.get('saved_at', 0) >= oldest)
+
+    def cached_devices(self) -> List[Dict[str, Any]]:
+        """上次发现的设备列表（合并去重），没有缓存时为空"""
+        return merge_devices(self.load_cache())
+
+    def _save_cache(self, settings: Mapping[str, Any], by_server: Mapping[str, List[Dict[str, Any]]]):
+        """更新应答服务器的条目，未应答的服务器保留上次的结果"""
+        path = settings['cache_path']
+        now = time.time()
+        servers = OrderedDict()
+        for url, devices in by_server.items():
+            servers[url] = {'saved_at': now, 'devices': devices}
+        try:
+            with open(path, encoding='utf-8') as f:
+                previous = json.load(f).get('servers') or {}
+        except (OSError, ValueError):
+            previous = {}
+        for url, entry in previous.items():
+            servers.setdefault(url, entry)
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': CACHE_VERSION, 'servers': servers}, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("写入设备缓存失败: %s", e)
+
+
+_discovery_service: Optional[DiscoveryService] = None
+_discovery_lock = threading.Lock()
+
+
+def get_discovery_service() -> DiscoveryService:
+    """获取全局设备发现服务"""
+    global _discovery_service
+    with _discovery_lock:
+        if _discovery_service is None:
+            _discovery_service = DiscoveryService()
+        return _discovery_service
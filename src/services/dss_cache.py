@@ -0,0 +1,484 @@
+"""
+DSS 图像缓存
+
+取代 temp/ 目录下无限增长的 dss_image_*.gif：
+  - 网格空间索引：与已有图像中心相距不超过视场一定比例（reuse_fraction）的请求直接复用
+  - 磁盘按总大小和条目数做 LRU 淘汰
+  - 内存中保留最近使用的已解码 QImage
+  - manifest.json 记录缓存条目，重启后继续有效
+
+坐标约定：赤经以小时为单位（与望远镜 rightascension 一致），赤纬以度为单位。
+"""
+import glob
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import requests
+from PyQt5.QtCore import QThread, pyqtSignal
+from PyQt5.QtGui import QImage
+
+from src.config.config_service import get_config_service
+from src.utils.coordinates import angular_separation, parse_dec_degrees, parse_ra_hours
+
+logger = logging.getLogger(__name__)
+
+DSS_URL = 'https://archive.stsci.edu/cgi-bin/dss_search'
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+
+# 默认设置，可被配置 dss_cache 段覆盖
+DEFAULT_SETTINGS = {
+    'cache_dir': os.path.join('temp', 'dss_cache'),
+    'max_bytes': 64 * 1024 * 1024,
+    'max_entries': 400,
+    'memory_items': 8,
+    'fov_arcmin': 15.0,
+    'reuse_fraction': 0.1,
+    'url': DSS_URL,
+    'timeout': 20,
+}
+
+def dss_reuse_radius(settings: Optional[Dict[str, Any]] = None) -> float:
+    """缓存图像可以复用的最大中心距离（度）：视场的 reuse_fraction 倍"""
+    merged = dict(DEFAULT_SETTINGS)
+    merged.update(settings or {})
+    return float(merged['fov_arcmin']) / 60.0 * float(merged['reuse_fraction'])
+
+
+# 旧版 DSSImageFetcher 的文件名：dss_image_{r}_{d}.gif
+LEGACY_PATTERN = re.compile(r'dss_image_(-?\d+(?:\.\d+)?)_(-?\d+(?:\.\d+)?)\.gif$')
+
+
+class SkyGridIndex:
+    """
+    天球网格空间索引
+
+    按赤纬分带，每带按 cos(dec) 划分赤经格，格子边长约等于匹配半径，
+    查询时只检查相邻的格子（靠近极点时按实际角宽扩大范围）。
+    """
+
+    def __init__(self, cell_deg: float):
+        self.cell_deg = max(cell_deg, 1e-3)
+        self.band_count = int(math.ceil(180.0 / self.cell_deg))
+        self._cells: Dict[Tuple[int, int], set] = {}
+
+    def _band(self, dec_deg: float) -> int:
+        return min(self.band_count - 1, max(0, int((dec_deg + 90.0) / self.cell_deg)))
+
+    def _ra_cells(self, band: int) -> int:
+        dec_center = -90.0 + (band + 0.5) * self.cell_deg
+        return max(1, int(360.0 * math.cos(math.radians(dec_center)) / self.cell_deg))
+
+    def _cell(self, ra_deg: float, dec_deg: float) -> Tuple[int, int]:
+        band = self._band(dec_deg)
+        n = self._ra_cells(band)
+        return band, int((ra_deg % 360.0) / 360.0 * n) % n
+
+    def add(self, key: str, ra_deg: float, dec_deg: float):
+        self._cells.setdefault(self._cell(ra_deg, dec_deg), set()).add(key)
+
+    def remove(self, key: str, ra_deg: float, dec_deg: float):
+        cell = self._cell(ra_deg, dec_deg)
+        keys = self._cells.get(cell)
+        if keys:
+            keys.discard(key)
+            if not keys:
+                del self._cells[cell]
+
+    def candidates(self, ra_deg: float, dec_deg: float) -> List[str]:
+        """返回查询点附近格子中的所有条目"""
+        band = self._band(dec_deg)
+        result = []
+        for b in range(band - 1, band + 2):
+            if b < 0 or b >= self.band_count:
+                continue
+            n = self._ra_cells(b)
+            index = int((ra_deg % 360.0) / 360.0 * n) % n
+            # 靠近极点一侧的格子实际角宽小于 cell_deg，需要多检查几格
+            dec_edge = min(89.999, max(abs(-90.0 + b * self.cell_deg), abs(-90.0 + (b + 1) * self.cell_deg)))
+            width = 360.0 * math.cos(math.radians(dec_edge)) / n
+            reach = min(n // 2, int(math.ceil(self.cell_deg / width)))
+            for i in {(index + offset) % n for offset in range(-reach, reach + 1)}:
+                result.extend(self._cells.get((b, i), ()))
+        return result
+
+
+class DSSImageCache:
+    """
+    DSS 图像缓存（线程安全）
+
+    用法:
+        path = get_dss_cache().get_path(ra_hours, dec_deg)   # 命中缓存时不访问网络
+        image = get_dss_cache().get_image(ra_hours, dec_deg)
+    """
+
+    def __init__(self, settings: Optional[Dict[str, Any]] = None,
+                 download: Optional[Callable[[float, float, float], bytes]] = None):
+        """
+        初始化缓存
+
+        Args:
+            settings: 覆盖 DEFAULT_SETTINGS 的设置
+            download: 自定义下载函数 (ra_deg, dec_deg, fov_arcmin) -> GIF 字节，为空时访问 DSS 服务
+        """
+        self.settings = dict(DEFAULT_SETTINGS)
+        if settings:
+            self.settings.update(settings)
+        self.cache_dir = self.settings['cache_dir']
+        self.fov_arcmin = float(self.settings['fov_arcmin'])
+        self.reuse_radius = dss_reuse_radius(self.settings)
+        self._download = download or self._download_from_dss
+        self._session = None
+
+        self._lock = threading.RLock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._index = SkyGridIndex(self.reuse_radius)
+        self._memory = OrderedDict()
+        self._inflight: Dict[str, threading.Event] = {}
+        self._dirty = False
+        self.stats = {'hits': 0, 'memory_hits': 0, 'misses': 0, 'downloads': 0, 'evictions': 0}
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load_manifest()
+
+    # ------------------------------------------------------------------
+    # 清单
+    # ------------------------------------------------------------------
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.cache_dir, MANIFEST_NAME)
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            manifest = {}
+        except (OSError, ValueError) as e:
+            logger.warning("DSS 缓存清单损坏，将重新建立: %s", e)
+            manifest = {}
+
+        for key, entry in manifest.get('entries', {}).items():
+            path = os.path.join(self.cache_dir, entry.get('file', ''))
+            if os.path.exists(path):
+                self._add_entry(key, entry)
+            else:
+                self._dirty = True
+
+        # 清理清单中没有记录的文件（例如上次写清单前进程退出）
+        known = {entry['file'] for entry in self._entries.values()}
+        for path in glob.glob(os.path.join(self.cache_dir, '*.gif')):
+            if os.path.basename(path) not in known:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _save_manifest(self):
+        manifest = {'version': MANIFEST_VERSION, 'entries': self._entries}
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, self.manifest_path)
+        self._dirty = False
+
+    def flush(self):
+        """把最近的访问时间等变更写入清单"""
+        with self._lock:
+            if self._dirty:
+                self._save_manifest()
+
+    # ------------------------------------------------------------------
+    # 查找与淘汰
+    # ------------------------------------------------------------------
+    def _add_entry(self, key: str, entry: Dict[str, Any]):
+        self._entries[key] = entry
+        self._index.add(key, entry['ra_deg'], entry['dec_deg'])
+
+    def _remove_entry(self, key: str):
+        entry = self._entries.pop(key)
+        self._index.remove(key, entry['ra_deg'], entry['dec_deg'])
+        self._memory.pop(key, None)
+        try:
+            os.remove(os.path.join(self.cache_dir, entry['file']))
+        except OSError:
+            pass
+
+    def lookup(self, ra_hours: float, dec_deg: float) -> Optional[Dict[str, Any]]:
+        """查找可复用的缓存条目（中心距离在复用半径内且视场相同），不访问网络"""
+        ra_deg = ra_hours * 15.0
+        best, best_sep = None, None
+        with self._lock:
+            for key in self._index.candidates(ra_deg, dec_deg):
+                entry = self._entries[key]
+                if abs(entry['fov_arcmin'] - self.fov_arcmin) > 1e-6:
+                    continue
+                sep = angular_separation(ra_deg, dec_deg, entry['ra_deg'], entry['dec_deg'])
+                if sep <= self.reuse_radius and (best_sep is None or sep < best_sep):
+                    best, best_sep = key, sep
+            if best is None:
+                return None
+            entry = self._entries[best]
+            entry['last_access'] = time.time()
+            entry['hits'] = entry.get('hits', 0) + 1
+            self._dirty = True
+            return dict(entry, key=best)
+
+    def _evict(self, keep: Optional[str] = None):
+        """按最近访问时间淘汰到容量以内；keep 为刚写入、即将返回给调用方的条目，不淘汰"""
+        max_bytes = int(self.settings['max_bytes'])
+        max_entries = int(self.settings['max_entries'])
+        total = sum(entry['size'] for entry in self._entries.values())
+        if total <= max_bytes and len(self._entries) <= max_entries:
+            return
+        for key in sorted(self._entries, key=lambda k: self._entries[k]['last_access']):
+            if total <= max_bytes and len(self._entries) <= max_entries:
+                break
+            if key == keep:
+                continue
+            total -= self._entries[key]['size']
+            self._remove_entry(key)
+            self.stats['evictions'] += 1
+
+    @property
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(entry['size'] for entry in self._entries.values())
+
+    def __len__(self):
+        return len(self._entries)
+
+    # ------------------------------------------------------------------
+    # 获取
+    # ------------------------------------------------------------------
+    def _download_from_dss(self, ra_deg: float, dec_deg: float, fov_arcmin: float) -> bytes:
+        if self._session is None:
+            self._session = requests.Session()
+        params = {
+            'r': f"{ra_deg:.6f}",
+            'd': f"{dec_deg:.6f}",
+            'e': 'J2000',
+            'h': fov_arcmin,
+            'w': fov_arcmin,
+            'f': 'gif',
+            'v': 1,
+            'format': 'GIF',
+        }
+        response = self._session.get(self.settings['url'], params=params, timeout=self.settings['timeout'])
+        response.raise_for_status()
+        return response.content
+
+    def store(self, ra_deg: float, dec_deg: float, data: bytes, fov_arcmin: Optional[float] = None) -> str:
+        """写入一张图像并返回文件路径（淘汰旧条目时保留刚写入的这一张）"""
+        fov = self.fov_arcmin if fov_arcmin is None else fov_arcmin
+        key = f"{ra_deg:.4f}_{dec_deg:+.4f}_{fov:g}"
+        file_name = f"dss_{key}.gif"
+        tmp_path = os.path.join(self.cache_dir, file_name + '.part')
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, os.path.join(self.cache_dir, file_name))
+        now = time.time()
+        with self._lock:
+            if key in self._entries:
+                self._index.remove(key, self._entries[key]['ra_deg'], self._entries[key]['dec_deg'])
+            self._add_entry(key, {
+                'file': file_name,
+                'ra_deg': ra_deg,
+                'dec_deg': dec_deg,
+                'fov_arcmin': fov,
+                'size': len(data),
+                'created': now,
+                'last_access': now,
+                'hits': 0,
+            })
+            self._memory.pop(key, None)
+            self._evict(keep=key)
+            self._save_manifest()
+            return os.path.join(self.cache_dir, self._entries[key]['file'])
+
+    def get_path(self, ra_hours, dec_deg, fetch: bool = True) -> Optional[str]:
+        """
+        获取覆盖指定坐标的图像文件路径
+
+        Args:
+            ra_hours: 赤经（小时，或 'HH:MM:SS'）
+            dec_deg: 赤纬（度，或 '±DD:MM:SS'）
+            fetch: 未命中时是否下载
+
+        Returns:
+            图像路径，未命中且不下载或下载失败时为 None
+        """
+        ra_hours, dec_deg = parse_ra_hours(ra_hours), parse_dec_degrees(dec_deg)
+        entry = self.lookup(ra_hours, dec_deg)
+        if entry is not None:
+            with self._lock:
+                self.stats['hits'] += 1
+            return os.path.join(self.cache_dir, entry['file'])
+        with self._lock:
+            self.stats['misses'] += 1
+        if not fetch:
+            return None
+
+        # 同一视场的并发请求只下载一次
+        ra_deg = ra_hours * 15.0
+        slot = f"{round(ra_deg / self.reuse_radius)}_{round(dec_deg / self.reuse_radius)}"
+        with self._lock:
+            event = self._inflight.get(slot)
+            owner = event is None
+            if owner:
+                event = self._inflight[slot] = threading.Event()
+        if not owner:
+            event.wait(float(self.settings['timeout']) * 2)
+            entry = self.lookup(ra_hours, dec_deg)
+            return os.path.join(self.cache_dir, entry['file']) if entry else None
+
+        try:
+            data = self._download(ra_deg, dec_deg, self.fov_arcmin)
+            with self._lock:
+                self.stats['downloads'] += 1
+            return self.store(ra_deg, dec_deg, data)
+        except Exception as e:
+            logger.error("获取DSS图像失败: %s", e)
+            return None
+        finally:
+            with self._lock:
+                self._inflight.pop(slot, None)
+            event.set()
+
+    def get_image(self, ra_hours, dec_deg, fetch: bool = True) -> Optional[QImage]:
+        """获取覆盖指定坐标的已解码图像，优先使用内存缓存"""
+        ra, dec = parse_ra_hours(ra_hours), parse_dec_degrees(dec_deg)
+        entry = self.lookup(ra, dec)
+        if entry is not None:
+            with self._lock:
+                image = self._memory.get(entry['key'])
+                if image is not None:
+                    self._memory.move_to_end(entry['key'])
+                    self.stats['memory_hits'] += 1
+                    return image
+        path = self.get_path(ra, dec, fetch)
+        if path is None:
+            return None
+        image = QImage(path)
+        if image.isNull():
+            return None
+        key = os.path.basename(path)[len('dss_'):-len('.gif')]
+        with self._lock:
+            self._memory[key] = image
+            self._memory.move_to_end(key)
+            while len(self._memory) > int(self.settings['memory_items']):
+                self._memory.popitem(last=False)
+        return image
+
+    def adopt_legacy(self, directory: str = 'temp') -> int:
+        """
+        收编旧版 DSSImageFetcher 留下的 dss_image_*.gif
+
+        旧版直接把小时制赤经作为度数传给 DSS 服务，文件实际覆盖的天区是 (r°, d°)，
+        因此按文件名中的数值作为度数登记，避免把错误天区的图像当作目标天区使用。
+
+        Returns:
+            收编的文件数
+        """
+        adopted = 0
+        for path in glob.glob(os.path.join(directory, 'dss_image_*.gif')):
+            match = LEGACY_PATTERN.search(os.path.basename(path))
+            if not match:
+                continue
+            ra_deg, dec_deg = float(match.group(1)), float(match.group(2))
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                if self.lookup(ra_deg / 15.0, dec_deg) is None:
+                    self.store(ra_deg, dec_deg, data)
+                    adopted += 1
+                os.remove(path)
+            except OSError as e:
+                logger.warning("收编旧 DSS 图像失败 %s: %s", path, e)
+        if adopted:
+            logger.info("已收编 %d 张旧 DSS 图像", adopted)
+        return adopted
+
+
+_dss_cache: Optional[DSSImageCache] = None
+_dss_cache_lock = threading.Lock()
+
+
+def get_dss_cache() -> DSSImageCache:
+    """获取全局 DSS 图像缓存（首次使用时读取配置 dss_cache 段并收编 temp/ 下的旧文件）"""
+    global _dss_cache
+    if _dss_cache is None:
+        with _dss_cache_lock:
+            if _dss_cache is None:
+                settings = get_config_service().get('dss_cache', {})
+                cache = DSSImageCache(dict(settings))
+                cache.adopt_legacy('temp')
+                _dss_cache = cache
+    return _dss_cache
+
+
+class CachedDSSImageFetcher(QThread):
+    """
+    带缓存的 DSS 图像获取线程
+
+    接口与 DSSImageFetcher 相同：set_coordinates(ra, dec) 后在后台获取，完成后发出 image_ready(路径)。
+    连续设置坐标时只处理最新的一组。线程启动后一直等待新坐标，直到 stop()。
+    """
+    image_ready = pyqtSignal(str)
+
+    def __init__(self, cache: Optional[DSSImageCache] = None, parent=None):
+        super().__init__(parent)
+        self.cache = cache
+        self.ra = None
+        self.dec = None
+        self.running = True
+        self._condition = threading.Condition()
+        self._exiting = False
+
+    def set_coordinates(self, ra, dec):
+        """设置坐标（赤经小时、赤纬度，或 'HH:MM:SS' 字符串）并开始获取"""
+        with self._condition:
+            self.ra, self.dec = ra, dec
+            self.running = True
+            self._condition.notify()
+            restart = self._exiting or not self.isRunning()
+        if restart:
+            # stop() 之后线程可能还在退出，等它结束再重新启动，坐标不会丢失
+            self.wait()
+            self._exiting = False
+            self.start()
+
+    def stop(self):
+        with self._condition:
+            self.running = False
+            self._condition.notify()
+
+    def run(self):
+        cache = self.cache if self.cache is not None else get_dss_cache()
+        while True:
+            with self._condition:
+                while self.running and self.ra is None:
+                    self._condition.wait()
+                if not self.running:
+                    self._exiting = True
+                    break
+                ra, dec = self.ra, self.dec
+                self.ra = self.dec = None
+            try:
+                path = cache.get_path(ra, dec)
+                if path:
+                    self.image_ready.emit(path)
+            except Exception as e:
+                logger.error("获取DSS图像失败: %s", e)
+            with self._condition:
+                idle = self.ra is None
+            if idle:
+                cache.flush()
+        cache.flush()
@@ -0,0 +1,328 @@
+"""
+DSS 图像预取
+
+在 DSS 图像缓存之上增加带优先级的预取队列：
+  - 当前视场的请求走独立通道，不会排在预取任务之后
+  - 望远镜开始指向（slewing）时按目标坐标（targetrightascension/targetdeclination）预取
+  - 启动时可从目标列表文件预热缓存
+  - 预取任务按优先级由有限个工作线程并发下载
+
+PrefetchingDSSImageFetcher 保留 DSSImageFetcher 的接口（set_coordinates / image_ready / stop / wait），
+分阶段启动以它代替主窗口的 DSSImageFetcher，并用 connect_state_store 把状态中心的望远镜快照接入。
+"""
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from src.config.config_service import get_config_service
+from src.services.dss_cache import DSSImageCache, dss_reuse_radius, get_dss_cache
+from src.utils.coordinates import parse_dec_degrees, parse_ra_hours
+
+logger = logging.getLogger(__name__)
+
+# 判断开始指向所需的望远镜字段
+SLEW_FIELDS = ('slewing', 'targetrightascension', 'targetdeclination')
+
+# 优先级，数值越小越先执行
+PRIORITY_SLEW_TARGET = 0
+PRIORITY_NEARBY = 5
+PRIORITY_TARGET_LIST = 10
+
+DEFAULT_MAX_PARALLEL = 3
+
+
+def load_target_list(path: str) -> List[Tuple[str, float, float]]:
+    """
+    读取目标列表文件
+
+    每行一个目标：名称 赤经 赤纬，以空白或逗号分隔；赤经为小时或 'HH:MM:SS'，
+    赤纬为度或 '±DD:MM:SS'。# 开头的行为注释。
+
+    Returns:
+        [(名称, 赤经小时, 赤纬度)]
+    """
+    targets = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            parts = [p for p in line.replace(',', ' ').split() if p]
+            if len(parts) < 2:
+                continue
+            name = parts[0] if len(parts) >= 3 else f"target{line_number}"
+            try:
+                targets.append((name, parse_ra_hours(parts[-2]), parse_dec_degrees(parts[-1])))
+            except ValueError:
+                logger.warning("目标列表第 %d 行格式错误: %s", line_number, line)
+    return targets
+
+
+class PrefetchingDSSImageFetcher(QObject):
+    """
+    带预取队列的 DSS 图像获取器
+
+    信号:
+        image_ready(str): 当前视场的图像路径（与 DSSImageFetcher 相同）
+        prefetched(str, str): 预取完成 (原因, 路径)
+        queue_changed(int): 预取队列长度变化
+    """
+    image_ready = pyqtSignal(str)
+    prefetched = pyqtSignal(str, str)
+    queue_changed = pyqtSignal(int)
+
+    def __init__(self, cache: Optional[DSSImageCache] = None, max_parallel: Optional[int] = None,
+                 registry=None, parent=None):
+        """
+        初始化获取器
+
+        Args:
+            cache: DSS 图像缓存，为空时使用全局缓存
+            max_parallel: 预取并发数，为空时取配置 dss_prefetch.max_parallel
+            registry: Alpaca 客户端注册表，用于在指向开始时读取目标坐标，为空时使用全局注册表
+            parent: 父QObject
+        """
+        super().__init__(parent)
+        settings = get_config_service().get('dss_prefetch', {})
+        self.cache = cache
+        # 全局缓存在第一次下载时（后台线程中）才创建，入队去重不需要它
+        self.reuse_radius = cache.reuse_radius if cache is not None else dss_reuse_radius(
+            get_config_service().get('dss_cache', {}) or {})
+        self.max_parallel = max_parallel or int(settings.get('max_parallel', DEFAULT_MAX_PARALLEL))
+        self.registry = registry
+
+        self._lock = threading.Condition()
+        self._queue: List[tuple] = []
+        self._queued_slots = set()
+        self._seq = itertools.count()
+        self._running = True
+        self._workers: List[threading.Thread] = []
+
+        # 当前视场通道：只保留最新一组坐标
+        self._current: Optional[Tuple[float, float]] = None
+        self._current_event = threading.Event()
+        self._current_thread: Optional[threading.Thread] = None
+
+        self._was_slewing = False
+        self.stats = {'prefetched': 0, 'skipped': 0, 'failed': 0}
+
+    def _cache(self) -> DSSImageCache:
+        if self.cache is None:
+            self.cache = get_dss_cache()
+        return self.cache
+
+    def _slot(self, ra_hours: float, dec_deg: float) -> Tuple[int, int]:
+        radius = self.reuse_radius
+        return round(ra_hours * 15.0 / radius), round(dec_deg / radius)
+
+    def _ensure_threads(self):
+        if self._current_thread is None or not self._current_thread.is_alive():
+            self._current_thread = threading.Thread(target=self._current_loop, name='dss-current', daemon=True)
+            self._current_thread.start()
+        alive = [t for t in self._workers if t.is_alive()]
+        for i in range(len(alive), self.max_parallel):
+            worker = threading.Thread(target=self._prefetch_loop, name=f"dss-prefetch-{i}", daemon=True)
+            worker.start()
+            alive.append(worker)
+        self._workers = alive
+
+    # ------------------------------------------------------------------
+    # 当前视场
+    # ------------------------------------------------------------------
+    def set_coordinates(self, ra, dec):
+        """请求当前视场的图像（赤经小时、赤纬度，或 'HH:MM:SS' 字符串）"""
+        self._running = True
+        with self._lock:
+            self._current = (parse_ra_hours(ra), parse_dec_degrees(dec))
+        self._ensure_threads()
+        self._current_event.set()
+
+    def _current_loop(self):
+        while self._running:
+            self._current_event.wait(1.0)
+            self._current_event.clear()
+            with self._lock:
+                current, self._current = self._current, None
+            if current is None:
+                continue
+            try:
+                path = self._cache().get_path(*current)
+                if path:
+                    self.image_ready.emit(path)
+            except Exception as e:
+                logger.error("获取DSS图像失败: %s", e)
+
+    # ------------------------------------------------------------------
+    # 预取
+    # ------------------------------------------------------------------
+    def prefetch(self, ra, dec, priority: int = PRIORITY_NEARBY, reason: str = 'prefetch') -> bool:
+        """
+        把一个视场加入预取队列（不访问缓存，可在界面线程中调用；已缓存的视场由工作线程跳过）
+
+        Returns:
+            是否入队（已在队列中时返回 False）
+        """
+        ra_hours, dec_deg = parse_ra_hours(ra), parse_dec_degrees(dec)
+        slot = self._slot(ra_hours, dec_deg)
+        with self._lock:
+            if slot in self._queued_slots:
+                return False
+            self._queued_slots.add(slot)
+            heapq.heappush(self._queue, (priority, next(self._seq), ra_hours, dec_deg, reason, slot))
+            size = len(self._queue)
+            self._lock.notify()
+        self._running = True
+        self._ensure_threads()
+        self.queue_changed.emit(size)
+        return True
+
+    def _prefetch_loop(self):
+        while self._running:
+            with self._lock:
+                while self._running and not self._queue:
+                    self._lock.wait(1.0)
+                if not self._running:
+                    return
+                _, _, ra_hours, dec_deg, reason, slot = heapq.heappop(self._queue)
+                size = len(self._queue)
+            self.queue_changed.emit(size)
+            try:
+                cache = self._cache()
+                if cache.lookup(ra_hours, dec_deg) is not None:
+                    self.stats['skipped'] += 1
+                    continue
+                path = cache.get_path(ra_hours, dec_deg)
+                if path:
+                    self.stats['prefetched'] += 1
+                    self.prefetched.emit(reason, path)
+                else:
+                    self.stats['failed'] += 1
+            except Exception as e:
+                self.stats['failed'] += 1
+                logger.error("预取DSS图像失败: %s", e)
+            finally:
+                with self._lock:
+                    self._queued_slots.discard(slot)
+
+    @property
+    def queue_size(self) -> int:
+        with self._lock:
+            return len(self._queue)
+
+    def clear_queue(self, max_priority: Optional[int] = None):
+        """清空预取队列（可只清除优先级数值大于 max_priority 的任务）"""
+        with self._lock:
+            kept = [item for item in self._queue if max_priority is not None and item[0] <= max_priority]
+            self._queued_slots = {item[5] for item in kept}
+            self._queue = kept
+            heapq.heapify(self._queue)
+            size = len(self._queue)
+        self.queue_changed.emit(size)
+
+    # ------------------------------------------------------------------
+    # 数据来源
+    # ------------------------------------------------------------------
+    def on_telescope_snapshot(self, snapshot: Dict[str, Any]):
+        """
+        处理望远镜快照（可连接 PollingMonitor.snapshot_updated 中 'telescope' 的数据）
+
+        开始指向时按目标坐标预取；快照中没有目标坐标时在后台从设备读取一次。
+        """
+        slewing = bool(snapshot.get('slewing'))
+        started = slewing and not self._was_slewing
+        self._was_slewing = slewing
+        if not slewing:
+            return
+        ra = snapshot.get('targetrightascension')
+        dec = snapshot.get('targetdeclination')
+        if ra is not None and dec is not None:
+            self.prefetch(ra, dec, PRIORITY_SLEW_TARGET, 'slew')
+        elif started:
+            threading.Thread(target=self._prefetch_slew_target_from_device,
+                             name='dss-slew-target', daemon=True).start()
+
+    def _prefetch_slew_target_from_device(self):
+        if self.registry is None:
+            from src.services.alpaca_registry import alpaca_registry
+            self.registry = alpaca_registry
+        try:
+            client = self.registry.client_for_device('telescope')
+            values = client.get_multiple('telescope', self.registry.device_number_for('telescope'),
+                                         ['targetrightascension', 'targetdeclination'])
+        except Exception as e:
+            logger.warning("读取望远镜目标坐标失败: %s", e)
+            return
+        ra, dec = values.get('targetrightascension'), values.get('targetdeclination')
+        if ra is not None and dec is not None:
+            self.prefetch(ra, dec, PRIORITY_SLEW_TARGET, 'slew')
+
+    def warm_from_target_list(self, path: Optional[str] = None) -> int:
+        """
+        从目标列表文件预热缓存
+
+        Args:
+            path: 文件路径，为空时取配置 dss_prefetch.target_list
+
+        Returns:
+            入队的目标数
+        """
+        path = path or get_config_service().get('dss_prefetch.target_list')
+        if not path or not os.path.exists(path):
+            return 0
+        queued = 0
+        for name, ra_hours, dec_deg in load_target_list(path):
+            if self.prefetch(ra_hours, dec_deg, PRIORITY_TARGET_LIST, f"target:{name}"):
+                queued += 1
+        logger.info("已从目标列表 %s 加入 %d 个预取任务", path, queued)
+        return queued
+
+    def stop(self):
+        """停止所有线程并写入缓存清单"""
+        self._running = False
+        self._current_event.set()
+        with self._lock:
+            self._lock.notify_all()
+        if self.cache is not None:
+            self.cache.flush()
+
+    def isRunning(self) -> bool:
+        """与 QThread 接口保持一致"""
+        return self._running and any(t.is_alive() for t in self._workers + [self._current_thread] if t)
+
+    def wait(self, msecs: Optional[int] = None) -> bool:
+        """
+        等待所有线程退出（与 QThread.wait 接口保持一致，主窗口关闭时在 stop() 之后调用）
+
+        Args:
+            msecs: 最长等待毫秒数，为空时一直等待
+
+        Returns:
+            线程是否都已退出
+        """
+        deadline = None if msecs is None else time.monotonic() + msecs / 1000.0
+        for thread in self._workers + [self._current_thread]:
+            if thread is None:
+                continue
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        return not any(t.is_alive() for t in self._workers + [self._current_thread] if t)
+
+
+def connect_state_store(fetcher: PrefetchingDSSImageFetcher, store) -> Callable[[], None]:
+    """
+    把状态中心的望远镜快照接到 fetcher.on_telescope_snapshot
+
+    Args:
+        fetcher: 预取获取器
+        store: 状态中心（StateStore）
+
+    Returns:
+        取消订阅的函数
+    """
+    return store.subscribe('telescope', lambda snapshot, changed: fetcher.on_telescope_snapshot(snapshot.as_dict()),
+                           fields=SLEW_FIELDS)
@@ -0,0 +1,369 @@
+"""
+星历缓存
+
+界面每秒刷新一次时间信息，而固定站址（TELESCOPE_CONFIG）的日出日落、晨昏蒙影时刻每天只变化一次，
+月相也变化得很慢，没有必要在每次时钟刷新时重新计算。
+
+本模块按观测夜（TIMEZONE 时区的当天中午到次日中午）用 numpy 在时间网格上一次性批量计算太阳高度角和
+日月角距，由网格求出日落、昏影终、晨光始和日出时刻并缓存；每次刷新只做一次网格插值和字符串格式化，
+耗时为微秒级。过了午夜仍显示当晚的日落和晨昏蒙影时刻，到中午才切换到下一夜重新计算。
+
+返回值的格式与 astronomy_service 中的同名方法一致，可直接替换:
+    get_sun_info()         -> {'sunrise': 'HH:MM:SS', 'sunset': 'HH:MM:SS', 'altitude': '12.34°'}
+    get_twilight_info()    -> {'morning': 'HH:MM:SS', 'evening': 'HH:MM:SS'}
+    calculate_moon_phase() -> 0~1（0 为新月，0.5 为满月），保留两位小数
+
+太阳位置采用低精度的解析公式（误差约 0.01°），月球黄经采用主要周期项展开（误差约 0.3°），
+对界面显示足够；安装了 astropy 时可用 compare_with_astropy() 核对。
+"""
+import logging
+import math
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pytz
+
+from src.config.settings import TELESCOPE_CONFIG, TIMEZONE
+
+logger = logging.getLogger(__name__)
+
+# 时间网格步长（秒）
+DEFAULT_GRID_STEP = 120
+# 网格在观测夜前后各多覆盖的时长（秒），保证边界附近的插值和求根不越界
+GRID_MARGIN = 6 * 3600
+
+# 日出日落的太阳中心高度（含大气折射和太阳视半径）
+SUNRISE_ALTITUDE = -0.833
+# 天文晨昏蒙影
+ASTRONOMICAL_TWILIGHT_ALTITUDE = -18.0
+
+UNKNOWN_TIME = '--:--:--'
+
+J2000 = 2451545.0
+UNIX_EPOCH_JD = 2440587.5
+
+
+def julian_date(unix_seconds):
+    """Unix 时间戳（秒，可为数组）转儒略日"""
+    return np.asarray(unix_seconds, dtype=float) / 86400.0 + UNIX_EPOCH_JD
+
+
+def sun_position(jd) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    太阳的低精度位置
+
+    Args:
+        jd: 儒略日（可为数组）
+
+    Returns:
+        (黄经度, 赤经度, 赤纬度)
+    """
+    n = np.asarray(jd, dtype=float) - J2000
+    mean_longitude = 280.460 + 0.9856474 * n
+    g = np.radians(357.528 + 0.9856003 * n)
+    longitude = np.radians(mean_longitude + 1.915 * np.sin(g) + 0.020 * np.sin(2 * g))
+    obliquity = np.radians(23.439 - 4.0e-7 * n)
+    ra = np.degrees(np.arctan2(np.cos(obliquity) * np.sin(longitude), np.cos(longitude)))
+    dec = np.degrees(np.arcsin(np.sin(obliquity) * np.sin(longitude)))
+    return np.degrees(longitude) % 360.0, ra % 360.0, dec
+
+
+def moon_ecliptic_longitude(jd) -> np.ndarray:
+    """月球的视黄经（度），取主要周期项"""
+    t = (np.asarray(jd, dtype=float) - J2000) / 36525.0
+    terms = (
+        (6.29, 134.9, 477198.85),
+        (-1.27, 259.2, -413335.38),
+        (0.66, 235.7, 890534.23),
+        (0.21, 269.9, 954397.70),
+        (-0.19, 357.5, 35999.05),
+        (-0.11, 186.6, 966404.05),
+    )
+    longitude = 218.32 + 481267.881 * t
+    for amplitude, phase, rate in terms:
+        longitude = longitude + amplitude * np.sin(np.radians(phase + rate * t))
+    return longitude % 360.0
+
+
+def sun_altitude(jd, latitude: float, longitude: float) -> np.ndarray:
+    """
+    太阳中心的地平高度角（度，不含大气折射）
+
+    Args:
+        jd: 儒略日（可为数组）
+        latitude: 站址纬度（度）
+        longitude: 站址经度（度，东经为正）
+    """
+    jd = np.asarray(jd, dtype=float)
+    _, ra, dec = sun_position(jd)
+    gmst = 280.46061837 + 360.98564736629 * (jd - J2000)
+    hour_angle = np.radians(gmst + longitude - ra)
+    lat = math.radians(latitude)
+    dec = np.radians(dec)
+    return np.degrees(np.arcsin(math.sin(lat) * np.sin(dec) + math.cos(lat) * np.cos(dec) * np.cos(hour_angle)))
+
+
+def moon_elongation(jd) -> np.ndarray:
+    """月球与太阳的黄经差（度，0~360），0 为新月，180 为满月"""
+    sun_longitude, _, _ = sun_position(jd)
+    return (moon_ecliptic_longitude(jd) - sun_longitude) % 360.0
+
+
+def find_crossings(times: np.ndarray, values: np.ndarray, threshold: float) -> List[Tuple[float, bool]]:
+    """
+    求采样序列穿过阈值的时刻（相邻采样间线性插值）
+
+    Returns:
+        [(时刻, 是否为上升穿越)]
+    """
+    above = values >= threshold
+    indices = np.nonzero(above[1:] != above[:-1])[0]
+    crossings = []
+    for i in indices:
+        v0, v1 = values[i], values[i + 1]
+        fraction = (threshold - v0) / (v1 - v0)
+        crossings.append((float(times[i] + fraction * (times[i + 1] - times[i])), bool(v1 > v0)))
+    return crossings
+
+
+# 观测夜的分界（本地时刻的小时）
+NIGHT_BOUNDARY_HOUR = 12
+
+
+class DayEphemeris:
+    """一个观测夜的星历表：时间网格上的太阳高度、日月角距以及各事件时刻（date 为傍晚的日期）"""
+
+    __slots__ = ('date', 'start', 'end', 't0', 'step', 'altitudes', 'elongations',
+                 'sunrise', 'sunset', 'dawn', 'dusk', 'events')
+
+    def __init__(self, date, start: float, end: float, t0: float, step: float,
+                 altitudes: List[float], elongations: List[float], events: Dict[str, Optional[float]],
+                 tz):
+        self.date = date
+        self.start = start
+        self.end = end
+        self.t0 = t0
+        self.step = step
+        # 使用 Python 列表而不是 numpy 数组：单点取值时列表索引快一个数量级
+        self.altitudes = altitudes
+        self.elongations = elongations
+        self.events = events
+        self.sunrise = self._format(events.get('sunrise'), tz)
+        self.sunset = self._format(events.get('sunset'), tz)
+        self.dawn = self._format(events.get('dawn'), tz)
+        self.dusk = self._format(events.get('dusk'), tz)
+
+    @staticmethod
+    def _format(timestamp: Optional[float], tz) -> str:
+        if timestamp is None:
+            return UNKNOWN_TIME
+        return datetime.fromtimestamp(round(timestamp), tz).strftime('%H:%M:%S')
+
+    def covers(self, t: float) -> bool:
+        return self.start <= t < self.end
+
+    def _interpolate(self, series: List[float], t: float) -> float:
+        position = (t - self.t0) / self.step
+        i = int(position)
+        if i < 0:
+            return series[0]
+        if i >= len(series) - 1:
+            return series[-1]
+        v0 = series[i]
+        return v0 + (series[i + 1] - v0) * (position - i)
+
+    def sun_altitude(self, t: float) -> float:
+        return self._interpolate(self.altitudes, t)
+
+    def moon_elongation(self, t: float) -> float:
+        # 网格上的角距已展开为连续值，插值后再取模
+        return self._interpolate(self.elongations, t) % 360.0
+
+
+class EphemerisCache:
+    """
+    固定站址的星历缓存
+
+    用法:
+        cache = get_ephemeris_cache()
+        sun_info = cache.get_sun_info()          # 每秒调用，只做插值
+        twilight_info = cache.get_twilight_info()
+        moon_phase = cache.calculate_moon_phase()
+    """
+
+    def __init__(self, latitude: Optional[float] = None, longitude: Optional[float] = None,
+                 tz_name: Optional[str] = None, grid_step: float = DEFAULT_GRID_STEP,
+                 twilight_altitude: float = ASTRONOMICAL_TWILIGHT_ALTITUDE):
+        """
+        初始化星历缓存
+
+        Args:
+            latitude: 站址纬度，为空时取 TELESCOPE_CONFIG
+            longitude: 站址经度，为空时取 TELESCOPE_CONFIG
+            tz_name: 计算日期和显示时刻所用的时区，为空时取 TIMEZONE
+            grid_step: 时间网格步长（秒）
+            twilight_altitude: 晨昏蒙影的太阳高度（度），默认天文晨昏蒙影 -18°
+        """
+        self.latitude = float(TELESCOPE_CONFIG['latitude'] if latitude is None else latitude)
+        self.longitude = float(TELESCOPE_CONFIG['longitude'] if longitude is None else longitude)
+        self.tz = pytz.timezone(tz_name or TIMEZONE)
+        self.grid_step = float(grid_step)
+        self.twilight_altitude = float(twilight_altitude)
+        self._lock = threading.Lock()
+        self._day: Optional[DayEphemeris] = None
+        self.recomputes = 0
+
+    # ------------------------------------------------------------------
+    # 批量计算
+    # ------------------------------------------------------------------
+    def _night_bounds(self, t: float) -> Tuple[object, float, float]:
+        local = datetime.fromtimestamp(t, self.tz)
+        date = local.date()
+        if local.hour < NIGHT_BOUNDARY_HOUR:
+            # 午夜之后、中午之前仍属于前一天傍晚开始的观测夜
+            date -= timedelta(days=1)
+        noon = datetime(date.year, date.month, date.day, NIGHT_BOUNDARY_HOUR)
+        start = self.tz.localize(noon)
+        end = self.tz.localize(noon + timedelta(days=1))
+        return date, start.timestamp(), end.timestamp()
+
+    def compute_day(self, t: float) -> DayEphemeris:
+        """计算包含时刻 t 的观测夜（本地中午到次日中午）的星历表"""
+        date, start, end = self._night_bounds(t)
+        t0 = start - GRID_MARGIN
+        count = int(math.ceil((end - start + 2 * GRID_MARGIN) / self.grid_step)) + 1
+        times = t0 + np.arange(count) * self.grid_step
+        jd = julian_date(times)
+
+        altitudes = sun_altitude(jd, self.latitude, self.longitude)
+        elongations = np.degrees(np.unwrap(np.radians(moon_elongation(jd))))
+
+        def first(threshold, rising):
+            for when, up in find_crossings(times, altitudes, threshold):
+                if up == rising and start <= when < end:
+                    return when
+            return None
+
+        events = {
+            'sunset': first(SUNRISE_ALTITUDE, False),
+            'dusk': first(self.twilight_altitude, False),
+            'dawn': first(self.twilight_altitude, True),
+            'sunrise': first(SUNRISE_ALTITUDE, True),
+        }
+        return DayEphemeris(date, start, end, t0, self.grid_step,
+                            altitudes.tolist(), elongations.tolist(), events, self.tz)
+
+    def day(self, t: Optional[float] = None) -> DayEphemeris:
+        """返回包含时刻 t 的观测夜的星历表，过了中午切换到下一夜时重新计算"""
+        if t is None:
+            t = time.time()
+        day = self._day
+        if day is not None and day.covers(t):
+            return day
+        with self._lock:
+            day = self._day
+            if day is None or not day.covers(t):
+                start = time.perf_counter()
+                day = self.compute_day(t)
+                self._day = day
+                self.recomputes += 1
+                logger.debug("已计算 %s 夜的星历表，耗时 %.1f ms", day.date, (time.perf_counter() - start) * 1000)
+        return day
+
+    def invalidate(self):
+        """丢弃缓存（例如修改站址后）"""
+        with self._lock:
+            self._day = None
+
+    # ------------------------------------------------------------------
+    # 单点查询
+    # ------------------------------------------------------------------
+    def sun_altitude(self, t: Optional[float] = None) -> float:
+        """太阳高度角（度）"""
+        if t is None:
+            t = time.time()
+        return self.day(t).sun_altitude(t)
+
+    def moon_phase(self, t: Optional[float] = None) -> float:
+        """月相（0~1，0 为新月，0.5 为满月）"""
+        if t is None:
+            t = time.time()
+        return self.day(t).moon_elongation(t) / 360.0
+
+    # ------------------------------------------------------------------
+    # 与 astronomy_service 相同格式的接口
+    # ------------------------------------------------------------------
+    def get_current_time(self) -> Dict[str, str]:
+        """获取当前 UTC 和 UTC+8 时间"""
+        now = datetime.now(timezone.utc)
+        return {
+            'utc': now.strftime('%Y-%m-%d %H:%M:%S'),
+            'utc8': now.astimezone(timezone(timedelta(hours=8))).strftime('%Y-%m-%d %H:%M:%S'),
+        }
+
+    def get_sun_info(self, t: Optional[float] = None) -> Dict[str, str]:
+        """获取日出、日落时刻和当前太阳高度角"""
+        if t is None:
+            t = time.time()
+        day = self.day(t)
+        return {
+            'sunrise': day.sunrise,
+            'sunset': day.sunset,
+            'altitude': f"{day.sun_altitude(t):.2f}°",
+        }
+
+    def get_twilight_info(self, t: Optional[float] = None) -> Dict[str, str]:
+        """获取晨光始和昏影终时刻"""
+        day = self.day(t)
+        return {
+            'morning': day.dawn,
+            'evening': day.dusk,
+        }
+
+    def calculate_moon_phase(self, t: Optional[float] = None) -> float:
+        """计算月相"""
+        return round(self.moon_phase(t), 2)
+
+
+def compare_with_astropy(cache: EphemerisCache, samples: int = 48) -> Optional[Dict[str, float]]:
+    """
+    用 astropy 核对太阳高度角和日月角距
+
+    Args:
+        cache: 星历缓存
+        samples: 在当前观测夜均匀取样的点数
+
+    Returns:
+        {'max_altitude_error': 度, 'max_elongation_error': 度}；未安装 astropy 时返回 None
+    """
+    try:
+        import astropy.units as u
+        from astropy.coordinates import AltAz, EarthLocation, get_body, get_sun
+        from astropy.time import Time
+    except ImportError:
+        return None
+
+    day = cache.day()
+    times = np.linspace(day.start, day.end, samples, endpoint=False)
+    obstime = Time(times, format='unix')
+    location = EarthLocation(lat=cache.latitude * u.deg, lon=cache.longitude * u.deg)
+    sun = get_sun(obstime)
+    moon = get_body('moon', obstime, location)
+    altitudes = sun.transform_to(AltAz(obstime=obstime, location=location)).alt.deg
+    elongations = (moon.geocentrictrueecliptic.lon.deg - sun.geocentrictrueecliptic.lon.deg) % 360.0
+
+    altitude_error = max(abs(day.sun_altitude(t) - a) for t, a in zip(times, altitudes))
+    elongation_error = max(abs((day.moon_elongation(t) - e + 180.0) % 360.0 - 180.0)
+                           for t, e in zip(times, elongations))
+    return {'max_altitude_error': altitude_error, 'max_elongation_error': elongation_error}
+
+
+ephemeris_cache = EphemerisCache()
+
+
+def get_ephemeris_cache() -> EphemerisCache:
+    """获取全局星历缓存"""
+    return ephemeris_cache
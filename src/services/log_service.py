@@ -0,0 +1,372 @@
+"""
+日志服务
+
+主窗口的 update_weather_info、update_cooler_status、update_rotator_status 等方法每个周期都 print 多行，
+异常堆栈也直接打印到控制台，整夜运行时占用可观的界面线程时间并产生巨大的控制台输出。
+
+setup_logging() 建立统一的日志体系：
+  - 调用方线程只把日志记录放入队列（QueueHandler），由后台线程写入 logs/ 下按大小轮转的文件，
+    控制台只输出 WARNING 以上
+  - 按模块设置级别（config.yaml logging.levels），修改配置后立即生效
+  - 同一模块、同一级别、同一消息模板（数字视为相同）的日志在 rate_limit.interval 秒内最多输出
+    rate_limit.burst 条，其余计数，窗口结束后的下一条附带省略条数
+  - 可选把 print 的输出（sys.stdout）转为 'stdout' 日志（默认 INFO：只写入文件，不出现在控制台）、
+    sys.stderr 转为 'stderr' 日志；级别未启用时每次写入只做一次级别判断，几乎没有开销
+
+用法（在程序入口处、创建窗口之前调用）:
+    from src.services.log_service import setup_logging
+    setup_logging()
+"""
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from src.config.config_service import get_config_service
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS = {
+    'level': 'INFO',
+    'console_level': 'WARNING',
+    'dir': 'logs',
+    'file': 'tianyu.log',
+    'max_bytes': 5 * 1024 * 1024,
+    'backup_count': 5,
+    'levels': {},
+    'rate_limit': {'interval': 60.0, 'burst': 5},
+    'capture_print': True,
+    'print_level': 'INFO',
+    'capture_stderr': True,
+}
+
+LOG_FORMAT = '%(asctime)s %(levelname)s [%(threadName)s] %(name)s: %(message)s'
+
+_NUMBER_PATTERN = re.compile(r'[-+]?\d+(?:\.\d+)?')
+
+
+def _level(value: Any, default: int = logging.INFO) -> int:
+    """'DEBUG' / 10 等形式的级别转换为整数"""
+    if isinstance(value, int):
+        return value
+    level = logging.getLevelName(str(value).upper())
+    return level if isinstance(level, int) else default
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    重复日志限流
+
+    以（模块, 级别, 消息模板）为键，每个键在 interval 秒的窗口内最多放行 burst 条；
+    消息模板取 record.msg 并把其中的数字替换为 '#'，因此只有数值不同的 print 输出也视为重复。
+    """
+
+    def __init__(self, interval: float = 60.0, burst: int = 5, max_keys: int = 2048):
+        """
+        Args:
+            interval: 限流窗口（秒），0 表示不限流
+            burst: 每个窗口内每个键最多放行的条数
+            max_keys: 记录的键的上限，超出时丢弃最久未出现的键
+        """
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        # 键 -> [窗口起点, 本窗口已放行条数, 本窗口已省略条数]
+        self._windows: 'OrderedDict[Tuple[str, int, str], list]' = OrderedDict()
+        self.suppressed = 0
+
+    def allow(self, name: str, levelno: int, msg: Any, now: float) -> Optional[str]:
+        """
+        判断一条日志是否放行
+
+        Returns:
+            放行时返回要输出的消息（窗口结束后的第一条附带省略条数），不放行时返回 None
+        """
+        msg = str(msg)
+        if self.interval <= 0:
+            return msg
+        key = (name, levelno, _NUMBER_PATTERN.sub('#', msg))
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None:
+                self._windows[key] = [now, 1, 0]
+                if len(self._windows) > self.max_keys:
+                    self._windows.popitem(last=False)
+                return msg
+            self._windows.move_to_end(key)
+            if now - window[0] >= self.interval:
+                omitted = window[2]
+                window[:] = [now, 1, 0]
+                if omitted:
+                    return f"{msg}（前 {self.interval:g} 秒内另有 {omitted} 条相同日志已省略）"
+                return msg
+            if window[1] < self.burst:
+                window[1] += 1
+                return msg
+            window[2] += 1
+            self.suppressed += 1
+            return None
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, 'rate_checked', False):
+            return True
+        msg = self.allow(record.name, record.levelno, record.msg, record.created)
+        if msg is None:
+            return False
+        if msg != record.msg:
+            record.msg = msg
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """只做必要准备的队列处理器：在调用方线程合并参数和异常文本，格式化留给写入线程"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class LoggingStream:
+    """
+    把写入 sys.stdout / sys.stderr 的文本按行转为日志
+
+    级别未启用时 write() 只做一次级别判断就返回；启用时先经过限流再创建日志记录，
+    被限流的行不产生 LogRecord。
+    """
+
+    def __init__(self, name: str, level: int, original, rate_limit: Optional[RateLimitFilter] = None):
+        self.logger = logging.getLogger(name)
+        self.level = level
+        self.original = original
+        self.rate_limit = rate_limit
+        self._buffer = ''
+        self._lock = threading.Lock()
+
+    def write(self, text: str) -> int:
+        if not self.logger.isEnabledFor(self.level):
+            return len(text)
+        with self._lock:
+            self._buffer += text
+            if '\n' not in self._buffer:
+                return len(text)
+            *lines, self._buffer = self._buffer.split('\n')
+        for line in lines:
+            self._emit(line)
+        return len(text)
+
+    def _emit(self, line: str):
+        line = line.rstrip()
+        if not line.strip():
+            return
+        if self.rate_limit is not None:
+            line = self.rate_limit.allow(self.logger.name, self.level, line, time.time())
+            if line is None:
+                return
+        record = self.logger.makeRecord(self.logger.name, self.level, '(stream)', 0, line, None, None)
+        record.rate_checked = True
+        self.logger.handle(record)
+
+    def flush(self):
+        with self._lock:
+            line, self._buffer = self._buffer, ''
+        if self.logger.isEnabledFor(self.level):
+            self._emit(line)
+
+    def isatty(self) -> bool:
+        return False
+
+    def fileno(self) -> int:
+        return self.original.fileno()
+
+    @property
+    def encoding(self):
+        return getattr(self.original, 'encoding', 'utf-8')
+
+
+class LogService:
+    """日志体系的建立、重新配置与关闭"""
+
+    def __init__(self):
+        self.queue: 'queue.SimpleQueue' = queue.SimpleQueue()
+        self.listener: Optional[logging.handlers.QueueListener] = None
+        self.queue_handler: Optional[_QueueHandler] = None
+        self.rate_limit = RateLimitFilter()
+        self.file_handler: Optional[logging.Handler] = None
+        self.console_handler: Optional[logging.Handler] = None
+        self.settings: Dict[str, Any] = dict(DEFAULT_SETTINGS)
+        self._configured_loggers = set()
+        self._original_streams = None
+        self._unsubscribe = None
+
+    def setup(self, settings: Optional[Mapping[str, Any]] = None, watch: bool = True):
+        """
+        建立日志体系（重复调用时只重新应用配置）
+
+        Args:
+            settings: 日志设置，为空时取配置 logging 节
+            watch: 是否在 config.yaml 的 logging 节修改后自动重新应用
+        """
+        service = get_config_service()
+        if settings is None:
+            settings = service.get('logging', {}) or {}
+        if self.listener is None:
+            self._start(settings)
+            if watch and self._unsubscribe is None:
+                self._unsubscribe = service.subscribe('logging', self._on_settings_changed)
+        self.apply(settings)
+
+    def _merge(self, settings: Mapping[str, Any]) -> Dict[str, Any]:
+        merged = dict(DEFAULT_SETTINGS)
+        for key, value in (settings or {}).items():
+            if isinstance(value, Mapping):
+                value = dict(value)
+            merged[key] = value
+        return merged
+
+    def _start(self, settings: Mapping[str, Any]):
+        merged = self._merge(settings)
+        directory = merged['dir']
+        os.makedirs(directory, exist_ok=True)
+        formatter = logging.Formatter(LOG_FORMAT)
+
+        self.file_handler = logging.handlers.RotatingFileHandler(
+            os.path.join(directory, merged['file']), maxBytes=int(merged['max_bytes']),
+            backupCount=int(merged['backup_count']), encoding='utf-8', delay=True)
+        self.file_handler.setFormatter(formatter)
+        # 控制台直接写原始的 stderr，不经过被接管的 sys.stderr
+        self.console_handler = logging.StreamHandler(sys.__stderr__)
+        self.console_handler.setFormatter(formatter)
+
+        self.queue_handler = _QueueHandler(self.queue)
+        self.queue_handler.addFilter(self.rate_limit)
+        self.listener = logging.handlers.QueueListener(
+            self.queue, self.file_handler, self.console_handler, respect_handler_level=True)
+        self.listener.start()
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(self.queue_handler)
+        atexit.register(self.shutdown)
+
+    def apply(self, settings: Mapping[str, Any]):
+        """应用级别、限流和输出接管的设置"""
+        merged = self._merge(settings)
+        self.settings = merged
+        logging.getLogger().setLevel(_level(merged['level']))
+        if self.console_handler is not None:
+            self.console_handler.setLevel(_level(merged['console_level'], logging.WARNING))
+
+        # 配置中删除的模块恢复为跟随上级
+        levels = {name: _level(value) for name, value in (merged.get('levels') or {}).items()}
+        for name in self._configured_loggers - set(levels):
+            logging.getLogger(name).setLevel(logging.NOTSET)
+        for name, level in levels.items():
+            logging.getLogger(name).setLevel(level)
+        self._configured_loggers = set(levels)
+
+        rate_limit = merged.get('rate_limit') or {}
+        self.rate_limit.interval = float(rate_limit.get('interval', 60.0))
+        self.rate_limit.burst = int(rate_limit.get('burst', 5))
+
+        self._capture_streams(bool(merged.get('capture_print')), _level(merged.get('print_level'), logging.INFO),
+                              bool(merged.get('capture_stderr')))
+
+    def _capture_streams(self, capture_print: bool, print_level: int, capture_stderr: bool):
+        if self._original_streams is None:
+            self._original_streams = (sys.stdout, sys.stderr)
+        original_stdout, original_stderr = self._original_streams
+        if capture_print:
+            if isinstance(sys.stdout, LoggingStream):
+                sys.stdout.level = print_level
+            else:
+                sys.stdout = LoggingStream('stdout', print_level, original_stdout, self.rate_limit)
+        elif isinstance(sys.stdout, LoggingStream):
+            sys.stdout = original_stdout
+        if capture_stderr:
+            if not isinstance(sys.stderr, LoggingStream):
+                sys.stderr = LoggingStream('stderr', logging.ERROR, original_stderr, self.rate_limit)
+        elif isinstance(sys.stderr, LoggingStream):
+            sys.stderr = original_stderr
+
+    def _on_settings_changed(self, settings):
+        try:
+            self.apply(settings or {})
+            logger.info("日志设置已更新")
+        except Exception as e:
+            logger.error("应用日志设置失败: %s", e)
+
+    def shutdown(self):
+        """恢复标准输出，写完队列中的日志并关闭文件"""
+        if self._unsubscribe:
+            self._unsubscribe()
+            self._unsubscribe = None
+        if self._original_streams is not None:
+            for stream in (sys.stdout, sys.stderr):
+                if isinstance(stream, LoggingStream):
+                    stream.flush()
+            sys.stdout, sys.stderr = self._original_streams
+            self._original_streams = None
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+            logging.getLogger().removeHandler(self.queue_handler)
+            if self.file_handler is not None:
+                self.file_handler.close()
+
+
+_log_service: Optional[LogService] = None
+_log_service_lock = threading.Lock()
+
+
+def get_log_service() -> LogService:
+    """获取全局日志服务"""
+    global _log_service
+    with _log_service_lock:
+        if _log_service is None:
+            _log_service = LogService()
+        return _log_service
+
+
+def setup_logging(settings: Optional[Mapping[str, Any]] = None, watch: bool = True) -> LogService:
+    """建立全局日志体系，见 LogService.setup"""
+    service = get_log_service()
+    service.setup(settings, watch)
+    return service
+
+
+class Throttle:
+    """
+    热路径上的定时开关：每 interval 秒最多返回一次 True
+
+    用法:
+        _debug_throttle = Throttle(10)
+        if _debug_throttle.ready():
+            logger.debug("...")
+    """
+
+    __slots__ = ('interval', '_next')
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._next = 0.0
+
+    def ready(self) -> bool:
+        now = time.monotonic()
+        if now < self._next:
+            return False
+        self._next = now + self.interval
+        return True
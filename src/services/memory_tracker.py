@@ -0,0 +1,637 @@
+"""
+内存跟踪：tracemalloc 快照差分、对象类型统计与分代回收调优
+
+memory_monitor 每 check_interval 读一次 RSS，--optimize-memory 每 gc_interval 秒调用一次 gc.collect()。
+完整回收要遍历所有存活对象，在界面线程中造成停顿；RSS 上涨时也只知道"涨了"，不知道是哪里分配的。
+本模块改为：
+  - 低开销采样：每 sample_interval 秒记录 RSS、tracemalloc 当前/峰值和各代计数，追加到 samples.jsonl，
+    按最近 growth_window 秒的线性拟合估计增长速率，超过 growth_warning_mb_per_hour 时警告
+  - tracemalloc 快照：每 snapshot_interval 秒在后台线程取一次快照写入 logs/memory/，与上一次快照
+    按分配位置差分；增长最多的位置、按模块分组（状态字典、DSS 星图等）的大小和对象类型统计
+    追加到 growth.jsonl
+  - 对象类型统计：本项目的类（src.*）和 QPixmap/QImage 等 Qt 对象的实例数，图像给出估计字节数
+  - 分代回收调优（GcTuner）：不再定时 gc.collect()。启动完成后 gc.freeze() 把启动期的长寿对象移出
+    回收范围；按第 0 代实际回收频率和停顿调整阈值；gc.callbacks 记录每次回收的停顿（gc.gen0/1/2，
+    写入热点计时直方图）
+  - 离线分析：读取记录下来的采样、增长日志和快照，列出增长最多的分配位置和对象类型
+
+用法:
+    tracker = start_memory_tracking()    # QApplication 创建之后
+    tracker.freeze()                     # 启动完成后（同时取基线快照）
+    python -m src.services.memory_tracker analyze logs/memory
+    python -m src.services.memory_tracker diff 旧快照.tracemalloc 新快照.tracemalloc --traceback
+"""
+import argparse
+import fnmatch
+import gc
+import glob
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+from src.config.config_service import get_config_service
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS = {
+    'enabled': True,
+    'directory': 'logs/memory',
+    'sample_interval': 30,
+    'snapshot_interval': 900,
+    'trace': True,
+    'trace_frames': 1,
+    'keep_snapshots': 8,
+    'top_sites': 15,
+    'growth_window': 3600,
+    'growth_warning_mb_per_hour': 50,
+    'tracked_types': ['QPixmap', 'QImage', 'QTimer', 'QThread', 'QNetworkReply'],
+    'track_project_types': True,
+    'groups': {
+        'status_dicts': ['*polling_engine.py', '*state_store.py', '*telemetry_server.py',
+                         '*telemetry_store.py', '*device_service.py', '*serial_transport.py'],
+        'dss_images': ['*dss_cache.py', '*dss_image_fetcher.py', '*dss_prefetch.py'],
+        'allsky': ['*allsky_pipeline.py', '*allsky_analysis.py'],
+        'qt': ['*PyQt5*'],
+    },
+    'gc_freeze': True,
+    'gc_threshold_min': 700,
+    'gc_threshold_max': 20000,
+    'gc_target_rate': 2.0,
+    'gc_pause_budget_ms': 10,
+}
+
+SNAPSHOT_PATTERN = 'snapshot_*.tracemalloc'
+IMAGE_TYPES = ('QPixmap', 'QImage')
+PROJECT_PREFIX = 'src.'
+
+
+def memory_settings(overrides: Optional[Mapping[str, Any]] = None) -> Dict[str, Any]:
+    """合并默认值、config.yaml memory 段和调用参数"""
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update(get_config_service().get('memory', {}) or {})
+    settings.update(overrides or {})
+    return settings
+
+
+def current_rss() -> int:
+    """当前进程的常驻内存（字节）"""
+    import psutil
+    return psutil.Process().memory_info().rss
+
+
+def _short_path(filename: str) -> str:
+    # 项目文件显示为相对路径，第三方库从 site-packages 之后开始
+    for marker in ('site-packages' + os.sep, 'dist-packages' + os.sep):
+        if marker in filename:
+            return filename.split(marker, 1)[1]
+    try:
+        relative = os.path.relpath(filename)
+    except ValueError:
+        return filename
+    return filename if relative.startswith('..') else relative
+
+
+# ----------------------------------------------------------------------
+# 对象类型统计
+# ----------------------------------------------------------------------
+def count_objects(tracked_types: Iterable[str] = (), track_project_types: bool = True) -> Dict[str, Dict[str, int]]:
+    """
+    统计垃圾回收器跟踪的对象中指定类型的实例
+
+    只含原子值的字典不被回收器跟踪，状态字典的增长由 tracemalloc 的分组反映。
+    QPixmap/QImage 按宽×高×位深估计像素数据的字节数。应在界面线程中调用。
+
+    Args:
+        tracked_types: 按类名统计的类型（如 QPixmap）
+        track_project_types: 是否统计本项目（src.*）定义的所有类
+
+    Returns:
+        {类型名: {'count': 实例数, 'bytes': 估计字节数（仅图像）}}
+    """
+    names = set(tracked_types)
+    counts: Counter = Counter()
+    image_bytes: Counter = Counter()
+    for obj in gc.get_objects():
+        cls = type(obj)
+        name = cls.__name__
+        if name in names:
+            key = name
+        else:
+            # 部分类型的 __module__ 是描述符而不是字符串
+            module = getattr(cls, '__module__', None)
+            if not (track_project_types and isinstance(module, str) and module.startswith(PROJECT_PREFIX)):
+                continue
+            key = f"{module}.{cls.__qualname__}"
+        counts[key] += 1
+        if name in IMAGE_TYPES:
+            try:
+                image_bytes[key] += obj.width() * obj.height() * max(obj.depth(), 8) // 8
+            except (RuntimeError, TypeError):
+                pass
+    result = {key: {'count': count} for key, count in counts.items()}
+    for key, size in image_bytes.items():
+        result[key]['bytes'] = size
+    return result
+
+
+def diff_counts(before: Mapping[str, Mapping[str, int]], after: Mapping[str, Mapping[str, int]],
+                limit: int = 20) -> List[Dict[str, Any]]:
+    """两次类型统计之差，按实例数变化的绝对值排序"""
+    rows = []
+    for key in set(before) | set(after):
+        old, new = before.get(key, {}), after.get(key, {})
+        delta = new.get('count', 0) - old.get('count', 0)
+        if delta:
+            rows.append({'type': key, 'count': new.get('count', 0), 'delta': delta,
+                         'bytes_delta': new.get('bytes', 0) - old.get('bytes', 0)})
+    rows.sort(key=lambda row: abs(row['delta']), reverse=True)
+    return rows[:limit]
+
+
+# ----------------------------------------------------------------------
+# tracemalloc 快照
+# ----------------------------------------------------------------------
+def take_snapshot() -> tracemalloc.Snapshot:
+    """取快照并去掉 tracemalloc 自身和导入机制的分配"""
+    snapshot = tracemalloc.take_snapshot()
+    return snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+        tracemalloc.Filter(False, '<unknown>'),
+    ))
+
+
+def top_growth(current: tracemalloc.Snapshot, previous: Optional[tracemalloc.Snapshot],
+               limit: int = 15, key_type: str = 'lineno') -> List[Dict[str, Any]]:
+    """
+    按分配位置比较两个快照
+
+    Args:
+        current: 新快照
+        previous: 旧快照；为 None 时列出当前占用最多的位置
+        limit: 返回的条数
+        key_type: 'lineno' 按行，'traceback' 按完整调用栈（需要 trace_frames > 1）
+
+    Returns:
+        [{'site', 'size', 'size_diff', 'count', 'count_diff'[, 'traceback']}]，按 size_diff 从大到小
+    """
+    if previous is None:
+        stats = [tracemalloc.StatisticDiff(stat.traceback, stat.size, stat.size, stat.count, stat.count)
+                 for stat in current.statistics(key_type)]
+    else:
+        stats = current.compare_to(previous, key_type)
+    stats.sort(key=lambda stat: stat.size_diff, reverse=True)
+    rows = []
+    for stat in stats[:limit]:
+        # Traceback 中的帧从最早到最近排列，分配位置是最后一帧
+        frame = stat.traceback[-1]
+        row = {'site': f"{_short_path(frame.filename)}:{frame.lineno}", 'size': stat.size,
+               'size_diff': stat.size_diff, 'count': stat.count, 'count_diff': stat.count_diff}
+        if key_type == 'traceback' and len(stat.traceback) > 1:
+            row['traceback'] = [f"{_short_path(f.filename)}:{f.lineno}" for f in reversed(stat.traceback)]
+        rows.append(row)
+    return rows
+
+
+def group_sizes(snapshot: tracemalloc.Snapshot, groups: Mapping[str, Iterable[str]]) -> Dict[str, Dict[str, int]]:
+    """按文件名模式把快照中的分配归入各组（每条分配只看最内层的帧）"""
+    result = {name: {'size': 0, 'count': 0} for name in groups}
+    for stat in snapshot.statistics('filename'):
+        filename = stat.traceback[-1].filename
+        for name, patterns in groups.items():
+            if any(fnmatch.fnmatch(filename, pattern) for pattern in patterns):
+                result[name]['size'] += stat.size
+                result[name]['count'] += stat.count
+                break
+    return result
+
+
+def load_snapshot(path: str) -> tracemalloc.Snapshot:
+    return tracemalloc.Snapshot.load(path)
+
+
+def list_snapshots(directory: str) -> List[str]:
+    """目录中的快照文件，按时间从旧到新"""
+    return sorted(glob.glob(os.path.join(directory, SNAPSHOT_PATTERN)))
+
+
+def prune_snapshots(directory: str, keep: int) -> List[str]:
+    """保留第一个快照（作为基线）和最新的 keep - 1 个，返回删除的文件"""
+    paths = list_snapshots(directory)
+    if keep < 2 or len(paths) <= keep:
+        return []
+    removed = paths[1:len(paths) - (keep - 1)]
+    for path in removed:
+        try:
+            os.remove(path)
+        except OSError as e:
+            logger.warning("删除旧快照 %s 失败: %s", path, e)
+    return removed
+
+
+def growth_rate(samples: Iterable[Tuple[float, float]]) -> Optional[float]:
+    """最小二乘拟合 (时刻秒, 字节) 的斜率，换算为 MB/小时；样本不足时为 None"""
+    points = list(samples)
+    if len(points) < 3:
+        return None
+    n = len(points)
+    mean_t = sum(t for t, _ in points) / n
+    mean_v = sum(v for _, v in points) / n
+    var_t = sum((t - mean_t) ** 2 for t, _ in points)
+    if var_t <= 0:
+        return None
+    slope = sum((t - mean_t) * (v - mean_v) for t, v in points) / var_t
+    return slope * 3600.0 / (1024 * 1024)
+
+
+# ----------------------------------------------------------------------
+# 分代回收调优
+# ----------------------------------------------------------------------
+class GcTuner:
+    """
+    分代回收调优
+
+    通过 gc.callbacks 记录每一代回收的次数和停顿；adjust() 定期调用：
+    第 0 代回收的停顿超过预算时阈值减半，否则回收过于频繁时阈值加倍（限制在 [最小值, 最大值]）。
+    第 1、2 代阈值保持不变——freeze() 之后第 2 代回收只遍历启动之后新产生的长寿对象。
+    """
+
+    def __init__(self, instrumentation=None, min_threshold: int = 700, max_threshold: int = 20000,
+                 target_rate: float = 2.0, pause_budget: float = 0.010):
+        self.instrumentation = instrumentation
+        self.min_threshold = int(min_threshold)
+        self.max_threshold = int(max_threshold)
+        self.target_rate = float(target_rate)
+        self.pause_budget = float(pause_budget)
+        self.collections = [0, 0, 0]
+        self.pause_total = [0.0, 0.0, 0.0]
+        self.pause_max = [0.0, 0.0, 0.0]
+        self.collected = 0
+        self.frozen = 0
+        self._window_max = [0.0, 0.0, 0.0]
+        self._window_count = 0
+        self._window_start = time.monotonic()
+        self._started = None
+        self._installed = False
+
+    def install(self):
+        if not self._installed:
+            gc.callbacks.append(self._on_gc)
+            self._installed = True
+        return self
+
+    def uninstall(self):
+        if self._installed:
+            gc.callbacks.remove(self._on_gc)
+            self._installed = False
+
+    def _on_gc(self, phase: str, info: Mapping[str, int]):
+        if phase == 'start':
+            self._started = time.perf_counter()
+            return
+        if self._started is None:
+            return
+        pause = time.perf_counter() - self._started
+        self._started = None
+        generation = info.get('generation', 0)
+        self.collections[generation] += 1
+        self.pause_total[generation] += pause
+        if pause > self.pause_max[generation]:
+            self.pause_max[generation] = pause
+        if pause > self._window_max[generation]:
+            self._window_max[generation] = pause
+        if generation == 0:
+            self._window_count += 1
+        self.collected += info.get('collected', 0)
+        if self.instrumentation is not None:
+            self.instrumentation.record(f'gc.gen{generation}', pause)
+
+    def adjust(self) -> Optional[int]:
+        """根据上次调用以来的回收情况调整第 0 代阈值，返回新阈值（未调整时为 None）"""
+        now = time.monotonic()
+        elapsed = max(now - self._window_start, 1e-6)
+        rate = self._window_count / elapsed
+        worst = self._window_max[0]
+        self._window_start = now
+        self._window_count = 0
+        self._window_max = [0.0, 0.0, 0.0]
+        threshold0, threshold1, threshold2 = gc.get_threshold()
+        if worst > self.pause_budget and threshold0 > self.min_threshold:
+            new = max(self.min_threshold, threshold0 // 2)
+        elif rate > self.target_rate and threshold0 < self.max_threshold:
+            new = min(self.max_threshold, threshold0 * 2)
+        else:
+            return None
+        gc.set_threshold(new, threshold1, threshold2)
+        logger.debug("第 0 代回收阈值 %d -> %d（%.1f 次/秒，最长停顿 %.1f ms）",
+                     threshold0, new, rate, worst * 1000)
+        return new
+
+    def freeze(self) -> int:
+        """回收一次后把现存对象移入永久代，之后的回收不再遍历它们；返回移入的对象数"""
+        gc.collect()
+        gc.freeze()
+        self.frozen = gc.get_freeze_count()
+        logger.info("已冻结启动期对象 %d 个", self.frozen)
+        return self.frozen
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'threshold': list(gc.get_threshold()),
+            'collections': list(self.collections),
+            'pause_total_ms': [round(value * 1000, 3) for value in self.pause_total],
+            'pause_max_ms': [round(value * 1000, 3) for value in self.pause_max],
+            'collected': self.collected,
+            'frozen': self.frozen,
+        }
+
+
+# ----------------------------------------------------------------------
+# 运行时跟踪
+# ----------------------------------------------------------------------
+class MemoryTracker(QObject):
+    """定时采样、定时快照差分和回收调优（在界面线程中创建）"""
+
+    growth_warning = pyqtSignal(float)
+    snapshot_written = pyqtSignal(str)
+
+    def __init__(self, settings: Optional[Mapping[str, Any]] = None, instrumentation=None, parent=None):
+        super().__init__(parent)
+        self.settings = memory_settings(settings)
+        self.directory = self.settings['directory']
+        self.tuner = GcTuner(instrumentation, self.settings['gc_threshold_min'], self.settings['gc_threshold_max'],
+                             self.settings['gc_target_rate'], float(self.settings['gc_pause_budget_ms']) / 1000.0)
+        self.instrumentation = instrumentation
+        self._rss = deque()
+        self._previous: Optional[tracemalloc.Snapshot] = None
+        self._previous_census: Dict[str, Dict[str, int]] = {}
+        self._snapshot_thread: Optional[threading.Thread] = None
+        self._started_tracing = False
+        self._sample_timer = QTimer(self)
+        self._sample_timer.timeout.connect(self.sample)
+        self._snapshot_timer = QTimer(self)
+        self._snapshot_timer.timeout.connect(self.snapshot)
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        if self.settings['trace'] and not tracemalloc.is_tracing():
+            tracemalloc.start(max(1, int(self.settings['trace_frames'])))
+            self._started_tracing = True
+        self.tuner.install()
+        self._sample_timer.start(int(float(self.settings['sample_interval']) * 1000))
+        if self.settings['trace'] and float(self.settings['snapshot_interval']) > 0:
+            self._snapshot_timer.start(int(float(self.settings['snapshot_interval']) * 1000))
+        self.sample()
+        logger.info("内存跟踪已启动: 采样 %s s，快照 %s s，目录 %s",
+                    self.settings['sample_interval'], self.settings['snapshot_interval'], self.directory)
+        return self
+
+    def stop(self):
+        """停止定时器，写出最后一次快照和回收统计"""
+        self._sample_timer.stop()
+        self._snapshot_timer.stop()
+        self.sample()
+        if tracemalloc.is_tracing():
+            self.snapshot(wait=True)
+        self.tuner.uninstall()
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def freeze(self):
+        """启动完成后调用：冻结启动期对象（配置 gc_freeze 开启时），并取一个快照作为之后差分的基线"""
+        if self.settings['gc_freeze']:
+            self.tuner.freeze()
+        self.snapshot()
+
+    def _append(self, filename: str, record: Mapping[str, Any]):
+        path = os.path.join(self.directory, filename)
+        try:
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        except OSError as e:
+            logger.error("写入 %s 失败: %s", path, e)
+
+    def sample(self) -> Dict[str, Any]:
+        """记录一次 RSS、tracemalloc 和回收计数，并调整回收阈值"""
+        now = time.time()
+        rss = current_rss()
+        traced, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+        self._rss.append((now, rss))
+        window = float(self.settings['growth_window'])
+        while self._rss and now - self._rss[0][0] > window:
+            self._rss.popleft()
+        rate = growth_rate(self._rss) if now - self._rss[0][0] >= window / 2 else None
+        threshold = self.tuner.adjust()
+        record = {
+            'time': datetime.fromtimestamp(now).isoformat(timespec='seconds'),
+            'rss': rss, 'traced': traced, 'traced_peak': peak,
+            'gc_count': list(gc.get_count()), 'gc_threshold': list(gc.get_threshold()),
+            'gc_collections': list(self.tuner.collections),
+            'gc_pause_max_ms': [round(value * 1000, 3) for value in self.tuner.pause_max],
+            'growth_mb_per_hour': None if rate is None else round(rate, 2),
+        }
+        self._append('samples.jsonl', record)
+        if threshold is not None:
+            logger.info("第 0 代回收阈值调整为 %d", threshold)
+        if rate is not None and rate > float(self.settings['growth_warning_mb_per_hour']):
+            logger.warning("内存持续增长 %.1f MB/小时（RSS %.0f MB）", rate, rss / (1024 * 1024))
+            self.growth_warning.emit(rate)
+        return record
+
+    def census(self) -> Dict[str, Dict[str, int]]:
+        """在界面线程中统计对象类型（图像对象只能在界面线程中访问）"""
+        start = time.perf_counter()
+        counts = count_objects(self.settings['tracked_types'], bool(self.settings['track_project_types']))
+        if self.instrumentation is not None:
+            self.instrumentation.record('memory.census', time.perf_counter() - start)
+        return counts
+
+    def snapshot(self, wait: bool = False):
+        """
+        统计对象类型后在后台线程中取快照、与上一次差分并写出
+
+        Args:
+            wait: 等待后台线程完成（退出时使用）
+        """
+        if not tracemalloc.is_tracing():
+            return
+        if self._snapshot_thread is not None and self._snapshot_thread.is_alive():
+            if not wait:
+                logger.debug("上一次快照尚未完成，跳过")
+                return
+            self._snapshot_thread.join()
+        census = self.census()
+        self._snapshot_thread = threading.Thread(target=self._write_snapshot, args=(census,),
+                                                 name='memory-snapshot', daemon=True)
+        self._snapshot_thread.start()
+        if wait:
+            self._snapshot_thread.join()
+
+    def _write_snapshot(self, census: Dict[str, Dict[str, int]]):
+        start = time.perf_counter()
+        try:
+            snapshot = take_snapshot()
+            stamp = datetime.now()
+            path = os.path.join(self.directory, f"snapshot_{stamp:%Y%m%d_%H%M%S_%f}.tracemalloc")
+            snapshot.dump(path)
+            record = {
+                'time': stamp.isoformat(timespec='seconds'),
+                'snapshot': os.path.basename(path),
+                'traced': sum(stat.size for stat in snapshot.statistics('filename')),
+                'sites': top_growth(snapshot, self._previous, int(self.settings['top_sites'])),
+                'groups': group_sizes(snapshot, self.settings['groups']),
+                'types': census,
+                'types_diff': diff_counts(self._previous_census, census, int(self.settings['top_sites'])),
+                'gc': self.tuner.summary(),
+            }
+            self._append('growth.jsonl', record)
+            self._previous = snapshot
+            self._previous_census = census
+            prune_snapshots(self.directory, int(self.settings['keep_snapshots']))
+        except (OSError, RuntimeError) as e:
+            logger.error("写入内存快照失败: %s", e)
+            return
+        if self.instrumentation is not None:
+            self.instrumentation.record('memory.snapshot', time.perf_counter() - start)
+        if record['sites']:
+            top = record['sites'][0]
+            logger.info("内存快照 %s：增长最多 %s %+d KB", path, top['site'], top['size_diff'] // 1024)
+        self.snapshot_written.emit(path)
+
+
+def start_memory_tracking(settings: Optional[Mapping[str, Any]] = None, parent=None) -> Optional[MemoryTracker]:
+    """在 QApplication 创建之后启动内存跟踪；配置关闭时返回 None"""
+    settings = memory_settings(settings)
+    if not settings['enabled']:
+        return None
+    from src.services.profiler import get_instrumentation
+    instrumentation = get_instrumentation()
+    return MemoryTracker(settings, instrumentation if instrumentation.enabled else None, parent).start()
+
+
+# ----------------------------------------------------------------------
+# 离线分析
+# ----------------------------------------------------------------------
+def _load_jsonl(path: str) -> List[Dict[str, Any]]:
+    records = []
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        continue
+    except OSError:
+        pass
+    return records
+
+
+def _format_size(size: int) -> str:
+    sign = '-' if size < 0 else '+'
+    size = abs(size)
+    if size >= 1024 * 1024:
+        return f"{sign}{size / (1024 * 1024):.1f} MB"
+    return f"{sign}{size / 1024:.1f} KB"
+
+
+def format_sites(rows: Iterable[Mapping[str, Any]]) -> List[str]:
+    lines = []
+    for row in rows:
+        lines.append(f"  {_format_size(row['size_diff']):>11} {row['count_diff']:>+9} 块  {row['site']}")
+        for frame in row.get('traceback', [])[1:]:
+            lines.append(f"{'':>26}{frame}")
+    return lines
+
+
+def analyze(directory: str, top: int = 15, key_type: str = 'lineno') -> str:
+    """
+    分析记录目录：RSS 趋势、第一个与最新快照的差分、对象类型和分组的变化
+
+    Args:
+        directory: 记录目录（默认 logs/memory）
+        top: 列出的分配位置条数
+        key_type: 'lineno' 或 'traceback'
+
+    Returns:
+        报告文本
+    """
+    lines = [f"内存记录目录: {directory}"]
+    samples = _load_jsonl(os.path.join(directory, 'samples.jsonl'))
+    if samples:
+        first, last = samples[0], samples[-1]
+        points = [(datetime.fromisoformat(item['time']).timestamp(), item['rss']) for item in samples]
+        rate = growth_rate(points)
+        lines.append(f"采样 {len(samples)} 次（{first['time']} ~ {last['time']}）: "
+                     f"RSS {first['rss'] / 1048576:.0f} MB -> {last['rss'] / 1048576:.0f} MB"
+                     + (f"，拟合增长 {rate:+.1f} MB/小时" if rate is not None else ''))
+        lines.append(f"  tracemalloc {first['traced'] / 1048576:.1f} MB -> {last['traced'] / 1048576:.1f} MB，"
+                     f"峰值 {max(item['traced_peak'] for item in samples) / 1048576:.1f} MB")
+        lines.append(f"  回收次数（第 0/1/2 代）{last['gc_collections']}，最长停顿 {last['gc_pause_max_ms']} ms，"
+                     f"阈值 {last['gc_threshold']}")
+    else:
+        lines.append("没有采样记录")
+
+    growth = _load_jsonl(os.path.join(directory, 'growth.jsonl'))
+    if len(growth) >= 2:
+        first, last = growth[0], growth[-1]
+        lines.append(f"对象类型变化（{first['time']} -> {last['time']}）:")
+        for row in diff_counts(first.get('types', {}), last.get('types', {}), top):
+            extra = f"  像素 {_format_size(row['bytes_delta'])}" if row['bytes_delta'] else ''
+            lines.append(f"  {row['delta']:>+8} 个  共 {row['count']:>7}  {row['type']}{extra}")
+        lines.append("分组大小:")
+        for name, item in last.get('groups', {}).items():
+            before = first.get('groups', {}).get(name, {}).get('size', 0)
+            lines.append(f"  {name:<14} {item['size'] / 1024:>10.1f} KB  ({_format_size(item['size'] - before)})")
+
+    snapshots = list_snapshots(directory)
+    if len(snapshots) >= 2:
+        lines.append(f"快照差分 {os.path.basename(snapshots[0])} -> {os.path.basename(snapshots[-1])}:")
+        lines.extend(format_sites(top_growth(load_snapshot(snapshots[-1]), load_snapshot(snapshots[0]),
+                                             top, key_type)))
+    elif snapshots:
+        lines.append(f"只有一个快照 {os.path.basename(snapshots[0])}，占用最多的位置:")
+        lines.extend(format_sites(top_growth(load_snapshot(snapshots[0]), None, top, key_type)))
+    else:
+        lines.append("没有快照")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='内存记录离线分析')
+    sub = parser.add_subparsers(dest='command', required=True)
+    report = sub.add_parser('analyze', help='分析记录目录中的采样、增长日志和快照')
+    report.add_argument('directory', nargs='?', default=DEFAULT_SETTINGS['directory'])
+    report.add_argument('--top', type=int, default=15, help='列出的分配位置条数')
+    report.add_argument('--traceback', action='store_true', help='按完整调用栈分组（需要 trace_frames > 1）')
+    diff = sub.add_parser('diff', help='比较两个快照文件')
+    diff.add_argument('baseline')
+    diff.add_argument('current')
+    diff.add_argument('--top', type=int, default=15, help='列出的分配位置条数')
+    diff.add_argument('--traceback', action='store_true', help='按完整调用栈分组（需要 trace_frames > 1）')
+    args = parser.parse_args()
+
+    key_type = 'traceback' if args.traceback else 'lineno'
+    if args.command == 'analyze':
+        print(analyze(args.directory, args.top, key_type))
+        return 0
+    rows = top_growth(load_snapshot(args.current), load_snapshot(args.baseline), args.top, key_type)
+    print(f"{args.baseline} -> {args.current}:")
+    print('\n'.join(format_sites(rows)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
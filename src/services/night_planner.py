@@ -0,0 +1,596 @@
+"""
+整夜观测规划
+
+astronomy_service 只回答"当前指向、当前时刻"的问题；规划一夜几十到几百个目标时逐个调用 astroplan
+需要几分钟。本模块把目标列表和当夜的时间网格放进同一次 numpy 广播计算：
+
+    目标 (N, 1) × 时间网格 (1, T) -> 高度角、大气质量、月距、旁行角 (N, T)
+
+由此得到每个目标的升起/落下时刻、中天时刻和中天高度、天文夜内满足约束的可观测时长，
+再按优先级、大气质量和"剩余可观测时间"的紧迫程度排出一夜的观测顺序。站址的太阳、月亮星历
+只依赖日期，按观测夜缓存，同一夜反复规划时只计算目标部分。
+
+精度：目标坐标按 J2000 输入，岁差换算到观测日期（IAU 1976）；恒星时与 parallactic 模块一致；
+太阳位置误差约 0.01°，月球位置取主要周期项并做地心到站心的视差改正，误差约 0.3°。
+升起/落下/中天时刻与 astroplan 相差在一分钟以内（不含大气折射，与 astroplan 的默认设置相同）。
+
+用法:
+    planner = get_night_planner()
+    plan = planner.plan(load_targets('targets.txt'))        # 今晚
+    for block in plan.schedule:
+        print(block['name'], block['start'], block['airmass'])
+
+    python -m src.services.night_planner targets.txt --night 2026-10-17 --output plan.json
+"""
+import argparse
+import json
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import date as date_type
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+import numpy as np
+import pytz
+
+from src.config.config_service import get_config_service
+from src.config.settings import TELESCOPE_CONFIG, TIMEZONE
+from src.utils.coordinates import parse_dec_degrees, parse_ra_hours
+from src.services.ephemeris_cache import (SUNRISE_ALTITUDE, J2000, find_crossings, julian_date,
+                                          moon_ecliptic_longitude, sun_altitude, sun_position)
+from src.services.parallactic import (ParallacticCalculator, altitude, local_sidereal_time, parallactic_angle,
+                                      plan_rotator_moves, wrap_hour_angle)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS = {
+    'grid_step': 300,              # 时间网格步长（秒）
+    'horizon': 0.0,                # 升起/落下时刻所用的地平高度（度）
+    'min_altitude': 30.0,          # 可观测的最低高度角（度）
+    'max_airmass': 2.0,            # 可观测的最大大气质量
+    'min_moon_separation': 30.0,   # 与月亮的最小角距（度）
+    'twilight_altitude': -18.0,    # 天文夜的太阳高度（度）
+    'block_duration': 1800,        # 目标未指定时的观测时长（秒）
+    'rotator_tolerance': 1.0,      # 规划消旋器动作时允许的旁行角偏差（度）
+    'rotator_step': 60,            # 规划消旋器动作时的轨迹步长（秒）
+    'cache_nights': 3,             # 缓存的观测夜数
+    'target_list': '',             # 默认目标列表，为空时取 dss_prefetch.target_list
+}
+
+SIDEREAL_RATE = 1.00273790935
+EARTH_RADIUS_KM = 6378.14
+OBLIQUITY = math.radians(23.4393)
+
+
+def planning_settings(overrides: Optional[Mapping[str, Any]] = None) -> Dict[str, Any]:
+    """合并默认值、config.yaml planning 段和调用参数"""
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update(get_config_service().get('planning', {}) or {})
+    settings.update(overrides or {})
+    return settings
+
+
+# ----------------------------------------------------------------------
+# 坐标
+# ----------------------------------------------------------------------
+def precess(ra_hours, dec_deg, jd: float):
+    """
+    J2000 坐标换算到观测日期的平赤道坐标（IAU 1976 岁差）
+
+    Args:
+        ra_hours: 赤经（小时，可为数组）
+        dec_deg: 赤纬（度，可为数组）
+        jd: 观测日期的儒略日
+
+    Returns:
+        (赤经小时, 赤纬度)
+    """
+    t = (jd - J2000) / 36525.0
+    zeta = np.radians((2306.2181 * t + 0.30188 * t * t + 0.017998 * t ** 3) / 3600.0)
+    z = np.radians((2306.2181 * t + 1.09468 * t * t + 0.018203 * t ** 3) / 3600.0)
+    theta = np.radians((2004.3109 * t - 0.42665 * t * t - 0.041833 * t ** 3) / 3600.0)
+    ra = np.radians(np.asarray(ra_hours, dtype=float) * 15.0)
+    dec = np.radians(np.asarray(dec_deg, dtype=float))
+    a = np.cos(dec) * np.sin(ra + zeta)
+    b = math.cos(theta) * np.cos(dec) * np.cos(ra + zeta) - math.sin(theta) * np.sin(dec)
+    c = math.sin(theta) * np.cos(dec) * np.cos(ra + zeta) + math.cos(theta) * np.sin(dec)
+    ra_date = (np.degrees(np.arctan2(a, b) + z) / 15.0) % 24.0
+    return ra_date, np.degrees(np.arcsin(np.clip(c, -1.0, 1.0)))
+
+
+def moon_position(jd, lst_hours, latitude: float):
+    """
+    月球的站心赤道坐标
+
+    Args:
+        jd: 儒略日（数组）
+        lst_hours: 对应时刻的地方恒星时（小时，数组）
+        latitude: 站址纬度（度）
+
+    Returns:
+        (赤经小时, 赤纬度)
+    """
+    jd = np.asarray(jd, dtype=float)
+    t = (jd - J2000) / 36525.0
+    f = np.radians(93.272 + 483202.0175 * t)
+    m_moon = np.radians(134.963 + 477198.8676 * t)
+    d = np.radians(297.850 + 445267.1115 * t)
+    latitude_terms = (5.128 * np.sin(f) + 0.2806 * np.sin(m_moon + f) + 0.2777 * np.sin(m_moon - f)
+                      + 0.1732 * np.sin(2 * d - f))
+    distance = (385001.0 - 20905.0 * np.cos(m_moon) - 3699.0 * np.cos(2 * d - m_moon)
+                - 2956.0 * np.cos(2 * d) - 570.0 * np.cos(2 * m_moon)) / EARTH_RADIUS_KM
+    lam = np.radians(moon_ecliptic_longitude(jd))
+    beta = np.radians(latitude_terms)
+    # 黄道 -> 赤道直角坐标（单位：地球半径）
+    x = distance * np.cos(beta) * np.cos(lam)
+    y = distance * (np.cos(beta) * np.sin(lam) * math.cos(OBLIQUITY) - np.sin(beta) * math.sin(OBLIQUITY))
+    z = distance * (np.cos(beta) * np.sin(lam) * math.sin(OBLIQUITY) + np.sin(beta) * math.cos(OBLIQUITY))
+    # 减去站址的地心位置（视差改正，忽略地球扁率和海拔）
+    phi = math.radians(latitude)
+    theta = np.radians(np.asarray(lst_hours, dtype=float) * 15.0)
+    x = x - math.cos(phi) * np.cos(theta)
+    y = y - math.cos(phi) * np.sin(theta)
+    z = z - math.sin(phi)
+    ra = (np.degrees(np.arctan2(y, x)) / 15.0) % 24.0
+    return ra, np.degrees(np.arctan2(z, np.hypot(x, y)))
+
+
+def angular_distance(ra1_hours, dec1_deg, ra2_hours, dec2_deg):
+    """两组坐标间的角距（度，支持广播），haversine 公式"""
+    ra1, ra2 = np.radians(np.asarray(ra1_hours) * 15.0), np.radians(np.asarray(ra2_hours) * 15.0)
+    dec1, dec2 = np.radians(dec1_deg), np.radians(dec2_deg)
+    h = np.sin((dec2 - dec1) / 2) ** 2 + np.cos(dec1) * np.cos(dec2) * np.sin((ra2 - ra1) / 2) ** 2
+    return np.degrees(2 * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0))))
+
+
+def airmass(altitude_deg):
+    """大气质量（sec z，与 astroplan 一致），地平线以下为 inf"""
+    alt = np.asarray(altitude_deg, dtype=float)
+    with np.errstate(divide='ignore'):
+        return np.where(alt > 0.0, 1.0 / np.sin(np.radians(np.maximum(alt, 1e-6))), np.inf)
+
+
+def first_crossings(times: np.ndarray, values: np.ndarray, rising: bool) -> np.ndarray:
+    """
+    每一行第一次穿过 0 的时刻（相邻采样间线性插值），没有穿越时为 nan
+
+    Args:
+        times: 时间网格 (T,)
+        values: 相对阈值的采样 (N, T)
+        rising: True 为上升穿越，False 为下降穿越
+    """
+    above = values >= 0.0
+    change = (~above[:, :-1] & above[:, 1:]) if rising else (above[:, :-1] & ~above[:, 1:])
+    found = change.any(axis=1)
+    index = change.argmax(axis=1)
+    rows = np.arange(values.shape[0])
+    v0, v1 = values[rows, index], values[rows, index + 1]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        fraction = v0 / (v0 - v1)
+    result = times[index] + fraction * (times[index + 1] - times[index])
+    return np.where(found, result, np.nan)
+
+
+# ----------------------------------------------------------------------
+# 站址星历
+# ----------------------------------------------------------------------
+class NightEphemeris:
+    """一个观测夜（本地正午到次日正午）的时间网格和站址星历"""
+
+    __slots__ = ('date', 'times', 'jd', 'lst', 'sun_altitude', 'moon_ra', 'moon_dec', 'moon_altitude',
+                 'moon_illumination', 'sunset', 'sunrise', 'dusk', 'dawn', 'dark_start', 'dark_end', 'tz')
+
+    def __init__(self, night_date: date_type, latitude: float, longitude: float, tz,
+                 step: float, twilight_altitude: float):
+        self.date = night_date
+        self.tz = tz
+        noon = tz.localize(datetime(night_date.year, night_date.month, night_date.day, 12))
+        start = noon.timestamp()
+        end = tz.localize(datetime(night_date.year, night_date.month, night_date.day, 12) + timedelta(days=1))
+        count = int(math.ceil((end.timestamp() - start) / step)) + 1
+        self.times = start + np.arange(count) * step
+        self.jd = julian_date(self.times)
+        self.lst = local_sidereal_time(self.times, longitude)
+        self.sun_altitude = sun_altitude(self.jd, latitude, longitude)
+        self.moon_ra, self.moon_dec = moon_position(self.jd, self.lst, latitude)
+        self.moon_altitude = altitude(wrap_hour_angle(self.lst - self.moon_ra), self.moon_dec, latitude)
+        sun_longitude, _, _ = sun_position(self.jd)
+        elongation = np.radians(moon_ecliptic_longitude(self.jd) - sun_longitude)
+        self.moon_illumination = (1.0 - np.cos(elongation)) / 2.0
+
+        def crossing(threshold, rising):
+            for when, up in find_crossings(self.times, self.sun_altitude, threshold):
+                if up == rising:
+                    return when
+            return None
+
+        self.sunset = crossing(SUNRISE_ALTITUDE, False)
+        self.sunrise = crossing(SUNRISE_ALTITUDE, True)
+        self.dusk = crossing(twilight_altitude, False)
+        self.dawn = crossing(twilight_altitude, True)
+        # 天文夜对应的网格下标区间 [dark_start, dark_end)；高纬度夏季没有天文夜时为空
+        dark = np.nonzero(self.sun_altitude <= twilight_altitude)[0]
+        self.dark_start = int(dark[0]) if len(dark) else 0
+        self.dark_end = int(dark[-1]) + 1 if len(dark) else 0
+
+    @property
+    def dark_hours(self) -> float:
+        if self.dusk is None or self.dawn is None:
+            return 0.0
+        return (self.dawn - self.dusk) / 3600.0
+
+    def format_time(self, timestamp: Optional[float]) -> Optional[str]:
+        if timestamp is None or not np.isfinite(timestamp):
+            return None
+        return datetime.fromtimestamp(round(float(timestamp)), self.tz).strftime('%Y-%m-%d %H:%M:%S')
+
+
+# ----------------------------------------------------------------------
+# 规划结果
+# ----------------------------------------------------------------------
+class NightPlan:
+    """
+    一夜的规划结果
+
+    数组属性的第一维是目标（与 names 对应），第二维是 night.times：
+        altitude, airmass, moon_separation, parallactic_angle, hour_angle, observable
+    逐目标属性：rise, set, transit（Unix 时间戳，无穿越时为 nan）、transit_altitude、
+    observable_hours、min_airmass、best_time、score。
+    schedule 为按时间排列的观测块，ranked() 为按得分排列的目标汇总。
+    """
+
+    def __init__(self, night: NightEphemeris, names: List[str], ra: np.ndarray, dec: np.ndarray,
+                 priority: np.ndarray, duration: np.ndarray, settings: Mapping[str, Any]):
+        self.night = night
+        self.names = names
+        self.ra = ra
+        self.dec = dec
+        self.priority = priority
+        self.duration = duration
+        self.settings = dict(settings)
+        self.schedule: List[Dict[str, Any]] = []
+        self.scheduled = set()
+
+    def __len__(self):
+        return len(self.names)
+
+    def summary(self, index: int) -> Dict[str, Any]:
+        """单个目标的汇总"""
+        night = self.night
+        return {
+            'name': self.names[index],
+            'ra': float(self.ra[index]),
+            'dec': float(self.dec[index]),
+            'priority': float(self.priority[index]),
+            'rise': night.format_time(self.rise[index]),
+            'set': night.format_time(self.set[index]),
+            'transit': night.format_time(self.transit[index]),
+            'transit_altitude': round(float(self.transit_altitude[index]), 2),
+            'observable_hours': round(float(self.observable_hours[index]), 2),
+            'min_airmass': round(float(self.min_airmass[index]), 3) if np.isfinite(self.min_airmass[index]) else None,
+            'best_time': night.format_time(self.best_time[index]),
+            'score': round(float(self.score[index]), 4),
+            'scheduled': index in self.scheduled,
+        }
+
+    def ranked(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """按得分从高到低排列的目标汇总"""
+        order = np.argsort(-self.score, kind='stable')
+        if limit is not None:
+            order = order[:limit]
+        return [self.summary(int(i)) for i in order]
+
+    def track(self, name: str) -> Dict[str, np.ndarray]:
+        """目标在网格上的轨迹，格式与 ParallacticCalculator.night_track 相同"""
+        index = self.names.index(name)
+        return {
+            'time': self.night.times,
+            'hour_angle': self.hour_angle[index],
+            'altitude': self.altitude[index],
+            'parallactic_angle': self.parallactic_angle[index],
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        night = self.night
+        return {
+            'night': night.date.isoformat(),
+            'sunset': night.format_time(night.sunset),
+            'dusk': night.format_time(night.dusk),
+            'dawn': night.format_time(night.dawn),
+            'sunrise': night.format_time(night.sunrise),
+            'moon_illumination': round(float(np.mean(night.moon_illumination[night.dark_start:night.dark_end]))
+                                       if night.dark_end > night.dark_start else 0.0, 3),
+            'settings': self.settings,
+            'schedule': [dict(block, start=night.format_time(block['start']), end=night.format_time(block['end']))
+                         for block in self.schedule],
+            'targets': self.ranked(),
+        }
+
+
+# ----------------------------------------------------------------------
+# 规划器
+# ----------------------------------------------------------------------
+class NightPlanner:
+    """
+    固定站址的整夜规划器
+
+    用法:
+        planner = get_night_planner()
+        night = planner.night()                  # 今晚的站址星历（按观测夜缓存）
+        plan = planner.plan(targets)             # [(名称, 赤经, 赤纬)] 或 [{'name', 'ra', 'dec', 'priority', 'duration'}]
+        plan.schedule                            # 按时间排列的观测块
+        plan.ranked(20)                          # 得分最高的 20 个目标
+    """
+
+    def __init__(self, latitude: Optional[float] = None, longitude: Optional[float] = None,
+                 tz_name: Optional[str] = None, settings: Optional[Mapping[str, Any]] = None):
+        """
+        初始化规划器
+
+        Args:
+            latitude: 站址纬度，为空时取 TELESCOPE_CONFIG
+            longitude: 站址经度，为空时取 TELESCOPE_CONFIG
+            tz_name: 观测夜日期和显示时刻所用的时区，为空时取 TIMEZONE
+            settings: 覆盖 planning 配置
+        """
+        self.latitude = float(TELESCOPE_CONFIG['latitude'] if latitude is None else latitude)
+        self.longitude = float(TELESCOPE_CONFIG['longitude'] if longitude is None else longitude)
+        self.tz = pytz.timezone(tz_name or TIMEZONE)
+        self.settings = planning_settings(settings)
+        self.calculator = ParallacticCalculator(self.latitude, self.longitude)
+        self._lock = threading.Lock()
+        self._nights: 'OrderedDict[date_type, NightEphemeris]' = OrderedDict()
+        self.recomputes = 0
+
+    def night_date(self, t: Optional[float] = None) -> date_type:
+        """时刻 t 所属的观测夜日期（本地正午之前算作前一夜）"""
+        local = datetime.fromtimestamp(time.time() if t is None else t, self.tz) - timedelta(hours=12)
+        return local.date()
+
+    def night(self, night_date: Optional[date_type] = None) -> NightEphemeris:
+        """返回观测夜的站址星历，同一夜只计算一次"""
+        if night_date is None:
+            night_date = self.night_date()
+        with self._lock:
+            night = self._nights.get(night_date)
+            if night is not None:
+                self._nights.move_to_end(night_date)
+                return night
+            start = time.perf_counter()
+            night = NightEphemeris(night_date, self.latitude, self.longitude, self.tz,
+                                   float(self.settings['grid_step']), float(self.settings['twilight_altitude']))
+            self._nights[night_date] = night
+            while len(self._nights) > max(1, int(self.settings['cache_nights'])):
+                self._nights.popitem(last=False)
+            self.recomputes += 1
+            logger.debug("已计算 %s 夜的站址星历，耗时 %.1f ms", night_date, (time.perf_counter() - start) * 1000)
+        return night
+
+    def invalidate(self):
+        """丢弃缓存的站址星历（例如修改站址或网格步长后）"""
+        with self._lock:
+            self._nights.clear()
+
+    def plan(self, targets: Sequence[Any], night_date: Optional[date_type] = None,
+             schedule: bool = True, **overrides) -> NightPlan:
+        """
+        规划一夜
+
+        Args:
+            targets: [(名称, 赤经, 赤纬)] 或 [{'name', 'ra', 'dec'[, 'priority', 'duration']}]；
+                     赤经为小时或 'HH:MM:SS'，赤纬为度或 '±DD:MM:SS'（J2000）
+            night_date: 观测夜日期，为空时取当前时刻所属的观测夜
+            schedule: 是否排出观测顺序
+            **overrides: 覆盖约束（min_altitude、max_airmass、min_moon_separation、block_duration 等）
+
+        Returns:
+            NightPlan
+        """
+        settings = dict(self.settings, **overrides)
+        night = self.night(night_date)
+        names, ra, dec, priority, duration = self._normalize(targets, float(settings['block_duration']))
+        middle = float(night.jd[len(night.jd) // 2])
+        ra_date, dec_date = precess(ra, dec, middle)
+        plan = NightPlan(night, names, ra_date, dec_date, priority, duration, settings)
+        if not names:
+            plan.rise = plan.set = plan.transit = plan.transit_altitude = np.empty(0)
+            plan.observable_hours = plan.min_airmass = plan.best_time = plan.score = np.empty(0)
+            return plan
+
+        times = night.times
+        step = float(times[1] - times[0])
+        hour_angle = wrap_hour_angle(night.lst[None, :] - ra_date[:, None])
+        plan.hour_angle = hour_angle
+        plan.altitude = altitude(hour_angle, dec_date[:, None], self.latitude)
+        plan.airmass = airmass(plan.altitude)
+        plan.moon_separation = angular_distance(ra_date[:, None], dec_date[:, None],
+                                                night.moon_ra[None, :], night.moon_dec[None, :])
+        plan.parallactic_angle = parallactic_angle(hour_angle, dec_date[:, None], self.latitude)
+
+        dark = np.zeros(len(times), dtype=bool)
+        dark[night.dark_start:night.dark_end] = True
+        plan.observable = (dark[None, :]
+                           & (plan.altitude >= float(settings['min_altitude']))
+                           & (plan.airmass <= float(settings['max_airmass']))
+                           & (plan.moon_separation >= float(settings['min_moon_separation'])))
+
+        horizon = float(settings['horizon'])
+        plan.rise = first_crossings(times, plan.altitude - horizon, rising=True)
+        plan.set = first_crossings(times, plan.altitude - horizon, rising=False)
+        # 中天：正午之后时角第一次为 0 的时刻，由恒星时解析求出
+        sidereal_hours = (ra_date - night.lst[0]) % 24.0
+        plan.transit = times[0] + sidereal_hours * 3600.0 / SIDEREAL_RATE
+        plan.transit_altitude = 90.0 - np.abs(self.latitude - dec_date)
+
+        plan.observable_hours = plan.observable.sum(axis=1) * step / 3600.0
+        masked = np.where(plan.observable, plan.airmass, np.inf)
+        best = masked.argmin(axis=1)
+        plan.min_airmass = masked[np.arange(len(names)), best]
+        plan.best_time = np.where(np.isfinite(plan.min_airmass), times[best], np.nan)
+        with np.errstate(divide='ignore'):
+            plan.score = np.where(np.isfinite(plan.min_airmass),
+                                  priority * plan.observable_hours / plan.min_airmass, 0.0)
+        if schedule:
+            plan.schedule = self._dispatch(plan, step)
+            plan.scheduled = {block['index'] for block in plan.schedule}
+        return plan
+
+    @staticmethod
+    def _normalize(targets: Sequence[Any], default_duration: float):
+        names, ra, dec, priority, duration = [], [], [], [], []
+        for i, target in enumerate(targets):
+            if isinstance(target, Mapping):
+                name = target.get('name') or f"target{i + 1}"
+                target_ra, target_dec = target['ra'], target['dec']
+                target_priority = target.get('priority', 1.0)
+                target_duration = target.get('duration', default_duration)
+            else:
+                name, target_ra, target_dec = target[0], target[1], target[2]
+                target_priority, target_duration = 1.0, default_duration
+            names.append(str(name))
+            ra.append(parse_ra_hours(target_ra))
+            dec.append(parse_dec_degrees(target_dec))
+            priority.append(float(target_priority))
+            duration.append(float(target_duration))
+        return (names, np.array(ra, dtype=float), np.array(dec, dtype=float),
+                np.array(priority, dtype=float), np.array(duration, dtype=float))
+
+    def _dispatch(self, plan: NightPlan, step: float) -> List[Dict[str, Any]]:
+        """
+        按网格逐时段排出观测顺序
+
+        在每个空闲时刻，从"整个观测块内都满足约束"的未观测目标中选价值最高的一个：
+            价值 = 优先级 × (1 / 块中点大气质量 + 块长度 / 当前起剩余可观测时长)
+        后一项是紧迫程度：即将落下、今晚只剩这一次机会的目标优先。
+        """
+        night = plan.night
+        count, slots = plan.observable.shape
+        blocks = np.maximum(1, np.ceil(plan.duration / step).astype(int))
+        # cumulative[:, i] 为前 i 个网格点中可观测的个数，块内可观测个数由两次取值相减得到
+        cumulative = np.zeros((count, slots + 1), dtype=np.int32)
+        np.cumsum(plan.observable, axis=1, out=cumulative[:, 1:])
+        starts = np.arange(slots)[None, :]
+        ends = np.minimum(starts + blocks[:, None], slots)
+        inside = np.take_along_axis(cumulative, ends, axis=1) - cumulative[:, :slots]
+        feasible = (inside == blocks[:, None]) & (starts + blocks[:, None] <= slots)
+        remaining = cumulative[:, slots:slots + 1] - cumulative[:, :slots]
+        middle = np.minimum(starts + blocks[:, None] // 2, slots - 1)
+        middle_airmass = np.take_along_axis(plan.airmass, middle, axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            merit = plan.priority[:, None] * (1.0 / middle_airmass
+                                              + blocks[:, None] / np.maximum(remaining, 1))
+        merit = np.where(feasible, merit, -np.inf)
+
+        schedule = []
+        done = np.zeros(count, dtype=bool)
+        tolerance = float(plan.settings['rotator_tolerance'])
+        rotator_step = float(plan.settings['rotator_step'])
+        i = night.dark_start
+        while i < night.dark_end:
+            column = np.where(done, -np.inf, merit[:, i])
+            j = int(column.argmax())
+            if not np.isfinite(column[j]):
+                i += 1
+                continue
+            done[j] = True
+            start = float(night.times[i])
+            end = start + float(plan.duration[j])
+            mid = int(middle[j, i])
+            track = self.calculator.night_track(float(plan.ra[j]), float(plan.dec[j]), start, end, rotator_step)
+            schedule.append({
+                'index': j,
+                'name': plan.names[j],
+                'start': start,
+                'end': end,
+                'altitude': round(float(plan.altitude[j, mid]), 2),
+                'airmass': round(float(plan.airmass[j, mid]), 3),
+                'moon_separation': round(float(plan.moon_separation[j, i:i + blocks[j]].min()), 1),
+                'parallactic_angle_start': round(float(track['parallactic_angle'][0]), 2),
+                'parallactic_angle_end': round(float(track['parallactic_angle'][-1]), 2),
+                'rotator_moves': len(plan_rotator_moves(track, tolerance)),
+                'crosses_meridian': bool(start <= plan.transit[j] <= end),
+            })
+            i += int(blocks[j])
+        return schedule
+
+
+def load_targets(path: str) -> List[Any]:
+    """
+    读取目标列表
+
+    .json 文件为 [{'name', 'ra', 'dec'[, 'priority', 'duration']}]；
+    其他文件与 DSS 预取的目标列表格式相同（每行：名称 赤经 赤纬）。
+    """
+    if path.lower().endswith('.json'):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    from src.services.dss_prefetch import load_target_list
+    return load_target_list(path)
+
+
+_night_planner = None
+_night_planner_lock = threading.Lock()
+
+
+def get_night_planner() -> NightPlanner:
+    """获取全局规划器"""
+    global _night_planner
+    if _night_planner is None:
+        with _night_planner_lock:
+            if _night_planner is None:
+                _night_planner = NightPlanner()
+    return _night_planner
+
+
+def main():
+    parser = argparse.ArgumentParser(description='整夜观测规划')
+    parser.add_argument('targets', nargs='?', help='目标列表（.json 或 名称 赤经 赤纬 每行一个），为空时取配置')
+    parser.add_argument('--night', help='观测夜日期 YYYY-MM-DD，默认今晚')
+    parser.add_argument('--min-altitude', type=float, help='可观测的最低高度角（度）')
+    parser.add_argument('--max-airmass', type=float, help='可观测的最大大气质量')
+    parser.add_argument('--moon-separation', type=float, help='与月亮的最小角距（度）')
+    parser.add_argument('--duration', type=float, help='每个目标的观测时长（秒）')
+    parser.add_argument('--top', type=int, default=20, help='列出得分最高的目标数')
+    parser.add_argument('--output', help='把规划结果写入 JSON 文件')
+    args = parser.parse_args()
+
+    path = (args.targets or get_config_service().get('planning.target_list')
+            or get_config_service().get('dss_prefetch.target_list'))
+    if not path:
+        parser.error('未指定目标列表')
+    overrides = {key: value for key, value in (('min_altitude', args.min_altitude),
+                                               ('max_airmass', args.max_airmass),
+                                               ('min_moon_separation', args.moon_separation),
+                                               ('block_duration', args.duration)) if value is not None}
+    night_date = datetime.strptime(args.night, '%Y-%m-%d').date() if args.night else None
+
+    targets = load_targets(path)
+    planner = get_night_planner()
+    start = time.perf_counter()
+    plan = planner.plan(targets, night_date, **overrides)
+    elapsed = time.perf_counter() - start
+    night = plan.night
+    print(f"{night.date} 夜：日落 {night.format_time(night.sunset)}，天文夜 {night.format_time(night.dusk)}"
+          f" ~ {night.format_time(night.dawn)}（{night.dark_hours:.1f} 小时）")
+    print(f"{len(plan)} 个目标，排入 {len(plan.schedule)} 个观测块，用时 {elapsed * 1000:.0f} ms")
+    for block in plan.schedule:
+        flags = '  过中天' if block['crosses_meridian'] else ''
+        print(f"  {night.format_time(block['start'])[11:16]}-{night.format_time(block['end'])[11:16]}  "
+              f"{block['name']:<20} 高度 {block['altitude']:5.1f}°  X={block['airmass']:.2f}  "
+              f"月距 {block['moon_separation']:5.1f}°  旁行角 {block['parallactic_angle_start']:7.1f}° -> "
+              f"{block['parallactic_angle_end']:7.1f}°（消旋器 {block['rotator_moves']} 次）{flags}")
+    print(f"得分最高的 {args.top} 个目标:")
+    for row in plan.ranked(args.top):
+        print(f"  {row['name']:<20} 得分 {row['score']:7.2f}  可观测 {row['observable_hours']:4.1f} h  "
+              f"中天 {row['transit']} ({row['transit_altitude']:.1f}°)")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(plan.to_dict(), f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.output}")
+
+
+if __name__ == '__main__':
+    main()
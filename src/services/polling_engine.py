@@ -0,0 +1,868 @@
+"""
+设备批量轮询引擎
+
+把 config.yaml 中所有已启用 Alpaca 设备的端点合并到同一个轮询周期里，
+通过有界线程池和长连接会话并发读取，每个周期为每台设备产出一个合并快照，
+再按 TelescopeMonitor 的信号约定分发给界面。
+
+每个端点属于一个轮询层级：连接后只读一次、慢速、普通和运动时加速。
+设备报告 slewing/ismoving 等运动状态时自动切换到快速轮询，停止后延时回落。
+
+每个周期最多等待 cycle_deadline 秒，超时未返回的请求留到下一个周期收取，不阻塞其他设备；
+读取失败的字段保留上一次的有效值，错误信息放在快照的 '_errors' 字段中（{字段名: 错误}）。
+"""
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import requests
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from src.config.config_service import get_config_service
+from src.services.alpaca_registry import AlpacaClientRegistry, alpaca_registry
+
+logger = logging.getLogger(__name__)
+
+# config.yaml 设备键 -> Alpaca 设备类型
+DEVICE_TYPES = {
+    'telescope': 'telescope',
+    'focuser': 'focuser',
+    'rotator': 'rotator',
+    'ObservingConditions': 'observingconditions',
+    'dome': 'dome',
+    'covercalibrator': 'covercalibrator',
+}
+
+# 快照字段名与 Alpaca 端点名不一致的情况
+ENDPOINT_ALIASES = {
+    'shutter_status': 'shutterstatus',
+}
+
+# 镜头盖状态值 -> 名称，与 TelescopeMonitor 保持一致
+COVER_STATES = {
+    0: 'NotPresent',
+    1: 'Closed',
+    2: 'Moving',
+    3: 'Open',
+    4: 'Unknown',
+    5: 'Error',
+}
+
+DEFAULT_API_URL = 'http://202.127.24.217:11111'
+
+# 轮询层级
+TIER_ONCE = 'once'      # 连接后只读一次（口径、站点经纬度、最大步数等静态值）
+TIER_SLOW = 'slow'      # 慢速（很少变化的值）
+TIER_NORMAL = 'normal'  # 普通
+TIER_FAST = 'fast'      # 设备运动时加速，静止时按 fast_idle 间隔
+TIER_SAFETY = 'safety'  # 安全联锁依赖的气象读数，固定短间隔
+
+# 各层级的轮询间隔（秒）
+DEFAULT_POLL_INTERVALS = {
+    'fast': 0.5,          # 运动期间快速层级的间隔
+    'fast_idle': 5.0,     # 静止时快速层级的间隔
+    'motion_flag': 2.0,   # 静止时运动标志（slewing/ismoving 等）的间隔
+    'safety': 0.5,        # 降雨、阵风、湿度等安全联锁读数的间隔
+    'normal': 30.0,
+    'slow': 60.0,
+}
+
+# 运动结束后保持快速轮询的时间（秒）
+DEFAULT_FAST_HOLD = 5.0
+
+# 每个轮询周期等待请求返回的最长时间（秒），慢速端点的结果在之后的周期中收取
+DEFAULT_CYCLE_DEADLINE = 0.8
+
+# 快照中记录读取失败字段的元数据键
+ERRORS_KEY = '_errors'
+
+# 默认端点层级，未列出的端点按普通层级处理
+DEFAULT_ENDPOINT_TIERS = {
+    'telescope': {
+        'rightascension': TIER_FAST,
+        'declination': TIER_FAST,
+        'altitude': TIER_FAST,
+        'azimuth': TIER_FAST,
+        'slewing': TIER_FAST,
+        'alignmentmode': TIER_ONCE,
+        'aperturediameter': TIER_ONCE,
+        'doesrefraction': TIER_ONCE,
+        'siteelevation': TIER_ONCE,
+        'sitelatitude': TIER_ONCE,
+        'sitelongitude': TIER_ONCE,
+        'trackingrate': TIER_SLOW,
+        'utcdate': TIER_SLOW,
+    },
+    'focuser': {
+        'position': TIER_FAST,
+        'ismoving': TIER_FAST,
+        'absolute': TIER_ONCE,
+        'maxincrement': TIER_ONCE,
+        'maxstep': TIER_ONCE,
+        'stepsize': TIER_ONCE,
+        'temperature': TIER_SLOW,
+    },
+    'rotator': {
+        'position': TIER_FAST,
+        'ismoving': TIER_FAST,
+        'targetposition': TIER_FAST,
+        'reverse': TIER_ONCE,
+        'stepsize': TIER_ONCE,
+    },
+    'dome': {
+        'azimuth': TIER_FAST,
+        'slewing': TIER_FAST,
+        'shutter_status': TIER_FAST,
+    },
+    'covercalibrator': {
+        'coverstate': TIER_FAST,
+        'calibratorstate': TIER_SLOW,
+    },
+    'ObservingConditions': {
+        'rainrate': TIER_SAFETY,
+        'windgust': TIER_SAFETY,
+        'windspeed': TIER_SAFETY,
+        'humidity': TIER_SAFETY,
+    },
+}
+
+# 运动标志字段及其“正在运动”的判定
+MOTION_FLAGS = {
+    'slewing': lambda value: bool(value),
+    'ismoving': lambda value: bool(value),
+    'shutter_status': lambda value: value in (2, 3),   # 天窗正在打开/关闭
+    'coverstate': lambda value: value == 2,            # 镜头盖移动中
+}
+
+
+class PollTarget:
+    """一台需要轮询的设备"""
+
+    def __init__(self, device_key: str, device_type: str, base_url: str,
+                 endpoints: List[str], device_number: int = 0,
+                 tiers: Optional[Dict[str, str]] = None):
+        self.device_key = device_key
+        self.device_type = device_type
+        self.base_url = base_url.rstrip('/')
+        self.endpoints = list(endpoints)
+        self.device_number = device_number
+        self.tiers = dict(DEFAULT_ENDPOINT_TIERS.get(device_key, {}))
+        if tiers:
+            self.tiers.update(tiers)
+
+    def url_for(self, field: str) -> str:
+        """返回某个快照字段对应的请求地址"""
+        endpoint = ENDPOINT_ALIASES.get(field, field)
+        return f"{self.base_url}/api/v1/{self.device_type}/{self.device_number}/{endpoint}"
+
+    def tier_of(self, field: str) -> str:
+        """返回端点所属的轮询层级"""
+        return self.tiers.get(field, TIER_NORMAL)
+
+    def __repr__(self):
+        return f"PollTarget({self.device_key}, {len(self.endpoints)} endpoints @ {self.base_url})"
+
+
+def build_poll_targets(config: Dict[str, Any], connected: Optional[Dict[str, int]] = None,
+                       always: Iterable[str] = ()) -> List[PollTarget]:
+    """
+    根据配置生成轮询目标列表
+
+    只包含启用且通过 HTTP 访问的 Alpaca 设备，串口设备（水冷机、UPS）和全天相机不在此列。
+    设备配置中的 poll_tiers 可以覆盖默认的端点层级。
+
+    Args:
+        config: 配置字典
+        connected: 界面中已连接的设备（设备键 -> 设备号）；给出时只轮询这些设备（不要求配置中启用），
+                   设备号取连接时选择的设备号
+        always: connected 给出时仍按配置轮询的设备键（安全联锁读取的设备）
+    """
+    targets = []
+    devices = config.get('devices', {})
+    always = set(always)
+    for device_key, device_config in devices.items():
+        device_type = DEVICE_TYPES.get(device_key)
+        if not device_type:
+            continue
+        device_number = device_config.get('device_number', 0)
+        if connected is not None and device_key in connected:
+            device_number = connected[device_key]
+        elif connected is not None and device_key not in always:
+            continue
+        elif not device_config.get('enabled', False):
+            continue
+        base_url = device_config.get('api_url') or config.get('default_api_base_url') or DEFAULT_API_URL
+        if not base_url.startswith(('http://', 'https://')):
+            continue
+        endpoints = device_config.get('endpoints', [])
+        if not endpoints:
+            continue
+        targets.append(PollTarget(device_key, device_type, base_url, endpoints, device_number,
+                                  device_config.get('poll_tiers')))
+    return targets
+
+
+class DeviceConnections:
+    """
+    界面中已连接的设备（设备键 -> 设备号）
+
+    设备控件的 DeviceListMonitor 在连接、断开设备时更新；跟随连接的 PollingMonitor 据此增减轮询目标。
+    """
+
+    def __init__(self):
+        self._devices: Dict[str, int] = {}
+        self._listeners: List = []
+        self._lock = threading.Lock()
+
+    def connect_device(self, device_key: str, device_number: int):
+        with self._lock:
+            if self._devices.get(device_key) == device_number:
+                return
+            self._devices[device_key] = device_number
+        self._notify()
+
+    def disconnect_device(self, device_key: str):
+        with self._lock:
+            if self._devices.pop(device_key, None) is None:
+                return
+        self._notify()
+
+    def devices(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._devices)
+
+    def add_listener(self, callback: Callable[[Dict[str, int]], None]) -> Callable[[], None]:
+        """callback(已连接设备字典) 在调用 connect_device/disconnect_device 的线程中调用，返回取消函数"""
+        with self._lock:
+            self._listeners.append(callback)
+
+        def remove():
+            with self._lock:
+                if callback in self._listeners:
+                    self._listeners.remove(callback)
+        return remove
+
+    def _notify(self):
+        devices = self.devices()
+        with self._lock:
+            listeners = list(self._listeners)
+        for callback in listeners:
+            try:
+                callback(devices)
+            except Exception as e:
+                logger.error("处理设备连接变化出错: %s", e)
+
+
+_device_connections: Optional[DeviceConnections] = None
+_device_connections_lock = threading.Lock()
+
+
+def get_device_connections() -> DeviceConnections:
+    """获取全局设备连接表"""
+    global _device_connections
+    with _device_connections_lock:
+        if _device_connections is None:
+            _device_connections = DeviceConnections()
+        return _device_connections
+
+
+class RequestRateCounter:
+    """按设备统计的请求速率计数器"""
+
+    def __init__(self, window: float = 60.0):
+        self.window = window
+        self.totals: Dict[str, int] = {}
+        self._events = deque()
+        self._lock = threading.Lock()
+
+    def record(self, device_key: str, count: int, now: Optional[float] = None):
+        """记录某台设备发出的请求数"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self.totals[device_key] = self.totals.get(device_key, 0) + count
+            self._events.append((now, device_key, count))
+            cutoff = now - self.window
+            while self._events and self._events[0][0] < cutoff:
+                self._events.popleft()
+
+    def rates(self, now: Optional[float] = None) -> Dict[str, float]:
+        """返回统计窗口内每台设备的请求数/秒"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if not self._events:
+                return {}
+            span = max(1e-6, min(self.window, now - self._events[0][0]))
+            counts: Dict[str, int] = {}
+            for _, device_key, count in self._events:
+                counts[device_key] = counts.get(device_key, 0) + count
+        return {device_key: count / span for device_key, count in counts.items()}
+
+
+class PollingEngine:
+    """
+    批量轮询引擎（不依赖 Qt，可单独使用）
+
+    每个周期把到期端点一次性提交到有界线程池，
+    请求经由 alpaca_registry 中的共享会话发出，与界面命令共用同一组长连接。
+    """
+
+    def __init__(self, targets: List[PollTarget], max_workers: int = 16,
+                 timeout=(2, 5), client_id: int = 123,
+                 intervals: Optional[Dict[str, float]] = None,
+                 fast_hold: float = DEFAULT_FAST_HOLD,
+                 registry: Optional[AlpacaClientRegistry] = None,
+                 cycle_deadline: Optional[float] = DEFAULT_CYCLE_DEADLINE):
+        """
+        初始化轮询引擎
+
+        Args:
+            targets: 轮询目标列表
+            max_workers: 并发请求数上限
+            timeout: requests 的 (连接, 读取) 超时
+            client_id: Alpaca ClientID
+            intervals: 覆盖 DEFAULT_POLL_INTERVALS 中的层级间隔
+            fast_hold: 运动结束后保持快速轮询的时间（秒）
+            registry: 客户端注册表，为空时使用全局 alpaca_registry
+            cycle_deadline: 每个周期等待请求返回的最长时间（秒），None 表示等待全部返回
+        """
+        self.targets = list(targets)
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.client_id = client_id
+        self.intervals = dict(DEFAULT_POLL_INTERVALS)
+        if intervals:
+            self.intervals.update(intervals)
+        self.fast_hold = fast_hold
+        self.cycle_deadline = cycle_deadline
+        self.last_cycle_duration = 0.0
+        self.last_errors: Dict[str, str] = {}
+        self.last_polled: List[tuple] = []
+        self.request_counter = RequestRateCounter()
+
+        # 自适应轮询状态：最近一次的合并快照、每个端点的下次到期时间、各设备快速模式截止时间
+        self.snapshots: Dict[str, Dict[str, Any]] = {t.device_key: {} for t in self.targets}
+        self._next_due: Dict[tuple, float] = {}
+        self._fast_until: Dict[str, float] = {}
+        # 上一个周期超时未返回的请求，以及各设备当前读取失败的字段
+        self._inflight: Dict[Future, tuple] = {}
+        self.field_errors: Dict[str, Dict[str, str]] = {}
+        # 安全联锁读取的 (设备键, 字段)，间隔不超过 safety 层级
+        self.safety_fields: Set[Tuple[str, str]] = set()
+
+        self.registry = registry or alpaca_registry
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='alpaca-poll')
+
+    def _session_for(self, base_url: str) -> requests.Session:
+        """获取某个服务器的共享长连接会话"""
+        return self.registry.get_client(base_url).session
+
+    def _fetch(self, target: PollTarget, field: str):
+        """读取单个端点，失败时抛出异常"""
+        session = self._session_for(target.base_url)
+        params = {'ClientID': self.client_id, 'ClientTransactionID': self.registry.next_transaction_id()}
+        response = session.get(target.url_for(field), params=params, timeout=self.timeout)
+        response.raise_for_status()
+        data = response.json()
+        if data.get('ErrorNumber', 0) != 0:
+            raise RuntimeError(data.get('ErrorMessage', 'Unknown error'))
+        return data.get('Value')
+
+    def _fetch_many(self, requests_to_send):
+        """
+        并发读取一组 (目标, 字段)，最多等待 cycle_deadline 秒
+
+        上一个周期超时未返回的请求在本周期一并收取，超时的请求不会重复提交。
+
+        Returns:
+            (按设备分组的成功结果, 按设备分组的失败字段及错误信息)
+        """
+        start = time.perf_counter()
+        futures = dict(self._inflight)
+        sent: Dict[str, int] = {}
+        for target, field in requests_to_send:
+            futures[self._executor.submit(self._fetch, target, field)] = (target, field)
+            sent[target.device_key] = sent.get(target.device_key, 0) + 1
+
+        done, pending = wait(futures, timeout=self.cycle_deadline)
+        self._inflight = {future: futures[future] for future in pending}
+
+        results: Dict[str, Dict[str, Any]] = {}
+        failed: Dict[str, Dict[str, str]] = {}
+        errors = {}
+        for future in done:
+            target, field = futures[future]
+            field_errors = self.field_errors.setdefault(target.device_key, {})
+            try:
+                results.setdefault(target.device_key, {})[field] = future.result()
+                field_errors.pop(field, None)
+            except Exception as e:
+                failed.setdefault(target.device_key, {})[field] = field_errors[field] = str(e)
+                errors[f"{target.device_key}.{field}"] = str(e)
+
+        now = time.monotonic()
+        for device_key, count in sent.items():
+            self.request_counter.record(device_key, count, now)
+        self.last_errors = errors
+        self.last_cycle_duration = time.perf_counter() - start
+        if errors:
+            logger.debug("轮询周期内 %d 个端点读取失败", len(errors))
+        if pending:
+            logger.debug("%d 个端点超过周期截止时间，结果留到下一个周期", len(pending))
+        return results, failed
+
+    def _with_errors(self, device_key: str, snapshot: Dict[str, Any]) -> Dict[str, Any]:
+        """快照副本，附带当前读取失败的字段"""
+        result = dict(snapshot)
+        result[ERRORS_KEY] = dict(self.field_errors.get(device_key, {}))
+        return result
+
+    def poll_cycle(self, targets: Optional[List[PollTarget]] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        执行一个完整的轮询周期（读取全部端点，不考虑层级）
+
+        Returns:
+            {设备键: 合并后的完整快照}，读取失败的字段保留上一次的值，错误信息见 '_errors'
+        """
+        targets = self.targets if targets is None else targets
+        inflight = {(target.device_key, field) for target, field in self._inflight.values()}
+        results, _failed = self._fetch_many([(t, field) for t in targets for field in t.endpoints
+                                             if (t.device_key, field) not in inflight])
+        snapshots = {}
+        for target in targets:
+            snapshot = self.snapshots.setdefault(target.device_key, {})
+            snapshot.update(results.get(target.device_key, {}))
+            snapshots[target.device_key] = self._with_errors(target.device_key, snapshot)
+        return snapshots
+
+    def set_targets(self, targets: List[PollTarget]):
+        """
+        替换轮询目标（配置热加载时调用，可在其他线程中调用）
+
+        新目标的所有端点在下一次 poll_due 时立即读取一次。
+        """
+        self.targets = list(targets)
+        self.snapshots = {t.device_key: self.snapshots.get(t.device_key, {}) for t in self.targets}
+        self._next_due = {}
+
+    def set_safety_fields(self, fields: Iterable[Tuple[str, str]]):
+        """
+        登记安全联锁读取的字段
+
+        这些字段无论原来属于哪个层级（天窗、镜头盖状态属于快速层级，静止时 2 秒一次），
+        轮询间隔都不超过 safety 层级的间隔。
+        """
+        self.safety_fields = set(fields)
+
+    # ------------------------------------------------------------------
+    # 自适应轮询
+    # ------------------------------------------------------------------
+    def is_fast(self, device_key: str, now: Optional[float] = None) -> bool:
+        """设备当前是否处于快速轮询模式"""
+        now = time.monotonic() if now is None else now
+        return now < self._fast_until.get(device_key, 0.0)
+
+    def boost(self, device_key: str, duration: Optional[float] = None):
+        """
+        让某台设备立即进入快速轮询模式
+
+        发出运动类命令（开天窗、转动消旋器等）后调用，不必等下一次读到运动标志。
+        """
+        now = time.monotonic()
+        self._fast_until[device_key] = now + (self.fast_hold if duration is None else duration)
+        for target in self.targets:
+            if target.device_key == device_key:
+                for field in target.endpoints:
+                    if target.tier_of(field) == TIER_FAST:
+                        self._next_due[(device_key, field)] = now
+
+    def interval_for(self, target: PollTarget, field: str, fast: bool) -> Optional[float]:
+        """计算端点的下一次轮询间隔，None 表示不再轮询"""
+        tier = target.tier_of(field)
+        if tier == TIER_ONCE:
+            return None
+        if tier == TIER_FAST:
+            if fast:
+                interval = self.intervals['fast']
+            elif field in MOTION_FLAGS:
+                interval = self.intervals['motion_flag']
+            else:
+                interval = self.intervals['fast_idle']
+        else:
+            interval = self.intervals.get(tier, self.intervals['normal'])
+        if (target.device_key, field) in self.safety_fields:
+            return min(interval, self.intervals[TIER_SAFETY])
+        return interval
+
+    def due_requests(self, now: float):
+        """列出当前到期的 (目标, 字段)，仍在等待返回的请求除外"""
+        inflight = {(target.device_key, field) for target, field in self._inflight.values()}
+        due = []
+        for target in self.targets:
+            for field in target.endpoints:
+                key = (target.device_key, field)
+                if now >= self._next_due.get(key, 0.0) and key not in inflight:
+                    due.append((target, field))
+        return due
+
+    def seconds_until_due(self, now: Optional[float] = None) -> float:
+        """距离最近一个端点到期的秒数"""
+        now = time.monotonic() if now is None else now
+        pending = [self._next_due.get((t.device_key, f), 0.0) for t in self.targets for f in t.endpoints]
+        if self._inflight and self.cycle_deadline is not None:
+            pending.append(now + self.cycle_deadline)
+        if not pending:
+            return self.intervals['normal']
+        return max(0.0, min(pending) - now)
+
+    def poll_due(self, now: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        只读取已到期的端点，并合并进每台设备最近的快照
+
+        Returns:
+            {设备键: 合并后的完整快照}，只包含本次有端点返回的设备；
+            读取失败的字段保留上一次的值，错误信息见 '_errors'
+        """
+        now = time.monotonic() if now is None else now
+        due = self.due_requests(now)
+        self.last_polled = [(target.device_key, field) for target, field in due]
+        if not due and not self._inflight:
+            return {}
+
+        results, failed = self._fetch_many(due)
+        done = time.monotonic()
+        targets = {t.device_key: t for t in self.targets}
+        updated = {}
+        for device_key in {**results, **failed}:
+            values = results.get(device_key, {})
+            target = targets.get(device_key)
+            if target is None:
+                # 读取期间目标已被 set_targets 替换
+                continue
+            snapshot = self.snapshots.setdefault(device_key, {})
+            snapshot.update(values)
+
+            was_fast = self.is_fast(device_key, done)
+            moving = any(MOTION_FLAGS[f](snapshot.get(f)) for f in MOTION_FLAGS if f in snapshot)
+            if moving:
+                self._fast_until[device_key] = done + self.fast_hold
+                if not was_fast:
+                    logger.debug("%s 开始运动，切换到快速轮询", device_key)
+            fast = self.is_fast(device_key, done)
+
+            for field in values:
+                interval = self.interval_for(target, field, fast)
+                self._next_due[(device_key, field)] = done + (float('inf') if interval is None else interval)
+            for field in failed.get(device_key, {}):
+                # 只读一次的端点读取失败时按普通间隔重试
+                interval = self.interval_for(target, field, fast)
+                self._next_due[(device_key, field)] = done + (self.intervals['normal'] if interval is None
+                                                              else interval)
+
+            if fast and not was_fast:
+                # 刚进入快速模式：快速层级的端点立即到期
+                for field in target.endpoints:
+                    if target.tier_of(field) == TIER_FAST and field not in values:
+                        self._next_due[(device_key, field)] = done
+            updated[device_key] = self._with_errors(device_key, snapshot)
+        return updated
+
+    def request_stats(self, flat_interval: float = 1.0) -> Dict[str, Dict[str, float]]:
+        """
+        每台设备的请求统计
+
+        Returns:
+            {设备键: {'rate': 当前请求数/秒, 'flat_rate': 所有端点按 flat_interval 统一轮询时的请求数/秒,
+                      'total': 累计请求数}}
+        """
+        rates = self.request_counter.rates()
+        stats = {}
+        for target in self.targets:
+            stats[target.device_key] = {
+                'rate': rates.get(target.device_key, 0.0),
+                'flat_rate': len(target.endpoints) / flat_interval,
+                'total': self.request_counter.totals.get(target.device_key, 0),
+            }
+        return stats
+
+    def close(self):
+        """关闭线程池（共享会话由注册表管理，不在此关闭）"""
+        self._executor.shutdown(wait=False)
+
+
+class PollingMonitor(QThread):
+    """
+    批量轮询线程
+
+    信号与 TelescopeMonitor 保持一致，界面可以直接复用原有的槽函数；
+    另外提供 snapshot_updated 信号输出每台设备的完整合并快照，
+    stats_updated 信号定期输出每台设备的请求速率。
+    """
+    coordinates_updated = pyqtSignal(float, float, float, float)
+    status_updated = pyqtSignal(dict)
+    focuser_updated = pyqtSignal(dict)
+    rotator_updated = pyqtSignal(dict)
+    weather_updated = pyqtSignal(dict)
+    cover_updated = pyqtSignal(dict)
+    dome_updated = pyqtSignal(dict)
+    snapshot_updated = pyqtSignal(str, dict)
+    cycle_finished = pyqtSignal(float)
+    stats_updated = pyqtSignal(dict)
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None, interval: float = 1.0,
+                 max_workers: int = 16, adaptive: Optional[bool] = None,
+                 connections: Optional[DeviceConnections] = None, parent=None):
+        """
+        初始化轮询线程
+
+        Args:
+            config: 配置字典，为空时使用配置服务的快照并跟随 config.yaml 的修改
+            interval: 非自适应模式下的轮询周期（秒），同时作为请求速率对比的基准
+            max_workers: 并发请求数上限
+            adaptive: 是否按端点层级自适应轮询，为空时取配置 polling.adaptive（默认开启）
+            connections: 设备连接表；给出时只轮询界面中已连接的设备和安全联锁读取的设备，
+                         为空时轮询配置中启用的全部设备（遥测服务、无界面运行）
+            parent: 父QObject
+        """
+        super().__init__(parent)
+        self._unsubscribe = None
+        self._remove_connection_listener = None
+        if config is None:
+            service = get_config_service()
+            config = service.snapshot()
+            # 设备地址或端点修改后无需重启即可生效
+            self._unsubscribe = service.subscribe('devices', self._on_devices_changed)
+        self.config = config
+        self.connections = connections
+        polling_config = config.get('polling', {})
+        self.interval = interval
+        self.adaptive = polling_config.get('adaptive', True) if adaptive is None else adaptive
+        self.stats_interval = polling_config.get('stats_interval', 30.0)
+        self.engine = PollingEngine(self.build_targets(),
+                                    max_workers=polling_config.get('max_workers', max_workers),
+                                    client_id=config.get('client_id', 123),
+                                    intervals=polling_config.get('intervals'),
+                                    fast_hold=polling_config.get('fast_hold', DEFAULT_FAST_HOLD),
+                                    cycle_deadline=polling_config.get('cycle_deadline', DEFAULT_CYCLE_DEADLINE))
+        self.is_running = False
+        if connections is not None:
+            self._remove_connection_listener = connections.add_listener(self._on_connections_changed)
+
+    def build_targets(self) -> List[PollTarget]:
+        """按当前配置（和设备连接表）生成轮询目标"""
+        if self.connections is None:
+            return build_poll_targets(self.config)
+        engine = getattr(self, 'engine', None)
+        always = {device_key for device_key, _ in engine.safety_fields} if engine is not None else ()
+        return build_poll_targets(self.config, self.connections.devices(), always)
+
+    def stop(self):
+        """停止线程"""
+        self.is_running = False
+        if self._unsubscribe:
+            self._unsubscribe()
+            self._unsubscribe = None
+        if self._remove_connection_listener:
+            self._remove_connection_listener()
+            self._remove_connection_listener = None
+
+    def _on_devices_changed(self, _devices):
+        self.config = get_config_service().snapshot()
+        self.engine.set_targets(self.build_targets())
+        logger.info("设备配置已变化，轮询目标已更新")
+
+    def _on_connections_changed(self, devices: Dict[str, int]):
+        self.engine.set_targets(self.build_targets())
+        logger.info("已连接设备变化，轮询目标: %s", ', '.join(t.device_key for t in self.engine.targets) or '无')
+
+    def run(self):
+        """线程运行方法"""
+        self.is_running = True
+        if self.connections is not None:
+            # 安全联锁在线程启动前登记读取的字段，这些设备未在界面中连接也要轮询
+            self.engine.set_targets(self.build_targets())
+        last_stats = time.monotonic()
+        while self.is_running:
+            cycle_start = time.monotonic()
+            try:
+                if self.adaptive:
+                    snapshots = self.engine.poll_due(cycle_start)
+                else:
+                    snapshots = self.engine.poll_cycle()
+                if snapshots:
+                    self.dispatch(snapshots)
+                    self.cycle_finished.emit(self.engine.last_cycle_duration)
+            except Exception as e:
+                logger.error("批量轮询出错: %s", e)
+
+            now = time.monotonic()
+            if now - last_stats >= self.stats_interval:
+                last_stats = now
+                self.emit_stats()
+
+            if self.adaptive:
+                remaining = min(self.engine.seconds_until_due(now), self.interval)
+            else:
+                # 按固定节拍运行，周期耗时从等待时间中扣除
+                remaining = self.interval - (now - cycle_start)
+            while self.is_running and remaining > 0:
+                step = min(remaining, 0.1)
+                time.sleep(step)
+                remaining -= step
+        self.engine.close()
+
+    def emit_stats(self):
+        """输出并记录每台设备的请求速率（自适应 vs 全端点统一轮询）"""
+        stats = self.engine.request_stats(self.interval)
+        for device_key, item in stats.items():
+            logger.info("%s 请求速率: %.2f 次/秒（统一轮询为 %.2f 次/秒）",
+                        device_key, item['rate'], item['flat_rate'])
+        self.stats_updated.emit(stats)
+
+    def dispatch(self, snapshots: Dict[str, Dict[str, Any]]):
+        """把合并快照转换为各设备的信号"""
+        for device_key, snapshot in snapshots.items():
+            self.snapshot_updated.emit(device_key, snapshot)
+
+            if device_key == 'telescope':
+                coords = [snapshot.get(k) for k in ('rightascension', 'declination', 'altitude', 'azimuth')]
+                if all(v is not None for v in coords):
+                    self.coordinates_updated.emit(*[float(v) for v in coords])
+                self.status_updated.emit({
+                    key: bool(snapshot.get(key) or False)
+                    for key in ('athome', 'atpark', 'ispulseguiding', 'slewing', 'tracking')
+                })
+            elif device_key == 'focuser':
+                self.focuser_updated.emit({
+                    'position': snapshot.get('position') or 0,
+                    'ismoving': bool(snapshot.get('ismoving') or False),
+                    'temperature': snapshot.get('temperature'),
+                    'maxstep': snapshot.get('maxstep') or 60000,
+                })
+            elif device_key == 'rotator':
+                if snapshot.get('position') is not None:
+                    self.rotator_updated.emit({
+                        'position': snapshot.get('position') or 0,
+                        'ismoving': bool(snapshot.get('ismoving') or False),
+                        'reverse': bool(snapshot.get('reverse') or False),
+                        'stepsize': snapshot.get('stepsize') or 1.0,
+                        'targetposition': snapshot.get('targetposition') or 0,
+                    })
+            elif device_key == 'ObservingConditions':
+                self.weather_updated.emit(dict(snapshot))
+            elif device_key == 'covercalibrator':
+                raw_value = snapshot.get('coverstate')
+                if raw_value is None:
+                    raw_value = 5
+                self.cover_updated.emit({
+                    'coverstate': COVER_STATES.get(raw_value, 'Unknown'),
+                    'raw_value': raw_value,
+                    'calibratorstate': snapshot.get('calibratorstate'),
+                    'brightness': snapshot.get('brightness', 0),
+                    'timestamp': time.time(),
+                })
+            elif device_key == 'dome':
+                self.dome_updated.emit(dict(snapshot))
+
+
+# TelescopeMonitor 的设备类型 -> config.yaml 设备键
+MONITOR_DEVICE_KEYS = {
+    'mount': 'telescope',
+    'weather': 'ObservingConditions',
+    'observingconditions': 'ObservingConditions',
+    'cover': 'covercalibrator',
+}
+
+DEVICE_SCAN_INTERVAL = 2.0
+
+
+class DeviceListMonitor(QThread):
+    """
+    TelescopeMonitor 的替代
+
+    每个设备控件原来各有一个 TelescopeMonitor 线程，连接后每 0.05 秒把该设备的全部端点读一遍。
+    设备状态改由 PollingMonitor 统一轮询并连接到主窗口后，这里只保留未连接时扫描设备列表
+    （devices_updated）的部分；信号和方法与 TelescopeMonitor 相同，主窗口和设备控件的连接代码无需修改。
+    set_device / disconnect_device 更新设备连接表，跟随连接表的 PollingMonitor 只轮询已连接的设备。
+    """
+    coordinates_updated = pyqtSignal(float, float, float, float)
+    status_updated = pyqtSignal(dict)
+    devices_updated = pyqtSignal(list)
+    focuser_updated = pyqtSignal(dict)
+    rotator_updated = pyqtSignal(dict)
+    weather_updated = pyqtSignal(dict)
+    cover_updated = pyqtSignal(dict)
+    dome_updated = pyqtSignal(dict)
+
+    def __init__(self, device_number: int = 0, device_type: str = 'telescope',
+                 registry: Optional[AlpacaClientRegistry] = None,
+                 connections: Optional[DeviceConnections] = None):
+        """
+        Args:
+            device_number: 设备号
+            device_type: 设备类型（'mount'、'weather'、'cover' 等按 TelescopeMonitor 的规则换算）
+            registry: 客户端注册表，为空时使用全局 alpaca_registry
+            connections: 设备连接表，为空时使用全局连接表
+        """
+        super().__init__()
+        self.registry = registry or alpaca_registry
+        self.connections = connections or get_device_connections()
+        self.device_number = device_number
+        self.device_type = device_type
+        self.is_running = True
+        self.is_connected = False
+        self.device_scan_interval = DEVICE_SCAN_INTERVAL
+        self.last_device_scan = 0.0
+
+    def set_device(self, device_number: int, device_type: Optional[str] = None):
+        """设置设备编号和类型"""
+        self.device_number = device_number
+        if device_type:
+            self.device_type = MONITOR_DEVICE_KEYS.get(device_type, device_type)
+        self.is_connected = True
+        self.connections.connect_device(self.device_key, device_number)
+        logger.info("设置设备: 类型=%s, 编号=%s", self.device_type, self.device_number)
+
+    def disconnect_device(self):
+        """断开设备连接"""
+        if self.is_connected:
+            self.connections.disconnect_device(self.device_key)
+        self.is_connected = False
+        self.device_number = 0
+
+    @property
+    def device_key(self) -> str:
+        """config.yaml 中的设备键"""
+        return MONITOR_DEVICE_KEYS.get(self.device_type, self.device_type)
+
+    def stop(self):
+        """停止线程"""
+        self.is_running = False
+
+    def start_dome_monitoring(self):
+        """与 TelescopeMonitor 一致：线程未运行时启动"""
+        if not self.isRunning():
+            self.is_running = True
+            self.start()
+
+    def scan_devices(self) -> List[Dict[str, Any]]:
+        """从设备所在服务器读取该类型的设备列表"""
+        client = self.registry.client_for_device(self.device_key)
+        return client.find_devices(DEVICE_TYPES.get(self.device_key, self.device_key))
+
+    def run(self):
+        """线程运行方法：未连接时按 device_scan_interval 扫描设备列表"""
+        while self.is_running:
+            now = time.monotonic()
+            if not self.is_connected and now - self.last_device_scan >= self.device_scan_interval:
+                self.last_device_scan = now
+                try:
+                    devices = self.scan_devices()
+                    if devices:
+                        self.devices_updated.emit(devices)
+                except Exception as e:
+                    logger.error("扫描 %s 设备列表出错: %s", self.device_type, e)
+            time.sleep(0.1)
@@ -0,0 +1,719 @@
+"""
+热点路径计时与延迟直方图
+
+memory_monitor 和 memory_diagnose.py 只关心内存，时间花在哪里一直没有数据。本模块提供：
+  - LatencyHistogram：HDR 风格的对数-线性直方图（微秒精度，相对误差约 1.6%），记录 O(1)，
+    可合并、可序列化，用于求整夜的 p50/p99 并在版本之间比较
+  - Instrumentation：按名称管理直方图，timer()/timed() 计时；关闭时 timer() 返回空操作对象
+  - install_instrumentation()：在类上包装热点方法，不修改调用方——
+        alpaca.get.<设备类型>.<端点> / alpaca.put.<设备类型>.<动作>   每个 Alpaca 请求
+        dss.download                                               DSS 星图下载
+        http.<方法>.<主机>                                          其他经 requests 发出的请求
+        ui.<方法名>                                                 主窗口 update_* 等槽函数
+        dss.get_path                                               DSS 缓存取图
+    HTTP 请求在 requests.adapters.HTTPAdapter.send 上计时（与 traffic_recorder 的记录点相同），
+    主窗口、telescope_monitor、轮询引擎和命令执行器发出的请求都经过这里
+        astro.<方法名> / ephemeris.compute_day                      astropy 计算与星历表
+  - EventLoopLagProbe：Qt 事件循环延迟探针（qt.loop_lag）
+  - SamplingProfiler：按需采样所有线程的调用栈，输出可用于火焰图的折叠栈文本
+  - MetricsMonitor：定时把摘要追加到 logs/perf_summary.jsonl、把完整直方图写到
+    logs/perf_histograms_<观测夜>.json，可选在本机端口提供 /metrics、/metrics/histograms、/profile
+
+用法:
+    install_instrumentation(MainWindow)     # 创建主窗口之前
+    monitor = start_monitoring()            # QApplication 创建之后
+    python -m src.services.profiler show logs/perf_histograms_2026-10-16.json
+    python -m src.services.profiler compare 旧版本.json 新版本.json
+"""
+import argparse
+import functools
+import json
+import logging
+import math
+import os
+import socket
+import sys
+import threading
+import time
+import types
+from collections import Counter
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+from urllib.parse import parse_qs, urlparse, urlsplit
+
+from PyQt5.QtCore import QObject, Qt, QTimer, pyqtSignal
+
+from src.config.config_service import get_config_service
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS = {
+    'enabled': True,
+    'label': '',
+    'export_interval': 300,
+    'summary_path': 'logs/perf_summary.jsonl',
+    'histogram_path': 'logs/perf_histograms_{night}.json',
+    'profile_dir': 'logs',
+    'lag_interval_ms': 100,
+    'lag_warning': 1.0,
+    'sample_interval_ms': 5,
+    'http_enabled': False,
+    'host': '127.0.0.1',
+    'port': 8766,
+    'regression_ratio': 1.2,
+    'regression_min_count': 100,
+}
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+# 直方图：小于 SUB_COUNT 微秒的值每微秒一个桶，之后每个 2 的幂区间 HALF 个桶
+SUB_BITS = 7
+SUB_COUNT = 1 << SUB_BITS
+HALF = SUB_COUNT >> 1
+
+
+def instrumentation_settings(overrides: Optional[Mapping[str, Any]] = None) -> Dict[str, Any]:
+    """合并默认值、config.yaml instrumentation 段和调用参数"""
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update(get_config_service().get('instrumentation', {}) or {})
+    settings.update(overrides or {})
+    return settings
+
+
+def bucket_index(value_us: int) -> int:
+    """微秒值所在的桶"""
+    if value_us < SUB_COUNT:
+        return max(value_us, 0)
+    shift = value_us.bit_length() - SUB_BITS
+    return (shift + 1) * HALF + ((value_us >> shift) - HALF)
+
+
+def bucket_bounds(index: int) -> Tuple[int, int]:
+    """桶覆盖的微秒范围 [下限, 上限)"""
+    if index < SUB_COUNT:
+        return index, index + 1
+    shift = index // HALF - 1
+    mantissa = index % HALF + HALF
+    return mantissa << shift, (mantissa + 1) << shift
+
+
+class LatencyHistogram:
+    """延迟直方图（秒为单位记录，内部按微秒分桶），线程安全"""
+
+    __slots__ = ('counts', 'count', 'total', 'min', 'max', '_lock')
+
+    def __init__(self):
+        self.counts: List[int] = []
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        index = bucket_index(int(seconds * 1e6))
+        with self._lock:
+            counts = self.counts
+            if index >= len(counts):
+                counts.extend([0] * (index + 1 - len(counts)))
+            counts[index] += 1
+            self.count += 1
+            self.total += seconds
+            if seconds < self.min:
+                self.min = seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def percentile(self, p: float) -> Optional[float]:
+        """百分位数（秒），取所在桶的中点并限制在最小、最大值之间；没有数据时为 None"""
+        with self._lock:
+            if not self.count:
+                return None
+            rank = max(1, math.ceil(p / 100.0 * self.count))
+            seen = 0
+            for index, n in enumerate(self.counts):
+                seen += n
+                if seen >= rank:
+                    low, high = bucket_bounds(index)
+                    value = (low + high - 1) / 2e6
+                    return min(max(value, self.min), self.max)
+            return self.max
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+    def summary(self) -> Dict[str, Any]:
+        result = {'count': self.count, 'mean': self.mean, 'max': self.max if self.count else None}
+        for p in PERCENTILES:
+            result[f"p{p:g}"] = self.percentile(p)
+        return result
+
+    def merge(self, other: 'LatencyHistogram'):
+        with other._lock:
+            counts, count, total, low, high = list(other.counts), other.count, other.total, other.min, other.max
+        with self._lock:
+            if len(counts) > len(self.counts):
+                self.counts.extend([0] * (len(counts) - len(self.counts)))
+            for index, n in enumerate(counts):
+                self.counts[index] += n
+            self.count += count
+            self.total += total
+            self.min = min(self.min, low)
+            self.max = max(self.max, high)
+
+    def reset(self):
+        with self._lock:
+            self.counts = []
+            self.count = 0
+            self.total = 0.0
+            self.min = math.inf
+            self.max = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """可 JSON 序列化的完整直方图（只保存非零桶）"""
+        with self._lock:
+            return {'count': self.count, 'total': self.total,
+                    'min': self.min if self.count else None, 'max': self.max if self.count else None,
+                    'buckets': {str(i): n for i, n in enumerate(self.counts) if n}}
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> 'LatencyHistogram':
+        histogram = cls()
+        buckets = {int(i): int(n) for i, n in (data.get('buckets') or {}).items()}
+        if buckets:
+            histogram.counts = [0] * (max(buckets) + 1)
+            for index, n in buckets.items():
+                histogram.counts[index] = n
+        histogram.count = int(data.get('count') or 0)
+        histogram.total = float(data.get('total') or 0.0)
+        histogram.min = data['min'] if data.get('min') is not None else math.inf
+        histogram.max = data.get('max') or 0.0
+        return histogram
+
+
+class _Timer:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram: LatencyHistogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.record(time.perf_counter() - self.start)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Instrumentation:
+    """按名称管理延迟直方图"""
+
+    def __init__(self, settings: Optional[Mapping[str, Any]] = None):
+        self.settings = instrumentation_settings(settings)
+        self.enabled = bool(self.settings['enabled'])
+        self.started = time.time()
+        self._histograms: Dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str) -> LatencyHistogram:
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(name, LatencyHistogram())
+        return histogram
+
+    def names(self) -> List[str]:
+        with self._lock:
+            return sorted(self._histograms)
+
+    def record(self, name: str, seconds: float):
+        if self.enabled:
+            self.histogram(name).record(seconds)
+
+    def timer(self, name: str):
+        """计时上下文: with instrumentation.timer('dss.download'): ..."""
+        return _Timer(self.histogram(name)) if self.enabled else _NULL_TIMER
+
+    def timed(self, name: str):
+        """计时装饰器"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.histogram(name).record(time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def summary(self, prefix: str = '') -> Dict[str, Dict[str, Any]]:
+        """各直方图的计数、均值和百分位数（秒）"""
+        with self._lock:
+            items = sorted(self._histograms.items())
+        return {name: histogram.summary() for name, histogram in items if name.startswith(prefix)}
+
+    def export(self) -> Dict[str, Any]:
+        """完整直方图（用于版本之间比较）"""
+        with self._lock:
+            items = sorted(self._histograms.items())
+        return {'label': self.settings['label'], 'host': socket.gethostname(), 'pid': os.getpid(),
+                'started': self.started, 'exported': time.time(),
+                'histograms': {name: histogram.to_dict() for name, histogram in items}}
+
+    def reset(self):
+        with self._lock:
+            for histogram in self._histograms.values():
+                histogram.reset()
+
+
+_instrumentation: Optional[Instrumentation] = None
+_instrumentation_lock = threading.Lock()
+
+
+def get_instrumentation() -> Instrumentation:
+    """获取全局计时实例"""
+    global _instrumentation
+    if _instrumentation is None:
+        with _instrumentation_lock:
+            if _instrumentation is None:
+                _instrumentation = Instrumentation()
+    return _instrumentation
+
+
+# ----------------------------------------------------------------------
+# 导出与比较
+# ----------------------------------------------------------------------
+def night_of(timestamp: Optional[float] = None) -> str:
+    """观测夜的日期（本地正午之前算作前一夜）"""
+    moment = datetime.fromtimestamp(time.time() if timestamp is None else timestamp) - timedelta(hours=12)
+    return moment.strftime('%Y-%m-%d')
+
+
+def write_histograms(instrumentation: Instrumentation, path: Optional[str] = None) -> str:
+    """把完整直方图写入文件（先写临时文件再替换），返回路径"""
+    path = path or instrumentation.settings['histogram_path'].format(night=night_of())
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(instrumentation.export(), f, ensure_ascii=False)
+    os.replace(temp_path, path)
+    return path
+
+
+def append_summary(instrumentation: Instrumentation, path: Optional[str] = None) -> str:
+    """在 JSON Lines 文件中追加一行摘要（毫秒），返回路径"""
+    path = path or instrumentation.settings['summary_path']
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    metrics = {name: {key: (round(value * 1000, 3) if isinstance(value, float) and key != 'count' else value)
+                      for key, value in item.items()}
+               for name, item in instrumentation.summary().items()}
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps({'time': datetime.now().isoformat(timespec='seconds'),
+                            'label': instrumentation.settings['label'], 'metrics': metrics},
+                           ensure_ascii=False) + '\n')
+    return path
+
+
+def load_histograms(path: str) -> Dict[str, LatencyHistogram]:
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return {name: LatencyHistogram.from_dict(item) for name, item in data.get('histograms', {}).items()}
+
+
+def find_regressions(baseline: Mapping[str, LatencyHistogram], current: Mapping[str, LatencyHistogram],
+                     ratio: float = 1.2, min_count: int = 100) -> List[Dict[str, Any]]:
+    """
+    找出 p50 或 p99 变慢超过 ratio 倍的指标
+
+    Args:
+        baseline: 基准（旧版本）的直方图
+        current: 当前的直方图
+        ratio: 判定为变慢的倍数
+        min_count: 两边都至少有这么多样本才比较
+
+    Returns:
+        [{'name', 'percentile', 'baseline', 'current', 'ratio'}]，按倍数从大到小
+    """
+    regressions = []
+    for name, histogram in current.items():
+        base = baseline.get(name)
+        if base is None or base.count < min_count or histogram.count < min_count:
+            continue
+        for p in (50, 99):
+            old, new = base.percentile(p), histogram.percentile(p)
+            if old and new and new / old >= ratio:
+                regressions.append({'name': name, 'percentile': f"p{p}", 'baseline': old,
+                                    'current': new, 'ratio': new / old})
+    return sorted(regressions, key=lambda item: item['ratio'], reverse=True)
+
+
+def format_summary(histograms: Mapping[str, LatencyHistogram]) -> str:
+    lines = [f"{'指标':<44} {'次数':>9} {'p50':>10} {'p90':>10} {'p99':>10} {'最大':>10}"]
+    for name in sorted(histograms):
+        h = histograms[name]
+        if not h.count:
+            continue
+        values = [h.percentile(50), h.percentile(90), h.percentile(99), h.max]
+        lines.append(f"{name:<44} {h.count:>9} " + ' '.join(f"{v * 1000:>8.2f}ms" for v in values))
+    return '\n'.join(lines)
+
+
+# ----------------------------------------------------------------------
+# 在类上包装热点方法
+# ----------------------------------------------------------------------
+def wrap_method(cls, method: str, name: Callable[..., str], instrumentation: Optional[Instrumentation] = None):
+    """
+    给类的方法加计时（重复调用不会重复包装）
+
+    Args:
+        cls: 类
+        method: 方法名
+        name: name(self, *args) -> 指标名
+        instrumentation: 计时实例，默认全局实例
+    """
+    original = cls.__dict__.get(method)
+    if original is None or getattr(original, '_instrumented', False):
+        return
+    instrumentation = instrumentation or get_instrumentation()
+
+    @functools.wraps(original)
+    def wrapper(self, *args, **kwargs):
+        if not instrumentation.enabled:
+            return original(self, *args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return original(self, *args, **kwargs)
+        finally:
+            try:
+                metric = name(self, *args, **kwargs)
+            except Exception:
+                metric = f"{cls.__name__}.{method}"
+            instrumentation.histogram(metric).record(time.perf_counter() - start)
+    wrapper._instrumented = True
+    setattr(cls, method, wrapper)
+
+
+def _fixed(metric: str) -> Callable[..., str]:
+    return lambda self, *args, **kwargs: metric
+
+
+def request_metric(request, dss_host: str = '') -> str:
+    """HTTP 请求的指标名：Alpaca 设备请求按设备类型和端点区分，发往 dss_host 的请求记为 DSS 下载"""
+    parts = urlsplit(request.url)
+    path = [p for p in parts.path.split('/') if p]
+    method = (request.method or 'GET').lower()
+    if len(path) == 5 and path[:2] == ['api', 'v1']:
+        return f"alpaca.{method}.{path[2].lower()}.{path[4].lower()}"
+    if dss_host and parts.netloc == dss_host:
+        return 'dss.download'
+    return f"http.{method}.{parts.netloc}"
+
+
+# 主窗口中 update_* 以外需要计时的方法
+WINDOW_METHODS = ('calculate_frame_dec_angle', 'force_refresh_cooler_status', 'refresh_device_list',
+                  'init_connect_menu')
+ASTRONOMY_METHODS = ('get_current_time', 'get_sun_info', 'get_twilight_info', 'calculate_moon_phase',
+                     'calculate_parallactic_angle')
+
+
+def instrument_window(window_cls, instrumentation: Optional[Instrumentation] = None):
+    """给主窗口类的 update_* 槽函数计时（ui.<方法名>），应在 install_ui_binding 等之后、创建窗口之前调用"""
+    for attr, value in list(vars(window_cls).items()):
+        if isinstance(value, types.FunctionType) and (attr.startswith('update_') or attr in WINDOW_METHODS):
+            wrap_method(window_cls, attr, _fixed(f"ui.{attr}"), instrumentation)
+
+
+def instrument_astronomy(module, instrumentation: Optional[Instrumentation] = None):
+    """给 astronomy_service 的计算方法计时（astro.<方法名>）"""
+    service = getattr(module, 'astronomy_service', None)
+    if service is None:
+        return
+    for method in ASTRONOMY_METHODS:
+        wrap_method(type(service), method, _fixed(f"astro.{method}"), instrumentation)
+
+
+def install_instrumentation(window_cls=None, instrumentation: Optional[Instrumentation] = None):
+    """
+    在 HTTP 请求、DSS 缓存、星历表、天文计算（以及可选的主窗口槽函数）上安装计时
+
+    HTTP 请求在 HTTPAdapter.send 上计时，覆盖主窗口按钮、telescope_monitor 线程和轮询引擎等
+    所有经 requests 发出的请求；astronomy_service 由分阶段启动延迟导入时，在真正导入后再安装。
+    """
+    from requests.adapters import HTTPAdapter
+    from src.services.dss_cache import DSS_URL, DSSImageCache
+    from src.services.ephemeris_cache import EphemerisCache
+    from src.services.startup import on_lazy_module_loaded
+
+    dss_host = urlsplit(DSS_URL).netloc
+    wrap_method(HTTPAdapter, 'send', lambda self, request, *a, **k: request_metric(request, dss_host),
+                instrumentation)
+    wrap_method(DSSImageCache, 'get_path', _fixed('dss.get_path'), instrumentation)
+    wrap_method(EphemerisCache, 'compute_day', _fixed('ephemeris.compute_day'), instrumentation)
+    if window_cls is not None:
+        instrument_window(window_cls, instrumentation)
+    on_lazy_module_loaded('src.services.astronomy_service',
+                          lambda module: instrument_astronomy(module, instrumentation))
+    logger.info("已安装热点路径计时")
+
+
+# ----------------------------------------------------------------------
+# 事件循环延迟
+# ----------------------------------------------------------------------
+class EventLoopLagProbe(QObject):
+    """
+    Qt 事件循环延迟探针
+
+    以精确定时器每 interval_ms 触发一次，实际触发时刻与预期时刻之差记为 qt.loop_lag；
+    超过 warning 秒时发出 stalled 信号并记录警告。
+    """
+
+    stalled = pyqtSignal(float)
+
+    def __init__(self, instrumentation: Optional[Instrumentation] = None, interval_ms: int = 100,
+                 warning: float = 1.0, parent=None):
+        super().__init__(parent)
+        self.instrumentation = instrumentation or get_instrumentation()
+        self.interval = interval_ms / 1000.0
+        self.warning = warning
+        self._expected = None
+        self._timer = QTimer(self)
+        self._timer.setTimerType(Qt.PreciseTimer)
+        self._timer.timeout.connect(self._on_timeout)
+        self._interval_ms = interval_ms
+
+    def start(self):
+        self._expected = time.perf_counter() + self.interval
+        self._timer.start(self._interval_ms)
+
+    def stop(self):
+        self._timer.stop()
+
+    def _on_timeout(self):
+        now = time.perf_counter()
+        lag = max(0.0, now - self._expected)
+        self._expected = now + self.interval
+        self.instrumentation.record('qt.loop_lag', lag)
+        if lag >= self.warning:
+            logger.warning("界面事件循环阻塞 %.0f ms", lag * 1000)
+            self.stalled.emit(lag)
+
+
+# ----------------------------------------------------------------------
+# 采样分析
+# ----------------------------------------------------------------------
+class SamplingProfiler:
+    """
+    采样所有线程的调用栈
+
+    每 interval 秒读取一次 sys._current_frames()，统计折叠栈（线程名;模块:函数;...），
+    结果可直接用于 flamegraph.pl 或 speedscope。
+    """
+
+    def __init__(self, interval: float = 0.005, max_depth: int = 64):
+        self.interval = interval
+        self.max_depth = max_depth
+
+    def sample(self, seconds: float) -> Tuple[Counter, int]:
+        """采样 seconds 秒，返回 (折叠栈计数, 采样次数)"""
+        own = threading.get_ident()
+        stacks: Counter = Counter()
+        samples = 0
+        deadline = time.perf_counter() + seconds
+        code_names: Dict[Any, str] = {}
+        while time.perf_counter() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                parts = []
+                depth = 0
+                while frame is not None and depth < self.max_depth:
+                    code = frame.f_code
+                    label = code_names.get(code)
+                    if label is None:
+                        label = code_names[code] = f"{os.path.basename(code.co_filename)}:{code.co_name}"
+                    parts.append(label)
+                    frame = frame.f_back
+                    depth += 1
+                parts.append(names.get(ident, str(ident)))
+                stacks[';'.join(reversed(parts))] += 1
+            samples += 1
+            time.sleep(self.interval)
+        return stacks, samples
+
+    def dump(self, seconds: float, directory: str = 'logs') -> str:
+        """采样并写出折叠栈文件，返回路径"""
+        stacks, samples = self.sample(seconds)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"profile_{datetime.now():%Y%m%d_%H%M%S}.folded")
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        logger.info("采样分析 %.1f 秒（%d 次采样）已写入 %s", seconds, samples, path)
+        return path
+
+
+def top_functions(stacks: Mapping[str, int], limit: int = 20) -> List[Tuple[str, int]]:
+    """按自身采样数（栈顶函数）排序"""
+    counts: Counter = Counter()
+    for stack, count in stacks.items():
+        counts[stack.rsplit(';', 1)[-1]] += count
+    return counts.most_common(limit)
+
+
+# ----------------------------------------------------------------------
+# 定时导出与本机端点
+# ----------------------------------------------------------------------
+class MetricsMonitor(QObject):
+    """运行事件循环探针、定时导出，以及可选的本机 HTTP 端点"""
+
+    exported = pyqtSignal(str)
+
+    def __init__(self, instrumentation: Optional[Instrumentation] = None,
+                 settings: Optional[Mapping[str, Any]] = None, parent=None):
+        super().__init__(parent)
+        self.instrumentation = instrumentation or get_instrumentation()
+        self.settings = instrumentation_settings(settings)
+        self.probe = EventLoopLagProbe(self.instrumentation, int(self.settings['lag_interval_ms']),
+                                       float(self.settings['lag_warning']), self)
+        self.profiler = SamplingProfiler(float(self.settings['sample_interval_ms']) / 1000.0)
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self.export)
+        self._httpd: Optional[ThreadingHTTPServer] = None
+
+    def start(self):
+        self.probe.start()
+        interval = float(self.settings['export_interval'])
+        if interval > 0:
+            self._timer.start(int(interval * 1000))
+        if self.settings['http_enabled']:
+            self._httpd = ThreadingHTTPServer((self.settings['host'], int(self.settings['port'])),
+                                              _make_handler(self))
+            self._httpd.daemon_threads = True
+            threading.Thread(target=self._httpd.serve_forever, name='metrics-http', daemon=True).start()
+            logger.info("性能指标端点: http://%s:%d/metrics", *self._httpd.server_address[:2])
+        return self
+
+    def stop(self):
+        """停止探针和端点，并导出最后一次结果"""
+        self.probe.stop()
+        self._timer.stop()
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+        self.export()
+
+    @property
+    def address(self) -> Optional[Tuple[str, int]]:
+        return self._httpd.server_address[:2] if self._httpd else None
+
+    def export(self):
+        try:
+            append_summary(self.instrumentation, self.settings['summary_path'])
+            path = write_histograms(self.instrumentation,
+                                    self.settings['histogram_path'].format(night=night_of()))
+            self.exported.emit(path)
+        except OSError as e:
+            logger.error("导出性能指标失败: %s", e)
+
+    def profile(self, seconds: float) -> str:
+        return self.profiler.dump(seconds, self.settings['profile_dir'])
+
+
+def _make_handler(monitor: MetricsMonitor):
+    class MetricsHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            logger.debug("%s - %s", self.address_string(), format % args)
+
+        def _send(self, body: bytes, content_type: str, status: int = 200):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_json(self, payload, status=200):
+            self._send(json.dumps(payload, ensure_ascii=False).encode('utf-8'),
+                       'application/json; charset=utf-8', status)
+
+        def do_GET(self):
+            parsed = urlparse(self.path)
+            params = parse_qs(parsed.query)
+            if parsed.path == '/metrics':
+                self._send_json(monitor.instrumentation.summary((params.get('prefix') or [''])[0]))
+            elif parsed.path == '/metrics/histograms':
+                self._send_json(monitor.instrumentation.export())
+            elif parsed.path == '/profile':
+                try:
+                    seconds = min(float((params.get('seconds') or ['10'])[0]), 120.0)
+                except ValueError:
+                    self._send_json({'error': 'seconds 必须是数字'}, 400)
+                    return
+                path = monitor.profile(seconds)
+                with open(path, 'rb') as f:
+                    self._send(f.read(), 'text/plain; charset=utf-8')
+            else:
+                self._send_json({'error': '未知的路径'}, 404)
+
+    return MetricsHandler
+
+
+def start_monitoring(settings: Optional[Mapping[str, Any]] = None, parent=None) -> Optional[MetricsMonitor]:
+    """在 QApplication 创建之后启动事件循环探针和定时导出；关闭计时时返回 None"""
+    instrumentation = get_instrumentation()
+    if not instrumentation.enabled:
+        return None
+    return MetricsMonitor(instrumentation, settings, parent).start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='性能直方图查看与比较')
+    sub = parser.add_subparsers(dest='command', required=True)
+    show = sub.add_parser('show', help='显示直方图文件中各指标的百分位数')
+    show.add_argument('path')
+    compare = sub.add_parser('compare', help='比较两个直方图文件，列出变慢的指标')
+    compare.add_argument('baseline')
+    compare.add_argument('current')
+    compare.add_argument('--ratio', type=float, help='判定为变慢的倍数（默认取配置 regression_ratio）')
+    args = parser.parse_args()
+
+    if args.command == 'show':
+        print(format_summary(load_histograms(args.path)))
+        return 0
+    settings = instrumentation_settings()
+    regressions = find_regressions(load_histograms(args.baseline), load_histograms(args.current),
+                                   args.ratio or float(settings['regression_ratio']),
+                                   int(settings['regression_min_count']))
+    if not regressions:
+        print('没有发现变慢的指标')
+        return 0
+    for item in regressions:
+        print(f"{item['name']:<44} {item['percentile']:>4} {item['baseline'] * 1000:>9.2f}ms -> "
+              f"{item['current'] * 1000:>9.2f}ms  x{item['ratio']:.2f}")
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,584 @@
+"""
+安全联锁
+
+主窗口的 update_weather_info、update_ups_status 只负责显示：下雨、阵风、高湿度、UPS 市电失败或电量不足时
+不会自动做任何事。本模块按规则在每一份新状态上增量判断，触发时通过独立的高优先级命令通道关闭天窗和镜头盖：
+
+  - 规则：阈值（> >= < <= == in）、回差（clear，恢复时使用的阈值）、持续时间（duration，条件连续成立多久才触发）
+    和恢复持续时间（clear_duration，恢复条件连续成立多久才解除）
+  - 数据来源：StateStore 的同步监听器，轮询线程、串口线程或界面线程发布状态时立即判断，
+    不经过合并时间窗，也不等待界面线程；只判断该设备上有规则的字段
+  - 命令通道：独立的客户端注册表（独立的 HTTP 连接）和工作线程，不与轮询共用连接，
+    也不排在 CommandExecutor 同一设备的普通命令之后——触发时先取消这些命令，再发送关闭命令，失败时重试
+  - 联锁期间 CommandExecutor 拒绝开天窗、开镜头盖；设备报告天窗或镜头盖被打开时重新关闭
+
+从读到触发值到发出关闭命令的延迟记录在计时直方图 safety.command_latency 中。
+
+用法:
+    interlock = start_safety_interlock(store, executor=get_command_executor(), polling_engine=monitor.engine)
+    interlock.rule_tripped.connect(on_tripped)        # (规则名, 详情)
+    interlock.stop()
+"""
+import logging
+import operator
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, List, Mapping, Optional
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from src.config.config_service import get_config_service
+from src.services.alpaca_registry import AlpacaClientRegistry
+from src.services.command_executor import COMMAND_TARGETS, CommandHandle, DeviceCommand
+
+logger = logging.getLogger(__name__)
+
+# 联锁动作 -> (config.yaml 设备键, Alpaca 设备类型, 动作, 快照字段, 需要重新关闭的状态值)
+ACTIONS = {
+    'close_shutter': ('dome', 'dome', 'closeshutter', 'shutter_status', (0, 2)),
+    'close_cover': ('covercalibrator', 'covercalibrator', 'closecover', 'coverstate', (2, 3)),
+}
+
+# 联锁期间拒绝的命令
+BLOCKED_ACTIONS = {('dome', 'openshutter'), ('covercalibrator', 'opencover')}
+
+DEFAULT_RULES = [
+    {'name': 'rain', 'device': 'ObservingConditions', 'field': 'rainrate', 'op': '>', 'value': 0.0,
+     'clear': 0.0, 'duration': 0, 'clear_duration': 900, 'actions': ['close_shutter', 'close_cover']},
+    {'name': 'wind_gust', 'device': 'ObservingConditions', 'field': 'windgust', 'op': '>', 'value': 15.0,
+     'clear': 12.0, 'duration': 0, 'clear_duration': 600, 'actions': ['close_shutter', 'close_cover']},
+    {'name': 'humidity', 'device': 'ObservingConditions', 'field': 'humidity', 'op': '>', 'value': 90.0,
+     'clear': 85.0, 'duration': 60, 'clear_duration': 600, 'actions': ['close_shutter', 'close_cover']},
+    # Megatec Q1 状态字节按 b7..b0 的字符顺序存放，status_bits[0] 为 b7（市电故障）
+    {'name': 'mains_failure', 'device': 'ups', 'field': 'status_bits', 'index': 0, 'op': '==', 'value': 1,
+     'duration': 30, 'clear_duration': 300, 'actions': ['close_shutter', 'close_cover']},
+    {'name': 'low_battery', 'device': 'ups', 'field': 'battery', 'op': '<', 'value': 50.0,
+     'clear': 70.0, 'duration': 0, 'clear_duration': 300, 'actions': ['close_shutter', 'close_cover']},
+]
+
+DEFAULT_SETTINGS = {
+    'enabled': True,
+    'check_interval': 0.5,        # 持续时间规则在没有新数据时的检查间隔（秒）
+    'command_timeout': 120.0,     # 等待天窗/镜头盖到达关闭状态的超时（秒）
+    'retry_interval': 2.0,        # 关闭命令未被受理时的重试间隔（秒）
+    'max_attempts': 5,            # 关闭命令的最多发送次数
+    'reassert': True,             # 联锁期间设备被打开时重新关闭
+    'block_open_commands': True,  # 联锁期间拒绝开天窗、开镜头盖
+    'rules': DEFAULT_RULES,
+}
+
+OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '==': operator.eq,
+    'in': lambda value, values: value in values,
+}
+
+
+def safety_settings(overrides: Optional[Mapping[str, Any]] = None) -> Dict[str, Any]:
+    """合并默认值、config.yaml safety 段和调用参数"""
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update(get_config_service().get('safety', {}) or {})
+    settings.update(overrides or {})
+    return settings
+
+
+class SafetyRule:
+    """
+    一条联锁规则
+
+    条件 `值 op value` 连续成立 duration 秒后触发；触发后 `值 op clear` 连续不成立 clear_duration 秒后解除。
+    clear 默认等于 value，设置不同的 clear 即为回差（如阵风 > 15 触发、≤ 12 才开始计算恢复时间）。
+    设置 index 时比较字段（列表）中的一个元素，如 UPS 的 status_bits[0]。
+    """
+
+    __slots__ = ('name', 'device', 'field', 'op', 'value', 'clear', 'duration', 'clear_duration', 'actions',
+                 'index', '_compare')
+
+    def __init__(self, name: str, device: str, field: str, op: str, value: Any, clear: Any = None,
+                 duration: float = 0.0, clear_duration: float = 0.0, actions: Optional[List[str]] = None,
+                 index: Optional[int] = None):
+        if op not in OPERATORS:
+            raise ValueError(f"不支持的比较运算: {op}")
+        unknown = [action for action in (actions or []) if action not in ACTIONS]
+        if unknown:
+            raise ValueError(f"规则 {name} 的动作未定义: {unknown}")
+        self.name = name
+        self.device = device
+        self.field = field
+        self.op = op
+        self.value = value
+        self.clear = value if clear is None else clear
+        self.duration = float(duration)
+        self.clear_duration = float(clear_duration)
+        self.actions = list(actions if actions is not None else ACTIONS)
+        self.index = index
+        self._compare = OPERATORS[op]
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> 'SafetyRule':
+        return cls(data['name'], data['device'], data['field'], data['op'], data['value'], data.get('clear'),
+                   data.get('duration', 0.0), data.get('clear_duration', 0.0), data.get('actions'),
+                   data.get('index'))
+
+    def select(self, value):
+        """取出规则比较的值：未设置 index 时为字段值本身，元素不存在时为 None"""
+        if self.index is None:
+            return value
+        try:
+            return value[self.index]
+        except (TypeError, IndexError, KeyError):
+            return None
+
+    def unsafe(self, value) -> bool:
+        try:
+            return bool(self._compare(value, self.value))
+        except TypeError:
+            return False
+
+    def recovered(self, value) -> bool:
+        try:
+            return not self._compare(value, self.clear)
+        except TypeError:
+            return False
+
+
+class RuleState:
+    """规则的增量判断状态"""
+
+    __slots__ = ('rule', 'tripped', 'pending_since', 'clear_since', 'value', 'updated', 'tripped_at')
+
+    def __init__(self, rule: SafetyRule):
+        self.rule = rule
+        self.tripped = False
+        self.pending_since: Optional[float] = None
+        self.clear_since: Optional[float] = None
+        self.value = None
+        self.updated: Optional[float] = None
+        self.tripped_at: Optional[float] = None
+
+    def update(self, value, now: float) -> Optional[str]:
+        """
+        用新读数推进状态
+
+        Returns:
+            'trip'、'clear' 或 None
+        """
+        self.value = value
+        self.updated = now
+        return self.check(now)
+
+    def check(self, now: float) -> Optional[str]:
+        """按最近一次读数和当前时刻判断（持续时间规则在没有新读数时也能到期）"""
+        if self.updated is None or self.value is None:
+            return None
+        rule = self.rule
+        if not self.tripped:
+            if not rule.unsafe(self.value):
+                self.pending_since = None
+                return None
+            if self.pending_since is None:
+                self.pending_since = now
+            if now - self.pending_since >= rule.duration:
+                self.tripped = True
+                self.tripped_at = time.time()
+                self.pending_since = None
+                self.clear_since = None
+                return 'trip'
+            return None
+        if not rule.recovered(self.value):
+            self.clear_since = None
+            return None
+        if self.clear_since is None:
+            self.clear_since = now
+        if now - self.clear_since >= rule.clear_duration:
+            self.tripped = False
+            self.clear_since = None
+            return 'clear'
+        return None
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            'rule': self.rule.name,
+            'device': self.rule.device,
+            'field': self.rule.field if self.rule.index is None else f"{self.rule.field}[{self.rule.index}]",
+            'value': self.value,
+            'threshold': self.rule.value,
+            'tripped': self.tripped,
+            'tripped_at': self.tripped_at,
+        }
+
+
+class SafetyCommandPath:
+    """
+    高优先级命令通道
+
+    使用独立的客户端注册表和工作线程：不与轮询共用 HTTP 连接，也不排在 CommandExecutor 的普通命令之后。
+    同一动作正在执行时重复触发只记录一次。
+    """
+
+    def __init__(self, settings: Mapping[str, Any], registry: Optional[AlpacaClientRegistry] = None,
+                 executor=None, polling_engine=None, on_finished: Optional[Callable[[str, Dict], None]] = None):
+        """
+        Args:
+            settings: safety 配置
+            registry: 客户端注册表，为空时新建一个专用注册表（设备地址仍从配置解析）
+            executor: 普通命令执行器，触发时取消其中同一设备的命令
+            polling_engine: 轮询引擎，命令受理后让设备进入快速轮询
+            on_finished: on_finished(动作, 结果字典)，在工作线程中调用
+        """
+        self.settings = settings
+        self.registry = registry or AlpacaClientRegistry(pool_maxsize=len(ACTIONS))
+        self.executor = executor
+        self.polling_engine = polling_engine
+        self.on_finished = on_finished
+        self._workers = ThreadPoolExecutor(max_workers=len(ACTIONS), thread_name_prefix='safety-cmd')
+        self._in_flight: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def execute(self, action: str, reason: str, triggered_at: float) -> bool:
+        """
+        执行联锁动作
+
+        Args:
+            action: ACTIONS 中的动作名
+            reason: 触发的规则名
+            triggered_at: 读到触发值的时刻（time.perf_counter()）
+
+        Returns:
+            是否新提交了命令（同一动作正在执行时为 False）
+        """
+        with self._lock:
+            if self._closed or action in self._in_flight:
+                return False
+            self._in_flight[action] = triggered_at
+        self._workers.submit(self._run, action, reason, triggered_at)
+        return True
+
+    def _run(self, action: str, reason: str, triggered_at: float):
+        device_key, device_type, command, _, _ = ACTIONS[action]
+        result = {'action': action, 'device': device_key, 'reason': reason, 'success': False, 'accepted': False,
+                  'attempts': 0, 'latency': None, 'elapsed': 0.0, 'state': None, 'error': ''}
+        try:
+            if self.executor is not None:
+                # 普通命令（例如正在等待开天窗完成）让路，不发送停止动作，关闭命令本身会改变设备动作
+                self.executor.cancel_device(device_key, halt=False)
+            client = self.registry.client_for_device(device_key)
+            device_number = self._device_number(device_key)
+            max_attempts = max(1, int(self.settings['max_attempts']))
+            while result['attempts'] < max_attempts and not self._closed:
+                result['attempts'] += 1
+                if result['latency'] is None:
+                    result['latency'] = time.perf_counter() - triggered_at
+                    _record_latency(result['latency'])
+                if client.put(device_type, device_number, command):
+                    result['accepted'] = True
+                    break
+                logger.error("安全联锁: %s.%s 未被受理（第 %d 次）", device_key, command, result['attempts'])
+                time.sleep(float(self.settings['retry_interval']))
+            if not result['accepted']:
+                result['error'] = '关闭命令未被设备受理'
+                return
+            if self.polling_engine is not None:
+                self.polling_engine.boost(device_key)
+            endpoint, reached = COMMAND_TARGETS[(device_type, command)]
+            deadline = time.perf_counter() + float(self.settings['command_timeout'])
+            while not self._closed:
+                value = client.get(device_type, device_number, endpoint)
+                result['state'] = value
+                if value is not None and reached(value):
+                    result['success'] = True
+                    return
+                if time.perf_counter() >= deadline:
+                    result['error'] = f"等待 {endpoint} 到达关闭状态超时"
+                    return
+                time.sleep(0.5)
+            result['error'] = '安全联锁已停止'
+        except Exception as e:
+            logger.error("安全联锁执行 %s 出错: %s", action, e)
+            result['error'] = str(e)
+        finally:
+            result['elapsed'] = time.perf_counter() - triggered_at
+            with self._lock:
+                self._in_flight.pop(action, None)
+            level = logging.WARNING if result['success'] else logging.ERROR
+            logger.log(level, "安全联锁 %s（%s）: 成功=%s 发出命令延迟 %s 总耗时 %.1f 秒 %s", action, reason,
+                       result['success'],
+                       f"{result['latency'] * 1000:.0f} ms" if result['latency'] is not None else '-',
+                       result['elapsed'], result['error'])
+            if self.on_finished is not None:
+                self.on_finished(action, result)
+
+    def _device_number(self, device_key: str) -> int:
+        """设备号与轮询目标一致：优先取轮询引擎中的目标，否则按配置解析"""
+        if self.polling_engine is not None:
+            for target in self.polling_engine.targets:
+                if target.device_key == device_key:
+                    return target.device_number
+        return self.registry.device_number_for(device_key)
+
+    def busy(self, action: Optional[str] = None) -> bool:
+        with self._lock:
+            return bool(self._in_flight) if action is None else action in self._in_flight
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+        self._workers.shutdown(wait=False)
+
+
+def _record_latency(seconds: float):
+    from src.services.profiler import get_instrumentation
+    get_instrumentation().record('safety.command_latency', seconds)
+
+
+class SafetyInterlock(QObject):
+    """
+    安全联锁
+
+    evaluate() 线程安全，在发布状态的线程中同步调用；信号从该线程发出，
+    连接到界面对象的槽时由 Qt 自动排队到界面线程。
+    """
+
+    rule_tripped = pyqtSignal(str, dict)
+    rule_cleared = pyqtSignal(str, dict)
+    action_finished = pyqtSignal(str, dict)
+    safe_changed = pyqtSignal(bool)
+
+    def __init__(self, settings: Optional[Mapping[str, Any]] = None, executor=None, polling_engine=None,
+                 registry: Optional[AlpacaClientRegistry] = None, parent=None):
+        """
+        初始化安全联锁
+
+        Args:
+            settings: 覆盖 safety 配置
+            executor: 普通命令执行器（CommandExecutor），触发时取消其中的天窗、镜头盖命令并在联锁期间拒绝开启命令
+            polling_engine: 轮询引擎，关闭命令受理后让设备进入快速轮询
+            registry: 高优先级通道使用的客户端注册表，为空时新建
+            parent: 父QObject
+        """
+        super().__init__(parent)
+        self.settings = safety_settings(settings)
+        self.rules = [SafetyRule.from_dict(rule) for rule in self.settings['rules']]
+        self._states: Dict[str, Dict[str, List[RuleState]]] = {}
+        for rule in self.rules:
+            self._states.setdefault(rule.device, {}).setdefault(rule.field, []).append(RuleState(rule))
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._detach: List[Callable[[], None]] = []
+        self.command_path = SafetyCommandPath(self.settings, registry, executor, polling_engine,
+                                              self._on_action_finished)
+        self.executor = executor
+        self.events: Deque[Dict[str, Any]] = deque(maxlen=200)
+
+    # ------------------------------------------------------------------
+    # 接入
+    # ------------------------------------------------------------------
+    def attach(self, store):
+        """监听状态中心的每一次发布"""
+        self._detach.append(store.add_listener(self.evaluate))
+        return self
+
+    def watched_fields(self) -> List[tuple]:
+        """规则和重新关闭判断读取的 (设备键, 字段)"""
+        fields = {(rule.device, rule.field) for rule in self.rules}
+        if self.settings['reassert']:
+            fields.update((device_key, field) for device_key, _, _, field, _ in ACTIONS.values())
+        return sorted(fields)
+
+    def guard(self, executor):
+        """
+        联锁期间让命令执行器拒绝开天窗、开镜头盖
+
+        被拒绝的命令立即完成，结果的 error 说明触发中的规则。
+        """
+        original = executor.submit
+
+        def submit(command: DeviceCommand) -> CommandHandle:
+            if (command.device_type, command.action) in BLOCKED_ACTIONS and not self.is_safe():
+                return self._reject(executor, command)
+            return original(command)
+        executor.submit = submit
+        self._detach.append(lambda: executor.__dict__.pop('submit', None))
+        return self
+
+    def _reject(self, executor, command: DeviceCommand) -> CommandHandle:
+        handle = CommandHandle(0, command)
+        result = {'id': 0, 'device': command.device_key, 'action': command.action, 'success': False,
+                  'state': None, 'elapsed': 0.0, 'rtt': 0.0, 'cancelled': True, 'timed_out': False,
+                  'error': f"安全联锁中: {', '.join(self.active_rules())}"}
+        logger.warning("安全联锁拒绝命令 %s: %s", command, result['error'])
+        executor.command_finished.emit(0, result)
+        handle.future.set_result(result)
+        return handle
+
+    def start(self):
+        """启动持续时间规则的检查线程"""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._check_loop, name='safety-check', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """停止检查线程、取消监听并关闭命令通道"""
+        self._stop.set()
+        for detach in self._detach:
+            detach()
+        self._detach = []
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+        self.command_path.close()
+
+    # ------------------------------------------------------------------
+    # 判断
+    # ------------------------------------------------------------------
+    def evaluate(self, device: str, values: Mapping[str, Any], timestamp: Optional[float] = None):
+        """
+        用一份新状态推进规则（任意线程）
+
+        只处理该设备上有规则的字段；其余设备和字段的开销是一次字典查找。
+        """
+        fields = self._states.get(device)
+        reassert = device in ('dome', 'covercalibrator') and self.settings['reassert']
+        if fields is None and not reassert:
+            return
+        start = time.perf_counter()
+        now = time.monotonic()
+        events = []
+        with self._lock:
+            was_safe = self._safe_locked()
+            for field, states in (fields or {}).items():
+                raw = values.get(field)
+                if raw is None:
+                    continue
+                for state in states:
+                    value = state.rule.select(raw)
+                    if value is None:
+                        continue
+                    event = state.update(value, now)
+                    if event:
+                        events.append((event, state))
+            safe = self._safe_locked()
+        for event, state in events:
+            self._emit(event, state, start)
+        if safe != was_safe:
+            self.safe_changed.emit(safe)
+        if reassert and not safe:
+            self._reassert(device, values, start)
+
+    def _check_loop(self):
+        interval = float(self.settings['check_interval'])
+        while not self._stop.wait(interval):
+            self.check()
+
+    def check(self, now: Optional[float] = None):
+        """没有新数据时推进持续时间规则"""
+        now = time.monotonic() if now is None else now
+        start = time.perf_counter()
+        events = []
+        with self._lock:
+            was_safe = self._safe_locked()
+            for fields in self._states.values():
+                for states in fields.values():
+                    for state in states:
+                        if state.pending_since is not None or state.clear_since is not None:
+                            event = state.check(now)
+                            if event:
+                                events.append((event, state))
+            safe = self._safe_locked()
+        for event, state in events:
+            self._emit(event, state, start)
+        if safe != was_safe:
+            self.safe_changed.emit(safe)
+
+    def _emit(self, event: str, state: RuleState, triggered_at: float):
+        detail = state.describe()
+        self.events.append(dict(detail, event=event, time=time.time()))
+        if event == 'trip':
+            logger.warning("安全联锁触发: %s（%s.%s = %r）", state.rule.name, state.rule.device,
+                           state.rule.field, state.value)
+            for action in state.rule.actions:
+                self.command_path.execute(action, state.rule.name, triggered_at)
+            self.rule_tripped.emit(state.rule.name, detail)
+        else:
+            logger.warning("安全联锁解除: %s", state.rule.name)
+            self.rule_cleared.emit(state.rule.name, detail)
+
+    def _reassert(self, device: str, values: Mapping[str, Any], triggered_at: float):
+        """联锁期间天窗或镜头盖被打开（或正在打开）时重新关闭"""
+        actions = {action for state in self._tripped_states() for action in state.rule.actions}
+        for action in actions:
+            device_key, _, _, field, reopen_states = ACTIONS[action]
+            if device_key != device:
+                continue
+            value = values.get(field)
+            if value in reopen_states and self.command_path.execute(action, 'reassert', triggered_at):
+                logger.warning("安全联锁期间 %s.%s = %r，重新关闭", device, field, value)
+
+    def _tripped_states(self) -> List[RuleState]:
+        with self._lock:
+            return [state for fields in self._states.values() for states in fields.values()
+                    for state in states if state.tripped]
+
+    def _safe_locked(self) -> bool:
+        return not any(state.tripped for fields in self._states.values()
+                       for states in fields.values() for state in states)
+
+    def _on_action_finished(self, action: str, result: Dict[str, Any]):
+        self.events.append(dict(result, event='action', time=time.time()))
+        self.action_finished.emit(action, result)
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+    def is_safe(self) -> bool:
+        with self._lock:
+            return self._safe_locked()
+
+    def active_rules(self) -> List[str]:
+        return [state.rule.name for state in self._tripped_states()]
+
+    def status(self) -> Dict[str, Any]:
+        """各规则的当前状态"""
+        with self._lock:
+            rules = [state.describe() for fields in self._states.values()
+                     for states in fields.values() for state in states]
+        return {'safe': not any(rule['tripped'] for rule in rules), 'rules': rules}
+
+
+def start_safety_interlock(store, executor=None, polling_engine=None,
+                           settings: Optional[Mapping[str, Any]] = None,
+                           parent=None) -> Optional[SafetyInterlock]:
+    """
+    按配置启动安全联锁
+
+    Args:
+        store: 状态中心
+        executor: 普通命令执行器，联锁期间拒绝其中的开启命令
+        polling_engine: 轮询引擎，联锁读取的字段按 safety 层级的间隔轮询
+        settings: 覆盖 safety 配置
+        parent: 父QObject
+
+    Returns:
+        联锁实例，配置未启用时为 None
+    """
+    merged = safety_settings(settings)
+    if not merged['enabled']:
+        return None
+    interlock = SafetyInterlock(merged, executor, polling_engine, parent=parent)
+    interlock.attach(store)
+    if polling_engine is not None:
+        polling_engine.set_safety_fields(interlock.watched_fields())
+    if executor is not None and merged['block_open_commands']:
+        interlock.guard(executor)
+    interlock.start()
+    logger.info("安全联锁已启动，%d 条规则", len(interlock.rules))
+    return interlock
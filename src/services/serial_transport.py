@@ -0,0 +1,639 @@
+"""
+串口设备传输层
+
+水冷机（Modbus RTU）和 UPS（Megatec Q1）原先由界面线程中的 QTimer 每秒轮询：写入后固定 sleep，
+再以 1 秒超时阻塞读取，一台设备无响应时界面和另一台设备都要跟着等待。
+
+本模块为每个串口建立一个收发线程：
+  - 请求进入队列后立即返回 Future，线路空闲时马上发出，不再固定 sleep
+  - 接收线程按协议从字节流中切分响应帧（Modbus 按长度和 CRC，Megatec 按回车），与等待中的请求匹配
+  - 每个请求独立计时，超时只影响本串口上的这个请求，其他串口不受影响
+  - 定时查询设备状态，解码后的状态字典每次都通过 status_read 信号推送，只在数值变化时通过 status_changed 推送
+
+允许的并发请求数由 pipeline_depth 控制（默认 1：Modbus RTU 规定主站须等到响应或超时后再发下一帧；
+设备支持时可调大，请求会连续发出，响应按顺序/地址匹配）。
+"""
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from src.config.config_service import get_config_service
+
+try:
+    import serial
+except ImportError:  # pragma: no cover - 未安装 PySerial 时只是不能打开串口
+    serial = None
+
+logger = logging.getLogger(__name__)
+
+# 各设备的默认串口参数（与原先 DeviceControl 中的取值一致），config.yaml 中同名设备的设置优先
+DEFAULT_SERIAL_SETTINGS = {
+    'cooler': {'baudrate': 9600, 'bytesize': 8, 'parity': 'N', 'stopbits': 1, 'timeout': 1.0,
+               'poll_interval': 1.0, 'pipeline_depth': 1},
+    'ups': {'baudrate': 2400, 'bytesize': 8, 'parity': 'N', 'stopbits': 1, 'timeout': 1.0,
+            'poll_interval': 1.0, 'pipeline_depth': 1},
+}
+
+# 接收线程单次读取的最长等待（秒），决定超时检查和发送的响应粒度
+READ_SLICE = 0.02
+
+
+class SerialProtocolError(Exception):
+    """响应帧格式错误或设备返回异常"""
+
+
+def crc16_modbus(data) -> int:
+    """Modbus RTU 的 CRC16（多项式 0xA001，初值 0xFFFF）"""
+    crc = 0xFFFF
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            if crc & 1:
+                crc = (crc >> 1) ^ 0xA001
+            else:
+                crc >>= 1
+    return crc
+
+
+class SerialProtocol:
+    """
+    串口协议
+
+    子类实现状态查询帧的生成、从接收缓冲区切分响应帧、请求与响应的匹配以及状态解码。
+    """
+    name = ''
+
+    def status_request(self) -> bytes:
+        raise NotImplementedError
+
+    def extract_frame(self, buffer: bytearray) -> Optional[bytes]:
+        """从缓冲区头部取出一个完整的响应帧（同时移除已消费的字节），数据不足时返回 None"""
+        raise NotImplementedError
+
+    def matches(self, request: bytes, frame: bytes) -> bool:
+        """响应帧是否属于该请求"""
+        return True
+
+    def decode_status(self, frame: bytes) -> Dict[str, Any]:
+        raise NotImplementedError
+
+
+class ModbusCoolerProtocol(SerialProtocol):
+    """水冷机：Modbus RTU 读保持寄存器（温度、保留、状态位）"""
+    name = 'modbus'
+
+    # 状态位 -> 状态字典键
+    STATUS_BITS = (
+        (0x80, 'running'),
+        (0x40, 'heating'),
+        (0x20, 'cooling'),
+        (0x10, 'flow_alarm'),
+        (0x08, 'pump'),
+        (0x04, 'temp_alarm'),
+        (0x02, 'level_alarm'),
+        (0x01, 'power'),
+    )
+    TEMP_OVERFLOW = 0x7FFF
+    TEMP_UNDERFLOW = 0x8001
+
+    def __init__(self, address: int = 1, register: int = 0, count: int = 3):
+        self.address = address
+        self.register = register
+        self.count = count
+
+    @staticmethod
+    def read_registers_request(address: int, register: int, count: int, function: int = 3) -> bytes:
+        """生成读寄存器请求帧"""
+        frame = bytearray([address, function, register >> 8, register & 0xFF, count >> 8, count & 0xFF])
+        crc = crc16_modbus(frame)
+        frame += bytes([crc & 0xFF, crc >> 8])
+        return bytes(frame)
+
+    def status_request(self) -> bytes:
+        return self.read_registers_request(self.address, self.register, self.count)
+
+    def extract_frame(self, buffer: bytearray) -> Optional[bytes]:
+        while len(buffer) >= 5:
+            function = buffer[1]
+            if function & 0x80:
+                length = 5
+            elif function in (3, 4):
+                length = 5 + buffer[2]
+            elif function in (5, 6, 15, 16):
+                length = 8
+            else:
+                # 无法识别的功能码：丢弃一个字节重新同步
+                del buffer[0]
+                continue
+            if len(buffer) < length:
+                return None
+            frame = bytes(buffer[:length])
+            if crc16_modbus(frame[:-2]) != (frame[-2] | frame[-1] << 8):
+                del buffer[0]
+                continue
+            del buffer[:length]
+            return frame
+        return None
+
+    def matches(self, request: bytes, frame: bytes) -> bool:
+        return frame[0] == request[0] and (frame[1] & 0x7F) == request[1]
+
+    def decode_status(self, frame: bytes) -> Dict[str, Any]:
+        if frame[1] & 0x80:
+            raise SerialProtocolError(f"水冷机返回异常码 {frame[2]}")
+        if frame[0] != self.address or len(frame) < 9:
+            raise SerialProtocolError("水冷机响应格式错误: 设备地址或长度不匹配")
+        temp_raw = frame[3] << 8 | frame[4]
+        status_bits = frame[7] << 8 | frame[8]
+        if temp_raw == self.TEMP_OVERFLOW:
+            temperature, temp_status = float('inf'), '上溢出'
+        elif temp_raw == self.TEMP_UNDERFLOW:
+            temperature, temp_status = float('-inf'), '下溢出'
+        else:
+            # 寄存器为有符号数，单位 0.1°C
+            temperature = (temp_raw - 0x10000 if temp_raw & 0x8000 else temp_raw) / 10.0
+            temp_status = '正常'
+        status = {
+            'temperature': float(temperature),
+            'temp_status': temp_status,
+            'raw_value': int(status_bits),
+            'status_bits': int(status_bits),
+        }
+        for mask, key in self.STATUS_BITS:
+            status[key] = bool(status_bits & mask)
+        return status
+
+
+class MegatecUpsProtocol(SerialProtocol):
+    """UPS：Megatec 协议 Q1 查询"""
+    name = 'megatec'
+
+    BATTERY_MIN_VOLTAGE = 10.5
+    BATTERY_MAX_VOLTAGE = 13.5
+
+    def status_request(self) -> bytes:
+        return b'Q1\r'
+
+    def extract_frame(self, buffer: bytearray) -> Optional[bytes]:
+        end = buffer.find(b'\r')
+        if end < 0:
+            return None
+        frame = bytes(buffer[:end + 1])
+        del buffer[:end + 1]
+        return frame
+
+    @classmethod
+    def battery_percentage(cls, voltage: float) -> int:
+        """按电池电压估算电量（%）"""
+        if voltage <= cls.BATTERY_MIN_VOLTAGE:
+            return 0
+        if voltage >= cls.BATTERY_MAX_VOLTAGE:
+            return 100
+        percentage = int((voltage - cls.BATTERY_MIN_VOLTAGE)
+                         / (cls.BATTERY_MAX_VOLTAGE - cls.BATTERY_MIN_VOLTAGE) * 100)
+        return max(0, min(100, percentage))
+
+    @staticmethod
+    def power_state(status_bits) -> str:
+        """
+        由状态位判断供电状态
+
+        status_bits 按 Q1 响应中的字符顺序存放，即 b7..b0：status_bits[0] 为 b7（市电故障），
+        [2] 为 b5（旁路/升降压），[3] 为 b4（UPS 故障）。
+        """
+        utility_fail, _battery_low, bypass, ups_failed = status_bits[:4]
+        if ups_failed == 1:
+            return '故障'
+        if utility_fail == 1:
+            return '电池供电'
+        return '旁路供电' if bypass == 1 else '市电正常'
+
+    def decode_status(self, frame: bytes) -> Dict[str, Any]:
+        response = frame.decode('ascii', errors='ignore').strip()
+        if not response.startswith('('):
+            raise SerialProtocolError(f"UPS响应格式不正确: {response}")
+        parts = response[1:].strip().split()
+        if len(parts) < 8:
+            raise SerialProtocolError(f"UPS响应数据不完整: {response}")
+        status_byte = parts[7]
+        if len(status_byte) != 8:
+            raise SerialProtocolError(f"UPS状态字节格式不正确: {status_byte}")
+        try:
+            status_bits = [int(bit) for bit in status_byte]
+            battery_voltage = float(parts[5])
+            return {
+                'input_voltage': float(parts[0]),
+                'output_voltage': float(parts[2]),
+                'load': int(parts[3]),
+                'battery': self.battery_percentage(battery_voltage),
+                'temperature': float(parts[6]),
+                'input_frequency': float(parts[4]),
+                'status': self.power_state(status_bits),
+                'raw_value': response,
+                'status_bits': status_bits,
+            }
+        except ValueError as e:
+            raise SerialProtocolError(f"解析UPS响应时发生错误: {e}, 响应: {response}")
+
+
+PROTOCOLS = {
+    'cooler': ModbusCoolerProtocol,
+    'ups': MegatecUpsProtocol,
+}
+
+
+class _PendingRequest:
+    __slots__ = ('payload', 'future', 'timeout', 'deadline')
+
+    def __init__(self, payload: bytes, timeout: float):
+        self.payload = payload
+        self.future: Future = Future()
+        self.timeout = timeout
+        self.deadline = 0.0
+
+
+class SerialPortChannel:
+    """
+    单个串口的收发线程
+
+    请求按提交顺序发出，最多同时有 pipeline_depth 个请求等待响应；
+    响应帧与最早的、协议判定匹配的等待请求对应。
+    """
+
+    def __init__(self, port: str, protocol: SerialProtocol, settings: Dict[str, Any],
+                 serial_factory: Optional[Callable[..., Any]] = None):
+        """
+        初始化串口通道（不打开串口）
+
+        Args:
+            port: 串口名，如 'COM20' 或 '/dev/ttyUSB0'（也支持 pyserial 的 URL）
+            protocol: 协议对象
+            settings: 串口参数（baudrate、bytesize、parity、stopbits、timeout、pipeline_depth）
+            serial_factory: 创建串口对象的函数，默认 serial.serial_for_url
+        """
+        self.port = port
+        self.protocol = protocol
+        self.settings = settings
+        self.request_timeout = float(settings.get('timeout', 1.0))
+        self.pipeline_depth = max(1, int(settings.get('pipeline_depth', 1)))
+        self._serial_factory = serial_factory
+        self._serial = None
+        self._queue: Deque[_PendingRequest] = deque()
+        self._in_flight: Deque[_PendingRequest] = deque()
+        self._buffer = bytearray()
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self._periodic: Optional[Callable[[], None]] = None
+        self._periodic_interval = 0.0
+        self._next_periodic = 0.0
+        self.stats = {'sent': 0, 'received': 0, 'timeouts': 0, 'unmatched': 0}
+
+    def open(self):
+        """打开串口并启动收发线程"""
+        factory = self._serial_factory
+        if factory is None:
+            if serial is None:
+                raise RuntimeError('请安装PySerial')
+            factory = serial.serial_for_url
+        self._serial = factory(
+            self.port,
+            baudrate=int(self.settings.get('baudrate', 9600)),
+            bytesize=int(self.settings.get('bytesize', 8)),
+            parity=str(self.settings.get('parity', 'N')),
+            stopbits=self.settings.get('stopbits', 1),
+            timeout=READ_SLICE,
+        )
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=f"serial-{self.port}", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """停止收发线程并关闭串口，未完成的请求以异常结束"""
+        self._running = False
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+        self._thread = None
+        with self._lock:
+            pending = list(self._in_flight) + list(self._queue)
+            self._in_flight.clear()
+            self._queue.clear()
+        for request in pending:
+            if not request.future.done():
+                request.future.set_exception(ConnectionError(f"串口 {self.port} 已关闭"))
+        if self._serial is not None:
+            try:
+                self._serial.close()
+            except Exception:
+                pass
+            self._serial = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._running and self._serial is not None
+
+    def set_periodic(self, callback: Optional[Callable[[], None]], interval: float):
+        """设置在收发线程中定时执行的回调（用于状态查询）"""
+        self._periodic = callback
+        self._periodic_interval = float(interval)
+        self._next_periodic = time.monotonic()
+
+    def submit(self, payload: bytes, timeout: Optional[float] = None) -> Future:
+        """
+        提交一个请求
+
+        Returns:
+            Future，结果为响应帧（bytes）；超时时为 TimeoutError
+        """
+        request = _PendingRequest(bytes(payload), self.request_timeout if timeout is None else timeout)
+        if not self.is_open:
+            request.future.set_exception(ConnectionError(f"串口 {self.port} 未打开"))
+            return request.future
+        with self._lock:
+            self._queue.append(request)
+        return request.future
+
+    @property
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._queue) + len(self._in_flight)
+
+    def _run(self):
+        while self._running:
+            try:
+                now = time.monotonic()
+                if self._periodic is not None and now >= self._next_periodic:
+                    self._next_periodic = now + self._periodic_interval
+                    self._periodic()
+                self._send_ready()
+                data = self._serial.read(self._serial.in_waiting or 1)
+                if data:
+                    self._buffer += data
+                    self._dispatch_frames()
+                self._expire(time.monotonic())
+            except Exception as e:
+                if not self._running:
+                    break
+                logger.error("串口 %s 收发出错: %s", self.port, e)
+                self._fail_all(e)
+                time.sleep(0.5)
+
+    def _send_ready(self):
+        while True:
+            with self._lock:
+                if not self._queue or len(self._in_flight) >= self.pipeline_depth:
+                    return
+                request = self._queue.popleft()
+                if request.future.cancelled():
+                    continue
+                request.deadline = time.monotonic() + request.timeout
+                self._in_flight.append(request)
+            self._serial.write(request.payload)
+            self.stats['sent'] += 1
+
+    def _dispatch_frames(self):
+        while True:
+            frame = self.protocol.extract_frame(self._buffer)
+            if frame is None:
+                return
+            with self._lock:
+                request = next((r for r in self._in_flight if self.protocol.matches(r.payload, frame)), None)
+                if request is not None:
+                    self._in_flight.remove(request)
+            if request is None:
+                self.stats['unmatched'] += 1
+                logger.debug("串口 %s 收到无法匹配的响应: %s", self.port, frame.hex(' '))
+                continue
+            self.stats['received'] += 1
+            if not request.future.done():
+                request.future.set_result(frame)
+
+    def _expire(self, now: float):
+        expired = []
+        with self._lock:
+            while self._in_flight and self._in_flight[0].deadline <= now:
+                expired.append(self._in_flight.popleft())
+        if not expired:
+            return
+        # 超时后残留的半帧数据不再可信，丢弃以便重新同步
+        self._buffer.clear()
+        for request in expired:
+            self.stats['timeouts'] += 1
+            if not request.future.done():
+                request.future.set_exception(
+                    TimeoutError(f"串口 {self.port} 在 {request.timeout:.1f} 秒内未收到响应"))
+
+    def _fail_all(self, error: Exception):
+        with self._lock:
+            pending = list(self._in_flight)
+            self._in_flight.clear()
+        self._buffer.clear()
+        for request in pending:
+            if not request.future.done():
+                request.future.set_exception(error)
+
+
+class SerialTransport(QObject):
+    """
+    串口设备管理
+
+    用法:
+        transport = get_serial_transport()
+        transport.status_changed.connect(on_status)     # (设备键, 状态字典)，只在数值变化时发出
+        transport.open_device('cooler', 'COM20')
+
+    信号在串口线程中发出，连接到界面对象的槽时由 Qt 自动排队到界面线程执行。
+    """
+    status_changed = pyqtSignal(str, dict)
+    status_read = pyqtSignal(str, dict)
+    device_error = pyqtSignal(str, str)
+    connection_changed = pyqtSignal(str, bool)
+
+    def __init__(self, serial_factory: Optional[Callable[..., Any]] = None, parent=None):
+        """
+        初始化串口设备管理
+
+        Args:
+            serial_factory: 创建串口对象的函数，默认 serial.serial_for_url
+            parent: 父QObject
+        """
+        super().__init__(parent)
+        self._serial_factory = serial_factory
+        self._channels: Dict[str, SerialPortChannel] = {}
+        self._status: Dict[str, Dict[str, Any]] = {}
+        self._failing: Dict[str, bool] = {}
+        self._polls_in_flight: Dict[str, bool] = {}
+        self._lock = threading.Lock()
+        self.stats = {'polls': 0, 'changes': 0, 'errors': 0}
+
+    @staticmethod
+    def settings_for(device_key: str, **overrides) -> Dict[str, Any]:
+        """合并默认值、config.yaml 中的设备设置和调用参数"""
+        settings = dict(DEFAULT_SERIAL_SETTINGS.get(device_key, {}))
+        configured = get_config_service().get(f"devices.{device_key}", None) or {}
+        for key in ('port', 'baudrate', 'bytesize', 'parity', 'stopbits', 'timeout',
+                    'poll_interval', 'pipeline_depth'):
+            if key in configured:
+                settings[key] = configured[key]
+        settings.update({k: v for k, v in overrides.items() if v is not None})
+        return settings
+
+    def open_device(self, device_key: str, port: Optional[str] = None,
+                    protocol: Optional[SerialProtocol] = None, **overrides) -> bool:
+        """
+        打开串口设备并开始定时查询状态
+
+        Args:
+            device_key: 设备键，'cooler' 或 'ups'
+            port: 串口名，为空时取配置
+            protocol: 协议对象，为空时按设备键选择
+            **overrides: 覆盖串口参数（baudrate、timeout、poll_interval、pipeline_depth 等）
+
+        Returns:
+            是否成功打开
+        """
+        self.close_device(device_key)
+        settings = self.settings_for(device_key, port=port, **overrides)
+        if not settings.get('port'):
+            logger.error("设备 %s 未指定串口", device_key)
+            return False
+        if protocol is None:
+            protocol_class = PROTOCOLS.get(device_key)
+            if protocol_class is None:
+                logger.error("设备 %s 没有对应的串口协议", device_key)
+                return False
+            protocol = protocol_class()
+
+        channel = SerialPortChannel(settings['port'], protocol, settings, self._serial_factory)
+        try:
+            channel.open()
+        except Exception as e:
+            logger.error("打开设备 %s 的串口 %s 失败: %s", device_key, settings['port'], e)
+            self.device_error.emit(device_key, str(e))
+            return False
+
+        with self._lock:
+            self._channels[device_key] = channel
+            self._failing[device_key] = False
+            self._polls_in_flight[device_key] = False
+        interval = float(settings.get('poll_interval', 0) or 0)
+        if interval > 0:
+            channel.set_periodic(lambda: self._poll(device_key), interval)
+        logger.info("已连接设备 %s，串口: %s", device_key, settings['port'])
+        self.connection_changed.emit(device_key, True)
+        return True
+
+    def close_device(self, device_key: str):
+        """关闭串口设备"""
+        with self._lock:
+            channel = self._channels.pop(device_key, None)
+            self._status.pop(device_key, None)
+        if channel is not None:
+            channel.close()
+            self.connection_changed.emit(device_key, False)
+
+    def is_open(self, device_key: str) -> bool:
+        channel = self._channels.get(device_key)
+        return channel is not None and channel.is_open
+
+    def channel(self, device_key: str) -> Optional[SerialPortChannel]:
+        return self._channels.get(device_key)
+
+    def request(self, device_key: str, payload: bytes, timeout: Optional[float] = None) -> Future:
+        """发送任意请求帧，返回结果为响应帧的 Future"""
+        channel = self._channels.get(device_key)
+        if channel is None:
+            future = Future()
+            future.set_exception(ConnectionError(f"设备 {device_key} 未连接"))
+            return future
+        return channel.submit(payload, timeout)
+
+    def refresh(self, device_key: str) -> Optional[Future]:
+        """立即查询一次状态（不阻塞，结果通过 status_changed 推送）"""
+        return self._poll(device_key, force=True)
+
+    def last_status(self, device_key: str) -> Optional[Dict[str, Any]]:
+        """最近一次解码的状态（副本），不做任何串口读写"""
+        status = self._status.get(device_key)
+        return dict(status) if status is not None else None
+
+    def _poll(self, device_key: str, force: bool = False) -> Optional[Future]:
+        channel = self._channels.get(device_key)
+        if channel is None:
+            return None
+        with self._lock:
+            # 上一次查询尚未返回时不重复排队（设备慢或无响应时队列不会越积越长）
+            if self._polls_in_flight.get(device_key) and not force:
+                return None
+            self._polls_in_flight[device_key] = True
+        self.stats['polls'] += 1
+        future = channel.submit(channel.protocol.status_request())
+        future.add_done_callback(lambda f: self._on_status_frame(device_key, channel, f))
+        return future
+
+    def _on_status_frame(self, device_key: str, channel: SerialPortChannel, future: Future):
+        self._polls_in_flight[device_key] = False
+        if future.cancelled():
+            return
+        try:
+            status = channel.protocol.decode_status(future.result())
+        except Exception as e:
+            self.stats['errors'] += 1
+            # 连续失败只报告一次，恢复后再次失败才重新报告
+            if not self._failing.get(device_key):
+                self._failing[device_key] = True
+                logger.warning("查询设备 %s 状态失败: %s", device_key, e)
+                self.device_error.emit(device_key, str(e))
+            return
+        self._failing[device_key] = False
+        # 状态中心（以及经它记录的历史）收到每一次读数，status_changed 只在状态变化时发出
+        self.status_read.emit(device_key, dict(status))
+        if self._status.get(device_key) == status or device_key not in self._channels:
+            return
+        self._status[device_key] = status
+        self.stats['changes'] += 1
+        self.status_changed.emit(device_key, dict(status))
+
+    def shutdown(self):
+        """关闭所有串口"""
+        for device_key in list(self._channels):
+            self.close_device(device_key)
+
+
+def transport_devices(extra: Iterable[str] = ()) -> List[str]:
+    """
+    由 SerialTransport 读取的串口设备
+
+    config.yaml 中启用且指定了串口的水冷机、UPS 默认由 SerialTransport 读取，设备设置 transport: false 时
+    仍由设备控件自己连接；extra 中的设备（telemetry_server.serial_devices、--serial 参数）总是包括在内。
+
+    Args:
+        extra: 额外打开的设备键
+
+    Returns:
+        设备键列表
+    """
+    devices = []
+    for device_key in PROTOCOLS:
+        configured = get_config_service().get(f"devices.{device_key}", None) or {}
+        if configured.get('enabled', False) and configured.get('port') and configured.get('transport', True):
+            devices.append(device_key)
+    devices.extend(device_key for device_key in extra if device_key not in devices)
+    return devices
+
+
+# 全局串口设备管理实例（首次使用时在界面线程中创建）
+_serial_transport: Optional[SerialTransport] = None
+
+
+def get_serial_transport() -> SerialTransport:
+    """获取全局串口设备管理实例"""
+    global _serial_transport
+    if _serial_transport is None:
+        _serial_transport = SerialTransport()
+    return _serial_transport
@@ -0,0 +1,1070 @@
+"""
+分阶段启动
+
+main.py / run_ui.py 在窗口可用之前同步完成所有工作：导入 main_window 时连带导入 astropy、astroplan
+（astronomy_service 在模块顶层导入），调用 AlpacaClient.find_devices() 搜索设备以生成连接菜单，
+构造窗口时 init_connect_menu 又同步枚举串口；第一次时钟刷新还要用 astroplan 计算日出日落。
+站点链路较慢或设备服务器不在线时，窗口要等十几秒才出现。
+
+本模块把启动拆成两个阶段：
+  1. 只导入显示窗口所需的模块，以空设备列表构造主窗口并显示
+     - astronomy_service 以占位模块代替，首次使用其属性时才导入真实模块
+     - dss_image_fetcher 以替代模块代替，主窗口得到带缓存和预取队列的 PrefetchingDSSImageFetcher，原模块不再导入
+     - 时钟刷新用到的 get_current_time/get_sun_info/get_twilight_info/calculate_moon_phase 和
+       calculate_parallactic_angle 直接由星历缓存和旁行角计算器提供，不需要 astropy
+     - 全天相机改由 AllSkyImagePipeline 在后台线程中解码和缩放，管线推迟到窗口可交互之后启动
+  2. 首次绘制完成后在后台线程中读取上次的设备缓存、搜索 Alpaca 设备（discovery_service）、
+     枚举串口、计算当天星历、建立 DSS 图像缓存、按目标列表预取 DSS 图像并预加载天文模块，各项完成后在界面线程中
+     填充连接菜单和设备下拉框；菜单中的"刷新设备"同样改为后台执行
+
+同时记录启动时间报告：每个模块的导入耗时（累计/自身）、各阶段（含首次绘制）相对进程启动的时刻、
+延迟加载和后台任务的耗时。报告写入 logs/startup_report.json，摘要追加到 logs/startup_history.jsonl，
+首次绘制时间明显慢于最近几次启动的中位数时输出警告。
+
+用法:
+    python -m src.services.startup                   # 分阶段启动
+    python -m src.services.startup --exit-when-ready # 后台任务完成后退出，用于跟踪启动耗时
+    python -m src.services.startup --show-report     # 查看上一次的启动报告
+    python -m src.services.startup --record logs/traffic.jsonl.gz  # 同时记录设备通信，供回放测试
+"""
+import argparse
+import importlib
+import importlib.abc
+import json
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+import types
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from PyQt5.QtCore import QEvent, QObject, QTimer, pyqtSignal
+
+from src.config.config_service import get_config_service
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS = {
+    'report_path': os.path.join('logs', 'startup_report.json'),
+    'history_path': os.path.join('logs', 'startup_history.jsonl'),
+    'history_size': 10,
+    'regression_ratio': 1.25,
+    'regression_min': 0.2,
+    'top_imports': 20,
+    'defer_timers_ms': 3000,
+    'fast_astronomy': True,
+    'preload': ['src.services.astronomy_service'],
+}
+
+# 延迟导入的模块 -> 主窗口从中导入的名字
+LAZY_MODULES: Dict[str, Tuple[str, ...]] = {
+    'src.services.astronomy_service': ('astronomy_service',),
+}
+
+# 以其他实现代替的模块 -> {主窗口从中导入的名字: (模块, 对象)}，原模块不会被导入
+MODULE_REPLACEMENTS: Dict[str, Dict[str, Tuple[str, str]]] = {
+    # 原 DSSImageFetcher 每次指向都下载一张新图存到 temp/，从不清理
+    'src.services.dss_image_fetcher': {
+        'DSSImageFetcher': ('src.services.dss_prefetch', 'PrefetchingDSSImageFetcher'),
+    },
+    # 原 TelescopeMonitor 在每个设备控件里各自每 0.05 秒读一遍设备状态；状态改由 PollingMonitor
+    # （或遥测服务）统一提供，设备控件只需扫描设备列表，连接、断开设备时增减 PollingMonitor 的轮询目标
+    'src.services.telescope_monitor': {
+        'TelescopeMonitor': ('src.services.polling_engine', 'DeviceListMonitor'),
+    },
+}
+
+# astronomy_service 上由其他模块直接提供的方法 -> (模块, 对象)，返回格式相同
+ASTRONOMY_FAST_PATHS: Dict[str, Tuple[str, str]] = {
+    'get_current_time': ('src.services.ephemeris_cache', 'ephemeris_cache'),
+    'get_sun_info': ('src.services.ephemeris_cache', 'ephemeris_cache'),
+    'get_twilight_info': ('src.services.ephemeris_cache', 'ephemeris_cache'),
+    'calculate_moon_phase': ('src.services.ephemeris_cache', 'ephemeris_cache'),
+    'calculate_parallactic_angle': ('src.services.parallactic', 'parallactic_calculator'),
+}
+
+# 未找到镜头盖设备时加入的默认设备，与主窗口 refresh_device_list 一致
+DEFAULT_COVER_DEVICE = {
+    'DeviceName': 'ASCOM CoverCalibrator Simulator',
+    'DeviceType': 'CoverCalibrator',
+    'DeviceNumber': 0,
+    'ApiVersion': '1.0',
+}
+
+REPORT_VERSION = 1
+HISTORY_LIMIT = 200
+
+
+def startup_settings(overrides: Optional[Mapping[str, Any]] = None) -> Dict[str, Any]:
+    """合并默认设置、配置 startup 段和传入的覆盖项"""
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update(get_config_service().get('startup', {}) or {})
+    if overrides:
+        settings.update(overrides)
+    return settings
+
+
+def process_start_time() -> float:
+    """进程启动时刻（time.time() 时间轴），取不到时返回当前时刻"""
+    try:
+        import psutil
+        return psutil.Process().create_time()
+    except Exception:
+        return time.time()
+
+
+# ----------------------------------------------------------------------
+# 导入计时
+# ----------------------------------------------------------------------
+class _TimedLoader:
+    """包装模块加载器，记录 create_module/exec_module 的耗时"""
+
+    def __init__(self, loader, timer: 'ImportTimer'):
+        self.loader = loader
+        self.timer = timer
+
+    def create_module(self, spec):
+        create = getattr(self.loader, 'create_module', None)
+        if create is None:
+            return None
+        self.timer._enter(spec.name)
+        try:
+            return create(spec)
+        finally:
+            self.timer._exit()
+
+    def exec_module(self, module):
+        # 模块属性换回原加载器，importlib.resources 等按加载器类型工作的代码不受影响
+        module.__loader__ = self.loader
+        if module.__spec__ is not None:
+            module.__spec__.loader = self.loader
+        self.timer._enter(module.__name__)
+        try:
+            self.loader.exec_module(module)
+        finally:
+            self.timer._exit()
+
+
+class ImportTimer(importlib.abc.MetaPathFinder):
+    """
+    记录每个模块的导入耗时
+
+    插在 sys.meta_path 最前面，把其他查找器找到的模块规格中的加载器换成计时包装。
+    累计耗时包含该模块导入时连带导入的其他模块，自身耗时则不包含（与 python -X importtime 相同）。
+    """
+
+    def __init__(self):
+        self.records: Dict[str, List[float]] = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @property
+    def installed(self) -> bool:
+        return self in sys.meta_path
+
+    def install(self):
+        if not self.installed:
+            sys.meta_path.insert(0, self)
+
+    def uninstall(self):
+        if self.installed:
+            sys.meta_path.remove(self)
+
+    def find_spec(self, fullname, path, target=None):
+        local = self._local
+        if getattr(local, 'finding', False):
+            return None
+        local.finding = True
+        try:
+            spec = None
+            for finder in list(sys.meta_path):
+                find = getattr(finder, 'find_spec', None)
+                if finder is self or find is None:
+                    continue
+                spec = find(fullname, path, target)
+                if spec is not None:
+                    break
+        finally:
+            local.finding = False
+        if spec is None or spec.loader is None or not hasattr(spec.loader, 'exec_module'):
+            return spec
+        spec.loader = _TimedLoader(spec.loader, self)
+        return spec
+
+    def _enter(self, name: str):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append([name, time.perf_counter(), 0.0])
+
+    def _exit(self):
+        stack = self._local.stack
+        name, start, children = stack.pop()
+        elapsed = time.perf_counter() - start
+        if stack:
+            stack[-1][2] += elapsed
+        with self._lock:
+            record = self.records.setdefault(name, [0.0, 0.0])
+            record[0] += elapsed
+            record[1] += elapsed - children
+
+    def total(self) -> float:
+        """所有模块自身耗时之和"""
+        with self._lock:
+            return sum(record[1] for record in self.records.values())
+
+    def top(self, count: int = 20, key: str = 'cumulative') -> List[Dict[str, Any]]:
+        """按累计或自身耗时排序的前 count 个模块"""
+        index = 0 if key == 'cumulative' else 1
+        with self._lock:
+            items = sorted(self.records.items(), key=lambda item: item[1][index], reverse=True)[:count]
+        return [{'module': name, 'cumulative': round(cumulative, 4), 'self': round(own, 4)}
+                for name, (cumulative, own) in items]
+
+
+# ----------------------------------------------------------------------
+# 延迟导入
+# ----------------------------------------------------------------------
+_UNSET = object()
+_lazy_lock = threading.RLock()
+_lazy_stubs: Dict[str, types.ModuleType] = {}
+_lazy_callbacks: Dict[str, List[Callable[[types.ModuleType], None]]] = {}
+
+
+class LazyAttribute:
+    """
+    占位模块中的属性代理
+
+    首次访问属性、赋值或调用时导入真实模块并转发；fast_paths 中列出的属性名直接从替代对象上取，
+    不会触发导入。
+    """
+
+    def __init__(self, module_name: str, attr: str, fast_paths: Optional[Mapping[str, Tuple[str, str]]] = None):
+        object.__setattr__(self, '_lazy_spec', (module_name, attr))
+        object.__setattr__(self, '_lazy_fast', dict(fast_paths or {}))
+        object.__setattr__(self, '_lazy_target', _UNSET)
+
+    def _lazy_resolve(self):
+        target = self._lazy_target
+        if target is _UNSET:
+            module_name, attr = self._lazy_spec
+            target = getattr(load_lazy_module(module_name), attr)
+            object.__setattr__(self, '_lazy_target', target)
+        return target
+
+    def __getattr__(self, name):
+        if name.startswith('_lazy_'):
+            raise AttributeError(name)
+        fast = self._lazy_fast.get(name)
+        if fast is not None:
+            if isinstance(fast, tuple):
+                module_name, attr = fast
+                fast = getattr(importlib.import_module(module_name), attr)
+                self._lazy_fast[name] = fast
+            return getattr(fast, name)
+        return getattr(self._lazy_resolve(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._lazy_resolve(), name, value)
+
+    def __call__(self, *args, **kwargs):
+        return self._lazy_resolve()(*args, **kwargs)
+
+    def __repr__(self):
+        module_name, attr = self._lazy_spec
+        state = 'unloaded' if self._lazy_target is _UNSET else 'loaded'
+        return f"<LazyAttribute {module_name}.{attr} ({state})>"
+
+
+def is_lazy_stub(module) -> bool:
+    return getattr(module, '__lazy_stub__', False)
+
+
+def install_lazy_module(name: str, attrs: Iterable[str],
+                        fast_paths: Optional[Mapping[str, Mapping[str, Tuple[str, str]]]] = None):
+    """
+    以占位模块代替尚未导入的模块
+
+    之后的 `from name import attr` 得到 LazyAttribute 代理，访问其他属性时导入真实模块。
+    模块已经导入时不做任何事。
+
+    Args:
+        name: 模块全名
+        attrs: 需要代理的属性名
+        fast_paths: 属性名 -> {方法名: (模块, 对象)}，这些方法不经真实模块
+
+    Returns:
+        sys.modules 中的模块（占位模块或已导入的真实模块）
+    """
+    fast_paths = fast_paths or {}
+    with _lazy_lock:
+        module = sys.modules.get(name)
+        if module is not None:
+            return module
+        stub = types.ModuleType(name, f"{name} 的延迟导入占位模块")
+        stub.__lazy_stub__ = True
+        for attr in attrs:
+            setattr(stub, attr, LazyAttribute(name, attr, fast_paths.get(attr)))
+
+        def module_getattr(attr):
+            # 导入系统会探测 __path__ 等属性，不能因此导入真实模块
+            if attr.startswith('__'):
+                raise AttributeError(attr)
+            return getattr(load_lazy_module(name), attr)
+
+        stub.__getattr__ = module_getattr
+        parent, _, child = name.rpartition('.')
+        if parent:
+            setattr(importlib.import_module(parent), child, stub)
+        sys.modules[name] = stub
+        _lazy_stubs[name] = stub
+    return stub
+
+
+def install_module_replacement(name: str, replacements: Mapping[str, Tuple[str, str]]):
+    """
+    以替代模块代替尚未导入的模块
+
+    之后的 `from name import attr` 得到 replacements 中指定的对象，原模块不会被导入；
+    模块已经导入时不做任何事。
+
+    Args:
+        name: 模块全名
+        replacements: 属性名 -> (模块, 对象)
+
+    Returns:
+        sys.modules 中的模块（替代模块或已导入的原模块）
+    """
+    with _lazy_lock:
+        module = sys.modules.get(name)
+        if module is not None:
+            return module
+        module = types.ModuleType(name, f"{name} 的替代模块")
+        module.__replacement__ = True
+        for attr, (module_name, obj) in replacements.items():
+            setattr(module, attr, getattr(importlib.import_module(module_name), obj))
+        parent, _, child = name.rpartition('.')
+        if parent:
+            setattr(importlib.import_module(parent), child, module)
+        sys.modules[name] = module
+    return module
+
+
+def install_lazy_modules(fast_astronomy: bool = True) -> List[str]:
+    """为 LAZY_MODULES 安装占位模块、为 MODULE_REPLACEMENTS 安装替代模块，返回实际被延迟的模块名"""
+    fast_paths = {'astronomy_service': ASTRONOMY_FAST_PATHS} if fast_astronomy else None
+    deferred = []
+    for name, attrs in LAZY_MODULES.items():
+        if is_lazy_stub(install_lazy_module(name, attrs, fast_paths)):
+            deferred.append(name)
+    for name, replacements in MODULE_REPLACEMENTS.items():
+        if not getattr(install_module_replacement(name, replacements), '__replacement__', False):
+            logger.warning("%s 已被导入，无法替换", name)
+    return deferred
+
+
+def load_lazy_module(name: str):
+    """导入占位模块对应的真实模块（已导入时直接返回），可在任意线程调用"""
+    module = sys.modules.get(name)
+    if module is not None and not is_lazy_stub(module):
+        return module
+    with _lazy_lock:
+        module = sys.modules.get(name)
+        if module is not None and not is_lazy_stub(module):
+            return module
+        stub = _lazy_stubs.get(name)
+        sys.modules.pop(name, None)
+        start = time.perf_counter()
+        try:
+            module = importlib.import_module(name)
+        except BaseException:
+            if stub is not None:
+                sys.modules[name] = stub
+            raise
+        elapsed = time.perf_counter() - start
+        _lazy_stubs.pop(name, None)
+        callbacks = _lazy_callbacks.pop(name, [])
+    thread = threading.current_thread().name
+    logger.info("延迟导入 %s，耗时 %.0f ms（%s 线程）", name, elapsed * 1000, thread)
+    get_startup_profiler().record_lazy(name, elapsed, thread)
+    for callback in callbacks:
+        callback(module)
+    return module
+
+
+def on_lazy_module_loaded(name: str, callback: Callable[[types.ModuleType], None]):
+    """
+    真实模块导入后调用 callback(module)
+
+    模块已导入时立即调用；仍是占位模块或尚未导入时，等到经 load_lazy_module 导入后在导入的线程中调用
+    （不会为此导入模块）。
+    """
+    with _lazy_lock:
+        module = sys.modules.get(name)
+        if module is None or is_lazy_stub(module):
+            _lazy_callbacks.setdefault(name, []).append(callback)
+            return
+    callback(module)
+
+
+# ----------------------------------------------------------------------
+# 启动计时与报告
+# ----------------------------------------------------------------------
+class _FirstPaintFilter(QObject):
+    """窗口（或其子控件）收到第一个重绘事件时回调一次"""
+
+    def __init__(self, window, callback: Callable[[], None]):
+        super().__init__(window)
+        self.window = window
+        self.callback = callback
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint and hasattr(obj, 'window') and obj.window() is self.window:
+            from PyQt5.QtWidgets import QApplication
+            QApplication.instance().removeEventFilter(self)
+            self.callback()
+        return False
+
+
+class StartupProfiler:
+    """
+    启动时间记录
+
+    各阶段时刻以进程启动为零点（取自 psutil），因此包括解释器启动和入口脚本之前的导入。
+    """
+
+    def __init__(self):
+        self.import_timer = ImportTimer()
+        self.marks: 'OrderedDict[str, float]' = OrderedDict()
+        self.lazy_modules: Dict[str, Dict[str, Any]] = {}
+        self.tasks: Dict[str, Dict[str, Any]] = {}
+        self.report: Optional[Dict[str, Any]] = None
+        self._origin = time.perf_counter() - (time.time() - process_start_time())
+        self._lock = threading.Lock()
+
+    def begin(self):
+        """开始记录导入耗时（在入口处尽早调用）"""
+        self.import_timer.install()
+        self.mark('entry')
+
+    def elapsed(self) -> float:
+        """距进程启动的秒数"""
+        return time.perf_counter() - self._origin
+
+    def mark(self, name: str) -> float:
+        """记录阶段时刻（同名阶段只记第一次）"""
+        with self._lock:
+            return self.marks.setdefault(name, self.elapsed())
+
+    def record_lazy(self, name: str, seconds: float, thread: str):
+        with self._lock:
+            self.lazy_modules[name] = {'seconds': round(seconds, 4), 'thread': thread,
+                                       'at': round(self.elapsed(), 4)}
+
+    def record_task(self, name: str, seconds: float, ok: bool):
+        with self._lock:
+            self.tasks[name] = {'seconds': round(seconds, 4), 'ok': ok, 'at': round(self.elapsed(), 4)}
+
+    def watch_first_paint(self, window, callback: Optional[Callable[[], None]] = None):
+        """
+        记录窗口的首次绘制（first_paint）和首次绘制处理完成后的时刻（interactive）
+
+        需在 window.show() 之前调用；callback 在 interactive 时于界面线程中调用。
+        """
+        from PyQt5.QtWidgets import QApplication
+
+        def on_paint():
+            self.mark('first_paint')
+            QTimer.singleShot(0, on_interactive)
+
+        def on_interactive():
+            self.mark('interactive')
+            if callback is not None:
+                callback()
+
+        QApplication.instance().installEventFilter(_FirstPaintFilter(window, on_paint))
+
+    def build_report(self, top: int = 20) -> Dict[str, Any]:
+        with self._lock:
+            marks = OrderedDict((name, round(t, 4)) for name, t in self.marks.items())
+            lazy_modules = dict(self.lazy_modules)
+            tasks = dict(self.tasks)
+        return {
+            'version': REPORT_VERSION,
+            'started_at': datetime.fromtimestamp(time.time() - self.elapsed()).isoformat(timespec='seconds'),
+            'python': sys.version.split()[0],
+            'time_to_first_paint': marks.get('first_paint'),
+            'import_total': round(self.import_timer.total(), 4),
+            'phases': marks,
+            'imports': self.import_timer.top(top),
+            'lazy_modules': lazy_modules,
+            'background': tasks,
+        }
+
+    def finish(self, settings: Optional[Mapping[str, Any]] = None) -> Dict[str, Any]:
+        """
+        停止导入计时，生成报告、与历史比较并写入文件
+
+        Args:
+            settings: 覆盖默认启动设置的项目
+
+        Returns:
+            报告字典，regressions 列出比历史明显变慢的项目
+        """
+        settings = startup_settings(settings)
+        self.import_timer.uninstall()
+        report = self.build_report(int(settings['top_imports']))
+        previous = load_report(settings['report_path'])
+        history = load_history(settings['history_path'])
+        report['regressions'] = find_regressions(report, previous, history, settings)
+        try:
+            write_report(report, settings['report_path'], settings['history_path'])
+        except OSError as e:
+            logger.warning("写入启动报告失败: %s", e)
+        logger.info("%s", format_report(report, 8))
+        for message in report['regressions']:
+            logger.warning("启动耗时变慢: %s", message)
+        self.report = report
+        return report
+
+
+def load_report(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_history(path: str) -> List[Dict[str, Any]]:
+    entries = []
+    try:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+    except OSError:
+        pass
+    return entries
+
+
+def write_report(report: Mapping[str, Any], report_path: str, history_path: str):
+    """写入完整报告，并把摘要追加到历史文件（只保留最近 HISTORY_LIMIT 条）"""
+    for path in (report_path, history_path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+    tmp_path = report_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, report_path)
+
+    summary = {
+        'started_at': report['started_at'],
+        'time_to_first_paint': report['time_to_first_paint'],
+        'interactive': report['phases'].get('interactive'),
+        'ready': report['phases'].get('ready'),
+        'import_total': report['import_total'],
+    }
+    history = load_history(history_path)[-(HISTORY_LIMIT - 1):]
+    history.append(summary)
+    with open(history_path, 'w', encoding='utf-8') as f:
+        for entry in history:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+
+def find_regressions(report: Mapping[str, Any], previous: Optional[Mapping[str, Any]],
+                     history: List[Mapping[str, Any]], settings: Mapping[str, Any]) -> List[str]:
+    """
+    与历史比较，找出明显变慢的项目
+
+    首次绘制时间和导入总耗时与最近 history_size 次启动的中位数比较，
+    单个模块的累计导入耗时与上一次报告比较；超过 regression_ratio 倍且多于 regression_min 秒才算变慢。
+    """
+    ratio = float(settings['regression_ratio'])
+    minimum = float(settings['regression_min'])
+    recent = history[-int(settings['history_size']):]
+    regressions = []
+
+    def slower(value, baseline):
+        return value is not None and baseline and value > baseline * ratio and value - baseline > minimum
+
+    for key, label in (('time_to_first_paint', '首次绘制'), ('import_total', '导入总耗时')):
+        values = [entry.get(key) for entry in recent if entry.get(key) is not None]
+        if values:
+            baseline = statistics.median(values)
+            if slower(report.get(key), baseline):
+                regressions.append(f"{label} {report[key]:.2f} s，最近 {len(values)} 次中位数 {baseline:.2f} s")
+
+    if previous:
+        before = {item['module']: item['cumulative'] for item in previous.get('imports', [])}
+        for item in report.get('imports', []):
+            baseline = before.get(item['module'])
+            if slower(item['cumulative'], baseline):
+                regressions.append(f"导入 {item['module']} {item['cumulative'] * 1000:.0f} ms，"
+                                   f"上次 {baseline * 1000:.0f} ms")
+    return regressions
+
+
+def format_report(report: Mapping[str, Any], top: int = 20) -> str:
+    """把报告格式化为多行文本"""
+    phases = report.get('phases', {})
+    lines = [f"启动报告（{report.get('started_at')}，时刻从进程启动算起）"]
+    lines.append('  阶段: ' + ' | '.join(f"{name} {t:.2f} s" for name, t in phases.items()))
+    lines.append(f"  导入总耗时 {report.get('import_total', 0):.2f} s，耗时最多的模块（累计 / 自身）:")
+    for item in report.get('imports', [])[:top]:
+        lines.append(f"    {item['module']:<40} {item['cumulative'] * 1000:>8.1f} ms / {item['self'] * 1000:>7.1f} ms")
+    for name, info in report.get('lazy_modules', {}).items():
+        lines.append(f"  延迟导入 {name}: {info['seconds'] * 1000:.0f} ms（{info['thread']} 线程，{info['at']:.2f} s 时）")
+    for name, info in report.get('background', {}).items():
+        state = '完成' if info['ok'] else '失败'
+        lines.append(f"  后台任务 {name}: {info['seconds'] * 1000:.0f} ms {state}（{info['at']:.2f} s 时）")
+    for message in report.get('regressions', []):
+        lines.append(f"  变慢: {message}")
+    return '\n'.join(lines)
+
+
+startup_profiler = StartupProfiler()
+
+
+def get_startup_profiler() -> StartupProfiler:
+    """获取全局启动计时器"""
+    return startup_profiler
+
+
+# ----------------------------------------------------------------------
+# 后台任务
+# ----------------------------------------------------------------------
+def list_serial_ports() -> List[str]:
+    """枚举系统串口"""
+    try:
+        from serial.tools import list_ports
+    except ImportError:
+        logger.warning("缺少 PySerial 库，无法列出串口设备")
+        return []
+    return [port.device for port in list_ports.comports()]
+
+
+def warm_ephemeris():
+    """计算当天的星历表"""
+    from src.services.ephemeris_cache import get_ephemeris_cache
+    return get_ephemeris_cache().day()
+
+
+def warm_dss_cache():
+    """创建全局 DSS 图像缓存（读取清单并收编旧文件），不让首次查询在界面线程中做这些文件操作"""
+    from src.services.dss_cache import get_dss_cache
+    return len(get_dss_cache())
+
+
+class BackgroundTasks(QObject):
+    """
+    在线程池中运行一批启动任务，结果通过信号在界面线程中送达
+
+    同名任务正在运行时不会重复提交。
+    """
+
+    task_finished = pyqtSignal(str, object)
+    task_failed = pyqtSignal(str, str)
+    all_finished = pyqtSignal()
+    _done = pyqtSignal(str, object, float, str)
+
+    def __init__(self, parent=None, max_workers: int = 4, profiler: Optional[StartupProfiler] = None):
+        super().__init__(parent)
+        self.profiler = profiler or get_startup_profiler()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='startup')
+        self._pending = set()
+        self._done.connect(self._on_done)
+
+    @property
+    def pending(self) -> List[str]:
+        return sorted(self._pending)
+
+    def submit(self, name: str, func: Callable[[], Any]) -> bool:
+        """提交任务（在界面线程中调用），同名任务未完成时返回 False"""
+        if name in self._pending:
+            return False
+        self._pending.add(name)
+        self._executor.submit(self._run, name, func)
+        return True
+
+    def _run(self, name: str, func: Callable[[], Any]):
+        start = time.perf_counter()
+        result, error = None, ''
+        try:
+            result = func()
+        except Exception as e:
+            logger.exception("启动任务 %s 失败", name)
+            error = str(e) or type(e).__name__
+        self._done.emit(name, result, time.perf_counter() - start, error)
+
+    def _on_done(self, name: str, result, seconds: float, error: str):
+        self._pending.discard(name)
+        self.profiler.record_task(name, seconds, not error)
+        if error:
+            self.task_failed.emit(name, error)
+        else:
+            logger.debug("启动任务 %s 完成，耗时 %.0f ms", name, seconds * 1000)
+            self.task_finished.emit(name, result)
+        if not self._pending:
+            self.all_finished.emit()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# ----------------------------------------------------------------------
+# 接入主窗口
+# ----------------------------------------------------------------------
+def with_default_cover(devices: Iterable[Mapping[str, Any]]) -> List[Dict[str, Any]]:
+    """复制设备列表，没有镜头盖设备时加入默认设备"""
+    devices = [dict(device) for device in devices]
+    if not any(device.get('DeviceType') == 'CoverCalibrator' for device in devices):
+        devices.append(dict(DEFAULT_COVER_DEVICE))
+    return devices
+
+
+def apply_device_list(window, devices: List[Dict[str, Any]]):
+    """把搜索到的设备填入连接菜单和设备下拉框，与主窗口 refresh_device_list 相同"""
+    devices = with_default_cover(devices)
+    window.init_connect_menu(list(devices))
+    for control in getattr(window, 'device_controls', []):
+        if not hasattr(control, 'update_devices'):
+            continue
+        device_id = getattr(control, 'device_id', None)
+        if device_id == 'cover':
+            control.update_devices([d for d in devices if d.get('DeviceType') == 'CoverCalibrator'])
+        elif device_id == 'dome':
+            control.update_devices([d for d in devices if d.get('DeviceType') == 'Dome'])
+        else:
+            control.update_devices(devices)
+
+
+class StagedStartup(QObject):
+    """
+    主窗口的分阶段启动
+
+    begin() 在窗口显示之前调用，等待首次绘制；defer() 登记的启动动作在首次绘制 defer_timers_ms 毫秒之后执行；
+    首次绘制处理完成后提交后台任务，各任务完成时更新窗口，全部完成后生成启动报告并发出 ready。
+    """
+
+    ready = pyqtSignal(dict)
+
+    def __init__(self, window, profiler: Optional[StartupProfiler] = None,
+                 settings: Optional[Mapping[str, Any]] = None, discovery=None):
+        """
+        初始化分阶段启动
+
+        Args:
+            window: 主窗口
+            profiler: 启动计时器，为空时使用全局计时器
+            settings: 覆盖默认启动设置的项目
+            discovery: 设备发现服务，为空时在后台线程中取全局服务（避免在首次绘制前导入 requests）
+        """
+        super().__init__(window)
+        self.window = window
+        self.profiler = profiler or get_startup_profiler()
+        self.settings = startup_settings(settings)
+        self.devices: List[Dict[str, Any]] = []
+        self.serial_ports: List[str] = []
+        self.discovery = discovery
+        self._by_server: 'OrderedDict[str, List[Dict[str, Any]]]' = OrderedDict()
+        self._live = False
+        self._discovery_lock = threading.Lock()
+        self._discovery_connected = False
+        self.tasks = BackgroundTasks(self, profiler=self.profiler)
+        self.tasks.task_finished.connect(self._on_task_finished)
+        self.tasks.all_finished.connect(self._on_all_finished)
+        self._deferred: List[Callable[[], None]] = []
+        self._deferred_done = False
+        self._started = False
+        self._reported = False
+
+    def begin(self):
+        """开始等待首次绘制（在 window.show() 之前调用）"""
+        self.profiler.watch_first_paint(self.window, self.start_background)
+
+    def defer(self, callback: Callable[[], None]):
+        """登记窗口可交互之后才执行的启动动作（例如全天相机管线的 start），已到时间时立即执行"""
+        if self._deferred_done:
+            callback()
+        else:
+            self._deferred.append(callback)
+
+    def start_background(self):
+        """提交首批后台任务（首次绘制后自动调用）"""
+        if self._started:
+            return
+        self._started = True
+        self.tasks.submit('device_cache', lambda: self._discovery_service().load_cache())
+        self.refresh_devices()
+        self.tasks.submit('ephemeris', warm_ephemeris)
+        fetcher = getattr(self.window, 'dss_fetcher', None)
+        if hasattr(fetcher, 'warm_from_target_list'):
+            self.tasks.submit('dss_cache', warm_dss_cache)
+            self.tasks.submit('dss_prefetch', fetcher.warm_from_target_list)
+        for name in self.settings['preload']:
+            self.tasks.submit(f"preload:{name}", lambda name=name: load_lazy_module(name))
+        QTimer.singleShot(int(self.settings['defer_timers_ms']), self._run_deferred)
+
+    def refresh_devices(self):
+        """在后台重新搜索 Alpaca 设备并枚举串口，各服务器的设备一到就更新菜单"""
+        self._live = False
+        self.tasks.submit('alpaca_devices', lambda: self._discovery_service().discover())
+        self.tasks.submit('serial_ports', list_serial_ports)
+
+    def _discovery_service(self):
+        # 在后台线程中调用：首次调用时导入发现服务并连接逐台服务器送达的信号
+        with self._discovery_lock:
+            if self.discovery is None:
+                from src.services.discovery_service import get_discovery_service
+                self.discovery = get_discovery_service()
+            if not self._discovery_connected:
+                self.discovery.devices_found.connect(self._on_server_devices)
+                self._discovery_connected = True
+        return self.discovery
+
+    def _apply_devices(self):
+        from src.services.discovery_service import merge_devices
+        self.devices = merge_devices(self._by_server)
+        apply_device_list(self.window, self.devices)
+
+    def _on_server_devices(self, url: str, devices: List[Dict[str, Any]]):
+        if not self._live:
+            # 本轮的第一个实时结果：缓存中的其他服务器先保留，发现结束时以实时结果为准
+            self._live = True
+            self.profiler.mark('first_devices')
+        self._by_server[url] = devices
+        self._apply_devices()
+
+    def _run_deferred(self):
+        self._deferred_done = True
+        deferred, self._deferred = self._deferred, []
+        for callback in deferred:
+            callback()
+
+    def _on_task_finished(self, name: str, result):
+        if name == 'device_cache':
+            if result and not self._live:
+                self._by_server = OrderedDict(result)
+                self._apply_devices()
+                logger.info("已显示缓存的 %d 个设备", len(self.devices))
+            self.profiler.mark('cached_devices')
+        elif name == 'alpaca_devices':
+            self._by_server = OrderedDict()
+            for device in result or []:
+                self._by_server.setdefault(device.get('ServerUrl', ''), []).append(device)
+            self._live = True
+            self._apply_devices()
+            logger.info("找到 %d 个 Alpaca 设备", len(self.devices))
+            self.profiler.mark('devices')
+        elif name == 'serial_ports':
+            self.serial_ports = list(result or [])
+            logger.info("找到可用串口: %s", self.serial_ports)
+            self.window.init_connect_menu(with_default_cover(self.devices))
+            self.profiler.mark('serial_ports')
+
+    def _on_all_finished(self):
+        if self._reported:
+            return
+        self._reported = True
+        self.profiler.mark('ready')
+        self.ready.emit(self.profiler.finish(self.settings))
+
+    def shutdown(self):
+        self.tasks.shutdown()
+
+
+def get_staged_startup(window) -> StagedStartup:
+    """获取窗口的分阶段启动对象（首次调用时创建）"""
+    startup = getattr(window, '_staged_startup', None)
+    if startup is None:
+        startup = StagedStartup(window)
+        window._staged_startup = startup
+    return startup
+
+
+def _get_available_serial_ports(self):
+    """返回后台枚举到的串口（尚未完成时为空）"""
+    return list(get_staged_startup(self).serial_ports)
+
+
+def _refresh_device_list(self):
+    """在后台刷新设备列表，完成后更新连接菜单"""
+    get_staged_startup(self).refresh_devices()
+
+
+def install_staged_startup(window_cls):
+    """
+    让主窗口类的串口枚举和设备刷新改为后台执行
+
+    必须在创建主窗口实例之前调用（构造时 init_connect_menu 会枚举串口）。
+
+    Args:
+        window_cls: 主窗口类（MainWindow）
+
+    Returns:
+        传入的类，便于用作装饰器
+    """
+    window_cls.get_available_serial_ports = _get_available_serial_ports
+    window_cls.refresh_device_list = _refresh_device_list
+    return window_cls
+
+
+def run_staged(argv: Optional[List[str]] = None, exit_when_ready: bool = False,
+               telemetry_url: Optional[str] = None, record_path: Optional[str] = None) -> int:
+    """
+    分阶段启动主程序
+
+    Args:
+        argv: 传给 QApplication 的参数
+        exit_when_ready: 后台任务全部完成、启动报告写出后退出（用于跟踪启动耗时）
+        telemetry_url: 遥测服务地址，设置后设备状态从该服务接收（为空时取配置 telemetry_server.client_url）
+        record_path: 设备通信记录文件，为空时按配置 recording.enabled 决定是否记录
+
+    Returns:
+        事件循环的退出码
+    """
+    profiler = get_startup_profiler()
+    profiler.begin()
+    from src.services.log_service import setup_logging
+    setup_logging()
+    profiler.mark('logging')
+
+    from PyQt5.QtWidgets import QApplication
+    app = QApplication.instance() or QApplication(list(argv if argv is not None else sys.argv))
+    profiler.mark('qapplication')
+
+    settings = startup_settings()
+    deferred = install_lazy_modules(bool(settings['fast_astronomy']))
+    logger.debug("延迟导入: %s", deferred)
+    from src.ui.main_window import MainWindow
+    from src.ui.angle_visualizer import install_angle_visualizer
+    from src.ui.state_binding import attach_state_store, install_state_binding
+    from src.ui.ui_binding import install_ui_binding
+    from src.utils.theme_manager import theme_manager
+    install_angle_visualizer(MainWindow)
+    install_ui_binding(MainWindow)
+    install_state_binding(MainWindow)
+    install_staged_startup(MainWindow)
+    from src.services.allsky_pipeline import attach_allsky_pipeline, install_allsky_pipeline
+    install_allsky_pipeline(MainWindow)
+    from src.services.command_executor import install_command_executor
+    install_command_executor(MainWindow)
+    from src.services.profiler import install_instrumentation, start_monitoring
+    install_instrumentation(MainWindow)
+    from src.services.traffic_recorder import start_recording, stop_recording
+    recorder = start_recording(path=record_path)
+    profiler.mark('imports')
+
+    window = MainWindow([])
+    window.setStyleSheet(theme_manager.get_theme_style())
+    store = attach_state_store(window)
+    if hasattr(getattr(window, 'dss_fetcher', None), 'on_telescope_snapshot'):
+        from src.services.dss_prefetch import connect_state_store
+        connect_state_store(window.dss_fetcher, store)
+    startup = get_staged_startup(window)
+    # 全天相机只由这一条管线解码：标签显示和图像分析共用
+    allsky = attach_allsky_pipeline(window)
+    if allsky is not None:
+        startup.defer(allsky.start)
+        app.aboutToQuit.connect(allsky.stop)
+    profiler.mark('window')
+    startup.begin()
+    window.show()
+    profiler.mark('shown')
+
+    from src.services.telemetry_server import server_settings
+    telemetry_url = telemetry_url or server_settings()['client_url']
+    if telemetry_url:
+        from src.services.telemetry_server import TelemetryClient, connect_window
+        client = TelemetryClient(telemetry_url)
+        connect_window(client, window)
+        client.start()
+        app.aboutToQuit.connect(client.stop)
+    else:
+        # 设备状态由一个批量轮询线程读取，送到主窗口的状态更新方法和状态中心
+        from src.services.polling_engine import PollingMonitor, get_device_connections
+        from src.services.state_store import connect_sources
+        from src.services.telemetry_server import connect_window
+        from src.ui.state_binding import stop_cooler_refresh
+        # 与原 TelescopeMonitor 一致，只轮询在设备控件中连接的设备（以及安全联锁读取的设备）
+        monitor = PollingMonitor(connections=get_device_connections())
+        # 配置了串口的水冷机、UPS（devices.<设备>.transport，默认开启）和 telemetry_server.serial_devices
+        # 中的设备由 SerialTransport 读取，不要再在设备控件中连接
+        from src.services.serial_transport import get_serial_transport, transport_devices
+        serial_devices = transport_devices(server_settings()['serial_devices'])
+        transport = None
+        if serial_devices:
+            transport = get_serial_transport()
+            for device_key in serial_devices:
+                transport.open_device(device_key)
+            app.aboutToQuit.connect(transport.shutdown)
+        connect_window(monitor, window, transport)
+        connect_sources(store, monitor=monitor, transport=transport)
+        stop_cooler_refresh(window, transport)
+        # 设备读数只经状态中心记录一次（轮询线程和主窗口都会发布同一读数）
+        from src.services.telemetry_store import connect_state_store, get_telemetry_store, telemetry_enabled
+        if telemetry_enabled():
+            connect_state_store(store)
+            app.aboutToQuit.connect(get_telemetry_store().close)
+        # 设备状态来自遥测服务时由服务端执行联锁，界面不重复发送关闭命令
+        from src.services.command_executor import get_command_executor
+        from src.services.safety_interlock import start_safety_interlock
+        # 按钮经 install_command_executor 提交到同一个全局执行器，guard() 对按钮同样生效
+        executor = get_command_executor()
+        executor.polling_engine = monitor.engine
+        interlock = start_safety_interlock(store, executor=executor, polling_engine=monitor.engine,
+                                           parent=window)
+        if interlock is not None:
+            app.aboutToQuit.connect(interlock.stop)
+        # 联锁接入状态中心之后再开始轮询，第一份气象读数也经过规则判断
+        monitor.start()
+        app.aboutToQuit.connect(monitor.stop)
+        app.aboutToQuit.connect(lambda: monitor.wait(5000))
+        if allsky is not None:
+            # 分析器接到显示用的管线上，每帧只解码一次
+            from src.services.allsky_analysis import start_allsky_analysis
+            start_allsky_analysis(store, pipeline=allsky)
+
+    metrics = start_monitoring()
+    if metrics is not None:
+        app.aboutToQuit.connect(metrics.stop)
+    from src.services.memory_tracker import start_memory_tracking
+    memory = start_memory_tracking()
+    if memory is not None:
+        # 启动期的长寿对象在后台任务完成后冻结，之后的回收不再遍历它们
+        startup.ready.connect(lambda report: memory.freeze())
+        app.aboutToQuit.connect(memory.stop)
+    if recorder is not None:
+        app.aboutToQuit.connect(lambda: stop_recording(recorder))
+    app.aboutToQuit.connect(startup.shutdown)
+    if exit_when_ready:
+        startup.ready.connect(lambda report: app.quit())
+    return app.exec_()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='分阶段启动')
+    parser.add_argument('--exit-when-ready', action='store_true', help='后台任务完成、写出启动报告后退出')
+    parser.add_argument('--show-report', action='store_true', help='显示上一次的启动报告后退出')
+    parser.add_argument('--telemetry-url', help='从遥测服务接收设备状态（如 http://host:8765）')
+    parser.add_argument('--record', metavar='PATH', help='把设备通信记录到文件（.jsonl.gz），供回放测试')
+    args, qt_args = parser.parse_known_args()
+    if args.show_report:
+        report = load_report(startup_settings()['report_path'])
+        print(format_report(report) if report else '没有启动报告')
+        return 0
+    return run_staged([sys.argv[0]] + qt_args, exit_when_ready=args.exit_when_ready,
+                      telemetry_url=args.telemetry_url, record_path=args.record)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,535 @@
+"""
+设备状态总线
+
+主窗口里有多个互不相关的定时器各自读取状态：每秒的 self.timer、每 5 秒强制刷新水冷机的
+cooler_refresh_timer、全天相机的 telescope_camera_timer、telescope_monitor 线程的循环，以及
+update_time_info 中 `int(time.time()) % 30 == 0` 时调用的 calculate_frame_dec_angle。后者从 QLabel
+文本读回赤经、赤纬和消旋器角度再解析成数字；定时器稍有漂移跳过了整 30 秒的那一秒，这一轮就不计算。
+
+StateStore 是进程内的状态中心：
+  - 数据源（轮询引擎、串口设备、主窗口的状态更新方法）publish 每台设备的状态，按 DEVICE_FIELDS
+    转换类型后形成不可变快照（DeviceSnapshot），数值没有变化的发布不产生通知
+  - 每台设备只有一个发布来源：connect_sources 接入的数据源发布过的设备，主窗口的状态更新方法不再重复发布
+  - 订阅者按设备和字段订阅；publish 可以来自任意线程，coalesce_ms 时间窗内的多次发布合并为一次通知，
+    在 StateStore 所在线程（界面线程）中送达，订阅者收到最新快照和窗口内累计变化的字段
+  - 派生值（derive）声明输入设备和字段，只在输入变化或超过 max_age 秒未计算时重新计算，
+    结果作为一台虚拟设备发布：'pointing'（旁行角、画幅夹角）和 'dss_target'（移动超过阈值的指向）
+
+用法:
+    store = get_state_store()                       # 首次调用应在界面线程中
+    connect_sources(store, monitor=polling_monitor, transport=get_serial_transport())
+    unsubscribe = store.subscribe('pointing', on_pointing)   # on_pointing(snapshot, changed)
+"""
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Mapping, Optional, Tuple
+
+from PyQt5.QtCore import QObject, Qt, QTimer, pyqtSignal
+
+from src.config.config_service import get_config_service
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS = {
+    'coalesce_ms': 50,
+    'pointing_max_age': 30,
+    'dss_threshold': 0.5,
+}
+
+# 各设备已知字段的类型；未列出的字段原样保存
+DEVICE_FIELDS: Dict[str, Dict[str, type]] = {
+    'telescope': {
+        'rightascension': float, 'declination': float, 'altitude': float, 'azimuth': float,
+        'siderealtime': float, 'targetrightascension': float, 'targetdeclination': float,
+        'athome': bool, 'atpark': bool, 'ispulseguiding': bool, 'slewing': bool, 'tracking': bool,
+    },
+    'focuser': {'position': int, 'ismoving': bool, 'temperature': float, 'maxstep': int},
+    'rotator': {'position': float, 'ismoving': bool, 'reverse': bool, 'stepsize': float,
+                'targetposition': float},
+    'ObservingConditions': {
+        'cloudcover': float, 'dewpoint': float, 'humidity': float, 'pressure': float, 'rainrate': float,
+        'skybrightness': float, 'skyquality': float, 'skytemperature': float, 'starfwhm': float,
+        'temperature': float, 'winddirection': float, 'windspeed': float, 'windgust': float,
+    },
+    'dome': {'azimuth': float, 'athome': bool, 'atpark': bool, 'slewing': bool, 'shutter_status': int},
+    'covercalibrator': {'coverstate': int, 'calibratorstate': int, 'brightness': int},
+    'cooler': {'temperature': float, 'running': bool, 'flow_alarm': bool, 'temp_alarm': bool,
+               'level_alarm': bool, 'power': bool, 'status_bits': int},
+    'ups': {'input_voltage': float, 'output_voltage': float, 'load': int, 'battery': float,
+            'temperature': float, 'input_frequency': float},
+    'allsky': {'cloud_cover': float, 'star_count': int, 'sky_background': float, 'sky_quality': float,
+               'daylight': bool},
+}
+
+# 旁行角的输入：望远镜赤经、赤纬，消旋器角度；恒星时每次轮询都在变，不作为触发条件，随时间的变化由 max_age 覆盖
+POINTING_INPUTS = {'telescope': ('rightascension', 'declination'), 'rotator': ('position',)}
+DSS_TARGET_INPUTS = {'telescope': ('rightascension', 'declination')}
+
+_MISSING = object()
+
+
+def coerce_values(device: str, values: Mapping[str, Any]) -> Dict[str, Any]:
+    """按 DEVICE_FIELDS 转换字段类型，None 和无法转换的值原样保留"""
+    types_ = DEVICE_FIELDS.get(device, {})
+    result = {}
+    for key, value in values.items():
+        kind = types_.get(key)
+        if kind is not None and value is not None and not isinstance(value, kind):
+            try:
+                value = kind(value)
+            except (TypeError, ValueError):
+                logger.debug("%s.%s 的值 %r 无法转换为 %s", device, key, value, kind.__name__)
+        result[key] = value
+    return result
+
+
+def _same(a, b) -> bool:
+    if a is b or a == b:
+        return True
+    return isinstance(a, float) and isinstance(b, float) and math.isnan(a) and math.isnan(b)
+
+
+class DeviceSnapshot:
+    """某台设备某一时刻的状态（只读）"""
+
+    __slots__ = ('device', 'values', 'timestamp', 'version')
+
+    def __init__(self, device: str, values: Dict[str, Any], timestamp: float, version: int):
+        self.device = device
+        self.values = MappingProxyType(values)
+        self.timestamp = timestamp
+        self.version = version
+
+    def get(self, field: str, default: Any = None) -> Any:
+        value = self.values.get(field)
+        return default if value is None else value
+
+    def __getitem__(self, field: str) -> Any:
+        return self.values[field]
+
+    def __contains__(self, field: str) -> bool:
+        return field in self.values
+
+    def as_dict(self) -> Dict[str, Any]:
+        return dict(self.values)
+
+    def __repr__(self):
+        return f"<DeviceSnapshot {self.device} v{self.version} {dict(self.values)}>"
+
+
+class _Subscription:
+    __slots__ = ('device', 'callback', 'fields')
+
+    def __init__(self, device: Optional[str], callback: Callable, fields: Optional[FrozenSet[str]]):
+        self.device = device
+        self.callback = callback
+        self.fields = fields
+
+
+class _Derivation:
+    __slots__ = ('name', 'inputs', 'compute', 'max_age', 'computed_at', 'stale')
+
+    def __init__(self, name: str, inputs: Dict[str, Optional[FrozenSet[str]]],
+                 compute: Callable[[Dict[str, Optional[DeviceSnapshot]]], Optional[Dict[str, Any]]],
+                 max_age: Optional[float]):
+        self.name = name
+        self.inputs = inputs
+        self.compute = compute
+        self.max_age = max_age
+        self.computed_at: Optional[float] = None
+        self.stale = True
+
+    def triggered_by(self, dirty: Mapping[str, set]) -> bool:
+        for device, fields in self.inputs.items():
+            changed = dirty.get(device)
+            if changed and (fields is None or not fields.isdisjoint(changed)):
+                return True
+        return False
+
+
+class StateStore(QObject):
+    """
+    进程内设备状态中心
+
+    publish() 线程安全；通知、派生值计算和 snapshot_changed 信号都在 StateStore 所在线程中进行。
+    """
+
+    snapshot_changed = pyqtSignal(str, object)
+    _flush_requested = pyqtSignal()
+
+    def __init__(self, coalesce_ms: Optional[int] = None, parent=None):
+        """
+        初始化状态中心
+
+        Args:
+            coalesce_ms: 合并通知的时间窗（毫秒），0 表示在下一轮事件循环中通知；为空时取配置
+            parent: 父QObject
+        """
+        super().__init__(parent)
+        settings = dict(DEFAULT_SETTINGS)
+        settings.update(get_config_service().get('state_store', {}) or {})
+        self.coalesce_ms = int(settings['coalesce_ms'] if coalesce_ms is None else coalesce_ms)
+        self._lock = threading.RLock()
+        self._snapshots: Dict[str, DeviceSnapshot] = {}
+        self._dirty: Dict[str, set] = {}
+        self._subscriptions: List[_Subscription] = []
+        self._listeners: Tuple[Callable[[str, Dict[str, Any], float], None], ...] = ()
+        self._derived: 'OrderedDict[str, _Derivation]' = OrderedDict()
+        self._sourced: set = set()
+        self._flush_pending = False
+        self._version = 0
+        self.stats = {'published': 0, 'unchanged': 0, 'flushes': 0, 'notifications': 0,
+                      'derived_runs': 0, 'derived_skipped': 0}
+
+        self._flush_timer = QTimer(self)
+        self._flush_timer.setSingleShot(True)
+        self._flush_timer.timeout.connect(self.flush)
+        self._flush_requested.connect(self._schedule_flush, Qt.QueuedConnection)
+        self._age_timer = QTimer(self)
+        self._age_timer.timeout.connect(self.tick)
+
+    # ------------------------------------------------------------------
+    # 发布
+    # ------------------------------------------------------------------
+    def _store(self, device: str, values: Mapping[str, Any], timestamp: Optional[float],
+               replace: bool) -> FrozenSet[str]:
+        """保存新快照，返回变化的字段（调用方持有锁）"""
+        previous = self._snapshots.get(device)
+        if previous is None:
+            merged = dict(values)
+            changed = set(merged)
+        else:
+            merged = dict(values) if replace else {**previous.values, **values}
+            changed = {key for key, value in merged.items()
+                       if not _same(previous.values.get(key, _MISSING), value)}
+            if replace:
+                changed.update(key for key in previous.values if key not in merged)
+        if not changed:
+            return frozenset()
+        self._version += 1
+        self._snapshots[device] = DeviceSnapshot(device, merged, timestamp or time.time(), self._version)
+        return frozenset(changed)
+
+    def publish(self, device: str, values: Mapping[str, Any], timestamp: Optional[float] = None,
+                replace: bool = False) -> FrozenSet[str]:
+        """
+        发布设备状态（任意线程）
+
+        Args:
+            device: 设备键（与 config.yaml devices 的键一致，串口设备为 'cooler'/'ups'）
+            values: 状态字典，默认与上一份快照合并
+            timestamp: 状态时刻，默认当前时间
+            replace: 为 True 时以 values 完全替换上一份快照
+
+        Returns:
+            变化的字段，没有变化时为空集合
+        """
+        values = coerce_values(device, values)
+        if timestamp is None:
+            timestamp = time.time()
+        for listener in self._listeners:
+            try:
+                listener(device, values, timestamp)
+            except Exception as e:
+                logger.error("状态监听器处理 %s 出错: %s", device, e)
+        with self._lock:
+            self.stats['published'] += 1
+            changed = self._store(device, values, timestamp, replace)
+            if not changed:
+                self.stats['unchanged'] += 1
+                return changed
+            self._dirty.setdefault(device, set()).update(changed)
+            schedule = not self._flush_pending
+            self._flush_pending = True
+        if schedule:
+            self._flush_requested.emit()
+        return changed
+
+    def publish_source(self, device: str, values: Mapping[str, Any], timestamp: Optional[float] = None,
+                       replace: bool = False) -> FrozenSet[str]:
+        """
+        数据源（轮询线程、串口设备、全天相机分析）发布设备状态，参数同 publish
+
+        发布过的设备由该数据源独占：主窗口的状态更新方法收到的是同一读数经排队信号转发的副本，
+        按 has_source 判断后不再发布。
+        """
+        with self._lock:
+            self._sourced.add(device)
+        return self.publish(device, values, timestamp, replace)
+
+    def has_source(self, device: str) -> bool:
+        """设备是否已由 connect_sources 接入的数据源发布"""
+        with self._lock:
+            return device in self._sourced
+
+    def _schedule_flush(self):
+        if self.coalesce_ms <= 0:
+            self.flush()
+        elif not self._flush_timer.isActive():
+            self._flush_timer.start(self.coalesce_ms)
+
+    # ------------------------------------------------------------------
+    # 读取与订阅
+    # ------------------------------------------------------------------
+    def snapshot(self, device: str) -> Optional[DeviceSnapshot]:
+        """设备的最新快照，没有时为 None"""
+        return self._snapshots.get(device)
+
+    def get(self, device: str, field: str, default: Any = None) -> Any:
+        snapshot = self._snapshots.get(device)
+        return default if snapshot is None else snapshot.get(field, default)
+
+    def devices(self) -> List[str]:
+        with self._lock:
+            return list(self._snapshots)
+
+    def snapshots(self) -> Dict[str, DeviceSnapshot]:
+        with self._lock:
+            return dict(self._snapshots)
+
+    def subscribe(self, device: Optional[str], callback: Callable[[DeviceSnapshot, FrozenSet[str]], None],
+                  fields: Optional[Iterable[str]] = None) -> Callable[[], None]:
+        """
+        订阅设备状态变化
+
+        Args:
+            device: 设备键，为 None 时订阅所有设备
+            callback: callback(snapshot, changed)，changed 为合并窗口内累计变化的字段
+            fields: 只关心的字段，为空时任何字段变化都通知
+
+        Returns:
+            取消订阅的函数
+        """
+        subscription = _Subscription(device, callback, frozenset(fields) if fields else None)
+        with self._lock:
+            self._subscriptions.append(subscription)
+
+        def unsubscribe():
+            with self._lock:
+                if subscription in self._subscriptions:
+                    self._subscriptions.remove(subscription)
+        return unsubscribe
+
+    def add_listener(self, callback: Callable[[str, Dict[str, Any], float], None]) -> Callable[[], None]:
+        """
+        注册同步监听器
+
+        每次 publish（包括数值没有变化的发布）都在发布者线程中立即调用 callback(device, values, timestamp)，
+        不经过合并时间窗，也不依赖界面线程，供安全联锁这类对延迟敏感的消费者使用。监听器应尽快返回。
+
+        Returns:
+            取消监听的函数
+        """
+        with self._lock:
+            self._listeners = self._listeners + (callback,)
+
+        def remove():
+            with self._lock:
+                self._listeners = tuple(item for item in self._listeners if item is not callback)
+        return remove
+
+    # ------------------------------------------------------------------
+    # 派生值
+    # ------------------------------------------------------------------
+    def derive(self, name: str, inputs: Mapping[str, Optional[Iterable[str]]],
+               compute: Callable[[Dict[str, Optional[DeviceSnapshot]]], Optional[Dict[str, Any]]],
+               max_age: Optional[float] = None):
+        """
+        注册派生值
+
+        Args:
+            name: 派生值的设备名，结果以此名发布
+            inputs: 输入设备 -> 字段（None 表示任何字段）
+            compute: compute(快照字典) -> 结果字典，返回 None 时保留上次结果
+            max_age: 输入不变时最长多久重新计算一次（秒），用于随时间变化的量（如旁行角）
+        """
+        derivation = _Derivation(name, {device: frozenset(fields) if fields else None
+                                        for device, fields in inputs.items()}, compute, max_age)
+        with self._lock:
+            self._derived[name] = derivation
+        if max_age and not self._age_timer.isActive():
+            self._age_timer.start(1000)
+
+    def refresh(self, name: Optional[str] = None):
+        """要求在下一次通知时重新计算派生值（为空时全部）"""
+        with self._lock:
+            for derivation in self._derived.values():
+                if name is None or derivation.name == name:
+                    derivation.stale = True
+            schedule = not self._flush_pending
+            self._flush_pending = True
+        if schedule:
+            self._flush_requested.emit()
+
+    def tick(self, now: Optional[float] = None):
+        """检查派生值是否超过 max_age（内部定时器每秒调用）；按经过的时间判断，定时器漂移不会漏算"""
+        now = time.monotonic() if now is None else now
+        expired = False
+        with self._lock:
+            for derivation in self._derived.values():
+                if derivation.max_age and (derivation.computed_at is None
+                                           or now - derivation.computed_at >= derivation.max_age):
+                    derivation.stale = True
+                    expired = True
+        if expired:
+            self.flush(now)
+
+    def _run_derived(self, dirty: Dict[str, set], now: float):
+        for derivation in list(self._derived.values()):
+            if not (derivation.stale or derivation.triggered_by(dirty)):
+                self.stats['derived_skipped'] += 1
+                continue
+            inputs = {device: self._snapshots.get(device) for device in derivation.inputs}
+            derivation.stale = False
+            derivation.computed_at = now
+            try:
+                result = derivation.compute(inputs)
+            except Exception:
+                logger.exception("计算派生值 %s 失败", derivation.name)
+                continue
+            self.stats['derived_runs'] += 1
+            if result is None:
+                continue
+            with self._lock:
+                changed = self._store(derivation.name, coerce_values(derivation.name, result), None, True)
+            if changed:
+                dirty.setdefault(derivation.name, set()).update(changed)
+
+    # ------------------------------------------------------------------
+    # 通知
+    # ------------------------------------------------------------------
+    def flush(self, now: Optional[float] = None) -> int:
+        """
+        计算派生值并通知订阅者（在 StateStore 所在线程中调用）
+
+        Returns:
+            送达的通知数
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            dirty = self._dirty
+            self._dirty = {}
+            self._flush_pending = False
+        self._run_derived(dirty, now)
+        if not dirty:
+            return 0
+        self.stats['flushes'] += 1
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        delivered = 0
+        for device, changed in dirty.items():
+            snapshot = self._snapshots[device]
+            changed = frozenset(changed)
+            self.snapshot_changed.emit(device, snapshot)
+            for subscription in subscriptions:
+                if subscription.device is not None and subscription.device != device:
+                    continue
+                if subscription.fields is not None and subscription.fields.isdisjoint(changed):
+                    continue
+                try:
+                    subscription.callback(snapshot, changed)
+                except Exception:
+                    logger.exception("状态订阅者处理 %s 时出错", device)
+                delivered += 1
+        self.stats['notifications'] += delivered
+        return delivered
+
+
+# ----------------------------------------------------------------------
+# 内置派生值
+# ----------------------------------------------------------------------
+def pointing_derivation(calculator=None):
+    """
+    旁行角派生值
+
+    结果: parallactic_angle、hour_angle、frame_dec_angle（度）以及所用的 declination、rotator_angle；
+    没有消旋器数据时按角度 0 计算，与主窗口 calculate_frame_dec_angle 一致。
+    """
+    def compute(snapshots):
+        telescope = snapshots.get('telescope')
+        if telescope is None:
+            return None
+        rotator = snapshots.get('rotator')
+        rotator_values = rotator.values if rotator is not None and rotator.get('position') is not None \
+            else {'position': 0.0}
+        from src.services.parallactic import get_parallactic_calculator
+        result = (calculator or get_parallactic_calculator()).from_snapshot(telescope.values, rotator_values)
+        if not result:
+            return None
+        result['declination'] = telescope.get('declination')
+        result['rotator_angle'] = float(rotator_values['position'])
+        return result
+    return compute
+
+
+def dss_target_derivation(threshold: float = 0.5):
+    """
+    DSS 星图指向派生值
+
+    望远镜指向与上次触发的位置相距超过 threshold 度时才更新（rightascension 小时、declination 度），
+    订阅者据此请求新的星图。
+    """
+    last: Dict[str, float] = {}
+
+    def compute(snapshots):
+        from src.utils.coordinates import angular_separation
+        telescope = snapshots.get('telescope')
+        if telescope is None:
+            return None
+        ra, dec = telescope.get('rightascension'), telescope.get('declination')
+        if ra is None or dec is None:
+            return None
+        if last and angular_separation(last['rightascension'] * 15.0, last['declination'],
+                                       ra * 15.0, dec) <= threshold:
+            return dict(last)
+        last.update(rightascension=float(ra), declination=float(dec))
+        return dict(last)
+    return compute
+
+
+def register_default_derivations(store: StateStore, settings: Optional[Mapping[str, Any]] = None):
+    """注册旁行角 'pointing' 和 DSS 指向 'dss_target' 两个派生值"""
+    merged = dict(DEFAULT_SETTINGS)
+    merged.update(get_config_service().get('state_store', {}) or {})
+    merged.update(settings or {})
+    store.derive('pointing', POINTING_INPUTS, pointing_derivation(),
+                 max_age=float(merged['pointing_max_age']) or None)
+    store.derive('dss_target', DSS_TARGET_INPUTS, dss_target_derivation(float(merged['dss_threshold'])))
+
+
+def connect_sources(store: StateStore, monitor=None, transport=None, allsky=None):
+    """
+    把数据源接入状态中心
+
+    数据源在自己的线程中直接发布（publish_source），同一设备不再由主窗口的状态更新方法重复发布。
+
+    Args:
+        store: 状态中心
+        monitor: PollingMonitor（snapshot_updated 信号）
+        transport: SerialTransport（status_read 信号，每一次读数）
+        allsky: AllSkyImagePipeline（analysis_ready 信号）
+    """
+    if monitor is not None:
+        monitor.snapshot_updated.connect(store.publish_source, Qt.DirectConnection)
+    if transport is not None:
+        transport.status_read.connect(store.publish_source, Qt.DirectConnection)
+    if allsky is not None:
+        allsky.analysis_ready.connect(store.publish_source, Qt.DirectConnection)
+
+
+_state_store: Optional[StateStore] = None
+_state_store_lock = threading.Lock()
+
+
+def get_state_store() -> StateStore:
+    """获取全局状态中心（首次调用时创建并注册内置派生值，应在界面线程中首次调用）"""
+    global _state_store
+    with _state_store_lock:
+        if _state_store is None:
+            _state_store = StateStore()
+            register_default_derivations(_state_store)
+        return _state_store
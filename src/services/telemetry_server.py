@@ -0,0 +1,918 @@
+"""
+遥测与控制服务
+
+设备状态原来只有主窗口能看到：再开一个监视屏或脚本需要数据时只能再去访问 Alpaca 服务器，
+每多一个程序，望远镜控制器上的请求就多一份。
+
+无界面模式（python -m src.services.telemetry_server）在 QCoreApplication 中运行批量轮询
+（PollingMonitor）和可选的串口设备（SerialTransport），状态汇总到 StateStore，
+由 TelemetryServer 通过 HTTP 和 WebSocket 提供给任意多个客户端，上游只轮询一份：
+  - GET  /api/v1/state[/<设备>]          最新快照
+  - GET  /api/v1/changes?since=<序号>    长轮询变化（序号过旧时返回完整快照）
+  - GET  /api/v1/stream                  WebSocket：先推送完整快照，之后推送每次变化
+  - GET  /api/v1/stats                   服务统计
+  - POST /api/v1/command                 设备命令（需开启 allow_control）
+查询参数 devices=a,b 只取部分设备；format=msgpack（或 Accept: application/msgpack）使用 msgpack 编码，
+需要安装 msgpack，默认 JSON。每条变化只编码一次，所有客户端共享。
+
+消息格式:
+    {'type': 'state', 'seq': 序号, 'devices': {设备: {'version', 'timestamp', 'values'}}}
+    {'type': 'update', 'seq': 序号, 'device': 设备, 'version', 'timestamp', 'values': {变化的字段: 值}}
+    {'type': 'changes', 'seq': 序号, 'changes': [update, ...]}
+
+TelemetryClient 是与 PollingMonitor 信号相同的客户端线程，主窗口可以把它当作数据源，
+不再自己访问 Alpaca 服务器（分阶段启动的 --telemetry-url 选项）。
+"""
+import argparse
+import base64
+import hashlib
+import json
+import logging
+import os
+import select
+import signal
+import socket
+import struct
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, FrozenSet, Iterable, List, Mapping, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from PyQt5.QtCore import QObject, QThread, pyqtSignal
+
+from src.config.config_service import get_config_service
+from src.services.polling_engine import DEVICE_TYPES, PollingMonitor
+from src.services.state_store import DeviceSnapshot, StateStore, get_state_store
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - 未安装 msgpack 时只提供 JSON
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS = {
+    'host': '127.0.0.1',
+    'port': 8765,
+    'allow_control': False,
+    'serial_devices': [],
+    'history_size': 1024,
+    'long_poll_timeout': 25.0,
+    'ping_interval': 20.0,
+    'send_timeout': 10.0,
+    'client_url': '',
+    'reconnect_delay': 2.0,
+}
+
+API_PREFIX = '/api/v1'
+FORMATS = ('json', 'msgpack')
+CONTENT_TYPES = {'json': 'application/json; charset=utf-8', 'msgpack': 'application/msgpack'}
+
+# 由串口设备管理提供状态的设备（客户端通过 status_changed 信号转发）
+SERIAL_DEVICES = ('cooler', 'ups')
+
+WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+OP_CONTINUATION, OP_TEXT, OP_BINARY, OP_CLOSE, OP_PING, OP_PONG = 0x0, 0x1, 0x2, 0x8, 0x9, 0xA
+MAX_CLIENT_MESSAGE = 1 << 20
+
+
+def server_settings(overrides: Optional[Mapping[str, Any]] = None) -> Dict[str, Any]:
+    """合并默认值、config.yaml telemetry_server 段和调用参数"""
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update(get_config_service().get('telemetry_server', {}) or {})
+    settings.update(overrides or {})
+    return settings
+
+
+# ----------------------------------------------------------------------
+# 编码
+# ----------------------------------------------------------------------
+def encode(payload: Any, fmt: str = 'json') -> bytes:
+    """把消息编码为 JSON 或 msgpack"""
+    if fmt == 'msgpack':
+        if msgpack is None:
+            raise ValueError('未安装 msgpack')
+        return msgpack.packb(payload, use_bin_type=True, default=str)
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+
+
+def decode(data: bytes, fmt: str = 'json') -> Any:
+    if fmt == 'msgpack':
+        if msgpack is None:
+            raise ValueError('未安装 msgpack')
+        return msgpack.unpackb(data, raw=False)
+    return json.loads(data.decode('utf-8'))
+
+
+def snapshot_entry(snapshot: DeviceSnapshot) -> Dict[str, Any]:
+    return {'version': snapshot.version, 'timestamp': snapshot.timestamp, 'values': snapshot.as_dict()}
+
+
+# ----------------------------------------------------------------------
+# WebSocket 帧（RFC 6455）
+# ----------------------------------------------------------------------
+def websocket_accept(key: str) -> str:
+    """握手应答中的 Sec-WebSocket-Accept"""
+    return base64.b64encode(hashlib.sha1((key + WS_GUID).encode('ascii')).digest()).decode('ascii')
+
+
+def _apply_mask(payload: bytes, key: bytes) -> bytes:
+    if not payload:
+        return payload
+    n = len(payload)
+    mask = (key * (n // 4 + 1))[:n]
+    return (int.from_bytes(payload, 'big') ^ int.from_bytes(mask, 'big')).to_bytes(n, 'big')
+
+
+def encode_frame(opcode: int, payload: bytes = b'', mask: bool = False) -> bytes:
+    """编码一个完整（FIN）帧；客户端发出的帧必须加掩码"""
+    header = bytearray([0x80 | opcode])
+    mask_bit = 0x80 if mask else 0
+    length = len(payload)
+    if length < 126:
+        header.append(mask_bit | length)
+    elif length < 65536:
+        header.append(mask_bit | 126)
+        header += struct.pack('!H', length)
+    else:
+        header.append(mask_bit | 127)
+        header += struct.pack('!Q', length)
+    if mask:
+        key = os.urandom(4)
+        header += key
+        payload = _apply_mask(payload, key)
+    return bytes(header) + payload
+
+
+def _read_exact(rfile, n: int) -> bytes:
+    data = rfile.read(n)
+    if data is None or len(data) < n:
+        raise ConnectionError('连接已关闭')
+    return data
+
+
+def read_message(rfile, max_size: int = 0) -> Tuple[int, bytes]:
+    """
+    读取一条消息（合并分片）
+
+    Returns:
+        (操作码, 负载)；控制帧（关闭、ping、pong）单独返回
+    """
+    opcode = None
+    chunks = []
+    size = 0
+    while True:
+        first, second = _read_exact(rfile, 2)
+        fin, frame_opcode = first & 0x80, first & 0x0F
+        length = second & 0x7F
+        if length == 126:
+            length = struct.unpack('!H', _read_exact(rfile, 2))[0]
+        elif length == 127:
+            length = struct.unpack('!Q', _read_exact(rfile, 8))[0]
+        key = _read_exact(rfile, 4) if second & 0x80 else None
+        size += length
+        if max_size and size > max_size:
+            raise ValueError(f'消息超过 {max_size} 字节')
+        payload = _read_exact(rfile, length) if length else b''
+        if key is not None:
+            payload = _apply_mask(payload, key)
+        if frame_opcode >= OP_CLOSE:
+            return frame_opcode, payload
+        if frame_opcode != OP_CONTINUATION:
+            opcode = frame_opcode
+        chunks.append(payload)
+        if fin:
+            return opcode, b''.join(chunks)
+
+
+# ----------------------------------------------------------------------
+# 变化记录
+# ----------------------------------------------------------------------
+class _Change:
+    """一次设备变化，按格式缓存编码结果"""
+
+    __slots__ = ('seq', 'device', 'message', '_encoded')
+
+    def __init__(self, seq: int, device: str, message: Dict[str, Any]):
+        self.seq = seq
+        self.device = device
+        self.message = message
+        self._encoded: Dict[str, bytes] = {}
+
+    def encoded(self, fmt: str) -> bytes:
+        data = self._encoded.get(fmt)
+        if data is None:
+            data = self._encoded[fmt] = encode(self.message, fmt)
+        return data
+
+
+class ChangeFeed:
+    """最近的设备变化（环形缓冲），供 WebSocket 推送和长轮询共享"""
+
+    def __init__(self, size: int = 1024):
+        self._entries: 'deque[_Change]' = deque(maxlen=size)
+        self._cond = threading.Condition()
+        self.sequence = 0
+        self.closed = False
+
+    def append(self, device: str, snapshot: DeviceSnapshot, changed: Iterable[str]) -> _Change:
+        with self._cond:
+            self.sequence += 1
+            values = snapshot.values
+            change = _Change(self.sequence, device, {
+                'type': 'update', 'seq': self.sequence, 'device': device, 'version': snapshot.version,
+                'timestamp': snapshot.timestamp, 'values': {key: values.get(key) for key in changed},
+            })
+            self._entries.append(change)
+            self._cond.notify_all()
+        return change
+
+    def since(self, seq: int) -> Tuple[List[_Change], bool]:
+        """
+        序号之后的变化
+
+        Returns:
+            (变化列表, 是否完整)；seq 早于缓冲区最早的记录时不完整，调用方应改发完整快照
+        """
+        with self._cond:
+            if seq >= self.sequence:
+                return [], True
+            complete = not self._entries or seq >= self._entries[0].seq - 1
+            return [entry for entry in self._entries if entry.seq > seq], complete
+
+    def wait(self, seq: int, timeout: float) -> Tuple[List[_Change], bool]:
+        """等待序号之后的变化，超时返回空列表"""
+        with self._cond:
+            if seq >= self.sequence and not self.closed:
+                self._cond.wait(timeout)
+        return self.since(seq)
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+# ----------------------------------------------------------------------
+# 服务端
+# ----------------------------------------------------------------------
+class TelemetryServer(QObject):
+    """
+    把 StateStore 的状态通过 HTTP / WebSocket 提供给多个客户端
+
+    StateStore 的通知在其所在线程中写入变化记录，每个客户端连接由独立线程读取并发送，
+    客户端数量不影响上游轮询。
+    """
+
+    client_count_changed = pyqtSignal(int)
+
+    def __init__(self, store: Optional[StateStore] = None, settings: Optional[Mapping[str, Any]] = None,
+                 executor=None, parent=None):
+        """
+        初始化服务
+
+        Args:
+            store: 状态中心，默认全局实例
+            settings: 覆盖 config.yaml telemetry_server 段的设置
+            executor: CommandExecutor，开启 allow_control 时用于执行 /api/v1/command
+            parent: 父QObject
+        """
+        super().__init__(parent)
+        self.settings = server_settings(settings)
+        self.store = store or get_state_store()
+        self.executor = executor
+        self.feed = ChangeFeed(int(self.settings['history_size']))
+        self._httpd: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+        self._unsubscribe = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._clients = 0
+        self.stats = {'http_requests': 0, 'websocket_clients': 0, 'messages_sent': 0, 'bytes_sent': 0}
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self._httpd.server_address[:2] if self._httpd else (self.settings['host'], self.settings['port'])
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.address
+        return f"http://{host}:{port}"
+
+    @property
+    def stream_url(self) -> str:
+        host, port = self.address
+        return f"ws://{host}:{port}{API_PREFIX}/stream"
+
+    def start(self):
+        """开始监听（端口为 0 时自动选择），返回自身"""
+        self._stopping.clear()
+        self._httpd = ThreadingHTTPServer((self.settings['host'], int(self.settings['port'])), _make_handler(self))
+        self._httpd.daemon_threads = True
+        self._unsubscribe = self.store.subscribe(None, self._on_change)
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='telemetry-server', daemon=True)
+        self._thread.start()
+        logger.info("遥测服务已启动: %s", self.base_url)
+        return self
+
+    def stop(self):
+        """停止监听并断开所有客户端"""
+        self._stopping.set()
+        self.feed.close()
+        if self._unsubscribe:
+            self._unsubscribe()
+            self._unsubscribe = None
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+        logger.info("遥测服务已停止")
+
+    def _on_change(self, snapshot: DeviceSnapshot, changed: FrozenSet[str]):
+        self.feed.append(snapshot.device, snapshot, changed)
+
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def _client_delta(self, delta: int):
+        with self._lock:
+            self._clients += delta
+            count = self._clients
+            if delta > 0:
+                self.stats['websocket_clients'] += 1
+        self.client_count_changed.emit(count)
+
+    @property
+    def client_count(self) -> int:
+        return self._clients
+
+    def state_message(self, devices: Optional[FrozenSet[str]] = None) -> Dict[str, Any]:
+        """
+        完整快照消息
+
+        先取序号再取快照：快照可能已经包含序号之后的变化，客户端随后再收到这些变化时按绝对值覆盖，结果一致。
+        """
+        seq = self.feed.sequence
+        snapshots = self.store.snapshots()
+        return {'type': 'state', 'seq': seq,
+                'devices': {device: snapshot_entry(snapshot) for device, snapshot in snapshots.items()
+                            if devices is None or device in devices}}
+
+    def changes_message(self, since: int, timeout: float,
+                        devices: Optional[FrozenSet[str]] = None) -> Dict[str, Any]:
+        """长轮询：等待 since 之后的变化"""
+        entries, complete = self.feed.wait(since, timeout)
+        if not complete:
+            return self.state_message(devices)
+        seq = entries[-1].seq if entries else since
+        return {'type': 'changes', 'seq': seq,
+                'changes': [entry.message for entry in entries if devices is None or entry.device in devices]}
+
+    def run_command(self, request: Mapping[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        """执行 /api/v1/command 请求，返回 (HTTP 状态码, 结果)"""
+        if not self.settings['allow_control'] or self.executor is None:
+            return 403, {'error': '未开启设备控制（telemetry_server.allow_control）'}
+        from src.services.command_executor import DEFAULT_TIMEOUT, DeviceCommand
+        device, action = request.get('device'), request.get('action')
+        if not device or not action:
+            return 400, {'error': '需要 device 和 action'}
+        timeout = float(request.get('timeout', DEFAULT_TIMEOUT))
+        command = DeviceCommand(device, action, int(request.get('device_number', 0)),
+                                request.get('data') or {}, timeout=timeout,
+                                wait_for_target=bool(request.get('wait', True)))
+        handle = self.executor.submit(command)
+        if not request.get('wait', True):
+            return 202, {'id': handle.command_id}
+        try:
+            return 200, handle.result(timeout + 5.0)
+        except Exception as e:
+            return 504, {'id': handle.command_id, 'error': str(e)}
+
+
+def _parse_devices(params: Dict[str, List[str]]) -> Optional[FrozenSet[str]]:
+    names = [name for value in params.get('devices', []) for name in value.split(',') if name]
+    return frozenset(names) if names else None
+
+
+def _make_handler(server: TelemetryServer):
+    """创建绑定到指定服务实例的请求处理类"""
+
+    class TelemetryHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            logger.debug("%s - %s", self.address_string(), format % args)
+
+        def _format(self, params) -> Optional[str]:
+            fmt = (params.get('format') or [''])[0]
+            if not fmt:
+                accept = self.headers.get('Accept', '')
+                fmt = 'msgpack' if 'msgpack' in accept else 'json'
+            return fmt if fmt in FORMATS and (fmt != 'msgpack' or msgpack is not None) else None
+
+        def _send(self, payload, status=200, fmt='json'):
+            body = encode(payload, fmt)
+            self.send_response(status)
+            self.send_header('Content-Type', CONTENT_TYPES[fmt])
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('Cache-Control', 'no-store')
+            self.end_headers()
+            self.wfile.write(body)
+            server._count('bytes_sent', len(body))
+
+        def _route(self):
+            parsed = urlparse(self.path)
+            if not parsed.path.startswith(API_PREFIX):
+                return None, None, parse_qs(parsed.query)
+            parts = [part for part in parsed.path[len(API_PREFIX):].split('/') if part]
+            return (parts[0] if parts else ''), parts[1:], parse_qs(parsed.query)
+
+        def do_GET(self):
+            server._count('http_requests')
+            endpoint, rest, params = self._route()
+            fmt = self._format(params)
+            if fmt is None:
+                self._send({'error': '不支持的格式（msgpack 需要安装 msgpack）'}, 406)
+                return
+            devices = _parse_devices(params)
+            if endpoint == 'stream':
+                self._serve_websocket(fmt, devices)
+            elif endpoint == 'state' and rest:
+                snapshot = server.store.snapshot(rest[0])
+                if snapshot is None:
+                    self._send({'error': f'没有设备 {rest[0]} 的状态'}, 404, fmt)
+                else:
+                    self._send(dict(snapshot_entry(snapshot), device=rest[0]), 200, fmt)
+            elif endpoint == 'state':
+                self._send(server.state_message(devices), 200, fmt)
+            elif endpoint == 'changes':
+                try:
+                    since = int((params.get('since') or ['-1'])[0])
+                    timeout = min(float((params.get('timeout') or [server.settings['long_poll_timeout']])[0]),
+                                  float(server.settings['long_poll_timeout']))
+                except ValueError:
+                    self._send({'error': 'since/timeout 必须是数字'}, 400, fmt)
+                    return
+                if since < 0:
+                    self._send(server.state_message(devices), 200, fmt)
+                else:
+                    self._send(server.changes_message(since, max(timeout, 0.0), devices), 200, fmt)
+            elif endpoint == 'stats':
+                self._send(dict(server.stats, clients=server.client_count, seq=server.feed.sequence,
+                                store=dict(server.store.stats)), 200, fmt)
+            else:
+                self._send({'error': '未知的路径'}, 404, fmt)
+
+        def do_POST(self):
+            server._count('http_requests')
+            endpoint, _rest, _params = self._route()
+            if endpoint != 'command':
+                self._send({'error': '未知的路径'}, 404)
+                return
+            length = int(self.headers.get('Content-Length') or 0)
+            try:
+                request = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                self._send({'error': '请求体必须是 JSON'}, 400)
+                return
+            status, result = server.run_command(request)
+            self._send(result, status)
+
+        # ------------------------------------------------------------------
+        # WebSocket
+        # ------------------------------------------------------------------
+        def _serve_websocket(self, fmt, devices):
+            key = self.headers.get('Sec-WebSocket-Key')
+            if self.headers.get('Upgrade', '').lower() != 'websocket' or not key:
+                self._send({'error': '需要 WebSocket 升级请求'}, 426, fmt)
+                return
+            self.send_response(101, 'Switching Protocols')
+            self.send_header('Upgrade', 'websocket')
+            self.send_header('Connection', 'Upgrade')
+            self.send_header('Sec-WebSocket-Accept', websocket_accept(key))
+            self.end_headers()
+            self.close_connection = True
+            self.connection.settimeout(float(server.settings['send_timeout']))
+            connection = _WebSocketConnection(self, fmt, devices)
+            server._client_delta(1)
+            try:
+                connection.run()
+            finally:
+                server._client_delta(-1)
+
+    class _WebSocketConnection:
+        """一个 WebSocket 客户端：读线程处理控制帧和订阅修改，处理线程推送变化"""
+
+        def __init__(self, handler, fmt, devices):
+            self.handler = handler
+            self.fmt = fmt
+            self.opcode = OP_BINARY if fmt == 'msgpack' else OP_TEXT
+            self.devices = devices
+            self.closed = threading.Event()
+            self._send_lock = threading.Lock()
+
+        def send(self, opcode, payload):
+            frame = encode_frame(opcode, payload)
+            with self._send_lock:
+                self.handler.wfile.write(frame)
+            if opcode in (OP_TEXT, OP_BINARY):
+                server._count('messages_sent')
+                server._count('bytes_sent', len(frame))
+
+        def _read_loop(self):
+            try:
+                while not self.closed.is_set():
+                    # 读超时只用于定期检查关闭标志
+                    readable, _, _ = select.select([self.handler.connection], [], [], 1.0)
+                    if not readable:
+                        continue
+                    opcode, payload = read_message(self.handler.rfile, MAX_CLIENT_MESSAGE)
+                    if opcode == OP_CLOSE:
+                        self.send(OP_CLOSE, payload[:2])
+                        break
+                    if opcode == OP_PING:
+                        self.send(OP_PONG, payload)
+                    elif opcode in (OP_TEXT, OP_BINARY):
+                        self._on_message(payload, 'msgpack' if opcode == OP_BINARY else 'json')
+            except (ConnectionError, OSError, ValueError) as e:
+                logger.debug("WebSocket 客户端断开: %s", e)
+            finally:
+                self.closed.set()
+
+        def _on_message(self, payload, fmt):
+            """客户端消息 {'devices': [...]} 修改订阅的设备（空列表为全部），之后重新推送完整快照"""
+            try:
+                request = decode(payload, fmt)
+            except ValueError:
+                return
+            if isinstance(request, dict) and 'devices' in request:
+                self.devices = frozenset(request['devices']) or None
+                self.send(self.opcode, encode(server.state_message(self.devices), self.fmt))
+
+        def run(self):
+            reader = threading.Thread(target=self._read_loop, name='telemetry-ws-reader', daemon=True)
+            reader.start()
+            ping_interval = float(server.settings['ping_interval'])
+            try:
+                state = server.state_message(self.devices)
+                cursor = state['seq']
+                self.send(self.opcode, encode(state, self.fmt))
+                last_sent = time.monotonic()
+                while not self.closed.is_set() and not server._stopping.is_set():
+                    entries, complete = server.feed.wait(cursor, 1.0)
+                    if not complete:
+                        state = server.state_message(self.devices)
+                        self.send(self.opcode, encode(state, self.fmt))
+                        cursor = state['seq']
+                        last_sent = time.monotonic()
+                        continue
+                    devices = self.devices
+                    for entry in entries:
+                        if devices is None or entry.device in devices:
+                            self.send(self.opcode, entry.encoded(self.fmt))
+                            last_sent = time.monotonic()
+                        cursor = entry.seq
+                    if time.monotonic() - last_sent >= ping_interval:
+                        self.send(OP_PING, b'')
+                        last_sent = time.monotonic()
+                if not self.closed.is_set():
+                    self.send(OP_CLOSE, struct.pack('!H', 1001))
+            except (ConnectionError, OSError, socket.timeout) as e:
+                logger.debug("向 WebSocket 客户端发送失败: %s", e)
+            finally:
+                self.closed.set()
+                reader.join(2.0)
+
+    return TelemetryHandler
+
+
+# ----------------------------------------------------------------------
+# 客户端
+# ----------------------------------------------------------------------
+class WebSocketClient:
+    """最小的 WebSocket 客户端（阻塞），用于 TelemetryClient、脚本和基准测试"""
+
+    def __init__(self, url: str, timeout: float = 10.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or '127.0.0.1'
+        self.port = parsed.port or 80
+        self.path = (parsed.path or '/') + (f'?{parsed.query}' if parsed.query else '')
+        self.sock = socket.create_connection((self.host, self.port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.rfile = self.sock.makefile('rb')
+        self._send_lock = threading.Lock()
+        key = base64.b64encode(os.urandom(16)).decode('ascii')
+        request = (f"GET {self.path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+                   f"Upgrade: websocket\r\nConnection: Upgrade\r\nSec-WebSocket-Key: {key}\r\n"
+                   f"Sec-WebSocket-Version: 13\r\n\r\n")
+        self.sock.sendall(request.encode('ascii'))
+        status = self.rfile.readline().decode('latin-1')
+        headers = {}
+        while True:
+            line = self.rfile.readline().decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if ' 101 ' not in status or headers.get('sec-websocket-accept') != websocket_accept(key):
+            self.close()
+            raise ConnectionError(f"WebSocket 握手失败: {status.strip()}")
+
+    def send(self, opcode: int, payload: bytes = b''):
+        with self._send_lock:
+            self.sock.sendall(encode_frame(opcode, payload, mask=True))
+
+    def receive(self) -> Tuple[int, bytes]:
+        """读取下一条数据消息，自动应答 ping；服务端关闭时抛出 ConnectionError"""
+        while True:
+            opcode, payload = read_message(self.rfile)
+            if opcode == OP_PING:
+                self.send(OP_PONG, payload)
+            elif opcode == OP_CLOSE:
+                raise ConnectionError('服务端关闭了连接')
+            elif opcode != OP_PONG:
+                return opcode, payload
+
+    def close(self):
+        try:
+            self.send(OP_CLOSE, struct.pack('!H', 1000))
+        except OSError:
+            pass
+        try:
+            self.rfile.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class TelemetryClient(QThread):
+    """
+    遥测服务的客户端线程
+
+    信号与 PollingMonitor 一致（另有串口设备的 status_changed），可以替代轮询线程作为主窗口的数据源。
+    """
+    coordinates_updated = pyqtSignal(float, float, float, float)
+    status_updated = pyqtSignal(dict)
+    focuser_updated = pyqtSignal(dict)
+    rotator_updated = pyqtSignal(dict)
+    weather_updated = pyqtSignal(dict)
+    cover_updated = pyqtSignal(dict)
+    dome_updated = pyqtSignal(dict)
+    snapshot_updated = pyqtSignal(str, dict)
+    status_changed = pyqtSignal(str, dict)
+    connection_changed = pyqtSignal(bool)
+
+    # 把合并快照转换为各设备信号的逻辑与轮询线程相同
+    dispatch = PollingMonitor.dispatch
+
+    def __init__(self, url: Optional[str] = None, fmt: str = 'json',
+                 devices: Optional[Iterable[str]] = None, parent=None):
+        """
+        初始化客户端
+
+        Args:
+            url: 服务地址（http://host:port 或 ws://host:port/api/v1/stream），为空时取配置 client_url
+            fmt: 'json' 或 'msgpack'
+            devices: 只订阅的设备，为空时订阅全部
+            parent: 父QObject
+        """
+        super().__init__(parent)
+        settings = server_settings()
+        url = url or settings['client_url']
+        parsed = urlparse(url)
+        netloc = parsed.netloc or f"{settings['host']}:{settings['port']}"
+        self.base_url = f"http://{netloc}"
+        query = f"?format={fmt}" + (f"&devices={','.join(devices)}" if devices else '')
+        self.stream_url = f"ws://{netloc}{API_PREFIX}/stream{query}"
+        self.fmt = fmt
+        self.reconnect_delay = float(settings['reconnect_delay'])
+        self.telemetry = None
+        self.is_running = False
+        self.messages = 0
+        self._socket: Optional[WebSocketClient] = None
+        self._snapshots: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def snapshots(self) -> Dict[str, Dict[str, Any]]:
+        """服务端所有设备（含派生值）的最新状态副本"""
+        with self._lock:
+            return {device: dict(values) for device, values in self._snapshots.items()}
+
+    def stop(self):
+        """停止线程"""
+        self.is_running = False
+        if self._socket is not None:
+            self._socket.close()
+
+    def run(self):
+        """线程运行方法：连接、接收，断开后按 reconnect_delay 重连"""
+        self.is_running = True
+        while self.is_running:
+            try:
+                self._socket = WebSocketClient(self.stream_url)
+                self._socket.sock.settimeout(None)
+                self.connection_changed.emit(True)
+                logger.info("已连接遥测服务: %s", self.stream_url)
+                while self.is_running:
+                    _opcode, payload = self._socket.receive()
+                    self.handle_message(decode(payload, self.fmt))
+            except (ConnectionError, OSError, ValueError) as e:
+                if self.is_running:
+                    logger.warning("遥测服务连接中断: %s", e)
+            finally:
+                if self._socket is not None:
+                    self._socket.close()
+                    self._socket = None
+                    self.connection_changed.emit(False)
+            deadline = time.monotonic() + self.reconnect_delay
+            while self.is_running and time.monotonic() < deadline:
+                time.sleep(0.1)
+
+    def handle_message(self, message: Mapping[str, Any]):
+        """应用服务端消息并发出对应信号"""
+        self.messages += 1
+        kind = message.get('type')
+        if kind == 'state':
+            with self._lock:
+                self._snapshots = {device: dict(entry['values']) for device, entry in message['devices'].items()}
+            changed = list(message['devices'])
+        elif kind == 'update':
+            with self._lock:
+                self._snapshots.setdefault(message['device'], {}).update(message['values'])
+            changed = [message['device']]
+        elif kind == 'changes':
+            for change in message['changes']:
+                self.handle_message(change)
+            return
+        else:
+            return
+        for device in changed:
+            with self._lock:
+                snapshot = dict(self._snapshots.get(device, {}))
+            if device in SERIAL_DEVICES:
+                self.status_changed.emit(device, snapshot)
+            elif device in DEVICE_TYPES:
+                self.dispatch({device: snapshot})
+
+    def command(self, device: str, action: str, data: Optional[Dict[str, Any]] = None,
+                wait: bool = True, timeout: float = 120.0) -> Dict[str, Any]:
+        """通过服务端执行设备命令（服务端需开启 allow_control）"""
+        import requests
+        response = requests.post(f"{self.base_url}{API_PREFIX}/command",
+                                 json={'device': device, 'action': action, 'data': data or {},
+                                       'wait': wait, 'timeout': timeout},
+                                 timeout=timeout + 10.0)
+        return response.json()
+
+
+# 客户端信号 -> 主窗口槽
+WINDOW_SLOTS = (
+    ('coordinates_updated', 'update_coordinates'),
+    ('status_updated', 'update_telescope_status'),
+    ('focuser_updated', 'update_focuser_status'),
+    ('rotator_updated', 'update_rotator_status'),
+    ('weather_updated', 'update_weather_info'),
+    ('cover_updated', 'update_cover_status'),
+    ('dome_updated', 'update_dome_status'),
+)
+SERIAL_SLOTS = {'cooler': 'update_cooler_status', 'ups': 'update_ups_status'}
+
+
+def connect_window(client, window, transport=None):
+    """
+    把数据源的信号连接到主窗口的状态更新方法
+
+    Args:
+        client: TelemetryClient 或 PollingMonitor（信号名与 TelescopeMonitor 一致）
+        window: 主窗口
+        transport: 可选的 SerialTransport，水冷机、UPS 状态送到对应的更新方法
+    """
+    for signal_name, slot_name in WINDOW_SLOTS:
+        slot = getattr(window, slot_name, None)
+        if slot is not None:
+            getattr(client, signal_name).connect(slot)
+
+    def on_serial_status(device, status):
+        slot = getattr(window, SERIAL_SLOTS.get(device, ''), None)
+        if slot is not None:
+            slot(status)
+    for source in (client, transport):
+        if hasattr(source, 'status_changed'):
+            source.status_changed.connect(on_serial_status)
+    window._telemetry_serial_slot = on_serial_status
+
+
+# ----------------------------------------------------------------------
+# 无界面模式
+# ----------------------------------------------------------------------
+def run_headless(settings: Optional[Mapping[str, Any]] = None, argv: Optional[List[str]] = None,
+                 record_path: Optional[str] = None) -> int:
+    """
+    无界面运行轮询和遥测服务，直到收到 Ctrl+C / SIGTERM
+
+    Args:
+        settings: 覆盖 telemetry_server 段的设置
+        argv: 传给 QCoreApplication 的参数
+        record_path: 设备通信记录文件，为空时按配置 recording.enabled 决定是否记录
+
+    Returns:
+        退出码
+    """
+    from PyQt5.QtCore import QCoreApplication, QTimer
+    from src.services.allsky_analysis import start_allsky_analysis
+    from src.services.command_executor import CommandExecutor
+    from src.services.log_service import setup_logging
+    from src.services.memory_tracker import start_memory_tracking
+    from src.services.profiler import install_instrumentation, start_monitoring
+    from src.services.state_store import connect_sources
+    from src.services.safety_interlock import start_safety_interlock
+    from src.services.serial_transport import get_serial_transport, transport_devices
+    from src.services.telemetry_store import connect_state_store, get_telemetry_store, telemetry_enabled
+    from src.services.traffic_recorder import start_recording, stop_recording
+
+    setup_logging()
+    app = QCoreApplication.instance() or QCoreApplication(list(argv if argv is not None else sys.argv))
+    install_instrumentation()
+    metrics = start_monitoring()
+    recorder = start_recording(path=record_path)
+    settings = server_settings(settings)
+    store = get_state_store()
+    monitor = PollingMonitor()
+    transport = None
+    serial_devices = transport_devices(settings['serial_devices'])
+    if serial_devices:
+        transport = get_serial_transport()
+        for device_key in serial_devices:
+            transport.open_device(device_key)
+    connect_sources(store, monitor=monitor, transport=transport)
+    telemetry = None
+    if telemetry_enabled():
+        telemetry = get_telemetry_store()
+        connect_state_store(store, telemetry)
+    executor = CommandExecutor(polling_engine=monitor.engine) if settings['allow_control'] else None
+    interlock = start_safety_interlock(store, executor, monitor.engine)
+    allsky = start_allsky_analysis(store)
+    server = TelemetryServer(store, settings, executor).start()
+    monitor.start()
+    memory = start_memory_tracking()
+    if memory is not None:
+        memory.freeze()
+
+    def shutdown(*_args):
+        app.quit()
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+    # 让 Python 解释器定期运行，以便及时处理信号
+    heartbeat = QTimer()
+    heartbeat.timeout.connect(lambda: None)
+    heartbeat.start(200)
+
+    # sys.stdout 已被日志服务接管（INFO 只写入文件），服务地址直接写到原始标准输出
+    print(f"遥测服务: {server.base_url}{API_PREFIX}/state  WebSocket: {server.stream_url}",
+          file=sys.__stdout__, flush=True)
+    try:
+        return app.exec_()
+    finally:
+        server.stop()
+        if interlock is not None:
+            interlock.stop()
+        if allsky is not None:
+            allsky.stop()
+        monitor.stop()
+        monitor.wait(5000)
+        if metrics is not None:
+            metrics.stop()
+        if memory is not None:
+            memory.stop()
+        stop_recording(recorder)
+        if transport is not None:
+            for device_key in serial_devices:
+                transport.close_device(device_key)
+        if executor is not None:
+            executor.shutdown()
+        if telemetry is not None:
+            telemetry.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='无界面遥测与控制服务')
+    parser.add_argument('--host', help='监听地址（默认取配置，127.0.0.1）')
+    parser.add_argument('--port', type=int, help='监听端口（默认取配置，8765）')
+    parser.add_argument('--allow-control', action='store_true', help='允许通过 /api/v1/command 发送设备命令')
+    parser.add_argument('--serial', nargs='*', metavar='DEVICE', help='配置中的串口设备之外同时打开的串口设备（cooler、ups）')
+    parser.add_argument('--record', metavar='PATH', help='把设备通信记录到文件（.jsonl.gz），供回放测试')
+    args, qt_args = parser.parse_known_args()
+    overrides = {key: value for key, value in (('host', args.host), ('port', args.port),
+                                               ('serial_devices', args.serial)) if value is not None}
+    if args.allow_control:
+        overrides['allow_control'] = True
+    return run_headless(overrides, [sys.argv[0]] + qt_args, record_path=args.record)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,567 @@
+"""
+设备读数时序存储
+
+气象、水冷机、UPS、赤道仪等设备的读数在界面上显示后即被丢弃。本模块把它们按序列（'设备.字段'）
+追加写入磁盘，并自动降采样：
+
+    raw   原始数据，保留 24 小时，每小时一个段
+    1m    1 分钟聚合（均值/最小/最大/点数），保留 30 天，每天一个段
+    10m   10 分钟聚合，永久保留，每 30 天一个段
+
+每个序列按时间分段存储为只追加的定长记录文件（<层级>/<序列>/<段起点>.f8，小端 float64 记录：
+原始数据为 (t, v)，聚合数据为 (t, mean, min, max, n)）。查询时用 numpy.memmap 把段映射为结构化数组，
+在时间列上二分查找范围，读取一整夜的数据只需毫秒级。一个段只有一个文件，fsync 的次数与序列数相当。
+
+写入先进入内存缓冲区，由后台线程每隔 flush_interval 秒成批追加到文件，fsync 间隔由 fsync_interval 控制，
+1 Hz 的多设备数据流几乎不占用 CPU 和磁盘同步。
+
+读数只从状态中心记录（connect_state_store 注册的同步监听器），轮询线程、串口设备和主窗口都只向状态中心发布；
+状态中心的每台设备只有一个发布来源，每个读数记录一次。
+"""
+import logging
+import math
+import os
+import re
+import struct
+import threading
+import time
+from collections import OrderedDict
+from operator import itemgetter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from src.config.config_service import get_config_service
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ROOT = os.path.join('data', 'telemetry')
+DEFAULT_FLUSH_INTERVAL = 5.0
+DEFAULT_FSYNC_INTERVAL = 60.0
+
+RAW_COLUMNS = ('t', 'v')
+AGGREGATE_COLUMNS = ('t', 'mean', 'min', 'max', 'n')
+MAX_OPEN_FILES = 128
+
+
+class Tier:
+    """存储层级"""
+
+    __slots__ = ('name', 'bucket', 'retention', 'segment')
+
+    def __init__(self, name: str, bucket: float, retention: Optional[float], segment: float):
+        """
+        Args:
+            name: 层级名，同时是目录名
+            bucket: 聚合桶宽（秒），0 表示原始数据
+            retention: 保留时长（秒），None 表示永久保留
+            segment: 每个段覆盖的时长（秒）
+        """
+        self.name = name
+        self.bucket = bucket
+        self.retention = retention
+        self.segment = segment
+
+    @property
+    def columns(self) -> Tuple[str, ...]:
+        return RAW_COLUMNS if self.bucket == 0 else AGGREGATE_COLUMNS
+
+    @property
+    def dtype(self) -> np.dtype:
+        return np.dtype([(column, '<f8') for column in self.columns])
+
+
+DEFAULT_TIERS = (
+    Tier('raw', 0, 24 * 3600, 3600),
+    Tier('1m', 60, 30 * 86400, 86400),
+    Tier('10m', 600, None, 30 * 86400),
+)
+
+_SERIES_PATTERN = re.compile(r'[^A-Za-z0-9_.\-]')
+
+
+def series_name(device_key: str, field: str) -> str:
+    """由设备键和字段名生成序列名（只保留文件名安全的字符）"""
+    return _SERIES_PATTERN.sub('_', f"{device_key}.{field}")
+
+
+def numeric_value(value: Any) -> Optional[float]:
+    """把快照中的值转换为可存储的浮点数（布尔转 0/1），无法转换或非有限值返回 None"""
+    if isinstance(value, bool):
+        return 1.0 if value else 0.0
+    if isinstance(value, (int, float)):
+        value = float(value)
+        return value if math.isfinite(value) else None
+    return None
+
+
+class _Aggregate:
+    """未完成的聚合桶"""
+
+    __slots__ = ('start', 'total', 'low', 'high', 'count')
+
+    def __init__(self, start: float):
+        self.start = start
+        self.total = 0.0
+        self.low = math.inf
+        self.high = -math.inf
+        self.count = 0
+
+    def add(self, value: float):
+        self.total += value
+        if value < self.low:
+            self.low = value
+        if value > self.high:
+            self.high = value
+        self.count += 1
+
+    def row(self) -> Tuple[float, float, float, float, float]:
+        return self.start, self.total / self.count, self.low, self.high, float(self.count)
+
+
+class TelemetryStore:
+    """
+    时序存储
+
+    用法:
+        store = get_telemetry_store()
+        store.record_snapshot('ObservingConditions', snapshot)     # 任意线程中调用，只写入内存缓冲区
+        data = store.query('ObservingConditions.cloudcover', start, end)
+    """
+
+    def __init__(self, root: Optional[str] = None, flush_interval: Optional[float] = None,
+                 fsync_interval: Optional[float] = None, tiers: Iterable[Tier] = DEFAULT_TIERS,
+                 autostart: bool = True):
+        """
+        初始化时序存储
+
+        Args:
+            root: 存储目录，为空时取配置 telemetry.path
+            flush_interval: 缓冲区写入文件的间隔（秒），为空时取配置
+            fsync_interval: fsync 的最小间隔（秒），为空时取配置，0 表示每次写入都 fsync
+            tiers: 存储层级，第一个必须是原始数据层
+            autostart: 是否启动后台写入线程
+        """
+        settings = get_config_service().get('telemetry', {}) or {}
+        self.root = root or settings.get('path', DEFAULT_ROOT)
+        self.flush_interval = float(settings.get('flush_interval', DEFAULT_FLUSH_INTERVAL)
+                                    if flush_interval is None else flush_interval)
+        self.fsync_interval = float(settings.get('fsync_interval', DEFAULT_FSYNC_INTERVAL)
+                                    if fsync_interval is None else fsync_interval)
+        # 复制层级定义，配置中的保留时长不影响其他实例
+        self.tiers = tuple(Tier(t.name, t.bucket, t.retention, t.segment) for t in tiers)
+        retention = settings.get('retention', {})
+        for tier in self.tiers:
+            if tier.name in retention:
+                tier.retention = float(retention[tier.name]) or None
+        self._tier_by_name = {tier.name: tier for tier in self.tiers}
+
+        self._lock = threading.Lock()
+        self._buffer: Dict[str, List[Tuple[float, float]]] = {}
+        self._series_names: Dict[str, Dict[str, str]] = {}
+        self._write_lock = threading.Lock()
+        self._last_time: Dict[str, float] = {}
+        self._aggregates: Dict[Tuple[str, str], _Aggregate] = {}
+        self._segments: Dict[Tuple[str, str], List[float]] = {}
+        self._maps: 'OrderedDict[Tuple[str, int], np.ndarray]' = OrderedDict()
+        self._files: 'OrderedDict[str, Any]' = OrderedDict()
+        self._directories = set()
+        self._dirty = set()
+        self._last_fsync = time.monotonic()
+        self._last_prune = 0.0
+        self.stats = {'records': 0, 'dropped': 0, 'flushes': 0, 'fsyncs': 0, 'bytes': 0}
+
+        self._running = False
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        if autostart:
+            self.start()
+
+    # ------------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------------
+    def record(self, series: str, value: Any, t: Optional[float] = None):
+        """记录一个数据点（只写入内存缓冲区）"""
+        value = numeric_value(value)
+        if value is None:
+            return
+        t = time.time() if t is None else float(t)
+        with self._lock:
+            points = self._buffer.get(series)
+            if points is None:
+                self._buffer[series] = [(t, value)]
+            else:
+                points.append((t, value))
+            self.stats['records'] += 1
+
+    def record_snapshot(self, device_key: str, snapshot: Dict[str, Any], t: Optional[float] = None):
+        """记录一台设备快照中的所有数值字段"""
+        t = time.time() if t is None else float(t)
+        names = self._series_names.get(device_key)
+        if names is None:
+            names = self._series_names[device_key] = {}
+        with self._lock:
+            for field, value in snapshot.items():
+                value = numeric_value(value)
+                if value is None:
+                    continue
+                series = names.get(field)
+                if series is None:
+                    series = names[field] = series_name(device_key, field)
+                points = self._buffer.get(series)
+                if points is None:
+                    self._buffer[series] = [(t, value)]
+                else:
+                    points.append((t, value))
+                self.stats['records'] += 1
+
+    def start(self):
+        """启动后台写入线程"""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='telemetry-writer', daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """停止后台线程，写入剩余数据、fsync 并关闭文件"""
+        self._running = False
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        # 关闭时写入尚未结束的聚合桶，避免丢失最后一个桶的数据
+        self.flush(fsync=True, now=math.inf)
+        with self._write_lock:
+            self._close_maps()
+            while self._files:
+                _, handle = self._files.popitem(last=False)
+                handle.close()
+
+    def _run(self):
+        while self._running:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error("写入遥测数据失败: %s", e)
+
+    def flush(self, fsync: Optional[bool] = None, now: Optional[float] = None):
+        """
+        把缓冲区写入文件
+
+        Args:
+            fsync: 是否 fsync，为空时按 fsync_interval 决定
+            now: 当前时刻（用于关闭已结束的聚合桶和清理过期段），为空时取系统时间
+        """
+        with self._lock:
+            buffer, self._buffer = self._buffer, {}
+        now = time.time() if now is None else now
+        if fsync is None:
+            fsync = time.monotonic() - self._last_fsync >= self.fsync_interval
+        with self._write_lock:
+            writes: Dict[Tuple[str, str, float], List[List[float]]] = {}
+            for series, points in buffer.items():
+                self._prepare_series(series, points, writes)
+            self._close_stale_aggregates(now, writes)
+            self._write(writes)
+            if fsync:
+                self._fsync()
+            if math.isfinite(now) and now - self._last_prune >= 600:
+                self._last_prune = now
+                self._prune(now)
+        self.stats['flushes'] += 1
+
+    def _prepare_series(self, series: str, points: List[Tuple[float, float]], writes):
+        # 每批只有几个点，逐点处理比转换为 numpy 数组快；已有序时排序是线性的
+        points.sort(key=itemgetter(0))
+        last = self._last_time.get(series, -math.inf)
+        if points[0][0] < last:
+            # 每个序列只追加不早于已写入数据的点
+            kept = [p for p in points if p[0] >= last]
+            self.stats['dropped'] += len(points) - len(kept)
+            points = kept
+            if not points:
+                return
+        self._last_time[series] = points[-1][0]
+
+        raw = self.tiers[0]
+        for t, value in points:
+            self._queue_row(writes, raw, series, (t, value))
+        for tier in self.tiers[1:]:
+            key = (tier.name, series)
+            current = self._aggregates.get(key)
+            for t, value in points:
+                bucket = math.floor(t / tier.bucket) * tier.bucket
+                if current is None or current.start != bucket:
+                    if current is not None:
+                        self._queue_row(writes, tier, series, current.row())
+                    current = _Aggregate(bucket)
+                current.add(value)
+            self._aggregates[key] = current
+
+    def _close_stale_aggregates(self, now: float, writes):
+        for key, current in list(self._aggregates.items()):
+            tier = self._tier_by_name[key[0]]
+            if current.start + tier.bucket <= now:
+                self._queue_row(writes, tier, key[1], current.row())
+                del self._aggregates[key]
+
+    @staticmethod
+    def _queue_row(writes, tier: Tier, series: str, row: Tuple[float, ...]):
+        segment = math.floor(row[0] / tier.segment) * tier.segment
+        values = writes.get((tier.name, series, segment))
+        if values is None:
+            writes[(tier.name, series, segment)] = list(row)
+        else:
+            values.extend(row)
+
+    def _segment_path(self, tier_name: str, series: str, start: float) -> str:
+        return os.path.join(self.root, tier_name, series, f"{int(start)}.f8")
+
+    def _handle(self, path: str, itemsize: int):
+        """以追加方式打开的段文件（最近使用的保持打开）"""
+        handle = self._files.get(path)
+        if handle is not None:
+            self._files.move_to_end(path)
+            return handle
+        directory = os.path.dirname(path)
+        if directory not in self._directories:
+            os.makedirs(directory, exist_ok=True)
+            self._directories.add(directory)
+        handle = open(path, 'ab')
+        # 上次写入中断留下的不完整记录会使后续记录错位，先截掉
+        size = handle.seek(0, os.SEEK_END)
+        if size % itemsize:
+            logger.warning("遥测文件 %s 末尾有不完整的记录，已截断", path)
+            handle.truncate(size - size % itemsize)
+        self._files[path] = handle
+        while len(self._files) > MAX_OPEN_FILES:
+            _, oldest = self._files.popitem(last=False)
+            oldest.close()
+        return handle
+
+    def _write(self, writes):
+        for (tier_name, series, start), values in writes.items():
+            path = self._segment_path(tier_name, series, start)
+            handle = self._handle(path, self._tier_by_name[tier_name].dtype.itemsize)
+            payload = struct.pack(f"<{len(values)}d", *values)
+            handle.write(payload)
+            handle.flush()
+            self._dirty.add(path)
+            self.stats['bytes'] += len(payload)
+            segments = self._segments.get((tier_name, series))
+            if segments is not None and start not in segments:
+                segments.append(start)
+                segments.sort()
+
+    def _fsync(self):
+        for path in self._dirty:
+            handle = self._files.get(path)
+            try:
+                if handle is not None:
+                    os.fsync(handle.fileno())
+                else:
+                    with open(path, 'ab') as f:
+                        os.fsync(f.fileno())
+                self.stats['fsyncs'] += 1
+            except OSError as e:
+                logger.warning("同步遥测文件 %s 失败: %s", path, e)
+        self._dirty.clear()
+        self._last_fsync = time.monotonic()
+
+    def _prune(self, now: float):
+        for tier in self.tiers:
+            if tier.retention is None:
+                continue
+            cutoff = now - tier.retention
+            for series in self._list_series(tier.name):
+                for start in list(self._list_segments(tier.name, series)):
+                    if start + tier.segment > cutoff:
+                        break
+                    path = self._segment_path(tier.name, series, start)
+                    handle = self._files.pop(path, None)
+                    if handle is not None:
+                        handle.close()
+                    self._dirty.discard(path)
+                    self._close_maps(path)
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                    self._segments[(tier.name, series)].remove(start)
+
+    def _close_maps(self, path: Optional[str] = None):
+        """关闭段文件（为空时为全部段）的内存映射；Windows 上映射未关闭时文件不能删除"""
+        for key in [key for key in self._maps if path is None or key[0] == path]:
+            mapping = getattr(self._maps.pop(key), '_mmap', None)
+            if mapping is None:
+                continue
+            try:
+                mapping.close()
+            except BufferError:
+                # 仍有数组引用该映射（查询结果都是副本，正常不会发生），最后一个引用释放时关闭
+                logger.debug("遥测文件 %s 的内存映射仍被引用", key[0])
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+    def _list_series(self, tier_name: str) -> List[str]:
+        try:
+            return sorted(os.listdir(os.path.join(self.root, tier_name)))
+        except OSError:
+            return []
+
+    def _list_segments(self, tier_name: str, series: str) -> List[float]:
+        key = (tier_name, series)
+        segments = self._segments.get(key)
+        if segments is None:
+            try:
+                names = os.listdir(os.path.join(self.root, tier_name, series))
+            except OSError:
+                names = []
+            segments = sorted({float(name.split('.', 1)[0]) for name in names if name.endswith('.f8')})
+            self._segments[key] = segments
+        return segments
+
+    def series(self) -> List[str]:
+        """所有序列名（含尚未写入文件的）"""
+        names = set(self._list_series(self.tiers[0].name))
+        for tier in self.tiers[1:]:
+            names.update(self._list_series(tier.name))
+        with self._lock:
+            names.update(self._buffer)
+        return sorted(names)
+
+    def _records(self, path: str, dtype: np.dtype) -> np.ndarray:
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return np.empty(0, dtype=dtype)
+        # 写入中断时末尾可能有不完整的记录，只映射完整的部分
+        count = size // dtype.itemsize
+        if not count:
+            return np.empty(0, dtype=dtype)
+        key = (path, count)
+        records = self._maps.get(key)
+        if records is None:
+            records = np.memmap(path, dtype=dtype, mode='r', shape=(count,))
+            self._maps[key] = records
+            while len(self._maps) > 256:
+                self._maps.popitem(last=False)
+        else:
+            self._maps.move_to_end(key)
+        return records
+
+    def _read_tier(self, tier: Tier, series: str, start: float, end: float) -> np.ndarray:
+        dtype = tier.dtype
+        chunks = []
+        for segment_start in self._list_segments(tier.name, series):
+            if segment_start + tier.segment <= start or segment_start > end:
+                continue
+            records = self._records(self._segment_path(tier.name, series, segment_start), dtype)
+            times = records['t']
+            lo = int(np.searchsorted(times, start, side='left'))
+            hi = int(np.searchsorted(times, end, side='right'))
+            if hi > lo:
+                chunks.append(records[lo:hi])
+        return np.concatenate(chunks) if chunks else np.empty(0, dtype=dtype)
+
+    def choose_tier(self, start: float, end: float, max_points: Optional[int] = None,
+                    now: Optional[float] = None) -> Tier:
+        """选择覆盖该时间范围的最细层级（给出 max_points 时同时限制点数）"""
+        now = time.time() if now is None else now
+        for tier in self.tiers:
+            if tier.retention is not None and start < now - tier.retention:
+                continue
+            if max_points and tier.bucket and (end - start) / tier.bucket > max_points:
+                continue
+            if max_points and not tier.bucket and end - start > max_points:
+                # 原始数据按约 1 Hz 估算
+                continue
+            return tier
+        return self.tiers[-1]
+
+    def query(self, series: str, start: float, end: float, tier: Optional[str] = None,
+              max_points: Optional[int] = None, now: Optional[float] = None) -> Dict[str, Any]:
+        """
+        查询时间范围内的数据
+
+        Args:
+            series: 序列名
+            start: 起始时刻（Unix 时间戳）
+            end: 结束时刻（Unix 时间戳）
+            tier: 指定层级（'raw'、'1m'、'10m'），为空时自动选择
+            max_points: 自动选择层级时的点数上限
+            now: 当前时刻，为空时取系统时间
+
+        Returns:
+            {'tier': 层级名, 't': 时间数组, 'v': 值数组}；聚合层级另有 'min'、'max'、'n'
+        """
+        chosen = self._tier_by_name[tier] if tier else self.choose_tier(start, end, max_points, now)
+        with self._write_lock:
+            data = self._read_tier(chosen, series, start, end)
+        if chosen.bucket == 0:
+            times, values = data['t'], data['v']
+            with self._lock:
+                pending = [p for p in self._buffer.get(series, ()) if start <= p[0] <= end]
+            if pending:
+                extra = np.asarray(pending, dtype='<f8')
+                times = np.concatenate([times, extra[:, 0]])
+                values = np.concatenate([values, extra[:, 1]])
+            result = {'tier': chosen.name, 't': np.array(times), 'v': np.array(values)}
+        else:
+            result = {'tier': chosen.name, 't': np.array(data['t']), 'v': np.array(data['mean']),
+                      'min': np.array(data['min']), 'max': np.array(data['max']), 'n': np.array(data['n'])}
+        return result
+
+    def disk_usage(self) -> int:
+        """存储目录占用的字节数"""
+        total = 0
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(directory, name))
+                except OSError:
+                    pass
+        return total
+
+
+_telemetry_store: Optional[TelemetryStore] = None
+_telemetry_lock = threading.Lock()
+
+
+def get_telemetry_store() -> TelemetryStore:
+    """获取全局时序存储（首次调用时创建并启动后台写入线程）"""
+    global _telemetry_store
+    with _telemetry_lock:
+        if _telemetry_store is None:
+            _telemetry_store = TelemetryStore()
+        return _telemetry_store
+
+
+def telemetry_enabled() -> bool:
+    """配置中是否启用了遥测存储"""
+    return bool(get_config_service().get('telemetry.enabled', False))
+
+
+def connect_state_store(state_store, telemetry: Optional[TelemetryStore] = None):
+    """
+    让时序存储记录状态中心的每一次发布
+
+    监听器在发布者线程中调用，只把数值写入内存缓冲区。
+
+    Args:
+        state_store: 状态中心（StateStore）
+        telemetry: 时序存储，为空时使用全局存储
+
+    Returns:
+        取消记录的函数
+    """
+    telemetry = telemetry or get_telemetry_store()
+
+    def record(device: str, values: Dict[str, Any], timestamp: float):
+        telemetry.record_snapshot(device, values, timestamp)
+
+    return state_store.add_listener(record)
@@ -0,0 +1,403 @@
+"""
+设备通信记录
+
+在真实观测夜中记录全部 Alpaca 请求/响应和串口收发帧，写入一个 gzip 压缩的 JSON Lines 文件，
+之后可由 src.simulators.replay_server 在本机按原速或加速回放，用于没有望远镜和串口硬件时
+对 telescope_monitor、device_service、水冷机/UPS 解码等改动做可重复的负载测试。
+
+记录方式与热点路径计时相同，在类上包装而不修改调用方：
+  - requests.adapters.HTTPAdapter.send：进程内所有经 requests 发出、路径以 record_paths 开头的请求
+    （轮询引擎、命令执行器和其他基于 requests 的客户端都经过这里），
+    记录方法、URL、表单、状态码、响应 JSON 和耗时；连接失败、超时记录异常
+  - serial.Serial.write / read：写出的帧和读到的字节块，回放时按端口把请求与其后的响应配对
+
+文件格式（每行一个 JSON 对象）：
+    {"format": "tianyu-traffic", "version": 1, "started": "...", "label": "..."}      文件头
+    {"t": 12.345, "k": "http", "m": "GET", "u": "http://.../api/v1/telescope/0/rightascension",
+     "s": 200, "r": {"Value": 5.5, "ErrorNumber": 0, "ErrorMessage": ""}, "d": 0.012}
+    {"t": 12.400, "k": "http", "m": "PUT", "u": "...", "f": {"Position": "100"}, "e": "ReadTimeout(...)", "d": 5.0}
+    {"t": 13.001, "k": "serial", "p": "COM20", "w": "01 03 00 00 00 03 05 cb"}          写出
+    {"t": 13.052, "k": "serial", "p": "COM20", "r": "01 03 06 00 b9 ..."}               读到
+t 为相对记录开始的秒数，ClientID / ClientTransactionID 不记录（回放时重新生成）。
+
+用法:
+    recorder = start_recording()                     # 配置 recording.enabled 开启时
+    python -m src.services.startup --record logs/traffic_night.jsonl.gz
+    python -m src.services.traffic_recorder summary logs/traffic_2026-10-16.jsonl.gz
+"""
+import argparse
+import functools
+import gzip
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, Iterator, Mapping, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+from src.config.config_service import get_config_service
+from src.services.profiler import night_of
+
+try:
+    import serial
+except ImportError:  # pragma: no cover - 未安装 PySerial 时只记录 HTTP
+    serial = None
+
+logger = logging.getLogger(__name__)
+
+FORMAT_NAME = 'tianyu-traffic'
+FORMAT_VERSION = 1
+
+DEFAULT_SETTINGS = {
+    'enabled': False,
+    'path': 'logs/traffic_{night}.jsonl.gz',
+    'label': '',
+    'record_paths': ['/api/v1/', '/management/v1/'],
+    'serial': True,
+    'flush_interval': 2.0,
+}
+
+# 不记录的请求参数（每次请求都不同，回放时重新生成）
+VOLATILE_PARAMS = ('clientid', 'clienttransactionid')
+
+
+def recording_settings(overrides: Optional[Mapping[str, Any]] = None) -> Dict[str, Any]:
+    """合并默认值、config.yaml recording 段和调用参数"""
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update(get_config_service().get('recording', {}) or {})
+    settings.update(overrides or {})
+    return settings
+
+
+def _form(body) -> Dict[str, str]:
+    if not body:
+        return {}
+    if isinstance(body, bytes):
+        body = body.decode('utf-8', 'replace')
+    if not isinstance(body, str):
+        return {}
+    return {key: value for key, value in parse_qsl(body, keep_blank_values=True)
+            if key.lower() not in VOLATILE_PARAMS}
+
+
+class TrafficRecorder:
+    """
+    通信记录器
+
+    record_* 可在任意线程中调用，只把事件放入队列；写文件和压缩在后台线程中进行，
+    不增加轮询线程和串口线程的耗时。
+    """
+
+    def __init__(self, path: str, label: str = '', flush_interval: float = 2.0):
+        self.path = path
+        self.label = label
+        self.flush_interval = flush_interval
+        self.counts: Counter = Counter()
+        self._origin = time.monotonic()
+        self._queue: 'queue.SimpleQueue[Optional[Dict[str, Any]]]' = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+    def start(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._origin = time.monotonic()
+        self._running = True
+        header = {'format': FORMAT_NAME, 'version': FORMAT_VERSION,
+                  'started': datetime.now().isoformat(timespec='seconds'), 'label': self.label}
+        self._thread = threading.Thread(target=self._write_loop, args=(header,), name='traffic-recorder',
+                                        daemon=True)
+        self._thread.start()
+        logger.info("开始记录设备通信: %s", self.path)
+        return self
+
+    def stop(self):
+        """停止记录，写完队列中剩余的事件"""
+        if not self._running:
+            return
+        self._running = False
+        self._queue.put(None)
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        logger.info("设备通信记录已保存: %s（HTTP %d 条，串口 %d 条）",
+                    self.path, self.counts['http'], self.counts['serial'])
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self._origin
+
+    def record_http(self, method: str, url: str, form: Mapping[str, str], started: float, duration: float,
+                    status: Optional[int] = None, body: Any = None, error: Optional[str] = None):
+        """
+        记录一次 HTTP 请求
+
+        Args:
+            method: GET / PUT
+            url: 不含查询参数的 URL
+            form: 表单参数（已去掉 ClientID / ClientTransactionID）
+            started: 请求开始时刻（time.monotonic()）
+            duration: 耗时（秒）
+            status: HTTP 状态码，请求失败时为 None
+            body: 解析后的响应 JSON（无法解析时为文本）
+            error: 请求失败时的异常描述
+        """
+        if not self._running:
+            return
+        event = {'t': round(started - self._origin, 4), 'k': 'http', 'm': method, 'u': url,
+                 'd': round(duration, 4)}
+        if form:
+            event['f'] = dict(form)
+        if error is not None:
+            event['e'] = error
+        else:
+            event['s'] = status
+            event['r'] = body
+        self._queue.put(event)
+
+    def record_serial(self, port: str, direction: str, data: bytes):
+        """记录串口收发的字节（direction 为 'w' 写出或 'r' 读到）"""
+        if not self._running or not data:
+            return
+        self._queue.put({'t': round(time.monotonic() - self._origin, 4), 'k': 'serial', 'p': port,
+                         direction: bytes(data).hex(' ')})
+
+    def _write_loop(self, header: Dict[str, Any]):
+        with gzip.open(self.path, 'wt', encoding='utf-8', compresslevel=6) as f:
+            f.write(json.dumps(header, ensure_ascii=False) + '\n')
+            last_flush = time.monotonic()
+            while True:
+                try:
+                    event = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    event = {}
+                if event is None:
+                    break
+                if event:
+                    f.write(json.dumps(event, ensure_ascii=False, separators=(',', ':')) + '\n')
+                    self.counts[event['k']] += 1
+                if time.monotonic() - last_flush >= self.flush_interval:
+                    # 每隔一段时间刷新压缩流，程序异常退出时最多丢失最后几秒
+                    f.flush()
+                    last_flush = time.monotonic()
+
+
+# ----------------------------------------------------------------------
+# 类级别的记录钩子
+# ----------------------------------------------------------------------
+_recorder: Optional[TrafficRecorder] = None
+_record_paths: Tuple[str, ...] = ()
+_installed = False
+
+
+def _recorded_path(url: str) -> Optional[str]:
+    parts = urlsplit(url)
+    if any(parts.path.startswith(prefix) for prefix in _record_paths):
+        return f"{parts.scheme}://{parts.netloc}{parts.path}"
+    return None
+
+
+def _wrap_http_send(original):
+    @functools.wraps(original)
+    def send(self, request, *args, **kwargs):
+        recorder = _recorder
+        url = _recorded_path(request.url) if recorder is not None and recorder.running else None
+        if url is None:
+            return original(self, request, *args, **kwargs)
+        started = time.monotonic()
+        form = _form(request.body)
+        try:
+            response = original(self, request, *args, **kwargs)
+        except Exception as e:
+            recorder.record_http(request.method, url, form, started, time.monotonic() - started,
+                                 error=f"{type(e).__name__}: {e}")
+            raise
+        duration = time.monotonic() - started
+        try:
+            body = json.loads(response.content)
+        except ValueError:
+            body = response.text[:1024]
+        recorder.record_http(request.method, url, form, started, duration, response.status_code, body)
+        return response
+    send._recording = True
+    return send
+
+
+def _port_name(port) -> str:
+    return getattr(port, 'name', None) or str(port.port)
+
+
+def _wrap_serial_write(original):
+    @functools.wraps(original)
+    def write(self, data):
+        recorder = _recorder
+        if recorder is not None:
+            recorder.record_serial(_port_name(self), 'w', data)
+        return original(self, data)
+    write._recording = True
+    return write
+
+
+def _wrap_serial_read(original):
+    @functools.wraps(original)
+    def read(self, size=1):
+        data = original(self, size)
+        recorder = _recorder
+        if recorder is not None and data:
+            recorder.record_serial(_port_name(self), 'r', data)
+        return data
+    read._recording = True
+    return read
+
+
+def install_recording(recorder: TrafficRecorder, record_paths=('/api/v1/', '/management/v1/'),
+                      record_serial: bool = True):
+    """
+    开始把 HTTP 和串口通信交给 recorder（类级别包装只安装一次，之后只替换记录器）
+
+    Args:
+        recorder: 已启动的记录器
+        record_paths: 记录的 URL 路径前缀
+        record_serial: 是否记录串口
+    """
+    global _recorder, _record_paths, _installed
+    _record_paths = tuple(record_paths)
+    _recorder = recorder
+    if _installed:
+        return
+    from requests.adapters import HTTPAdapter
+    if not getattr(HTTPAdapter.send, '_recording', False):
+        HTTPAdapter.send = _wrap_http_send(HTTPAdapter.send)
+    if record_serial and serial is not None:
+        serial_cls = serial.Serial
+        if not getattr(serial_cls.write, '_recording', False):
+            serial_cls.write = _wrap_serial_write(serial_cls.write)
+        if not getattr(serial_cls.read, '_recording', False):
+            serial_cls.read = _wrap_serial_read(serial_cls.read)
+    _installed = True
+
+
+def uninstall_recording():
+    """停止交给记录器（包装保留，没有记录器时直接调用原方法）"""
+    global _recorder
+    _recorder = None
+
+
+def start_recording(settings: Optional[Mapping[str, Any]] = None, path: Optional[str] = None
+                    ) -> Optional[TrafficRecorder]:
+    """
+    按配置开始记录
+
+    Args:
+        settings: 覆盖 recording 段的设置
+        path: 记录文件路径；指定时即使配置未开启也记录
+
+    Returns:
+        记录器，未开启时为 None
+    """
+    settings = recording_settings(settings)
+    if path is None and not settings['enabled']:
+        return None
+    path = path or settings['path'].format(night=night_of())
+    recorder = TrafficRecorder(path, settings['label'], float(settings['flush_interval'])).start()
+    install_recording(recorder, settings['record_paths'], bool(settings['serial']))
+    return recorder
+
+
+def stop_recording(recorder: Optional[TrafficRecorder]):
+    if recorder is None:
+        return
+    if _recorder is recorder:
+        uninstall_recording()
+    recorder.stop()
+
+
+# ----------------------------------------------------------------------
+# 读取
+# ----------------------------------------------------------------------
+def open_recording(path: str):
+    """按扩展名打开记录文件（.gz 为压缩文件）"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, 'r', encoding='utf-8')
+
+
+def read_recording(path: str) -> Tuple[Dict[str, Any], Iterator[Dict[str, Any]]]:
+    """
+    读取记录文件
+
+    Returns:
+        (文件头, 事件迭代器)；文件被截断（记录中途断电）时读到最后一个完整行为止
+    """
+    f = open_recording(path)
+    try:
+        header = json.loads(f.readline() or '{}')
+    except ValueError:
+        header = {}
+    if header.get('format') != FORMAT_NAME:
+        f.close()
+        raise ValueError(f"{path} 不是设备通信记录文件")
+
+    def events():
+        try:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+        except (EOFError, OSError) as e:
+            logger.warning("记录文件 %s 不完整: %s", path, e)
+        finally:
+            f.close()
+    return header, events()
+
+
+def summarize(path: str) -> str:
+    """记录文件摘要：时长、各设备端点的请求数、失败数和平均耗时、串口字节数"""
+    header, events = read_recording(path)
+    http: Dict[Tuple[str, str], list] = {}
+    serial_bytes: Counter = Counter()
+    errors = Counter()
+    duration = 0.0
+    for event in events:
+        duration = max(duration, event.get('t', 0.0))
+        if event.get('k') == 'http':
+            parts = urlsplit(event['u']).path.split('/')
+            key = (event['m'], '/'.join(parts[3:]) if len(parts) > 3 else event['u'])
+            http.setdefault(key, []).append(event.get('d', 0.0))
+            if 'e' in event or event.get('s', 200) >= 400 or (event.get('r') or {}).get('ErrorNumber', 0):
+                errors[key] += 1
+        elif event.get('k') == 'serial':
+            for direction in ('w', 'r'):
+                if direction in event:
+                    serial_bytes[(event['p'], direction)] += len(bytes.fromhex(event[direction]))
+    lines = [f"{path}: 开始于 {header.get('started')}，时长 {duration / 3600:.2f} 小时"
+             + (f"，{header['label']}" if header.get('label') else '')]
+    for (method, endpoint), durations in sorted(http.items()):
+        lines.append(f"  {method:<4} {endpoint:<44} {len(durations):>7} 次  失败 {errors[(method, endpoint)]:>5}  "
+                     f"平均 {sum(durations) / len(durations) * 1000:>7.1f} ms")
+    for (port, direction), size in sorted(serial_bytes.items()):
+        lines.append(f"  串口 {port} {'写出' if direction == 'w' else '读到'} {size} 字节")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='设备通信记录')
+    sub = parser.add_subparsers(dest='command', required=True)
+    summary = sub.add_parser('summary', help='显示记录文件摘要')
+    summary.add_argument('path')
+    args = parser.parse_args()
+    if args.command == 'summary':
+        print(summarize(args.path))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,5 @@
+"""
+本地设备模拟器包
+
+提供不依赖真实硬件的 Alpaca 桩服务器等工具，用于联调和性能基准测试。
+"""
@@ -0,0 +1,596 @@
+"""
+Alpaca 桩服务器
+
+在本机启动一个最小化的 ASCOM Alpaca HTTP 服务，模拟 config.yaml 中用到的
+望远镜、调焦器、消旋器、气象站、圆顶和镜头盖设备。支持 HTTP/1.1 长连接、
+可配置的人为延迟和随机抖动、按比例注入的故障（HTTP 500、长时间不响应、直接断开连接，
+随机数种子固定，结果可重复）以及按设备统计请求数，用于轮询引擎等模块的联调和基准测试。
+AlpacaDiscoveryResponder 应答 Alpaca UDP 发现广播，用于设备发现服务的联调。
+
+用法:
+    python -m src.simulators.alpaca_server --port 11111 --latency 30
+    python -m src.simulators.alpaca_server --port 11111 --latency 30 --jitter 20 --fault-rate 0.01
+    python -m src.simulators.alpaca_server --port 11111 --discovery-port 32227
+"""
+import argparse
+import json
+import random
+import socket
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+# 各类设备的默认属性值（端点名使用 Alpaca 小写形式）
+DEFAULT_DEVICE_STATES = {
+    'telescope': {
+        'connected': True,
+        'rightascension': 12.0,
+        'declination': 30.0,
+        'altitude': 60.0,
+        'azimuth': 120.0,
+        'alignmentmode': 1,
+        'aperturediameter': 1.0,
+        'athome': False,
+        'atpark': False,
+        'doesrefraction': False,
+        'ispulseguiding': False,
+        'siteelevation': 4300.0,
+        'sitelatitude': 38.614595,
+        'sitelongitude': 93.897782,
+        'slewing': False,
+        'tracking': True,
+        'trackingrate': 0,
+        'targetrightascension': 12.0,
+        'targetdeclination': 30.0,
+    },
+    'focuser': {
+        'connected': True,
+        'absolute': True,
+        'ismoving': False,
+        'maxincrement': 60000,
+        'maxstep': 60000,
+        'position': 34000,
+        'stepsize': 1.0,
+        'temperature': 8.5,
+    },
+    'rotator': {
+        'connected': True,
+        'ismoving': False,
+        'position': 0.0,
+        'reverse': False,
+        'stepsize': 0.1,
+        'targetposition': 0.0,
+    },
+    'observingconditions': {
+        'connected': True,
+        'cloudcover': 10.0,
+        'dewpoint': -15.0,
+        'humidity': 35.0,
+        'pressure': 600.0,
+        'skybrightness': 0.01,
+        'rainrate': 0.0,
+        'skyquality': 21.5,
+        'skytemperature': -35.0,
+        'starfwhm': 1.2,
+        'temperature': -5.0,
+        'winddirection': 70.0,
+        'windgust': 6.0,
+        'windspeed': 4.0,
+    },
+    'dome': {
+        'connected': True,
+        'azimuth': 0.0,
+        'athome': True,
+        'atpark': False,
+        'slewing': False,
+        'shutterstatus': 1,
+    },
+    'covercalibrator': {
+        'connected': True,
+        'coverstate': 1,
+        'calibratorstate': 0,
+        'brightness': 0,
+    },
+}
+
+# 注入的故障类型
+FAULT_ERROR = 'error'   # 返回 HTTP 500
+FAULT_STALL = 'stall'   # 等待 stall_time 秒后才响应（客户端通常已超时）
+FAULT_DROP = 'drop'     # 不响应，直接关闭连接
+
+# configureddevices 接口中使用的设备类型名
+DEVICE_TYPE_NAMES = {
+    'telescope': 'Telescope',
+    'focuser': 'Focuser',
+    'rotator': 'Rotator',
+    'observingconditions': 'ObservingConditions',
+    'dome': 'Dome',
+    'covercalibrator': 'CoverCalibrator',
+}
+
+
+class AlpacaStubServer:
+    """本地 Alpaca 桩服务器"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0,
+                 motion_time: float = 2.0, connect_latency: float = 0.0, jitter: float = 0.0,
+                 fault_rate: float = 0.0, stall_rate: float = 0.0, drop_rate: float = 0.0,
+                 stall_time: float = 10.0, seed: int = 0):
+        """
+        初始化桩服务器
+
+        Args:
+            host: 监听地址
+            port: 监听端口，0 表示由系统分配
+            latency: 每个请求的人为延迟（秒），用于模拟站点链路
+            motion_time: 圆顶天窗、镜头盖、调焦器等动作的模拟耗时（秒）
+            connect_latency: 每个新 TCP 连接的人为延迟（秒），用于模拟建立连接的握手开销
+            jitter: 每个请求在 latency 之外再随机增加 [0, jitter) 秒
+            fault_rate: 返回 HTTP 500 的请求比例
+            stall_rate: 等待 stall_time 秒后才响应的请求比例
+            drop_rate: 不响应、直接断开连接的请求比例
+            stall_time: 模拟无响应时的等待时间（秒）
+            seed: 抖动和故障注入使用的随机数种子
+        """
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.motion_time = motion_time
+        self.connect_latency = connect_latency
+        self.jitter = jitter
+        self.fault_rate = fault_rate
+        self.stall_rate = stall_rate
+        self.drop_rate = drop_rate
+        self.stall_time = stall_time
+        self.connection_count = 0
+        self.endpoint_latency: Dict[str, float] = {}
+        self.fault_counts = Counter()
+        self._random = random.Random(seed)
+
+        self._lock = threading.Lock()
+        self._states: Dict[Tuple[str, int], Dict[str, Any]] = {}
+        self._pending = []
+        self._request_counts = Counter()
+        self._server_transaction_id = 0
+        self._started_at = time.monotonic()
+        self._httpd: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+        for device_type, state in DEFAULT_DEVICE_STATES.items():
+            self._states[(device_type, 0)] = dict(state)
+
+    @property
+    def base_url(self) -> str:
+        """服务器根地址，例如 http://127.0.0.1:11111"""
+        return f"http://{self.host}:{self.port}"
+
+    def start(self):
+        """在后台线程中启动服务器"""
+        handler = _make_handler(self)
+        self._httpd = ThreadingHTTPServer((self.host, self.port), handler)
+        self._httpd.daemon_threads = True
+        self.port = self._httpd.server_address[1]
+        self._thread = threading.Thread(target=self._httpd.serve_forever,
+                                        name='AlpacaStubServer', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止服务器"""
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+        if self._thread:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    # ------------------------------------------------------------------
+    # 状态与计数
+    # ------------------------------------------------------------------
+    def set_value(self, device_type: str, prop: str, value: Any, device_number: int = 0):
+        """直接设置设备属性值"""
+        with self._lock:
+            self._states.setdefault((device_type, device_number), {})[prop] = value
+
+    def get_value(self, device_type: str, prop: str, device_number: int = 0) -> Any:
+        """读取设备属性值（不计入请求数）"""
+        with self._lock:
+            self._apply_pending()
+            return self._states.get((device_type, device_number), {}).get(prop)
+
+    def request_count(self, device_type: Optional[str] = None) -> int:
+        """获取请求数，device_type 为空时返回全部设备的总数"""
+        with self._lock:
+            if device_type is None:
+                return sum(self._request_counts.values())
+            return self._request_counts.get(device_type, 0)
+
+    def reset_counters(self):
+        """清零请求计数和连接计数"""
+        with self._lock:
+            self._request_counts.clear()
+            self.connection_count = 0
+
+    def configured_devices(self):
+        """返回 /management/v1/configureddevices 的设备列表"""
+        with self._lock:
+            keys = sorted(self._states)
+        return [{
+            'DeviceName': f"Stub {DEVICE_TYPE_NAMES.get(device_type, device_type)}",
+            'DeviceType': DEVICE_TYPE_NAMES.get(device_type, device_type),
+            'DeviceNumber': number,
+            'UniqueID': f"stub-{self.port}-{device_type}-{number}",
+        } for device_type, number in keys]
+
+    # ------------------------------------------------------------------
+    # 请求处理
+    # ------------------------------------------------------------------
+    def handle_get(self, device_type: str, device_number: int, prop: str):
+        """处理属性读取，返回 (值, 错误码, 错误信息)"""
+        with self._lock:
+            self._request_counts[device_type] += 1
+            self._apply_pending()
+            state = self._states.get((device_type, device_number))
+            if state is None:
+                return None, 0x400, f"Device {device_type}/{device_number} not found"
+            self._simulate_motion(device_type, state)
+            if prop == 'utcdate':
+                return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ'), 0, ''
+            # 未知属性返回 0.0，便于基准测试按需扩展端点数量
+            return state.get(prop, 0.0), 0, ''
+
+    def handle_put(self, device_type: str, device_number: int, action: str, form: Dict[str, str]):
+        """处理动作请求，返回 (错误码, 错误信息)"""
+        with self._lock:
+            self._request_counts[device_type] += 1
+            self._apply_pending()
+            state = self._states.get((device_type, device_number))
+            if state is None:
+                return 0x400, f"Device {device_type}/{device_number} not found"
+
+            done_at = time.monotonic() + self.motion_time
+            if device_type == 'dome' and action == 'openshutter':
+                state['shutterstatus'] = 2
+                self._pending.append((done_at, state, {'shutterstatus': 0}))
+            elif device_type == 'dome' and action == 'closeshutter':
+                state['shutterstatus'] = 3
+                self._pending.append((done_at, state, {'shutterstatus': 1}))
+            elif device_type == 'covercalibrator' and action in ('opencover', 'closecover'):
+                state['coverstate'] = 2
+                target = 3 if action == 'opencover' else 1
+                self._pending.append((done_at, state, {'coverstate': target}))
+            elif device_type == 'covercalibrator' and action == 'haltcover':
+                self._drop_pending(state)
+                state['coverstate'] = 4
+            elif device_type == 'focuser' and action == 'move':
+                state['ismoving'] = True
+                position = int(float(form.get('Position', state.get('position', 0))))
+                self._pending.append((done_at, state, {'ismoving': False, 'position': position}))
+            elif device_type == 'focuser' and action == 'halt':
+                self._drop_pending(state)
+                state['ismoving'] = False
+            elif device_type == 'rotator' and action in ('moveabsolute', 'moveabsolutemechanical'):
+                position = float(form.get('Position', state.get('position', 0.0)))
+                state['ismoving'] = True
+                state['targetposition'] = position
+                self._pending.append((done_at, state, {'ismoving': False, 'position': position}))
+            elif device_type == 'telescope' and action in ('slewtocoordinatesasync', 'slewtocoordinates'):
+                ra = float(form.get('RightAscension', state.get('rightascension', 0.0)))
+                dec = float(form.get('Declination', state.get('declination', 0.0)))
+                state['targetrightascension'] = ra
+                state['targetdeclination'] = dec
+                state['slewing'] = True
+                self._pending.append((done_at, state, {'slewing': False,
+                                                       'rightascension': ra,
+                                                       'declination': dec}))
+            elif device_type == 'telescope' and action == 'abortslew':
+                self._drop_pending(state)
+                state['slewing'] = False
+            else:
+                # 其余属性写入（如 tracking、connected）直接落到状态表
+                for key, value in form.items():
+                    if key.lower() not in ('clientid', 'clienttransactionid'):
+                        state[action] = _coerce(value)
+            return 0, ''
+
+    def delay_for(self, device_type: str, device_number: int, endpoint: str, method: str = 'GET') -> float:
+        """请求的人为延迟（秒）：端点单独设置的延迟或 latency，再加随机抖动"""
+        delay = self.endpoint_latency.get(endpoint, self.latency)
+        if self.jitter > 0:
+            with self._lock:
+                delay += self._random.random() * self.jitter
+        return delay
+
+    def fault_for(self, device_type: str, device_number: int, endpoint: str, method: str = 'GET') -> Optional[str]:
+        """按比例抽取要注入的故障（FAULT_ERROR / FAULT_STALL / FAULT_DROP），不注入时返回 None"""
+        if not (self.fault_rate or self.stall_rate or self.drop_rate):
+            return None
+        with self._lock:
+            draw = self._random.random()
+            for fault, rate in ((FAULT_ERROR, self.fault_rate), (FAULT_STALL, self.stall_rate),
+                                (FAULT_DROP, self.drop_rate)):
+                if draw < rate:
+                    self.fault_counts[fault] += 1
+                    return fault
+                draw -= rate
+        return None
+
+    def next_server_transaction_id(self) -> int:
+        """生成服务器事务号"""
+        with self._lock:
+            self._server_transaction_id += 1
+            return self._server_transaction_id
+
+    def _apply_pending(self):
+        """应用已到期的模拟动作结果（调用方需持有锁）"""
+        if not self._pending:
+            return
+        now = time.monotonic()
+        remaining = []
+        for done_at, state, updates in self._pending:
+            if done_at <= now:
+                state.update(updates)
+            else:
+                remaining.append((done_at, state, updates))
+        self._pending = remaining
+
+    def _drop_pending(self, state):
+        """取消某个设备上尚未完成的模拟动作（调用方需持有锁）"""
+        self._pending = [item for item in self._pending if item[1] is not state]
+
+    def _simulate_motion(self, device_type: str, state: Dict[str, Any]):
+        """让跟踪中的望远镜坐标随时间缓慢变化"""
+        if device_type == 'telescope' and state.get('tracking') and not state.get('slewing'):
+            elapsed = time.monotonic() - self._started_at
+            state['altitude'] = 60.0 + 0.001 * (elapsed % 3600)
+            state['azimuth'] = (120.0 + 0.004 * elapsed) % 360.0
+
+
+def _coerce(value: str):
+    """把表单字符串转换为合适的 Python 类型"""
+    lowered = value.lower()
+    if lowered in ('true', 'false'):
+        return lowered == 'true'
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            return value
+
+
+class AlpacaDiscoveryResponder:
+    """
+    Alpaca UDP 发现应答器
+
+    收到 "alpacadiscovery1" 数据报时向发送方回复 {"AlpacaPort": <HTTP 端口>}。
+    """
+
+    MESSAGE = b'alpacadiscovery1'
+
+    def __init__(self, alpaca_port: int, host: str = '', port: int = 32227, delay: float = 0.0):
+        """
+        初始化应答器
+
+        Args:
+            alpaca_port: 回复中给出的 Alpaca HTTP 端口
+            host: 监听地址，空字符串表示所有网卡（可收到广播）
+            port: 监听的 UDP 端口，0 表示由系统分配
+            delay: 回复前的人为延迟（秒）
+        """
+        self.alpaca_port = alpaca_port
+        self.host = host
+        self.port = port
+        self.delay = delay
+        self.request_count = 0
+        self._sock: Optional[socket.socket] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self):
+        """在后台线程中开始应答"""
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind((self.host, self.port))
+        self._sock.settimeout(0.2)
+        self.port = self._sock.getsockname()[1]
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._serve, name='AlpacaDiscoveryResponder', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止应答"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+            self._thread = None
+        if self._sock:
+            self._sock.close()
+            self._sock = None
+
+    def _serve(self):
+        reply = json.dumps({'AlpacaPort': self.alpaca_port}).encode('utf-8')
+        while not self._stop.is_set():
+            try:
+                data, address = self._sock.recvfrom(1024)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            if not data.startswith(self.MESSAGE):
+                continue
+            self.request_count += 1
+            if self.delay > 0:
+                time.sleep(self.delay)
+            try:
+                self._sock.sendto(reply, address)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+def _make_handler(server: AlpacaStubServer):
+    """创建绑定到指定桩服务器实例的请求处理类"""
+
+    class AlpacaStubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # 头部和正文分两次写出时，Nagle 与延迟确认叠加会额外引入约 40ms 延迟
+        disable_nagle_algorithm = True
+
+        def setup(self):
+            super().setup()
+            with server._lock:
+                server.connection_count += 1
+            if server.connect_latency > 0:
+                time.sleep(server.connect_latency)
+
+        def log_message(self, format, *args):
+            # 桩服务器不输出访问日志
+            pass
+
+        def _client_transaction_id(self, params):
+            for key, values in params.items():
+                if key.lower() == 'clienttransactionid' and values:
+                    try:
+                        return int(values[0])
+                    except ValueError:
+                        return 0
+            return 0
+
+        def _send_json(self, payload, status=200):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _delay(self, device_type, number, endpoint):
+            """等待人为延迟并注入故障，返回 False 表示已按故障处理、不再正常响应"""
+            delay = server.delay_for(device_type, number, endpoint, self.command)
+            if delay > 0:
+                time.sleep(delay)
+            fault = server.fault_for(device_type, number, endpoint, self.command)
+            if fault == FAULT_ERROR:
+                self._send_json({'ErrorNumber': 0x500, 'ErrorMessage': 'Injected fault'}, status=500)
+                return False
+            if fault == FAULT_DROP:
+                self.close_connection = True
+                return False
+            if fault == FAULT_STALL:
+                time.sleep(server.stall_time)
+            return True
+
+        def _route(self):
+            parsed = urlparse(self.path)
+            parts = [p for p in parsed.path.split('/') if p]
+            return parsed, parts
+
+        def do_GET(self):
+            parsed, parts = self._route()
+            params = parse_qs(parsed.query)
+            if parts[:3] == ['management', 'v1', 'configureddevices']:
+                self._send_json(self._wrap(server.configured_devices(), params))
+                return
+            if len(parts) != 5 or parts[:2] != ['api', 'v1']:
+                self._send_json({'ErrorNumber': 0x400, 'ErrorMessage': 'Not found'}, status=404)
+                return
+            device_type, number, prop = parts[2].lower(), int(parts[3]), parts[4].lower()
+            if not self._delay(device_type, number, prop):
+                return
+            value, error_number, error_message = server.handle_get(device_type, number, prop)
+            payload = self._wrap(value, params)
+            payload['ErrorNumber'] = error_number
+            payload['ErrorMessage'] = error_message
+            self._send_json(payload)
+
+        def do_PUT(self):
+            parsed, parts = self._route()
+            length = int(self.headers.get('Content-Length') or 0)
+            body = self.rfile.read(length).decode('utf-8') if length else ''
+            form = {k: v[0] for k, v in parse_qs(body).items()}
+            params = parse_qs(parsed.query)
+            params.update({k: [v] for k, v in form.items()})
+            if len(parts) != 5 or parts[:2] != ['api', 'v1']:
+                self._send_json({'ErrorNumber': 0x400, 'ErrorMessage': 'Not found'}, status=404)
+                return
+            device_type, number, action = parts[2].lower(), int(parts[3]), parts[4].lower()
+            if not self._delay(device_type, number, action):
+                return
+            error_number, error_message = server.handle_put(device_type, number, action, form)
+            payload = self._wrap(None, params)
+            payload.pop('Value')
+            payload['ErrorNumber'] = error_number
+            payload['ErrorMessage'] = error_message
+            self._send_json(payload)
+
+        def _wrap(self, value, params):
+            return {
+                'Value': value,
+                'ClientTransactionID': self._client_transaction_id(params),
+                'ServerTransactionID': server.next_server_transaction_id(),
+                'ErrorNumber': 0,
+                'ErrorMessage': '',
+            }
+
+    return AlpacaStubHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地 Alpaca 桩服务器')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址')
+    parser.add_argument('--port', type=int, default=11111, help='监听端口')
+    parser.add_argument('--latency', type=float, default=0.0, help='每个请求的人为延迟（毫秒）')
+    parser.add_argument('--motion-time', type=float, default=2.0, help='模拟动作耗时（秒）')
+    parser.add_argument('--connect-latency', type=float, default=0.0, help='每个新连接的人为延迟（毫秒）')
+    parser.add_argument('--jitter', type=float, default=0.0, help='每个请求额外的随机延迟上限（毫秒）')
+    parser.add_argument('--fault-rate', type=float, default=0.0, help='返回 HTTP 500 的请求比例')
+    parser.add_argument('--stall-rate', type=float, default=0.0, help='长时间不响应的请求比例')
+    parser.add_argument('--drop-rate', type=float, default=0.0, help='直接断开连接的请求比例')
+    parser.add_argument('--seed', type=int, default=0, help='抖动和故障注入的随机数种子')
+    parser.add_argument('--discovery-port', type=int, default=None,
+                        help='同时应答 Alpaca UDP 发现广播的端口（标准端口 32227），不指定时不应答')
+    args = parser.parse_args()
+
+    server = AlpacaStubServer(args.host, args.port, latency=args.latency / 1000.0,
+                              motion_time=args.motion_time,
+                              connect_latency=args.connect_latency / 1000.0,
+                              jitter=args.jitter / 1000.0, fault_rate=args.fault_rate,
+                              stall_rate=args.stall_rate, drop_rate=args.drop_rate, seed=args.seed)
+    server.start()
+    print(f"Alpaca 桩服务器已启动: {server.base_url}")
+    responder = None
+    if args.discovery_port is not None:
+        responder = AlpacaDiscoveryResponder(server.port, port=args.discovery_port).start()
+        print(f"UDP 发现应答器已启动: 端口 {responder.port}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if responder:
+            responder.stop()
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
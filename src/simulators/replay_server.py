@@ -0,0 +1,369 @@
+"""
+设备通信回放
+
+读取 src.services.traffic_recorder 记录的文件，在本机回放：
+  - HTTP：ReplayAlpacaServer 在 AlpacaStubServer 的基础上，按回放时钟返回每个端点在该时刻之前
+    最近一次记录的响应；记录中没有的端点按桩服务器的默认状态应答。多台服务器的记录按路径合并
+  - 串口：每个记录过的串口建立一个伪终端（ReplaySerialDevice），收到与记录相同的请求帧时
+    返回该时刻之前最近一次的响应帧；记录中超时（没有响应）的请求同样不响应
+回放时钟可按原速或加速运行（--speed 60 把 12 小时压缩到 12 分钟），可循环；在记录之外还可以注入
+固定延迟、随机抖动和按比例的故障（随机数种子固定），或按记录的耗时和失败原样重现。
+
+用法:
+    python -m src.simulators.replay_server logs/traffic_2026-10-16.jsonl.gz --port 11111 --speed 60
+    python -m src.simulators.replay_server night.jsonl.gz --recorded-latency --fault-rate 0.01 --loop
+然后把 config.yaml 中各设备的 api_url 指向回放地址、cooler/ups 的 port 指向输出的伪终端路径。
+"""
+import argparse
+import bisect
+import random
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from src.services.traffic_recorder import read_recording
+from src.simulators.alpaca_server import FAULT_DROP, FAULT_ERROR, FAULT_STALL, AlpacaStubServer
+from src.simulators.serial_device import FakeSerialDevice
+
+MEGATEC_STATUS_REQUEST = b'Q1\r'
+
+
+class ReplayClock:
+    """回放时钟：把经过的真实时间按 speed 倍换算为记录中的时刻"""
+
+    def __init__(self, speed: float = 1.0, start: float = 0.0, duration: Optional[float] = None,
+                 loop: bool = False):
+        self.speed = float(speed)
+        self.start = float(start)
+        self.duration = duration
+        self.loop = loop
+        self._origin = time.monotonic()
+
+    def reset(self):
+        self._origin = time.monotonic()
+
+    def now(self) -> float:
+        t = self.start + (time.monotonic() - self._origin) * self.speed
+        if self.loop and self.duration:
+            t %= self.duration
+        return t
+
+    @property
+    def finished(self) -> bool:
+        return not self.loop and self.duration is not None and self.now() >= self.duration
+
+
+class _Series:
+    """按时刻排序的一组记录"""
+
+    __slots__ = ('times', 'items')
+
+    def __init__(self):
+        self.times: List[float] = []
+        self.items: List[Any] = []
+
+    def add(self, t: float, item: Any):
+        if self.times and t < self.times[-1]:
+            index = bisect.bisect_right(self.times, t)
+            self.times.insert(index, t)
+            self.items.insert(index, item)
+        else:
+            self.times.append(t)
+            self.items.append(item)
+
+    def at(self, t: float) -> Any:
+        """t 之前（含）最近的一条；t 早于第一条时返回第一条"""
+        index = bisect.bisect_right(self.times, t) - 1
+        return self.items[max(index, 0)]
+
+
+class TrafficIndex:
+    """按端点和串口请求帧索引的通信记录"""
+
+    def __init__(self):
+        self.header: Dict[str, Any] = {}
+        self.duration = 0.0
+        self.http: Dict[Tuple[str, str], _Series] = {}
+        self.serial: Dict[str, Dict[bytes, _Series]] = {}
+        self.counts: Counter = Counter()
+
+    @classmethod
+    def load(cls, path: str) -> 'TrafficIndex':
+        index = cls()
+        header, events = read_recording(path)
+        index.header = header
+        exchanges: Dict[str, list] = {}
+        for event in events:
+            t = float(event.get('t', 0.0))
+            index.duration = max(index.duration, t)
+            kind = event.get('k')
+            if kind == 'http':
+                index.add_http(event)
+            elif kind == 'serial':
+                port = event['p']
+                current = exchanges.get(port)
+                if 'w' in event:
+                    if current is not None:
+                        index.add_exchange(port, *current)
+                    exchanges[port] = [t, bytes.fromhex(event['w']), bytearray(), None]
+                elif 'r' in event and current is not None:
+                    if current[3] is None:
+                        current[3] = t - current[0]
+                    current[2] += bytes.fromhex(event['r'])
+        for port, current in exchanges.items():
+            index.add_exchange(port, *current)
+        return index
+
+    def add_http(self, event: Dict[str, Any]):
+        path = urlsplit(event['u']).path.lower().rstrip('/')
+        self.http.setdefault((event['m'].upper(), path), _Series()).add(float(event.get('t', 0.0)), event)
+        self.counts['http'] += 1
+
+    def add_exchange(self, port: str, t: float, request: bytes, response, latency: Optional[float]):
+        series = self.serial.setdefault(port, {}).setdefault(bytes(request), _Series())
+        series.add(t, (bytes(response), latency or 0.0))
+        self.counts['serial'] += 1
+
+    def http_at(self, method: str, path: str, t: float) -> Optional[Dict[str, Any]]:
+        series = self.http.get((method.upper(), path.lower().rstrip('/')))
+        return series.at(t) if series is not None else None
+
+    def serial_at(self, port: str, request: bytes, t: float) -> Optional[Tuple[bytes, float]]:
+        series = self.serial.get(port, {}).get(bytes(request))
+        return series.at(t) if series is not None else None
+
+    def serial_kind(self, port: str) -> str:
+        """按请求帧判断串口设备类型（Megatec Q1 为 UPS，其余为 Modbus 水冷机）"""
+        requests = self.serial.get(port, {})
+        return 'ups' if any(request.strip() == MEGATEC_STATUS_REQUEST.strip() for request in requests) else 'cooler'
+
+
+def recorded_fault(event: Optional[Dict[str, Any]]) -> Optional[str]:
+    """记录中的失败对应的故障类型"""
+    if event is None:
+        return None
+    if 'e' in event:
+        return FAULT_STALL if 'timeout' in event['e'].lower() else FAULT_DROP
+    if int(event.get('s') or 200) >= 500:
+        return FAULT_ERROR
+    return None
+
+
+class ReplayAlpacaServer(AlpacaStubServer):
+    """按回放时钟应答记录中的 Alpaca 响应"""
+
+    def __init__(self, index: TrafficIndex, clock: ReplayClock, replay_faults: bool = True,
+                 recorded_latency: bool = False, **kwargs):
+        """
+        初始化回放服务器
+
+        Args:
+            index: 通信记录索引
+            clock: 回放时钟
+            replay_faults: 是否重现记录中的失败（超时、断开、HTTP 5xx）
+            recorded_latency: 是否按记录的耗时（除以回放速度）延迟响应
+            **kwargs: 传给 AlpacaStubServer（host、port、latency、jitter、fault_rate 等）
+        """
+        super().__init__(**kwargs)
+        self.index = index
+        self.clock = clock
+        self.replay_faults = replay_faults
+        self.recorded_latency = recorded_latency
+        self.replay_counts = Counter()
+
+    def _recorded(self, method: str, device_type: str, device_number: int, endpoint: str):
+        return self.index.http_at(method, f"/api/v1/{device_type}/{device_number}/{endpoint}", self.clock.now())
+
+    def delay_for(self, device_type: str, device_number: int, endpoint: str, method: str = 'GET') -> float:
+        delay = super().delay_for(device_type, device_number, endpoint, method)
+        if self.recorded_latency:
+            event = self._recorded(method, device_type, device_number, endpoint)
+            if event is not None and 'e' not in event:
+                delay += float(event.get('d', 0.0)) / max(self.clock.speed, 1.0)
+        return delay
+
+    def fault_for(self, device_type: str, device_number: int, endpoint: str, method: str = 'GET') -> Optional[str]:
+        if self.replay_faults:
+            fault = recorded_fault(self._recorded(method, device_type, device_number, endpoint))
+            if fault is not None:
+                with self._lock:
+                    self.fault_counts[f"recorded_{fault}"] += 1
+                return fault
+        return super().fault_for(device_type, device_number, endpoint, method)
+
+    def handle_get(self, device_type: str, device_number: int, prop: str):
+        event = self._recorded('GET', device_type, device_number, prop)
+        body = event.get('r') if event is not None else None
+        if not isinstance(body, dict):
+            with self._lock:
+                self.replay_counts['fallback'] += 1
+            return super().handle_get(device_type, device_number, prop)
+        with self._lock:
+            self._request_counts[device_type] += 1
+            self.replay_counts['replayed'] += 1
+        return body.get('Value'), int(body.get('ErrorNumber') or 0), body.get('ErrorMessage') or ''
+
+    def handle_put(self, device_type: str, device_number: int, action: str, form: Dict[str, str]):
+        # 命令仍作用于桩服务器的状态（记录中的读数不受影响），应答取记录中同一时刻的结果
+        error_number, error_message = super().handle_put(device_type, device_number, action, form)
+        event = self._recorded('PUT', device_type, device_number, action)
+        body = event.get('r') if event is not None else None
+        if isinstance(body, dict):
+            with self._lock:
+                self.replay_counts['replayed'] += 1
+            return int(body.get('ErrorNumber') or 0), body.get('ErrorMessage') or ''
+        return error_number, error_message
+
+    def configured_devices(self):
+        event = self.index.http_at('GET', '/management/v1/configureddevices', self.clock.now())
+        body = event.get('r') if event is not None else None
+        if isinstance(body, dict) and isinstance(body.get('Value'), list):
+            return body['Value']
+        return super().configured_devices()
+
+
+class ReplaySerialDevice(FakeSerialDevice):
+    """按回放时钟应答记录中的串口响应帧"""
+
+    def __init__(self, index: TrafficIndex, recorded_port: str, clock: ReplayClock, delay: float = 0.0,
+                 replay_faults: bool = True, recorded_latency: bool = False, drop_rate: float = 0.0,
+                 seed: int = 0):
+        """
+        初始化串口回放
+
+        Args:
+            index: 通信记录索引
+            recorded_port: 记录中的串口名（如 COM20）
+            clock: 回放时钟
+            delay: 在记录之外额外的响应延迟（秒）
+            replay_faults: 记录中没有响应的请求是否同样不响应
+            recorded_latency: 是否按记录的响应耗时（除以回放速度）延迟
+            drop_rate: 额外随机不响应的请求比例
+            seed: 随机数种子
+        """
+        super().__init__(index.serial_kind(recorded_port), delay=delay)
+        self.index = index
+        self.recorded_port = recorded_port
+        self.clock = clock
+        self.replay_faults = replay_faults
+        self.recorded_latency = recorded_latency
+        self.drop_rate = drop_rate
+        self.replay_counts = Counter()
+        self._random = random.Random(seed)
+
+    def _respond(self, request: bytes) -> bytes:
+        if self.drop_rate and self._random.random() < self.drop_rate:
+            self.replay_counts['dropped'] += 1
+            return b''
+        found = self.index.serial_at(self.recorded_port, request, self.clock.now())
+        if found is None:
+            self.replay_counts['fallback'] += 1
+            return super()._respond(request)
+        response, latency = found
+        if not response:
+            if self.replay_faults:
+                self.replay_counts['recorded_timeout'] += 1
+                return b''
+            return super()._respond(request)
+        if self.recorded_latency and latency > 0:
+            time.sleep(latency / max(self.clock.speed, 1.0))
+        self.replay_counts['replayed'] += 1
+        return response
+
+
+class ReplayHarness:
+    """HTTP 回放服务器和各串口的伪终端，共用一个回放时钟"""
+
+    def __init__(self, path: str, speed: float = 1.0, start: float = 0.0, loop: bool = False,
+                 host: str = '127.0.0.1', port: int = 0, serial: bool = True, replay_faults: bool = True,
+                 recorded_latency: bool = False, latency: float = 0.0, jitter: float = 0.0,
+                 fault_rate: float = 0.0, stall_rate: float = 0.0, drop_rate: float = 0.0,
+                 stall_time: float = 10.0, serial_delay: float = 0.0, seed: int = 0):
+        self.index = TrafficIndex.load(path)
+        self.clock = ReplayClock(speed, start, self.index.duration, loop)
+        self.server = ReplayAlpacaServer(self.index, self.clock, replay_faults, recorded_latency,
+                                         host=host, port=port, latency=latency, jitter=jitter,
+                                         fault_rate=fault_rate, stall_rate=stall_rate, drop_rate=drop_rate,
+                                         stall_time=stall_time, seed=seed)
+        self.devices: Dict[str, ReplaySerialDevice] = {}
+        if serial:
+            for offset, recorded_port in enumerate(sorted(self.index.serial)):
+                self.devices[recorded_port] = ReplaySerialDevice(
+                    self.index, recorded_port, self.clock, serial_delay, replay_faults, recorded_latency,
+                    drop_rate, seed + offset + 1)
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        return self.server.base_url
+
+    @property
+    def serial_ports(self) -> Dict[str, Tuple[str, str]]:
+        """记录中的串口名 -> (设备类型, 伪终端路径)"""
+        return {name: (device.kind, device.port) for name, device in self.devices.items()}
+
+    def start(self):
+        self.server.start()
+        for device in self.devices.values():
+            device.start()
+        self.clock.reset()
+        return self
+
+    def stop(self):
+        for device in self.devices.values():
+            device.stop()
+        self.server.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='设备通信回放')
+    parser.add_argument('recording', help='traffic_recorder 记录的文件')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址')
+    parser.add_argument('--port', type=int, default=11111, help='HTTP 监听端口')
+    parser.add_argument('--speed', type=float, default=1.0, help='回放速度倍数')
+    parser.add_argument('--start', type=float, default=0.0, help='从记录的第几秒开始')
+    parser.add_argument('--loop', action='store_true', help='回放到结尾后从头开始')
+    parser.add_argument('--no-serial', action='store_true', help='不回放串口')
+    parser.add_argument('--no-recorded-faults', action='store_true', help='不重现记录中的失败')
+    parser.add_argument('--recorded-latency', action='store_true', help='按记录的耗时（除以回放速度）延迟响应')
+    parser.add_argument('--latency', type=float, default=0.0, help='每个 HTTP 请求额外的延迟（毫秒）')
+    parser.add_argument('--jitter', type=float, default=0.0, help='每个 HTTP 请求额外的随机延迟上限（毫秒）')
+    parser.add_argument('--fault-rate', type=float, default=0.0, help='返回 HTTP 500 的请求比例')
+    parser.add_argument('--stall-rate', type=float, default=0.0, help='长时间不响应的 HTTP 请求比例')
+    parser.add_argument('--drop-rate', type=float, default=0.0, help='直接断开连接 / 串口不响应的请求比例')
+    parser.add_argument('--serial-delay', type=float, default=0.0, help='串口额外的响应延迟（毫秒）')
+    parser.add_argument('--seed', type=int, default=0, help='抖动和故障注入的随机数种子')
+    args = parser.parse_args()
+
+    harness = ReplayHarness(args.recording, speed=args.speed, start=args.start, loop=args.loop,
+                            host=args.host, port=args.port, serial=not args.no_serial,
+                            replay_faults=not args.no_recorded_faults, recorded_latency=args.recorded_latency,
+                            latency=args.latency / 1000.0, jitter=args.jitter / 1000.0,
+                            fault_rate=args.fault_rate, stall_rate=args.stall_rate, drop_rate=args.drop_rate,
+                            serial_delay=args.serial_delay / 1000.0, seed=args.seed).start()
+    index = harness.index
+    print(f"记录 {args.recording}: {index.duration / 3600:.2f} 小时，HTTP {index.counts['http']} 条，"
+          f"串口交互 {index.counts['serial']} 次；回放速度 x{args.speed:g}")
+    print(f"Alpaca 回放: {harness.base_url}")
+    for name, (kind, path) in harness.serial_ports.items():
+        print(f"串口 {name}（{kind}）: {path}")
+    try:
+        while not harness.clock.finished:
+            time.sleep(1)
+        print("回放结束")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        harness.stop()
+
+
+if __name__ == '__main__':
+    main()
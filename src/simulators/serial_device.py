@@ -0,0 +1,183 @@
+"""
+基于伪终端（pty）的串口设备模拟器
+
+模拟水冷机（Modbus RTU 读保持寄存器）和 UPS（Megatec Q1），向 pyserial 暴露一个真实的串口设备路径，
+可设置响应延迟或让设备停止响应，用于在没有硬件的情况下测试串口传输层。仅支持 Linux/macOS。
+
+用法:
+    python -m src.simulators.serial_device --kind cooler --delay 50
+"""
+import argparse
+import os
+import select
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from src.services.serial_transport import crc16_modbus
+
+DEFAULT_STATES = {
+    'cooler': {
+        'temperature': 18.5,
+        'status_bits': 0x80 | 0x20 | 0x08 | 0x01,   # 运行、制冷、水泵、电源
+    },
+    'ups': {
+        'input_voltage': 230.0,
+        'fault_voltage': 230.0,
+        'output_voltage': 229.8,
+        'load': 12,
+        'input_frequency': 50.0,
+        'battery_voltage': 13.2,
+        'temperature': 30.0,
+        'status_bits': '00000000',
+    },
+}
+
+
+class FakeSerialDevice:
+    """伪终端串口设备"""
+
+    def __init__(self, kind: str = 'cooler', delay: float = 0.0, address: int = 1):
+        """
+        初始化模拟设备
+
+        Args:
+            kind: 'cooler' 或 'ups'
+            delay: 收到请求后的响应延迟（秒）
+            address: 水冷机的 Modbus 地址
+        """
+        if kind not in DEFAULT_STATES:
+            raise ValueError(f"不支持的设备类型: {kind}")
+        self.kind = kind
+        self.delay = delay
+        self.address = address
+        self.state: Dict[str, Any] = dict(DEFAULT_STATES[kind])
+        self.silent = False
+        self.requests = 0
+        self._master: Optional[int] = None
+        self._slave: Optional[int] = None
+        self.port = ''
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """创建伪终端并在后台线程中应答"""
+        self._master, self._slave = os.openpty()
+        self.port = os.ttyname(self._slave)
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=f"FakeSerialDevice-{self.kind}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止应答并关闭伪终端"""
+        self._running = False
+        if self._thread:
+            self._thread.join(timeout=1)
+        for fd in (self._master, self._slave):
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        self._master = self._slave = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def set_state(self, **values):
+        """修改设备状态"""
+        with self._lock:
+            self.state.update(values)
+
+    def _run(self):
+        buffer = bytearray()
+        while self._running:
+            try:
+                readable, _, _ = select.select([self._master], [], [], 0.05)
+                if not readable:
+                    continue
+                buffer += os.read(self._master, 1024)
+            except OSError:
+                return
+            for request in self._split(buffer):
+                self.requests += 1
+                if self.silent:
+                    continue
+                response = self._respond(request)
+                if response:
+                    if self.delay > 0:
+                        time.sleep(self.delay)
+                    os.write(self._master, response)
+
+    def _split(self, buffer: bytearray):
+        if self.kind == 'ups':
+            while b'\r' in buffer:
+                end = buffer.index(b'\r')
+                yield bytes(buffer[:end + 1])
+                del buffer[:end + 1]
+            return
+        while len(buffer) >= 8:
+            frame = bytes(buffer[:8])
+            if crc16_modbus(frame[:6]) != (frame[6] | frame[7] << 8):
+                del buffer[0]
+                continue
+            del buffer[:8]
+            yield frame
+
+    def _respond(self, request: bytes) -> bytes:
+        with self._lock:
+            state = dict(self.state)
+        if self.kind == 'ups':
+            if request.strip() != b'Q1':
+                return b''
+            return (f"({state['input_voltage']:05.1f} {state['fault_voltage']:05.1f} "
+                    f"{state['output_voltage']:05.1f} {state['load']:03d} {state['input_frequency']:04.1f} "
+                    f"{state['battery_voltage']:04.2f} {state['temperature']:04.1f} {state['status_bits']}\r"
+                    ).encode('ascii')
+
+        address, function = request[0], request[1]
+        if address != self.address:
+            return b''
+        if function != 3:
+            body = bytearray([address, function | 0x80, 1])
+        else:
+            count = request[4] << 8 | request[5]
+            temperature = state['temperature']
+            if temperature == float('inf'):
+                temp_raw = 0x7FFF
+            elif temperature == float('-inf'):
+                temp_raw = 0x8001
+            else:
+                temp_raw = int(round(temperature * 10)) & 0xFFFF
+            registers = [temp_raw, 0, state['status_bits']] + [0] * max(0, count - 3)
+            body = bytearray([address, function, count * 2])
+            for value in registers[:count]:
+                body += bytes([value >> 8, value & 0xFF])
+        crc = crc16_modbus(body)
+        return bytes(body + bytes([crc & 0xFF, crc >> 8]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='基于伪终端的串口设备模拟器')
+    parser.add_argument('--kind', choices=sorted(DEFAULT_STATES), default='cooler', help='设备类型')
+    parser.add_argument('--delay', type=float, default=50.0, help='响应延迟（毫秒）')
+    args = parser.parse_args()
+
+    device = FakeSerialDevice(args.kind, delay=args.delay / 1000.0).start()
+    print(f"模拟{args.kind}已启动，串口: {device.port}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        device.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+"""
+本地 DSS 巡天图像桩服务器
+
+模拟 https://archive.stsci.edu/cgi-bin/dss_search：按请求的坐标生成确定性的合成星场 GIF，
+可设置人为延迟，用于在不访问外网的情况下测试 DSS 图像缓存和预取。
+
+用法:
+    python -m src.simulators.survey_server --port 8765 --latency 1500
+"""
+import argparse
+import math
+import random
+import struct
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+DSS_PATH = '/cgi-bin/dss_search'
+
+
+def encode_gif(pixels: bytes, width: int, height: int) -> bytes:
+    """
+    把 8 位灰度像素编码为 GIF
+
+    使用不压缩的 LZW 写法：每 250 个像素插入一次清除码，码宽始终为 9 位，实现简单且任何解码器都能读取。
+    """
+    header = b'GIF89a' + struct.pack('<HHBBB', width, height, 0xF7, 0, 0)
+    palette = b''.join(bytes((i, i, i)) for i in range(256))
+    descriptor = b',' + struct.pack('<HHHHB', 0, 0, width, height, 0)
+
+    clear, end = 256, 257
+    bits = 0
+    nbits = 0
+    out = bytearray()
+
+    def emit(code):
+        nonlocal bits, nbits
+        bits |= code << nbits
+        nbits += 9
+        while nbits >= 8:
+            out.append(bits & 0xFF)
+            bits >>= 8
+            nbits -= 8
+
+    for i, value in enumerate(pixels):
+        if i % 250 == 0:
+            emit(clear)
+        emit(value)
+    emit(end)
+    if nbits:
+        out.append(bits & 0xFF)
+
+    blocks = bytearray()
+    for i in range(0, len(out), 255):
+        chunk = out[i:i + 255]
+        blocks.append(len(chunk))
+        blocks += chunk
+    return header + palette + descriptor + bytes([8]) + bytes(blocks) + b'\x00;'
+
+
+def render_field(ra: float, dec: float, size: int = 400) -> bytes:
+    """按坐标生成确定性的合成星场（背景加若干高斯星点）"""
+    rng = random.Random(f"{ra:.4f},{dec:.4f}")
+    image = bytearray(rng.randrange(20, 36) for _ in range(size * size))
+    for _ in range(60):
+        cx, cy = rng.randrange(size), rng.randrange(size)
+        peak = rng.randrange(80, 255)
+        for dy in range(-3, 4):
+            for dx in range(-3, 4):
+                x, y = cx + dx, cy + dy
+                if 0 <= x < size and 0 <= y < size:
+                    value = int(peak * math.exp(-(dx * dx + dy * dy) / 2.0))
+                    index = y * size + x
+                    image[index] = min(255, image[index] + value)
+    return encode_gif(bytes(image), size, size)
+
+
+class SurveyStubServer:
+    """本地 DSS 桩服务器"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0,
+                 image_size: int = 400):
+        """
+        初始化桩服务器
+
+        Args:
+            host: 监听地址
+            port: 监听端口，0 表示由系统分配
+            latency: 每个请求的人为延迟（秒），真实 DSS 服务通常需要 1~3 秒
+            image_size: 返回图像的边长（像素）
+        """
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.image_size = image_size
+        self.requests = Counter()
+        self.max_concurrent = 0
+        self._active = 0
+        self._lock = threading.Lock()
+        self._httpd: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """与 astronomy_service.dss_url 对应的检索地址"""
+        return f"http://{self.host}:{self.port}{DSS_PATH}"
+
+    @property
+    def request_count(self) -> int:
+        with self._lock:
+            return sum(self.requests.values())
+
+    def reset_counters(self):
+        with self._lock:
+            self.requests.clear()
+            self.max_concurrent = 0
+
+    def start(self):
+        """在后台线程中启动服务器"""
+        self._httpd = ThreadingHTTPServer((self.host, self.port), _make_handler(self))
+        self._httpd.daemon_threads = True
+        self.port = self._httpd.server_address[1]
+        self._thread = threading.Thread(target=self._httpd.serve_forever,
+                                        name='SurveyStubServer', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止服务器"""
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+        if self._thread:
+            self._thread.join(timeout=2)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def handle(self, params) -> bytes:
+        ra = float(params.get('r', ['0'])[0])
+        dec = float(params.get('d', ['0'])[0])
+        with self._lock:
+            self.requests[(round(ra, 4), round(dec, 4))] += 1
+            self._active += 1
+            self.max_concurrent = max(self.max_concurrent, self._active)
+        try:
+            if self.latency > 0:
+                time.sleep(self.latency)
+            return render_field(ra, dec, self.image_size)
+        finally:
+            with self._lock:
+                self._active -= 1
+
+
+def _make_handler(server: SurveyStubServer):
+    class SurveyStubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            parsed = urlparse(self.path)
+            if parsed.path != DSS_PATH:
+                self.send_error(404)
+                return
+            body = server.handle(parse_qs(parsed.query))
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/gif')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return SurveyStubHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地 DSS 巡天图像桩服务器')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址')
+    parser.add_argument('--port', type=int, default=8765, help='监听端口')
+    parser.add_argument('--latency', type=float, default=1500.0, help='每个请求的人为延迟（毫秒）')
+    args = parser.parse_args()
+
+    server = SurveyStubServer(args.host, args.port, latency=args.latency / 1000.0).start()
+    print(f"DSS 桩服务器已启动: {server.url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,330 @@
+"""
+分层缓存的角度可视化控件
+
+主窗口的 AngleVisualizer 在 DSSImageFetcher.image_ready 时由 set_background(image_path) 重新解码星图，
+消旋器每次轮询由 update_rotator_status（接入状态总线后为 'pointing' 订阅者）调用 set_angles，
+每次都立即 update()，paintEvent 连同背景图一起整幅重绘。消旋器轮询频率较高时，界面线程的时间主要花在
+重复绘制背景上。本模块的 CachedAngleVisualizer 与原控件接口和绘制结果一致，但分成两层：
+  - 背景层：解码后的星图按 (文件路径, 修改时间, 大小) 只解码一次；按可用边长和设备像素比预先缩放的
+    QPixmap 放在 LRU 缓存中；星图（或灰色底）和中心点合成为一张不透明的 QPixmap，
+    只在星图、控件尺寸或设备像素比变化时重建，重绘时只需一次贴图
+  - 矢量层：Dec 框、Rot 框、方向箭头和夹角弧线，每次重绘时绘制
+同一个文件再次触发 image_ready 且内容未变时不重新解码；set_angles 数值不变时不重绘，数值变化时
+按屏幕刷新率（或配置的 max_frame_rate）合并重绘请求，两帧之间的多次调用只绘制最后一次的角度。
+
+用法（在创建主窗口之前调用，主窗口构造时会使用替换后的控件类）:
+    from src.ui.angle_visualizer import install_angle_visualizer
+    install_angle_visualizer(MainWindow)
+
+之后可以通过 window.angle_visualizer.stats 查看合并的重绘次数和背景缩放次数。
+"""
+import logging
+import math
+import os
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from PyQt5.QtCore import QPoint, Qt, QTimer
+from PyQt5.QtGui import QColor, QGuiApplication, QImage, QPainter, QPen, QPixmap
+from PyQt5.QtWidgets import QSizePolicy, QWidget
+
+from src.config.config_service import get_config_service
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS = {
+    'max_frame_rate': 0,   # 角度变化时的最高重绘频率（次/秒），0 表示使用屏幕刷新率
+    'cache_size': 4,       # 预缩放背景的缓存数量（星图 × 边长）
+}
+
+# 无法取得屏幕刷新率时使用的默认值
+DEFAULT_REFRESH_RATE = 60.0
+
+# 背景图的缓存键：(绝对路径, 修改时间 ns, 文件大小)
+ImageKey = Tuple[str, int, int]
+
+
+def visualizer_settings(overrides: Optional[Mapping[str, Any]] = None) -> Dict[str, Any]:
+    """合并默认值、config.yaml angle_visualizer 段和调用参数"""
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update(get_config_service().get('angle_visualizer', {}) or {})
+    settings.update(overrides or {})
+    return settings
+
+
+def image_key(image_path: str) -> Optional[ImageKey]:
+    """星图文件的缓存键；文件不存在时返回 None"""
+    try:
+        stat = os.stat(image_path)
+    except OSError:
+        return None
+    return os.path.abspath(image_path), stat.st_mtime_ns, stat.st_size
+
+
+class CachedAngleVisualizer(QWidget):
+    """画幅赤纬方向与消旋器角度的可视化，背景层缓存、重绘按刷新率合并"""
+
+    def __init__(self, parent=None, settings: Optional[Mapping[str, Any]] = None):
+        super().__init__(parent)
+        self.settings = visualizer_settings(settings)
+        self.dec_angle = 0
+        self.rotator_angle = 0
+        self.last_rotator_angle = 0
+        # 与原控件相同的属性：解码后的原图和当前尺寸下预缩放的背景
+        self.original_image = None
+        self.background_image = None
+        self.setMinimumSize(250, 250)
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+        self.setContentsMargins(10, 10, 10, 10)
+
+        self._image_key: Optional[ImageKey] = None
+        self._scaled: 'OrderedDict[Tuple[ImageKey, int, float], QPixmap]' = OrderedDict()
+        self._layer: Optional[Tuple[QPoint, QPixmap]] = None
+        self._layer_key = None
+        self._pending = False
+        self._last_frame = 0.0
+        self._frame_timer = QTimer(self)
+        self._frame_timer.setSingleShot(True)
+        self._frame_timer.timeout.connect(self._request_paint)
+        self.stats = {'angle_updates': 0, 'unchanged': 0, 'coalesced': 0, 'paints': 0, 'paint_seconds': 0.0,
+                      'decodes': 0, 'decode_skipped': 0, 'scales': 0, 'layer_builds': 0}
+
+    # ------------------------------------------------------------------
+    # 背景层
+    # ------------------------------------------------------------------
+    def set_background(self, image_path):
+        """设置 DSS 星图；同一文件内容未变时不重新解码"""
+        if not image_path:
+            return
+        key = image_key(image_path)
+        if key is None:
+            return
+        if key == self._image_key and self.original_image is not None:
+            self.stats['decode_skipped'] += 1
+            return
+        logger.debug("加载背景图片: %s", image_path)
+        image = QImage(image_path)
+        self.stats['decodes'] += 1
+        if image.isNull():
+            logger.warning("图片加载失败: %s", image_path)
+            return
+        self.original_image = image
+        self._image_key = key
+        logger.debug("图片加载成功: 原始尺寸 %dx%d", image.width(), image.height())
+        self.update_background_image()
+        self.update()
+
+    def update_background_image(self):
+        """按当前可用尺寸取得预缩放的背景，并让背景层在下次重绘时重建"""
+        self._layer = None
+        if self.original_image is None:
+            return
+        _, _, available_size = self._geometry()
+        self.background_image = self._scaled_background(available_size)
+
+    def _geometry(self) -> Tuple[float, float, int]:
+        """(中心 x, 中心 y, 可用边长)，与原控件的计算一致"""
+        margins = self.contentsMargins()
+        available_width = self.width() - margins.left() - margins.right()
+        available_height = self.height() - margins.top() - margins.bottom()
+        center_x = margins.left() + available_width / 2
+        center_y = margins.top() + available_height / 2
+        return center_x, center_y, min(available_width, available_height)
+
+    def _scaled_background(self, available_size: int) -> Optional[QPixmap]:
+        """按可用边长和设备像素比缩放原图，结果按 (星图, 边长, 像素比) 缓存"""
+        if available_size <= 0:
+            return None
+        ratio = self.devicePixelRatioF()
+        key = (self._image_key, available_size, ratio)
+        pixmap = self._scaled.get(key)
+        if pixmap is not None:
+            self._scaled.move_to_end(key)
+            return pixmap
+        side = int(round(available_size * ratio))
+        scaled = self.original_image.scaled(side, side, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        pixmap = QPixmap.fromImage(scaled)
+        pixmap.setDevicePixelRatio(ratio)
+        self.stats['scales'] += 1
+        self._scaled[key] = pixmap
+        while len(self._scaled) > max(1, int(self.settings['cache_size'])):
+            self._scaled.popitem(last=False)
+        return pixmap
+
+    def _background_layer(self) -> Tuple[QPoint, QPixmap]:
+        """
+        背景层：星图（或灰色底）加中心点，返回 (左上角, 图层)
+
+        图层只覆盖星图或灰色底所在的矩形，不透明的星图可以直接贴图而不需要逐像素混合；
+        星图、控件尺寸或像素比变化时重建。
+        """
+        ratio = self.devicePixelRatioF()
+        center_x, center_y, available_size = self._geometry()
+        key = (self._image_key, self.width(), self.height(), center_x, center_y, ratio)
+        if self._layer is not None and self._layer_key == key:
+            return self._layer
+        if self.original_image is not None:
+            self.background_image = self._scaled_background(available_size)
+        background = self.background_image if self.original_image is not None else None
+        if background is not None:
+            width, height = background.width(), background.height()
+            origin = QPoint(int(center_x - width / ratio / 2), int(center_y - height / ratio / 2))
+        else:
+            margins = self.contentsMargins()
+            width = math.ceil(max(1, self.width() - margins.left() - margins.right()) * ratio)
+            height = math.ceil(max(1, self.height() - margins.top() - margins.bottom()) * ratio)
+            origin = QPoint(margins.left(), margins.top())
+        layer = QPixmap(max(1, width), max(1, height))
+        layer.setDevicePixelRatio(ratio)
+        if background is not None and background.hasAlphaChannel():
+            layer.fill(Qt.transparent)
+        painter = QPainter(layer)
+        painter.setRenderHint(QPainter.Antialiasing)
+        if background is not None:
+            painter.drawPixmap(0, 0, background)
+        else:
+            painter.fillRect(layer.rect(), QColor(240, 240, 240))
+        painter.setOpacity(0.7)
+        painter.setBrush(QColor(100, 100, 100))
+        painter.setPen(Qt.NoPen)
+        painter.drawEllipse(int(center_x - 3) - origin.x(), int(center_y - 3) - origin.y(), 6, 6)
+        painter.end()
+        self._layer = (origin, layer)
+        self._layer_key = key
+        self.stats['layer_builds'] += 1
+        return self._layer
+
+    def resizeEvent(self, event):
+        # 背景层的缓存键已包含控件尺寸，尺寸未变的 resize 事件（如隐藏控件 grab 时补发的）不重建
+        super().resizeEvent(event)
+        self.update()
+
+    # ------------------------------------------------------------------
+    # 角度与重绘合并
+    # ------------------------------------------------------------------
+    def set_angles(self, dec_angle, rotator_angle):
+        """设置赤纬方向和消旋器角度；数值不变时不重绘，变化时按刷新率合并重绘"""
+        self.stats['angle_updates'] += 1
+        self.last_rotator_angle = rotator_angle
+        if dec_angle == self.dec_angle and rotator_angle == self.rotator_angle:
+            self.stats['unchanged'] += 1
+            return
+        self.rotator_angle = rotator_angle
+        self.dec_angle = dec_angle
+        self._schedule_paint()
+
+    def frame_interval(self) -> float:
+        """两次角度重绘之间的最短间隔（秒）"""
+        rate = float(self.settings['max_frame_rate'] or 0)
+        if rate <= 0:
+            screen = self.screen() if self.isVisible() else QGuiApplication.primaryScreen()
+            rate = screen.refreshRate() if screen is not None else 0
+        return 1.0 / (rate if rate > 0 else DEFAULT_REFRESH_RATE)
+
+    def _schedule_paint(self):
+        if self._pending or self._frame_timer.isActive():
+            self.stats['coalesced'] += 1
+            return
+        wait = self.frame_interval() - (time.perf_counter() - self._last_frame)
+        if wait > 0:
+            self._frame_timer.start(math.ceil(wait * 1000))
+        else:
+            self._request_paint()
+
+    def _request_paint(self):
+        self._pending = True
+        self.update()
+
+    # ------------------------------------------------------------------
+    # 绘制
+    # ------------------------------------------------------------------
+    def paintEvent(self, event):
+        start = time.perf_counter()
+        self._pending = False
+        self._last_frame = start
+        center_x, center_y, size = self._geometry()
+        origin, layer = self._background_layer()
+        painter = QPainter(self)
+        painter.drawPixmap(origin, layer)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setOpacity(0.7)
+        self._draw_overlay(painter, center_x, center_y, size)
+        painter.end()
+        self.stats['paints'] += 1
+        self.stats['paint_seconds'] += time.perf_counter() - start
+
+    def _draw_overlay(self, painter: QPainter, center_x: float, center_y: float, size: int):
+        """矢量层：Dec 框、Rot 框、方向箭头和两者之间的夹角弧线"""
+        rect_size = int(size * 0.8)
+        arrow_y = -rect_size // 2
+
+        painter.save()
+        painter.translate(center_x, center_y)
+        painter.rotate(self.dec_angle)
+        painter.setPen(QPen(QColor(0, 0, 255), 2))
+        painter.drawRect(-20, -rect_size // 2, 40, rect_size)
+        painter.drawLine(0, arrow_y - 10, -10, arrow_y + 10)
+        painter.drawLine(0, arrow_y - 10, 10, arrow_y + 10)
+        painter.drawText(-20, -rect_size // 2 - 15, 'Dec')
+        painter.restore()
+
+        painter.save()
+        painter.translate(center_x, center_y)
+        painter.rotate(self.rotator_angle)
+        painter.setPen(QPen(QColor(255, 0, 0), 2))
+        painter.setBrush(QColor(255, 200, 200, 50))
+        painter.drawRect(-30, -rect_size // 2, 60, rect_size)
+        painter.drawLine(0, arrow_y - 10, -10, arrow_y + 10)
+        painter.drawLine(0, arrow_y - 10, 10, arrow_y + 10)
+        painter.drawText(-20, -rect_size // 2 - 15, 'Rot')
+        painter.restore()
+
+        angle_diff = abs(self.rotator_angle - self.dec_angle) % 360
+        if angle_diff > 180:
+            angle_diff = 360 - angle_diff
+        painter.save()
+        painter.translate(center_x, center_y)
+        start_angle = min(self.dec_angle, self.rotator_angle)
+        end_angle = max(self.dec_angle, self.rotator_angle)
+        if end_angle - start_angle > 180:
+            start_angle, end_angle = end_angle, start_angle + 360
+        painter.setPen(QPen(QColor(0, 255, 0), 2))
+        radius = int(size * 0.2)
+        qt_start = (90 - start_angle) % 360 * 16
+        qt_span = -((end_angle - start_angle) % 360) * 16
+        painter.drawArc(-radius, -radius, 2 * radius, 2 * radius, int(qt_start), int(qt_span))
+
+        mid_angle = start_angle + (end_angle - start_angle) / 2
+        text_radius = radius * 1.2
+        text_x = math.cos(math.radians(mid_angle)) * text_radius
+        text_y = -math.sin(math.radians(mid_angle)) * text_radius
+        painter.save()
+        painter.translate(text_x, text_y)
+        painter.rotate(-mid_angle)
+        painter.drawText(-20, 0, f"{angle_diff:.1f}°")
+        painter.restore()
+        painter.restore()
+
+
+def install_angle_visualizer(window_cls):
+    """
+    让主窗口构造时使用 CachedAngleVisualizer
+
+    主窗口模块在导入时从 components 取得 AngleVisualizer，构造时按模块全局名创建控件，
+    因此替换模块中的名字即可，必须在创建主窗口实例之前调用。
+
+    Args:
+        window_cls: 主窗口类（MainWindow）
+
+    Returns:
+        传入的类，便于用作装饰器
+    """
+    module = sys.modules.get(window_cls.__module__)
+    if module is None or not hasattr(module, 'AngleVisualizer'):
+        logger.warning("主窗口模块中没有 AngleVisualizer，保留原控件")
+        return window_cls
+    module.AngleVisualizer = CachedAngleVisualizer
+    logger.info("角度可视化已改用分层缓存控件")
+    return window_cls
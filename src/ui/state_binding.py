@@ -0,0 +1,205 @@
+"""
+主窗口接入设备状态总线
+
+主窗口原来在 calculate_frame_dec_angle（update_time_info 中每 30 秒一次）和 update_rotator_status 里
+从 telescope_status 的赤经、赤纬标签和 focuser_status 的 angle 标签读回文本，再解析成数字计算旁行角、
+判断是否需要更新 DSS 星图。接入后：
+  - 各状态更新方法照常刷新显示；设备没有接入 StateStore 的数据源时（connect_sources），同时把收到的状态
+    发布到 StateStore。轮询线程已直接发布的设备不再由界面线程重复发布，订阅者每个读数只收到一次
+  - 画幅夹角、角度可视化和 DSS 星图改为订阅 StateStore 的 'pointing' 和 'dss_target' 派生值，
+    只在望远镜或消旋器的数值变化、或旁行角超过 max_age 未计算时更新，不再读取标签文本
+  - calculate_frame_dec_angle 改为要求重新计算 'pointing'；水冷机由 SerialTransport 推送状态时
+    不再需要每 5 秒强制刷新的 cooler_refresh_timer
+  - 环境监测组增加全天相机分析的云量、天空亮度和星数标签，订阅 'allsky' 更新
+    （未配置 sky_zero_point 时天空亮度标签显示天顶背景 ADU）
+
+用法（在 install_ui_binding 之后、创建主窗口之前调用 install_state_binding，创建之后调用 attach_state_store）:
+    install_ui_binding(MainWindow)
+    install_state_binding(MainWindow)
+    window = MainWindow([])
+    attach_state_store(window)
+"""
+import logging
+from typing import Dict, Optional
+
+from src.services.state_store import StateStore, get_state_store
+from src.ui.ui_binding import ALLSKY_FIELDS, get_binder, render_allsky
+
+logger = logging.getLogger(__name__)
+
+# 主窗口方法 -> 发布到的设备键（方法参数为状态字典）
+PUBLISHED_METHODS: Dict[str, str] = {
+    'update_telescope_status': 'telescope',
+    'update_focuser_status': 'focuser',
+    'update_weather_info': 'ObservingConditions',
+    'update_dome_status': 'dome',
+    'update_cooler_status': 'cooler',
+    'update_ups_status': 'ups',
+}
+
+
+def format_ra(ra: float) -> str:
+    """赤经（小时）格式化为 'HH:MM:SS'，与主窗口 update_coordinates 一致"""
+    ra_h = int(ra)
+    ra_m = int((ra - ra_h) * 60)
+    ra_s = int(((ra - ra_h) * 60 - ra_m) * 60)
+    return f"{ra_h:02d}:{ra_m:02d}:{ra_s:02d}"
+
+
+def format_dec(dec: float) -> str:
+    """赤纬（度）格式化为 '+DD:MM:SS'，与主窗口 update_coordinates 一致"""
+    dec_sign = '+' if dec >= 0 else '-'
+    dec_abs = abs(dec)
+    dec_d = int(dec_abs)
+    dec_m = int((dec_abs - dec_d) * 60)
+    dec_s = int(((dec_abs - dec_d) * 60 - dec_m) * 60)
+    return f"{dec_sign}{dec_d:02d}:{dec_m:02d}:{dec_s:02d}"
+
+
+def _store_of(window) -> StateStore:
+    store = getattr(window, '_state_store', None)
+    return store if store is not None else get_state_store()
+
+
+def _publish(window, device: str, status):
+    """设备没有数据源直接发布时，把界面收到的状态发布到状态总线"""
+    store = _store_of(window)
+    if not store.has_source(device):
+        store.publish(device, status)
+
+
+def _publishing(name: str, device: str, previous):
+    def update(self, status):
+        previous(self, status)
+        if status:
+            _publish(self, device, status)
+    update.__name__ = name
+    update.__doc__ = f"{previous.__doc__ or name}（同时发布到状态总线 {device}）"
+    return update
+
+
+def _publishing_coordinates(previous):
+    def update_coordinates(self, ra, dec, alt, az):
+        """更新望远镜坐标信息（同时发布到状态总线 telescope）"""
+        previous(self, ra, dec, alt, az)
+        _publish(self, 'telescope', {'rightascension': ra, 'declination': dec, 'altitude': alt, 'azimuth': az})
+    return update_coordinates
+
+
+def _update_rotator_status(self, status):
+    """更新消旋器角度显示并发布到状态总线；旁行角由 'pointing' 订阅者更新"""
+    position = status.get('position') if status else None
+    if position is None:
+        return
+    pair = self.focuser_status.pairs.get('angle')
+    if pair is not None:
+        get_binder(self).set(pair, f"{position:.2f}°")
+    _publish(self, 'rotator', status)
+
+
+def _calculate_frame_dec_angle(self):
+    """要求状态总线重新计算旁行角（结果由 'pointing' 订阅者显示）"""
+    _store_of(self).refresh('pointing')
+
+
+def install_state_binding(window_cls):
+    """
+    让主窗口类的状态更新方法把状态发布到状态总线
+
+    Args:
+        window_cls: 主窗口类（MainWindow），应已调用过 install_ui_binding
+
+    Returns:
+        传入的类，便于用作装饰器
+    """
+    for name, device in PUBLISHED_METHODS.items():
+        previous = getattr(window_cls, name, None)
+        if previous is not None:
+            setattr(window_cls, name, _publishing(name, device, previous))
+    if hasattr(window_cls, 'update_coordinates'):
+        window_cls.update_coordinates = _publishing_coordinates(window_cls.update_coordinates)
+    window_cls.update_rotator_status = _update_rotator_status
+    window_cls.calculate_frame_dec_angle = _calculate_frame_dec_angle
+    logger.info("主窗口已接入设备状态总线")
+    return window_cls
+
+
+def _on_pointing(window, snapshot, changed):
+    binder = get_binder(window)
+    frame_dec_angle = snapshot.get('frame_dec_angle')
+    pair = window.telescope_status.pairs.get('frame_dec_angle')
+    if frame_dec_angle is not None and pair is not None:
+        binder.set(pair, f"{frame_dec_angle:.6f}°")
+    visualizer = getattr(window, 'angle_visualizer', None)
+    if visualizer is not None and changed & {'declination', 'rotator_angle'}:
+        visualizer.set_angles(snapshot.get('declination', 0.0), snapshot.get('rotator_angle', 0.0))
+
+
+def _on_dss_target(window, snapshot, changed):
+    fetcher = getattr(window, 'dss_fetcher', None)
+    if fetcher is not None:
+        fetcher.set_coordinates(format_ra(snapshot['rightascension']), format_dec(snapshot['declination']))
+
+
+def _on_allsky(window, snapshot, changed):
+    environment = getattr(window, 'environment', None)
+    if environment is not None:
+        get_binder(window).apply(environment.pairs, render_allsky(snapshot.as_dict()))
+
+
+def _add_allsky_items(window):
+    """在环境监测组中（气象站数据之后）添加全天相机分析的标签"""
+    environment = getattr(window, 'environment', None)
+    if environment is None or not hasattr(environment, 'add_item'):
+        return
+    for _field, key, _fmt in ALLSKY_FIELDS:
+        if key not in environment.pairs:
+            environment.add_item(key, '--', 'medium-text')
+
+
+def attach_state_store(window, store: Optional[StateStore] = None, transport=None) -> StateStore:
+    """
+    让主窗口订阅状态总线的派生值
+
+    Args:
+        window: 主窗口实例
+        store: 状态中心，默认全局实例
+        transport: SerialTransport；水冷机由它推送状态时停止 cooler_refresh_timer，
+            否则水冷机仍由设备控件的串口定时器读取，保留强制刷新
+
+    Returns:
+        使用的状态中心
+    """
+    store = store or get_state_store()
+    window._state_store = store
+    window._state_subscriptions = [
+        store.subscribe('pointing', lambda snapshot, changed: _on_pointing(window, snapshot, changed)),
+        store.subscribe('dss_target', lambda snapshot, changed: _on_dss_target(window, snapshot, changed)),
+        store.subscribe('allsky', lambda snapshot, changed: _on_allsky(window, snapshot, changed),
+                        fields=[field for field, _key, _fmt in ALLSKY_FIELDS] + ['sky_background']),
+    ]
+    _add_allsky_items(window)
+    stop_cooler_refresh(window, transport)
+    return store
+
+
+def stop_cooler_refresh(window, transport) -> bool:
+    """
+    水冷机由 SerialTransport 推送状态时停止主窗口每 5 秒的 cooler_refresh_timer
+
+    Returns:
+        是否已停止
+    """
+    timer = getattr(window, 'cooler_refresh_timer', None)
+    if timer is None or transport is None or not transport.is_open('cooler'):
+        return False
+    timer.stop()
+    return True
+
+
+def detach_state_store(window):
+    """取消主窗口的状态总线订阅"""
+    for unsubscribe in getattr(window, '_state_subscriptions', ()):
+        unsubscribe()
+    window._state_subscriptions = []
+
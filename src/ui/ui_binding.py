@@ -0,0 +1,449 @@
+"""
+状态显示的差异更新层
+
+主窗口的 update_weather_info、update_cooler_status、update_indicator、update_ups_status、
+update_dome_status、update_focuser_status 每次收到状态都会对所有标签调用 set_value、
+setProperty('class', ...) 和 style().unpolish()/polish()，即使显示内容没有变化。
+重新 polish 会让 Qt 重新匹配样式表，是控制电脑上 CPU 尖峰的主要来源。
+
+本模块把"状态字典 -> 每个标签的文本和样式类"的计算（render_* 函数，与主窗口原有逻辑一致）
+和对控件的修改分开：StatusBinder 记住每个标签最后显示的文本和样式类，只修改有变化的部分，
+并把同一轮轮询中各设备的修改合并到一次事件循环中统一提交，Qt 只重绘一次。
+
+用法（在创建主窗口之前调用）:
+    from src.ui.ui_binding import install_ui_binding
+    install_ui_binding(MainWindow)
+
+之后可以通过 get_binder(window).stats 查看跳过的控件更新次数。
+"""
+import logging
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+from src.services.serial_transport import MegatecUpsProtocol
+from src.utils.i18n import i18n
+
+logger = logging.getLogger(__name__)
+
+# 标签键 -> (文本, 样式类)；样式类为 None 时不修改样式
+Rendered = Dict[str, Tuple[str, Optional[str]]]
+
+# (气象站字段, 标签键, 格式)
+WEATHER_FIELDS = (
+    ('cloudcover', 'cloud_cover', '{:.0f}%'),
+    ('dewpoint', 'dew_point', '{:.2f}°C'),
+    ('humidity', 'humidity', '{:.0f}%'),
+    ('pressure', 'pressure', '{:.0f}hPa'),
+    ('rainrate', 'rain', '{:.1f}mm/h'),
+    ('skybrightness', 'sky_brightness', '{:.1f}lux'),
+    ('skytemperature', 'sky_temperature', '{:.2f}°C'),
+    ('starfwhm', 'seeing', '{:.1f}arcsec'),
+    ('temperature', 'air_temp', '{:.2f}°C'),
+    ('winddirection', 'wind_direction', '{:.0f}°'),
+    ('windspeed', 'wind_speed', '{:.1f}m/s'),
+    ('windgust', 'avg_wind_speed', '{:.1f}m/s'),
+)
+
+# (全天相机分析字段, 标签键, 格式)
+ALLSKY_FIELDS = (
+    ('cloud_cover', 'allsky_cloud_cover', '{:.0f}%'),
+    ('sky_quality', 'allsky_sky_quality', '{:.2f}mag/arcsec²'),
+    ('star_count', 'allsky_star_count', '{:d}'),
+)
+# 未配置 sky_zero_point 时天空亮度标签改为显示天顶背景（ADU）
+ALLSKY_BACKGROUND_FORMAT = '{:.0f}ADU'
+
+# (标签键, 状态字段, 指示灯类型)
+COOLER_INDICATORS = (
+    ('cooler_running', 'running', 'running'),
+    ('cooler_flow_alarm', 'flow_alarm', 'flow'),
+    ('cooler_temp_alarm', 'temp_alarm', 'temp'),
+    ('cooler_level_alarm', 'level_alarm', 'level'),
+    ('cooler_power', 'power', 'power'),
+)
+
+ALARM_INDICATORS = ('flow', 'temp', 'level')
+INDICATOR_ON_STYLES = {
+    'running': 'status-success',
+    'heating': 'status-warning',
+    'cooling': 'status-info',
+    'pump': 'status-success',
+    'power': 'status-success',
+}
+
+UPS_STATUS = {
+    '市电正常': ('ups_status_normal', 'status-success'),
+    '电池供电': ('ups_status_battery', 'status-warning'),
+    '旁路供电': ('ups_status_bypass', 'status-info'),
+    '故障': ('ups_status_fault', 'status-error'),
+}
+
+
+# ----------------------------------------------------------------------
+# 状态 -> 显示内容
+# ----------------------------------------------------------------------
+def render_weather(weather_data: Dict[str, Any]) -> Rendered:
+    """气象站数据 -> 环境监测组各标签"""
+    rendered = {}
+    for field, key, fmt in WEATHER_FIELDS:
+        value = weather_data.get(field)
+        rendered[key] = (fmt.format(value) if value is not None else "--", None)
+    return rendered
+
+
+def render_allsky(analysis: Dict[str, Any]) -> Rendered:
+    """全天相机分析结果 -> 环境监测组的全天相机标签"""
+    rendered = {}
+    for field, key, fmt in ALLSKY_FIELDS:
+        value = analysis.get(field)
+        rendered[key] = (fmt.format(value) if value is not None else "--", None)
+    background = analysis.get('sky_background')
+    if analysis.get('sky_quality') is None and background is not None:
+        rendered['allsky_sky_quality'] = (ALLSKY_BACKGROUND_FORMAT.format(background), None)
+    return rendered
+
+
+def render_focuser(status: Dict[str, Any]) -> Rendered:
+    """调焦器状态 -> 调焦器状态组各标签"""
+    if not status or not isinstance(status, dict):
+        return {}
+    temperature = status.get('temperature')
+    ismoving = status.get('ismoving', False)
+    return {
+        'position': (f"{status.get('position', 0)}/{status.get('maxstep', 60000)}", None),
+        'temperature': (f"{temperature:.2f}°C" if temperature is not None else "--°C", None),
+        'moving': (i18n.get_text('moving_yes') if ismoving else i18n.get_text('moving_no'),
+                   'medium-text ' + ('status-warning' if ismoving else 'status-success')),
+    }
+
+
+def render_dome(status: Dict[str, Any]) -> Rendered:
+    """圆顶状态 -> 圆顶状态组各标签"""
+    if not status:
+        return {
+            'dome_azimuth': ("--", None),
+            'dome_status': (i18n.get_text('dome_status_unknown'), 'medium-text status-normal'),
+        }
+
+    azimuth = status.get('azimuth')
+    status_text = []
+    style_class = 'medium-text '
+    if status.get('athome'):
+        status_text.append(i18n.get_text('dome_at_home'))
+        style_class += 'status-info'
+    if status.get('atpark'):
+        status_text.append(i18n.get_text('dome_at_park'))
+        style_class += 'status-info'
+    if status.get('slewing'):
+        status_text.append(i18n.get_text('dome_slewing'))
+        style_class += 'status-warning'
+
+    shutter_status = status.get('shutter_status')
+    if shutter_status == 0:
+        status_text.append(i18n.get_text('dome_shutter_open'))
+        if not style_class.endswith('status-warning'):
+            style_class += 'status-success'
+    elif shutter_status == 1:
+        status_text.append(i18n.get_text('dome_shutter_closed'))
+        if not style_class.endswith('status-warning'):
+            style_class += 'status-info'
+    elif shutter_status == 2:
+        status_text.append(i18n.get_text('dome_shutter_opening'))
+        style_class += 'status-warning'
+    elif shutter_status == 3:
+        status_text.append(i18n.get_text('dome_shutter_closing'))
+        style_class += 'status-warning'
+    elif shutter_status == 4:
+        status_text.append(i18n.get_text('dome_shutter_error'))
+        style_class += 'status-error'
+
+    if not status_text:
+        status_text.append(i18n.get_text('dome_status_unknown'))
+        style_class += 'status-normal'
+
+    return {
+        'dome_azimuth': (f"{azimuth:.2f}°" if azimuth is not None else "--", None),
+        'dome_status': (', '.join(status_text), style_class),
+    }
+
+
+def render_indicator(bit_value: Any, indicator_type: str) -> Tuple[str, str]:
+    """指示灯状态 -> (文本, 样式类)"""
+    if bit_value:
+        if indicator_type in ALARM_INDICATORS:
+            return i18n.get_text('alarm_on'), 'medium-text status-error'
+        return i18n.get_text('indicator_on'), 'medium-text ' + INDICATOR_ON_STYLES.get(indicator_type, 'status-normal')
+    if indicator_type in ALARM_INDICATORS:
+        return i18n.get_text('alarm_off'), 'medium-text status-normal'
+    return i18n.get_text('indicator_off'), 'medium-text status-normal'
+
+
+def render_cooler(status: Dict[str, Any]) -> Rendered:
+    """水冷机状态 -> 水冷机状态组各标签"""
+    if not status:
+        return {}
+    rendered = {}
+    temperature = status.get('temperature')
+    if temperature is not None:
+        try:
+            if temperature == float('inf'):
+                rendered['cooler_temperature'] = (i18n.get_text('temperature_overflow'), None)
+            elif temperature == float('-inf'):
+                rendered['cooler_temperature'] = (i18n.get_text('temperature_underflow'), None)
+            else:
+                temp = float(temperature)
+                if temp > 30:
+                    style = 'status-error'
+                elif temp < 10:
+                    style = 'status-info'
+                else:
+                    style = 'status-success'
+                rendered['cooler_temperature'] = (f"{temp:.2f}°C", f"medium-text {style}")
+        except (ValueError, TypeError):
+            rendered['cooler_temperature'] = ("--°C", None)
+    for key, field, indicator_type in COOLER_INDICATORS:
+        rendered[key] = render_indicator(status.get(field, False), indicator_type)
+    return rendered
+
+
+def render_ups_bit(key: str, bit_value: Any, style_class: str) -> Tuple[str, str]:
+    """UPS 状态位 -> (文本, 样式类)"""
+    if key == 'ups_health':
+        text = i18n.get_text('ups_health_fault') if bit_value == 1 else i18n.get_text('ups_health_normal')
+    elif key == 'running_status':
+        text = i18n.get_text('ups_running_shutdown') if bit_value == 1 else i18n.get_text('ups_running_normal')
+    else:
+        text = f"{bit_value}"
+    return text, f"medium-text {style_class}"
+
+
+def render_ups(status: Dict[str, Any]) -> Rendered:
+    """UPS 状态 -> UPS 状态组各标签"""
+    if not status:
+        return {
+            'ups_status': (i18n.get_text('ups_status_unknown'), 'medium-text status-normal'),
+            'ups_output_voltage': ('0.0V', None),
+            'ups_battery': ('0%', None),
+            'ups_temperature': ('0.0°C', None),
+            'ups_health': (i18n.get_text('ups_health_normal'), None),
+            'running_status': (i18n.get_text('ups_running_normal'), None),
+        }
+
+    status_bits = status.get('status_bits')
+    power_state = status.get('status', '状态未知')
+    if status_bits is not None and len(status_bits) >= 8:
+        # 设备控件自带的解析把 b7..b0 顺序的状态位当作 b0..b7 读取，按状态位重新判断
+        power_state = MegatecUpsProtocol.power_state(status_bits)
+    text_key, style = UPS_STATUS.get(power_state, ('ups_status_unknown', 'status-normal'))
+    battery = status.get('battery', 0)
+    if battery <= 20:
+        battery_style = 'status-error'
+    elif battery <= 50:
+        battery_style = 'status-warning'
+    else:
+        battery_style = 'status-success'
+    rendered = {
+        'ups_status': (i18n.get_text(text_key), f"medium-text {style}"),
+        'ups_output_voltage': (f"{status.get('output_voltage', 0.0):.1f}V", None),
+        'ups_battery': (f"{battery}%", f"medium-text {battery_style}"),
+        'ups_temperature': (f"{status.get('temperature', 0.0):.2f}°C", None),
+    }
+    if status_bits is not None and len(status_bits) >= 8:
+        for key, bit in (('ups_health', status_bits[3]), ('running_status', status_bits[6])):
+            rendered[key] = render_ups_bit(key, bit, 'status-error' if bit == 1 else 'status-success')
+    return rendered
+
+
+# ----------------------------------------------------------------------
+# 差异更新
+# ----------------------------------------------------------------------
+class StatusBinder(QObject):
+    """
+    标签的差异更新与批量提交
+
+    set()/apply() 只登记待显示的内容，同一个标签在提交前被多次设置时只保留最后一次；
+    commit() 在事件循环空闲时（或轮询周期结束时）统一执行，只修改文本或样式类确实变化的标签。
+    界面其他地方（例如圆顶、镜头盖命令的回调）可能直接修改控件，
+    所以除了记录的最后显示内容，还会核对控件当前的文本和样式类。
+    """
+    committed = pyqtSignal(int)   # 本次提交实际修改的标签数
+
+    def __init__(self, parent=None, auto_commit: bool = True):
+        """
+        初始化差异更新层
+
+        Args:
+            parent: 父QObject
+            auto_commit: 登记修改后是否在下一次事件循环中自动提交
+        """
+        super().__init__(parent)
+        self.auto_commit = auto_commit
+        self._pending: Dict[Any, Tuple[Any, str, Optional[str]]] = {}
+        self._rendered: Dict[Any, Tuple[Optional[str], Optional[str]]] = {}
+        self._scheduled = False
+        self.stats = {
+            'requested': 0,       # 登记的标签更新次数
+            'coalesced': 0,       # 提交前被同一标签后续更新覆盖的次数
+            'text_updates': 0,
+            'text_skipped': 0,
+            'style_updates': 0,
+            'style_skipped': 0,
+            'commits': 0,
+        }
+
+    def set(self, pair, text: str, style_class: Optional[str] = None):
+        """
+        登记一个标签的显示内容
+
+        Args:
+            pair: LabelPair 组件
+            text: 显示文本
+            style_class: 样式类，为 None 时不修改样式
+        """
+        label = pair.value_label
+        self.stats['requested'] += 1
+        previous = self._pending.get(label)
+        if previous is not None:
+            self.stats['coalesced'] += 1
+            if style_class is None:
+                # 同一轮中先设置了样式、后只设置文本时保留样式
+                style_class = previous[2]
+        self._pending[label] = (pair, str(text), style_class)
+        if self.auto_commit and not self._scheduled:
+            self._scheduled = True
+            QTimer.singleShot(0, self.commit)
+
+    def apply(self, pairs: Dict[str, Any], rendered: Rendered):
+        """登记一组标签（InfoGroup.pairs）的显示内容，组中不存在的键被忽略"""
+        for key, (text, style_class) in rendered.items():
+            pair = pairs.get(key)
+            if pair is not None:
+                self.set(pair, text, style_class)
+
+    def commit(self) -> int:
+        """
+        提交登记的修改
+
+        Returns:
+            实际修改的标签数
+        """
+        self._scheduled = False
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, {}
+        changed = 0
+        for label, (pair, text, style_class) in pending.items():
+            last_text, last_style = self._rendered.get(label, (None, None))
+            touched = False
+            if text == last_text and label.text() == text:
+                self.stats['text_skipped'] += 1
+            else:
+                pair.set_value(text)
+                last_text = text
+                self.stats['text_updates'] += 1
+                touched = True
+            if style_class is not None:
+                if style_class == last_style and label.property('class') == style_class:
+                    self.stats['style_skipped'] += 1
+                else:
+                    label.setProperty('class', style_class)
+                    style = label.style()
+                    style.unpolish(label)
+                    style.polish(label)
+                    last_style = style_class
+                    self.stats['style_updates'] += 1
+                    touched = True
+            self._rendered[label] = (last_text, last_style)
+            changed += touched
+        self.stats['commits'] += 1
+        self.committed.emit(changed)
+        return changed
+
+    def invalidate(self, pair=None):
+        """丢弃记录的显示内容（不指定标签时丢弃全部），下次更新时无条件写入控件"""
+        if pair is None:
+            self._rendered.clear()
+        else:
+            self._rendered.pop(pair.value_label, None)
+
+    def skipped_ratio(self) -> float:
+        """跳过的控件修改（文本和样式）占全部登记修改的比例"""
+        skipped = self.stats['text_skipped'] + self.stats['style_skipped'] + self.stats['coalesced']
+        total = skipped + self.stats['text_updates'] + self.stats['style_updates']
+        return skipped / total if total else 0.0
+
+    def reset_stats(self):
+        """清零计数"""
+        for key in self.stats:
+            self.stats[key] = 0
+
+
+def get_binder(window) -> StatusBinder:
+    """获取窗口的差异更新层（首次调用时创建）"""
+    binder = getattr(window, '_status_binder', None)
+    if binder is None:
+        binder = StatusBinder(window)
+        window._status_binder = binder
+    return binder
+
+
+# ----------------------------------------------------------------------
+# 接入主窗口
+# ----------------------------------------------------------------------
+# 主窗口方法 -> (InfoGroup 属性名, 渲染函数)
+BOUND_METHODS: Dict[str, Tuple[str, Callable[[Dict[str, Any]], Rendered]]] = {
+    'update_weather_info': ('environment', render_weather),
+    'update_focuser_status': ('focuser_status', render_focuser),
+    'update_dome_status': ('dome_status_group', render_dome),
+    'update_cooler_status': ('expanded_cooler_status_group', render_cooler),
+    'update_ups_status': ('expanded_ups_status_group', render_ups),
+}
+
+
+def _bound_update(name: str, group_attr: str, render: Callable[[Dict[str, Any]], Rendered]):
+    def update(self, status):
+        group = getattr(self, group_attr, None)
+        if group is None:
+            return
+        try:
+            get_binder(self).apply(group.pairs, render(status))
+        except Exception as e:
+            logger.error("更新 %s 显示时出错: %s", group_attr, e)
+    update.__name__ = name
+    update.__doc__ = f"经差异更新层刷新 {group_attr} 的显示"
+    return update
+
+
+def _update_indicator(self, indicator_key, bit_value, indicator_type):
+    """更新水冷机指示灯状态（经差异更新层）"""
+    pair = self.expanded_cooler_status_group.pairs.get(indicator_key)
+    if pair is not None:
+        get_binder(self).set(pair, *render_indicator(bit_value, indicator_type))
+
+
+def _update_ups_status_bit(self, key, bit_value, style_class):
+    """更新 UPS 状态位显示（经差异更新层）"""
+    pair = self.expanded_ups_status_group.pairs.get(key)
+    if pair is not None:
+        get_binder(self).set(pair, *render_ups_bit(key, bit_value, style_class))
+
+
+def install_ui_binding(window_cls):
+    """
+    让主窗口类的状态更新方法经过差异更新层
+
+    信号在主窗口构造时连接到这些方法，因此必须在创建主窗口实例之前调用。
+
+    Args:
+        window_cls: 主窗口类（MainWindow）
+
+    Returns:
+        传入的类，便于用作装饰器
+    """
+    for name, (group_attr, render) in BOUND_METHODS.items():
+        setattr(window_cls, name, _bound_update(name, group_attr, render))
+    window_cls.update_indicator = _update_indicator
+    window_cls.update_ups_status_bit = _update_ups_status_bit
+    logger.info("状态显示已接入差异更新层")
+    return window_cls
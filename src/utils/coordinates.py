@@ -0,0 +1,33 @@
+"""
+天球坐标的轻量工具函数
+
+只依赖标准库，DSS 缓存、旁行角计算、夜间规划和状态总线共用，导入时不会带入 requests 或 Qt。
+"""
+import math
+
+
+def parse_ra_hours(value) -> float:
+    """解析赤经（数字按小时，字符串支持 'HH:MM:SS'）"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip()
+    negative = text.startswith('-')
+    parts = text.lstrip('+-').split(':')
+    if len(parts) == 1:
+        number = float(parts[0])
+    else:
+        number = float(parts[0]) + float(parts[1]) / 60 + (float(parts[2]) if len(parts) > 2 else 0.0) / 3600
+    return -number if negative else number
+
+
+def parse_dec_degrees(value) -> float:
+    """解析赤纬（数字按度，字符串支持 '±DD:MM:SS'）"""
+    return parse_ra_hours(value)
+
+
+def angular_separation(ra1_deg: float, dec1_deg: float, ra2_deg: float, dec2_deg: float) -> float:
+    """两点间角距（度），使用对小角度稳定的 haversine 公式"""
+    ra1, dec1, ra2, dec2 = map(math.radians, (ra1_deg, dec1_deg, ra2_deg, dec2_deg))
+    h = (math.sin((dec2 - dec1) / 2) ** 2
+         + math.cos(dec1) * math.cos(dec2) * math.sin((ra2 - ra1) / 2) ** 2)
+    return math.degrees(2 * math.asin(min(1.0, math.sqrt(h))))
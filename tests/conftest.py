@@ -0,0 +1,25 @@
+"""
+测试公共设置：无界面运行 Qt，并把仓库根目录加入导入路径
+"""
+import os
+import sys
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def qapp():
+    """整个测试会话共用的 QApplication"""
+    from PyQt5.QtWidgets import QApplication
+    return QApplication.instance() or QApplication([sys.argv[0]])
+
+
+@pytest.fixture
+def alpaca_server():
+    """本地 Alpaca 桩服务器"""
+    from src.simulators.alpaca_server import AlpacaStubServer
+    with AlpacaStubServer(motion_time=0.2) as server:
+        yield server
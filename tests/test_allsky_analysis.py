@@ -0,0 +1,73 @@
+"""
+全天相机云量：晴天参考星数确立之前不给出云量，可由配置或保存的参考预置
+"""
+import numpy as np
+
+from src.services.allsky_analysis import AllSkyAnalyzer
+from src.ui.ui_binding import render_allsky
+
+SIZE = 480
+
+
+def star_frame(seed=0, clouded=None):
+    """背景 100 ADU 的合成帧，星点按 12 像素网格排列；clouded 为 (行切片, 列切片) 时该区域没有星"""
+    rng = np.random.default_rng(seed)
+    frame = 100 + rng.normal(0, 3, (SIZE, SIZE))
+    frame[6::12, 6::12] = 1000
+    if clouded is not None:
+        frame[clouded] = 100 + rng.normal(0, 3, frame[clouded].shape)
+    return np.clip(frame, 0, 65535).astype(np.uint16)
+
+
+def make_analyzer(tmp_path, **overrides):
+    settings = {'analysis_size': 0, 'horizon_mask': '', 'reference_frames': 3,
+                'reference_path': str(tmp_path / 'reference.json'), 'reference_save_interval': 0.0,
+                'clear_sky_stars': {}, 'sky_zero_point': None}
+    settings.update(overrides)
+    return AllSkyAnalyzer(settings)
+
+
+def test_cloud_cover_waits_for_reference(tmp_path):
+    analyzer = make_analyzer(tmp_path)
+    first = analyzer.analyze(star_frame(), timestamp=0.0)
+    assert first['star_count'] > 0
+    assert first['cloud_cover'] is None
+    assert set(first['sector_cloud_cover'].values()) == {None}
+    assert not (tmp_path / 'reference.json').exists()
+
+    analyzer.analyze(star_frame(1), timestamp=60.0)
+    third = analyzer.analyze(star_frame(2, (slice(0, SIZE // 2), slice(None))), timestamp=120.0)
+    assert third['cloud_cover'] is not None and third['cloud_cover'] > 20
+    assert (tmp_path / 'reference.json').exists()
+
+
+def test_saved_reference_is_used_after_restart(tmp_path):
+    analyzer = make_analyzer(tmp_path)
+    for index in range(3):
+        analyzer.analyze(star_frame(index), timestamp=60.0 * index)
+
+    restarted = make_analyzer(tmp_path)
+    result = restarted.analyze(star_frame(5, (slice(0, SIZE // 2), slice(None))), timestamp=1000.0)
+    assert result['cloud_cover'] is not None and result['cloud_cover'] > 20
+    assert result['sector_cloud_cover']['Z'] is not None
+
+    # 重置后不再读回保存的参考
+    restarted.reset_reference()
+    assert restarted.analyze(star_frame(6), timestamp=1060.0)['cloud_cover'] is None
+
+
+def test_configured_clear_sky_stars_seed_sectors(tmp_path):
+    clear = make_analyzer(tmp_path, reference_path='').analyze(star_frame(), timestamp=0.0)
+    analyzer = make_analyzer(tmp_path, reference_path='',
+                             clear_sky_stars={'Z': clear['sector_star_count']['Z']})
+    # 天顶区一开始就是阴天：配置的晴天星数作为参考，其余天区仍在积累
+    result = analyzer.analyze(star_frame(1, (slice(None), slice(None))), timestamp=0.0)
+    assert result['sector_cloud_cover']['Z'] == 100.0
+    assert [name for name, value in result['sector_cloud_cover'].items() if value is not None] == ['Z']
+
+
+def test_sky_background_shown_without_zero_point():
+    rendered = render_allsky({'cloud_cover': None, 'sky_quality': None, 'sky_background': 101.4, 'star_count': 3})
+    assert rendered['allsky_sky_quality'][0] == '101ADU'
+    rendered = render_allsky({'sky_quality': 20.51, 'sky_background': 101.4})
+    assert rendered['allsky_sky_quality'][0] == '20.51mag/arcsec²'
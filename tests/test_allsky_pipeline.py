@@ -0,0 +1,93 @@
+"""
+主窗口全天相机标签改由 AllSkyImagePipeline 显示：窗口自己的定时器停止，新帧在后台解码后送到标签
+"""
+import time
+
+import pytest
+from PyQt5.QtCore import QEventLoop, QTimer
+from PyQt5.QtGui import QColor, QImage
+from PyQt5.QtWidgets import QLabel, QWidget
+
+from src.services import allsky_pipeline
+from src.services.allsky_pipeline import attach_allsky_pipeline, install_allsky_pipeline
+
+
+class FakeConfig:
+    def __init__(self, camera):
+        self.camera = camera
+
+    def get(self, path, default=None):
+        value = {'devices': {'allsky_camera': self.camera}}
+        for part in path.split('.'):
+            if not isinstance(value, dict) or part not in value:
+                return default
+            value = value[part]
+        return value
+
+    def subscribe(self, path, callback):
+        return lambda: None
+
+
+class Window(QWidget):
+    """只带全天相机标签和刷新定时器的主窗口替身"""
+
+    def __init__(self):
+        super().__init__()
+        self.telescope_camera_label = QLabel(self)
+        self.telescope_camera_label.resize(200, 100)
+        self.telescope_camera_timer = QTimer(self)
+        self.telescope_camera_timer.timeout.connect(self.update_telescope_camera_image)
+        self.telescope_camera_timer.start(5000)
+        self.update_telescope_camera_image()
+
+    def update_telescope_camera_image(self):
+        raise AssertionError('界面线程中的原刷新方法不应再被调用')
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.perf_counter() + timeout
+    while not predicate() and time.perf_counter() < deadline:
+        loop = QEventLoop()
+        QTimer.singleShot(10, loop.quit)
+        loop.exec_()
+    return predicate()
+
+
+@pytest.fixture
+def camera(tmp_path, monkeypatch):
+    camera = {'enabled': True, 'image_path': str(tmp_path), 'image_name': 'allsky',
+              'image_extension': '.png', 'refresh_interval': 0.05}
+    monkeypatch.setattr(allsky_pipeline, 'get_config_service', lambda: FakeConfig(camera))
+    return camera
+
+
+def test_window_label_shows_pipeline_frames(qapp, camera, tmp_path):
+    image = QImage(400, 400, QImage.Format_RGB32)
+    image.fill(QColor(40, 40, 40))
+    image.save(str(tmp_path / 'allsky.png'))
+
+    window_cls = install_allsky_pipeline(type('PatchedWindow', (Window,), {}))
+    window = window_cls()
+    pipeline = attach_allsky_pipeline(window)
+    assert window.allsky_pipeline is pipeline
+    assert not window.telescope_camera_timer.isActive()
+
+    pipeline.start()
+    try:
+        label = window.telescope_camera_label
+        assert wait_until(lambda: label.pixmap() is not None and not label.pixmap().isNull())
+        assert label.pixmap().height() == 100
+        # 窗口 resizeEvent 中的刷新调用只检查管线，文件未变化时不重复处理
+        handoffs = pipeline.handoffs
+        window.update_telescope_camera_image()
+        assert pipeline.handoffs == handoffs
+    finally:
+        pipeline.stop()
+
+
+def test_disabled_camera_stops_window_timer(qapp, camera):
+    camera['enabled'] = False
+    window = install_allsky_pipeline(type('PatchedWindow', (Window,), {}))()
+    assert attach_allsky_pipeline(window) is None
+    assert not window.telescope_camera_timer.isActive()
+    window.update_telescope_camera_image()
@@ -0,0 +1,52 @@
+"""
+角度可视化：背景层只在星图、尺寸变化时重建，角度变化只重绘矢量层
+"""
+import os
+
+from PyQt5.QtGui import QColor, QImage
+
+from src.ui.angle_visualizer import CachedAngleVisualizer
+
+
+def save_image(path, color):
+    image = QImage(300, 300, QImage.Format_RGB32)
+    image.fill(color)
+    image.save(str(path))
+
+
+def test_background_layer_invalidation(qapp, tmp_path):
+    path = tmp_path / 'dss.png'
+    save_image(path, QColor(20, 20, 60))
+    widget = CachedAngleVisualizer(settings={'max_frame_rate': 1000})
+    widget.resize(300, 300)
+    widget.set_background(str(path))
+    widget.grab()
+    assert widget.stats['decodes'] == 1
+    assert widget.stats['layer_builds'] == 1
+
+    # 角度变化只重绘矢量层
+    for angle in (10, 20, 30):
+        widget.set_angles(45, angle)
+        widget.grab()
+    assert widget.stats['layer_builds'] == 1
+
+    # 同一文件再次到达时不重新解码
+    widget.set_background(str(path))
+    widget.grab()
+    assert widget.stats['decode_skipped'] == 1
+    assert widget.stats['layer_builds'] == 1
+
+    # 尺寸变化重建背景层
+    widget.resize(400, 320)
+    widget.grab()
+    assert widget.stats['layer_builds'] == 2
+
+    # 文件内容变化后重新解码并重建，新图层使用新的星图
+    save_image(path, QColor(200, 40, 40))
+    os.utime(str(path), ns=(1, 1))
+    widget.set_background(str(path))
+    frame = widget.grab().toImage()
+    assert widget.stats['decodes'] == 2
+    assert widget.stats['layer_builds'] == 3
+    # 400x320 下星图占 x 50..350、y 10..310，取矢量层之外的一角
+    assert frame.pixelColor(55, 15).getRgb()[:3] == (200, 40, 40)
@@ -0,0 +1,168 @@
+"""
+主窗口圆顶、镜头盖按钮接入命令执行器：设备响应慢时界面定时器不受影响，结果按原规则回到界面
+"""
+import threading
+import time
+
+import pytest
+from PyQt5.QtCore import QEventLoop, Qt, QTimer
+from PyQt5.QtWidgets import QComboBox, QLabel, QPushButton, QWidget
+
+from src.services.alpaca_registry import AlpacaClientRegistry
+from src.services.command_executor import CommandExecutor, CommandHandle, install_command_executor
+from src.services.startup import StagedStartup
+
+
+class Pair:
+    def __init__(self):
+        self.value_label = QLabel()
+
+    def set_value(self, text):
+        self.value_label.setText(text)
+
+
+class Group:
+    def __init__(self, *names):
+        self.pairs = {name: Pair() for name in names}
+
+
+class Control:
+    def __init__(self, device_id, device_number=0):
+        self.device_id = device_id
+        self.is_connected = True
+        self.combo = QComboBox()
+        self.combo.addItem(device_id, {'DeviceNumber': device_number})
+
+
+class Window(QWidget):
+    """只带圆顶、镜头盖相关控件的主窗口替身"""
+
+    def __init__(self, cover_number=0):
+        super().__init__()
+        self.device_controls = [Control('dome'), Control('cover', cover_number)]
+        self.dome_status_group = Group('dome_status')
+        self.telescope_status = Group('cover_status')
+        self.dome_open_button = QPushButton()
+        self.dome_close_button = QPushButton()
+        self.cover_open_button = QPushButton()
+        self.cover_close_button = QPushButton()
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.perf_counter() + timeout
+    while not predicate() and time.perf_counter() < deadline:
+        loop = QEventLoop()
+        QTimer.singleShot(10, loop.quit)
+        loop.exec_()
+    return predicate()
+
+
+@pytest.fixture
+def executor(alpaca_server):
+    registry = AlpacaClientRegistry(config={'devices': {
+        'dome': {'api_url': alpaca_server.base_url},
+        'covercalibrator': {'api_url': alpaca_server.base_url},
+    }})
+    executor = CommandExecutor(registry=registry)
+    yield executor
+    executor.shutdown(wait=True)
+    registry.close_all()
+
+
+@pytest.fixture
+def window_cls(executor):
+    class PatchedWindow(Window):
+        pass
+    return install_command_executor(PatchedWindow, executor)
+
+
+def test_slow_dome_does_not_stall_timers(qapp, alpaca_server, window_cls):
+    alpaca_server.endpoint_latency['openshutter'] = 1.0
+    window = window_cls()
+    ticks = []
+    timer = QTimer()
+    timer.setTimerType(Qt.PreciseTimer)
+    timer.timeout.connect(lambda: ticks.append(time.perf_counter()))
+    timer.start(20)
+
+    start = time.perf_counter()
+    window.open_dome_shutter()
+    assert time.perf_counter() - start < 0.2
+    assert not window.dome_open_button.isEnabled()
+    assert window.dome_status_group.pairs['dome_status'].value_label.text() == '正在打开圆顶...'
+
+    assert wait_until(window.dome_open_button.isEnabled)
+    timer.stop()
+    assert time.perf_counter() - start >= 1.0
+    assert window.dome_close_button.isEnabled()
+    gaps = [later - earlier for earlier, later in zip(ticks, ticks[1:])]
+    assert len(gaps) > 30
+    assert max(gaps) < 0.15
+
+
+def test_failed_cover_command_restores_buttons(qapp, window_cls):
+    window = window_cls(cover_number=9)
+    window._last_cover_state = 1
+    window.open_cover()
+    assert not window.cover_close_button.isEnabled()
+
+    label = window.telescope_status.pairs['cover_status'].value_label
+    assert wait_until(lambda: label.text() == '打开镜头盖失败')
+    assert window.cover_open_button.isEnabled()
+    assert not window.cover_close_button.isEnabled()
+
+
+def test_rejected_command_finishes_immediately(qapp, executor, window_cls):
+    def reject(command):
+        handle = CommandHandle(0, command)
+        result = {'id': 0, 'device': command.device_key, 'action': command.action, 'success': False,
+                  'error': '安全联锁中: wind'}
+        executor.command_finished.emit(0, result)
+        handle.future.set_result(result)
+        return handle
+    executor.submit = reject
+    window = window_cls()
+    window.open_dome_shutter()
+    assert window.dome_status_group.pairs['dome_status'].value_label.text() == '错误: 安全联锁中: wind'
+    assert window.dome_open_button.isEnabled()
+
+
+def test_missing_device_sends_nothing(qapp, alpaca_server, window_cls):
+    window = window_cls()
+    window.device_controls[0].is_connected = False
+    window.open_dome_shutter()
+    assert window.dome_open_button.isEnabled()
+    assert alpaca_server.request_count('dome') == 0
+
+
+def test_manual_cover_device_uses_registry(qapp, alpaca_server, executor, window_cls, tmp_path):
+    window = window_cls()
+    # 后台任务全部完成时会写启动报告，不写到仓库的 logs 目录
+    window._staged_startup = StagedStartup(window, settings={
+        'report_path': str(tmp_path / 'startup_report.json'),
+        'history_path': str(tmp_path / 'startup_history.jsonl')})
+    control = window.device_controls[1]
+    control.toggle_connection = lambda: setattr(control, 'is_connected', False)
+    control.update_devices = lambda devices: setattr(control, 'devices', devices)
+    window.init_connect_menu = lambda devices: setattr(window, 'menu_devices', devices)
+    client = executor.registry.client_for_device('covercalibrator')
+    find_devices = client.find_devices
+    threads = []
+
+    def slow_find_devices(*args):
+        threads.append(threading.current_thread())
+        time.sleep(0.3)
+        return find_devices(*args)
+    client.find_devices = slow_find_devices
+    start = time.perf_counter()
+    window.add_manual_cover_device()
+    # 设备列表在后台查询，界面线程不等待服务器响应
+    assert time.perf_counter() - start < 0.2
+    assert not control.is_connected
+    assert control.devices[0]['DeviceType'] == 'CoverCalibrator'
+    assert window.has_added_default_cover_device
+    assert not hasattr(window, 'menu_devices')
+    assert wait_until(lambda: hasattr(window, 'menu_devices'))
+    assert any(device['DeviceType'] == 'CoverCalibrator' for device in window.menu_devices)
+    assert threads and threads[0] is not threading.main_thread()
+    window._staged_startup.shutdown()
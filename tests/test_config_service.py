@@ -0,0 +1,55 @@
+"""
+配置服务：读取不做文件 I/O，文件的 mtime/inode 变化后重新加载，订阅者只在所关注的值变化时收到回调
+"""
+import os
+
+import pytest
+
+from src.config.config_service import ConfigService
+
+
+def write_config(path, text):
+    tmp = str(path) + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(text)
+    # 以替换方式保存（编辑器常见做法），inode 随之改变
+    os.replace(tmp, str(path))
+
+
+def test_reload_on_file_change(qapp, tmp_path):
+    path = tmp_path / 'config.yaml'
+    write_config(path, "devices:\n  dome:\n    api_url: http://a:11111\npolling:\n  max_workers: 8\n")
+    service = ConfigService(str(path), watch=False)
+    changes = []
+    service.subscribe('devices.dome.api_url', changes.append)
+    service.subscribe('polling.max_workers', lambda value: changes.append(('workers', value)))
+    assert service.get('devices.dome.api_url') == 'http://a:11111'
+
+    # 文件未变化时只比较 stat，不重新解析
+    assert not service.check_for_changes()
+    assert service.reload_count == 1
+
+    version = service.snapshot().version
+    write_config(path, "devices:\n  dome:\n    api_url: http://b:11111\npolling:\n  max_workers: 8\n")
+    assert service.check_for_changes()
+    assert service.get('devices.dome.api_url') == 'http://b:11111'
+    assert service.snapshot().version == version + 1
+    assert changes == ['http://b:11111']
+
+    # 保存到一半的文件解析失败时保留旧配置
+    write_config(path, "devices: [\n")
+    assert not service.check_for_changes()
+    assert service.get('devices.dome.api_url') == 'http://b:11111'
+
+
+def test_snapshot_is_read_only(qapp, tmp_path):
+    path = tmp_path / 'config.yaml'
+    write_config(path, "devices:\n  dome:\n    endpoints: [azimuth]\n")
+    snapshot = ConfigService(str(path), watch=False).snapshot()
+    with pytest.raises(TypeError):
+        snapshot['devices']['dome'] = {}
+    assert snapshot.value('devices.dome.endpoints') == ('azimuth',)
+    # 旧代码需要普通字典时取深拷贝，修改不影响快照
+    data = snapshot.to_dict()
+    data['devices']['dome']['endpoints'].append('shutterstatus')
+    assert snapshot.value('devices.dome.endpoints') == ('azimuth',)
@@ -0,0 +1,40 @@
+"""
+设备发现：并行查询各服务器，同一台服务器经不同地址查询到的设备按 UniqueID 去重，
+不可达的服务器不影响其他服务器，磁盘缓存保留未应答服务器上次的结果
+"""
+from PyQt5.QtCore import Qt
+
+from src.services.discovery_service import DiscoveryService, merge_devices
+
+
+def test_merge_devices_dedups_by_unique_id():
+    a = {'DeviceType': 'Dome', 'DeviceNumber': 0, 'UniqueID': 'dome-1', 'ServerUrl': 'http://a'}
+    b = {'DeviceType': 'Dome', 'DeviceNumber': 0, 'UniqueID': 'dome-1', 'ServerUrl': 'http://b'}
+    # 没有 UniqueID 时按 (服务器, 类型, 设备号) 区分
+    c = {'DeviceType': 'Focuser', 'DeviceNumber': 0}
+    merged = merge_devices({'http://a': [a, c], 'http://b': [b, dict(c)]})
+    assert merged == [a, c, c]
+
+
+def test_discover_survives_unreachable_server(qapp, alpaca_server, tmp_path):
+    same_server = alpaca_server.base_url.replace('127.0.0.1', 'localhost')
+    unreachable = 'http://127.0.0.1:1'
+    settings = {'udp': False, 'include_config': False, 'connect_timeout': 0.5, 'read_timeout': 1.0,
+                'deadline': 3.0, 'cache_path': str(tmp_path / 'discovery_cache.json'),
+                'servers': [alpaca_server.base_url, same_server, unreachable]}
+    service = DiscoveryService(settings)
+    found = []
+    service.devices_found.connect(lambda url, devices: found.append(url), Qt.DirectConnection)
+
+    devices = service.discover()
+    assert sorted(found) == sorted([alpaca_server.base_url, same_server])
+    assert unreachable in service.last_errors
+    types = [device['DeviceType'] for device in devices]
+    assert len(types) == len(set(types)) and 'Dome' in types
+    assert all(device['ServerUrl'] == alpaca_server.base_url for device in devices)
+
+    # 再次发现时服务器都不可达：缓存仍是上次的结果
+    unreachable_only = DiscoveryService(dict(settings, servers=[unreachable]))
+    assert unreachable_only.discover() == []
+    assert list(unreachable_only.load_cache()) == [alpaca_server.base_url, same_server]
+    assert unreachable_only.cached_devices() == devices
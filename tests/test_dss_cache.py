@@ -0,0 +1,76 @@
+"""
+DSS 图像缓存：刚写入的图像不会被立即淘汰，获取线程不丢失坐标
+"""
+import os
+import threading
+import time
+
+from PyQt5.QtCore import Qt
+
+from src.services.dss_cache import CachedDSSImageFetcher, DSSImageCache
+
+GIF = b'GIF89a' + b'\x00' * 1024
+
+
+def make_cache(tmp_path, **settings):
+    calls = []
+
+    def download(ra_deg, dec_deg, fov_arcmin):
+        calls.append((ra_deg, dec_deg))
+        return GIF
+    cache = DSSImageCache(dict({'cache_dir': str(tmp_path)}, **settings), download=download)
+    return cache, calls
+
+
+def test_get_path_survives_immediate_eviction(tmp_path):
+    # 容量小于一张图像：每次写入都会触发淘汰
+    cache, calls = make_cache(tmp_path, max_bytes=100)
+    first = cache.get_path(1.0, 10.0)
+    assert first is not None and os.path.exists(first)
+    second = cache.get_path(5.0, -20.0)
+    assert second is not None and os.path.exists(second)
+    assert not os.path.exists(first)
+    assert len(cache) == 1 and len(calls) == 2
+
+
+def test_store_returns_path(tmp_path):
+    cache, _calls = make_cache(tmp_path, max_entries=1)
+    path = cache.store(15.0, 10.0, GIF)
+    assert os.path.dirname(path) == str(tmp_path)
+    assert cache.get_path(1.0, 10.0, fetch=False) == path
+
+
+def test_fetcher_does_not_lose_coordinates(qapp, tmp_path):
+    cache, _calls = make_cache(tmp_path)
+    # 写清单较慢时，线程处理完一组坐标后仍在运行的时间窗口更长
+    flush = cache.flush
+    cache.flush = lambda: (time.sleep(0.02), flush())
+    fetcher = CachedDSSImageFetcher(cache)
+    received = []
+    done = threading.Event()
+
+    def on_ready(path):
+        received.append(path)
+        if len(received) == 50:
+            done.set()
+    fetcher.image_ready.connect(on_ready, Qt.DirectConnection)
+    try:
+        for index in range(50):
+            fetcher.set_coordinates(index * 0.4, 10.0)
+            # 等上一组处理完，让线程回到等待状态后再设置下一组
+            deadline = time.monotonic() + 2.0
+            while len(received) <= index and time.monotonic() < deadline:
+                time.sleep(0.001)
+        assert done.wait(5.0), f"只收到 {len(received)} 次 image_ready"
+    finally:
+        fetcher.stop()
+        fetcher.wait(2000)
+
+    # stop() 之后再次设置坐标会重新启动线程
+    fetcher.set_coordinates(3.0, 45.0)
+    deadline = time.monotonic() + 2.0
+    while len(received) < 51 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    fetcher.stop()
+    fetcher.wait(2000)
+    assert len(received) == 51
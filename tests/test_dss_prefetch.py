@@ -0,0 +1,102 @@
+"""
+DSS 预取：状态中心的指向开始触发预取，目标列表预热缓存
+"""
+import time
+
+from src.services.dss_cache import DSSImageCache
+from src.services.dss_prefetch import PRIORITY_SLEW_TARGET, PrefetchingDSSImageFetcher, connect_state_store
+from src.services.state_store import StateStore
+
+GIF = b'GIF89a' + b'\x00' * 256
+
+
+def make_fetcher(tmp_path):
+    cache = DSSImageCache({'cache_dir': str(tmp_path / 'cache')}, download=lambda ra, dec, fov: GIF)
+    return PrefetchingDSSImageFetcher(cache, max_parallel=1)
+
+
+def test_store_slew_triggers_prefetch(qapp, tmp_path):
+    fetcher = make_fetcher(tmp_path)
+    queued = []
+    fetcher.prefetch = lambda ra, dec, priority, reason: queued.append((ra, dec, priority, reason)) or True
+    store = StateStore(coalesce_ms=0)
+    connect_state_store(fetcher, store)
+    store.publish('telescope', {'slewing': False, 'rightascension': 1.0, 'declination': 2.0})
+    store.publish('telescope', {'slewing': True, 'targetrightascension': 5.5, 'targetdeclination': -5.4})
+    qapp.processEvents()
+    assert queued == [(5.5, -5.4, PRIORITY_SLEW_TARGET, 'slew')]
+
+
+def test_warm_from_target_list_and_wait(qapp, tmp_path):
+    targets = tmp_path / 'targets.txt'
+    targets.write_text('# 名称 赤经 赤纬\nM42 05:35:17 -05:23:28\nM51 13:29:52 +47:11:43\n', encoding='utf-8')
+    fetcher = make_fetcher(tmp_path)
+    assert fetcher.warm_from_target_list(str(targets)) == 2
+    fetcher.set_coordinates('05:35:17', '-05:23:28')
+    stopped = False
+    try:
+        for _ in range(200):
+            if fetcher.queue_size == 0 and fetcher.stats['prefetched'] + fetcher.stats['skipped'] >= 2:
+                break
+            qapp.processEvents()
+            time.sleep(0.01)
+        fetcher.stop()
+        stopped = fetcher.wait(3000)
+    finally:
+        fetcher.stop()
+    assert stopped
+    assert fetcher.cache.lookup(13.4978, 47.1953) is not None
+
+
+def test_prefetch_does_not_touch_cache_on_caller_thread(qapp, tmp_path, monkeypatch):
+    import threading
+    from src.services import dss_prefetch
+    cache = DSSImageCache({'cache_dir': str(tmp_path / 'cache')}, download=lambda ra, dec, fov: GIF)
+    threads = []
+
+    def global_cache():
+        threads.append(threading.current_thread())
+        return cache
+    monkeypatch.setattr(dss_prefetch, 'get_dss_cache', global_cache)
+    fetcher = PrefetchingDSSImageFetcher(max_parallel=1)
+    try:
+        assert fetcher.prefetch('05:35:17', '-05:23:28')
+        assert not fetcher.prefetch('05:35:17', '-05:23:28')
+        for _ in range(200):
+            if fetcher.stats['prefetched'] and not fetcher._queued_slots:
+                break
+            time.sleep(0.01)
+        # 已缓存的视场再次入队时由工作线程跳过
+        assert fetcher.prefetch('05:35:17', '-05:23:28')
+        for _ in range(200):
+            if fetcher.stats['skipped']:
+                break
+            time.sleep(0.01)
+    finally:
+        fetcher.stop()
+        fetcher.wait(3000)
+    assert fetcher.stats == {'prefetched': 1, 'skipped': 1, 'failed': 0}
+    assert threads and threading.main_thread() not in threads
+
+
+def test_slew_target_read_from_configured_device(qapp, tmp_path, alpaca_server, caplog):
+    from src.services.alpaca_registry import AlpacaClientRegistry
+    alpaca_server.set_value('telescope', 'targetrightascension', 3.25, device_number=1)
+    alpaca_server.set_value('telescope', 'targetdeclination', 41.5, device_number=1)
+    registry = AlpacaClientRegistry(config={'devices': {
+        'telescope': {'api_url': alpaca_server.base_url, 'device_number': 1}}})
+    fetcher = make_fetcher(tmp_path)
+    fetcher.registry = registry
+    queued = []
+    fetcher.prefetch = lambda ra, dec, priority, reason: queued.append((ra, dec, priority, reason)) or True
+    fetcher._prefetch_slew_target_from_device()
+    assert queued == [(3.25, 41.5, PRIORITY_SLEW_TARGET, 'slew')]
+
+    # 设备不可达时记录警告，不让线程因异常退出
+    def unreachable(*args):
+        raise ConnectionError('设备不可达')
+    registry.client_for_device('telescope').get_multiple = unreachable
+    fetcher._prefetch_slew_target_from_device()
+    assert len(queued) == 1
+    assert '读取望远镜目标坐标失败' in caplog.text
+    registry.close_all()
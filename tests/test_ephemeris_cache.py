@@ -0,0 +1,35 @@
+"""
+星历缓存：按观测夜（本地中午到次日中午）缓存，过了午夜仍显示当晚的日落和晨昏蒙影时刻
+"""
+from datetime import datetime
+
+import pytz
+
+from src.services.ephemeris_cache import EphemerisCache
+
+TZ = pytz.timezone('Asia/Shanghai')
+
+
+def local_time(*args):
+    return TZ.localize(datetime(*args)).timestamp()
+
+
+def test_night_spans_midnight():
+    cache = EphemerisCache(latitude=38.614595, longitude=93.897782, tz_name='Asia/Shanghai')
+    evening = cache.get_sun_info(local_time(2026, 3, 10, 22, 0))
+    twilight = cache.get_twilight_info(local_time(2026, 3, 10, 22, 0))
+    after_midnight = local_time(2026, 3, 11, 1, 30)
+    assert cache.get_sun_info(after_midnight)['sunset'] == evening['sunset']
+    assert cache.get_twilight_info(after_midnight) == twilight
+    assert cache.recomputes == 1
+
+    night = cache.day(after_midnight)
+    assert str(night.date) == '2026-03-10'
+    events = night.events
+    assert events['sunset'] < events['dusk'] < after_midnight < events['dawn'] < events['sunrise']
+
+    # 中午切换到下一夜
+    cache.day(local_time(2026, 3, 11, 11, 59))
+    assert cache.recomputes == 1
+    assert str(cache.day(local_time(2026, 3, 11, 12, 0)).date) == '2026-03-11'
+    assert cache.recomputes == 2
@@ -0,0 +1,27 @@
+"""
+日志服务：print 的输出以 INFO 写入日志文件，控制台仍只输出 WARNING 以上
+"""
+import logging
+import os
+import sys
+
+from src.services.log_service import LogService
+
+
+def test_print_goes_to_file_not_console(tmp_path, capfd):
+    service = LogService()
+    service.setup({'dir': str(tmp_path), 'file': 'test.log', 'rate_limit': {'interval': 0}}, watch=False)
+    try:
+        print("赤道仪状态已更新")
+        sys.stdout.flush()
+        logging.getLogger('test').warning("圆顶通信超时")
+    finally:
+        service.shutdown()
+
+    with open(os.path.join(str(tmp_path), 'test.log'), encoding='utf-8') as f:
+        content = f.read()
+    assert 'INFO [MainThread] stdout: 赤道仪状态已更新' in content
+    assert '圆顶通信超时' in content
+    console = capfd.readouterr().err
+    assert '圆顶通信超时' in console
+    assert '赤道仪状态已更新' not in console
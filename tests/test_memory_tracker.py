@@ -0,0 +1,80 @@
+"""
+内存跟踪：快照差分指出增长的分配位置和对象类型，回收阈值按停顿和频率调整
+"""
+import gc
+import json
+import os
+import time
+
+from PyQt5.QtGui import QImage
+
+from src.services.memory_tracker import GcTuner, MemoryTracker, analyze, growth_rate
+from src.services.profiler import LatencyHistogram
+
+LEAK = []
+
+
+def leak(count):
+    # 增长最多的分配位置应指向这一行
+    LEAK.extend(bytearray(4096) for _ in range(count))
+
+
+def test_snapshot_diff_finds_growing_site(qapp, tmp_path):
+    directory = str(tmp_path / 'memory')
+    tracker = MemoryTracker({'directory': directory, 'sample_interval': 3600, 'snapshot_interval': 0,
+                             'gc_freeze': False, 'tracked_types': ['QImage'],
+                             'groups': {'tests': ['*test_memory_tracker.py']}})
+    tracker.start()
+    try:
+        tracker.freeze()
+        leak(500)
+        histograms = [LatencyHistogram() for _ in range(300)]
+        images = [QImage(100, 100, QImage.Format_RGB32) for _ in range(4)]
+    finally:
+        tracker.stop()
+    try:
+        with open(os.path.join(directory, 'growth.jsonl'), encoding='utf-8') as f:
+            baseline, latest = [json.loads(line) for line in f]
+        top = latest['sites'][0]
+        assert top['site'].endswith(f"test_memory_tracker.py:{leak.__code__.co_firstlineno + 2}")
+        assert top['size_diff'] >= 500 * 4096
+        assert latest['groups']['tests']['size'] - baseline['groups']['tests']['size'] >= 500 * 4096
+        types = {row['type']: row for row in latest['types_diff']}
+        assert types['src.services.profiler.LatencyHistogram']['delta'] >= len(histograms)
+        assert types['QImage']['delta'] >= len(images)
+        assert types['QImage']['bytes_delta'] >= 4 * 100 * 100 * 4
+
+        report = analyze(directory)
+        assert '快照差分' in report
+        assert 'test_memory_tracker.py' in report
+    finally:
+        LEAK.clear()
+
+
+def test_gc_threshold_follows_pause_and_rate():
+    original = gc.get_threshold()
+    tuner = GcTuner(min_threshold=700, max_threshold=20000, target_rate=2.0, pause_budget=0.005)
+    try:
+        gc.set_threshold(4000, original[1], original[2])
+        # 第 0 代停顿超过预算：阈值减半
+        tuner._on_gc('start', {})
+        time.sleep(0.01)
+        tuner._on_gc('stop', {'generation': 0, 'collected': 3})
+        assert tuner.adjust() == 2000
+        assert gc.get_threshold()[0] == 2000
+        assert tuner.collections == [1, 0, 0]
+        # 停顿很短但回收过于频繁：阈值加倍
+        for _ in range(50):
+            tuner._on_gc('start', {})
+            tuner._on_gc('stop', {'generation': 0, 'collected': 0})
+        assert tuner.adjust() == 4000
+        # 没有回收时不调整
+        assert tuner.adjust() is None
+    finally:
+        gc.set_threshold(*original)
+
+
+def test_growth_rate():
+    mb = 1024 * 1024
+    assert growth_rate([(0, 100 * mb), (1800, 110 * mb), (3600, 120 * mb)]) == 20.0
+    assert growth_rate([(0, 100 * mb), (60, 100 * mb)]) is None
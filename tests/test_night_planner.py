@@ -0,0 +1,55 @@
+"""
+整夜规划：目标 × 时间网格的高度角、大气质量与 astroplan 核对，排出的观测块满足约束且互不重叠
+"""
+import datetime
+
+import numpy as np
+import pytest
+
+from src.services.night_planner import NightPlanner
+
+TARGETS = [('M31', '00:42:44', '+41:16:09'), ('M42', '05:35:17', '-05:23:28'), ('Vega', 18.6156, 38.7837)]
+NIGHT = datetime.date(2026, 10, 17)
+
+
+def make_planner():
+    return NightPlanner(latitude=38.614595, longitude=93.897782, tz_name='Asia/Shanghai')
+
+
+def test_airmass_matches_astroplan():
+    pytest.importorskip('astroplan')
+    import astropy.units as u
+    from astroplan import FixedTarget, Observer
+    from astropy.coordinates import EarthLocation, SkyCoord
+    from astropy.time import Time
+
+    planner = make_planner()
+    plan = planner.plan(TARGETS, night_date=NIGHT, schedule=False)
+    observer = Observer(location=EarthLocation(lat=planner.latitude * u.deg, lon=planner.longitude * u.deg,
+                                               height=0 * u.m))
+    obstime = Time(plan.night.times, format='unix')
+    for index, (_name, ra, dec) in enumerate(TARGETS):
+        target = FixedTarget(SkyCoord(ra, dec, unit=(u.hourangle, u.deg)))
+        altaz = observer.altaz(obstime, target)
+        up = altaz.alt.deg > 20.0
+        assert up.any()
+        assert np.max(np.abs(plan.altitude[index][up] - altaz.alt.deg[up])) < 0.02
+        assert np.max(np.abs(plan.airmass[index][up] / altaz.secz[up].value - 1.0)) < 1e-3
+        rise = observer.target_rise_time(obstime[0], target, which='next', horizon=0 * u.deg)
+        assert abs(plan.rise[index] - rise.unix) < 60.0
+
+
+def test_schedule_respects_constraints():
+    planner = make_planner()
+    plan = planner.plan(TARGETS, night_date=NIGHT, max_airmass=1.8)
+    assert plan.schedule
+    night = plan.night
+    previous_end = night.dusk
+    for block in plan.schedule:
+        assert block['start'] >= previous_end - 1e-6
+        assert block['end'] <= night.dawn + 1e-6
+        assert block['airmass'] <= 1.8
+        previous_end = block['end']
+    # 同一夜再次规划不重新计算站址星历
+    planner.plan(TARGETS[:1], night_date=NIGHT)
+    assert planner.recomputes == 1
@@ -0,0 +1,40 @@
+"""
+旁行角计算：与 astroplan 核对，出错时的返回值与 astronomy_service 一致
+"""
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pytest
+
+from src.services.parallactic import FALLBACK_ANGLE, ParallacticCalculator, compare_with_astroplan, frame_dec_angle
+
+
+def test_matches_astroplan():
+    pytest.importorskip('astroplan')
+    calculator = ParallacticCalculator(latitude=38.614595, longitude=93.897782)
+    start = time.time()
+    times = np.linspace(start, start + 8 * 3600, 50)
+    for ra_hours, dec_deg in ((5.5, -5.4), (13.4, 47.2), (20.7, 45.3)):
+        errors = compare_with_astroplan(calculator, ra_hours, dec_deg, times)
+        # 使用 astropy 恒星时时只剩公式本身的误差；传入 UT1−UTC 后本模块的恒星时与 astropy 相差不到 1″
+        assert errors['formula_arcsec'] < 5.0
+        assert errors['fast_path_dut1_arcsec'] < 1.0
+
+
+def test_text_coordinates_and_fallback():
+    calculator = ParallacticCalculator(latitude=38.614595, longitude=93.897782)
+    pa = calculator.parallactic_angle(5.5, -5.4, lst=7.0)
+    assert calculator.calculate_parallactic_angle('05:30:00', '-05:24:00', 30.0, lst=7.0) == \
+        pytest.approx(frame_dec_angle(30.0, pa))
+    assert calculator.calculate_parallactic_angle('--', '--', 30.0) == FALLBACK_ANGLE
+
+
+def test_import_does_not_load_requests_or_qt():
+    code = ("import sys, src.services.parallactic; "
+            "print('requests' in sys.modules or 'PyQt5.QtGui' in sys.modules)")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True, cwd=root)
+    assert output.stdout.strip() == 'False'
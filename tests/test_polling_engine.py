@@ -0,0 +1,119 @@
+"""
+批量轮询引擎：读取失败保留上一次的值，慢端点不阻塞轮询周期；
+设备控件的 DeviceListMonitor 只扫描设备列表，连接、断开设备时增减轮询目标
+"""
+import time
+
+from PyQt5.QtCore import Qt
+
+from src.services.alpaca_registry import AlpacaClientRegistry
+from src.services.polling_engine import (ERRORS_KEY, DeviceConnections, DeviceListMonitor, PollingEngine,
+                                         PollingMonitor, PollTarget)
+
+
+def make_engine(server, endpoints, cycle_deadline=0.3, intervals=None):
+    target = PollTarget('ObservingConditions', 'observingconditions', server.base_url, endpoints)
+    return PollingEngine([target], timeout=(1, 3), cycle_deadline=cycle_deadline, intervals=intervals,
+                         registry=AlpacaClientRegistry({}))
+
+
+def test_failed_read_keeps_last_value(alpaca_server):
+    # 5xx 会按退避重试，截止时间要覆盖重试耗时
+    engine = make_engine(alpaca_server, ['humidity', 'rainrate'], cycle_deadline=5.0)
+    try:
+        first = engine.poll_cycle()['ObservingConditions']
+        assert first['humidity'] == 35.0
+        assert first[ERRORS_KEY] == {}
+
+        alpaca_server.fault_rate = 1.0
+        second = engine.poll_cycle()['ObservingConditions']
+        assert second['humidity'] == 35.0
+        assert second['rainrate'] == 0.0
+        assert set(second[ERRORS_KEY]) == {'humidity', 'rainrate'}
+
+        alpaca_server.fault_rate = 0.0
+        alpaca_server.set_value('observingconditions', 'humidity', 80.0)
+        third = engine.poll_cycle()['ObservingConditions']
+        assert third['humidity'] == 80.0
+        assert third[ERRORS_KEY] == {}
+    finally:
+        engine.close()
+
+
+def test_slow_endpoint_carried_into_next_cycle(alpaca_server):
+    alpaca_server.endpoint_latency['humidity'] = 1.0
+    # 等待期间其余端点不到期，请求数只反映 humidity 是否被重复提交
+    engine = make_engine(alpaca_server, ['humidity', 'rainrate', 'windgust'], intervals={'safety': 30.0})
+    try:
+        start = time.monotonic()
+        first = engine.poll_due()
+        assert time.monotonic() - start < 0.9
+        assert 'rainrate' in first['ObservingConditions']
+        assert 'humidity' not in first['ObservingConditions']
+
+        # 仍在等待的请求不会重复提交
+        assert all(field != 'humidity' for _target, field in engine.due_requests(time.monotonic()))
+
+        deadline = time.monotonic() + 3.0
+        snapshot = {}
+        while 'humidity' not in snapshot and time.monotonic() < deadline:
+            snapshot = engine.poll_due().get('ObservingConditions', snapshot)
+        assert snapshot['humidity'] == 35.0
+        assert alpaca_server.request_count('observingconditions') == 3
+    finally:
+        engine.close()
+
+
+def test_device_list_monitor_only_scans_until_connected(alpaca_server):
+    registry = AlpacaClientRegistry({'devices': {'covercalibrator': {'api_url': alpaca_server.base_url}}})
+    monitor = DeviceListMonitor(0, 'cover', registry=registry, connections=DeviceConnections())
+    monitor.device_scan_interval = 0.1
+    scans = []
+    monitor.devices_updated.connect(scans.append, Qt.DirectConnection)
+    monitor.start()
+    try:
+        deadline = time.monotonic() + 3.0
+        while not scans and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert scans and all(device['DeviceType'] == 'CoverCalibrator' for device in scans[-1])
+
+        monitor.set_device(0, 'cover')
+        time.sleep(0.3)
+        alpaca_server.reset_counters()
+        time.sleep(0.5)
+        assert alpaca_server.request_count() == 0
+    finally:
+        monitor.stop()
+        monitor.wait(2000)
+        registry.close_all()
+
+
+def test_connected_devices_drive_poll_targets(qapp):
+    config = {'devices': {
+        'telescope': {'enabled': True, 'api_url': 'http://127.0.0.1:1', 'endpoints': ['rightascension']},
+        'covercalibrator': {'enabled': False, 'api_url': 'http://127.0.0.1:1', 'endpoints': ['coverstate']},
+        'ObservingConditions': {'enabled': True, 'api_url': 'http://127.0.0.1:1', 'endpoints': ['rainrate']},
+    }}
+    connections = DeviceConnections()
+    monitor = PollingMonitor(config=config, connections=connections)
+    mount = DeviceListMonitor(0, 'mount', registry=AlpacaClientRegistry(config), connections=connections)
+    cover = DeviceListMonitor(0, 'cover', registry=AlpacaClientRegistry(config), connections=connections)
+    try:
+        # 配置中启用但未在界面中连接的设备不轮询
+        assert monitor.engine.targets == []
+
+        mount.set_device(0, 'mount')
+        cover.set_device(2, 'cover')
+        targets = {target.device_key: target.device_number for target in monitor.engine.targets}
+        assert targets == {'telescope': 0, 'covercalibrator': 2}
+
+        mount.disconnect_device()
+        assert [target.device_key for target in monitor.engine.targets] == ['covercalibrator']
+
+        # 安全联锁读取的设备不随界面连接
+        monitor.engine.set_safety_fields([('ObservingConditions', 'rainrate')])
+        monitor.engine.set_targets(monitor.build_targets())
+        assert {target.device_key for target in monitor.engine.targets} == {'covercalibrator', 'ObservingConditions'}
+    finally:
+        monitor.stop()
+        monitor.engine.close()
@@ -0,0 +1,92 @@
+"""
+热点路径计时：直方图百分位数误差、导出后比较版本，以及 HTTP 请求按 Alpaca 端点计时
+"""
+import random
+import time
+
+import numpy as np
+import requests
+from PyQt5.QtCore import QEventLoop, QTimer
+from requests.adapters import HTTPAdapter
+
+from src.services.profiler import (EventLoopLagProbe, Instrumentation, LatencyHistogram, find_regressions,
+                                   load_histograms, request_metric, wrap_method, write_histograms)
+
+
+def test_percentiles_within_bucket_error():
+    rng = random.Random(7)
+    samples = [rng.lognormvariate(-6.0, 1.2) for _ in range(20000)]
+    histogram = LatencyHistogram()
+    for value in samples:
+        histogram.record(value)
+    assert histogram.count == len(samples)
+    assert abs(histogram.mean - np.mean(samples)) < 1e-9
+    for p in (50, 90, 99, 99.9):
+        exact = float(np.percentile(samples, p, method='higher'))
+        assert abs(histogram.percentile(p) / exact - 1.0) < 0.02
+    assert histogram.percentile(100) == max(samples)
+
+
+def test_exported_histograms_compare_between_versions(tmp_path):
+    old = Instrumentation({'enabled': True, 'label': 'old'})
+    new = Instrumentation({'enabled': True, 'label': 'new'})
+    for _ in range(200):
+        old.record('alpaca.get.telescope.rightascension', 0.010)
+        new.record('alpaca.get.telescope.rightascension', 0.015)
+        old.record('dss.get_path', 0.002)
+        new.record('dss.get_path', 0.002)
+    baseline = load_histograms(write_histograms(old, str(tmp_path / 'old.json')))
+    current = load_histograms(write_histograms(new, str(tmp_path / 'new.json')))
+    assert baseline['dss.get_path'].summary() == old.histogram('dss.get_path').summary()
+
+    regressions = find_regressions(baseline, current, ratio=1.2, min_count=100)
+    assert {item['name'] for item in regressions} == {'alpaca.get.telescope.rightascension'}
+    assert abs(regressions[0]['ratio'] - 1.5) < 0.05
+    assert find_regressions(baseline, current, min_count=500) == []
+
+    disabled = Instrumentation({'enabled': False})
+    with disabled.timer('ui.update_status'):
+        pass
+    disabled.record('ui.update_status', 1.0)
+    assert disabled.names() == []
+
+
+def test_http_requests_timed_per_alpaca_endpoint(alpaca_server):
+    instrumentation = Instrumentation({'enabled': True})
+
+    class Adapter(HTTPAdapter):
+        def send(self, request, *args, **kwargs):
+            return super().send(request, *args, **kwargs)
+
+    def metric(self, request, *args, **kwargs):
+        return request_metric(request, 'archive.stsci.edu')
+
+    wrap_method(Adapter, 'send', metric, instrumentation)
+    wrap_method(Adapter, 'send', metric, instrumentation)
+    session = requests.Session()
+    session.mount('http://', Adapter())
+    alpaca_server.endpoint_latency['rightascension'] = 0.05
+    for _ in range(3):
+        session.get(f"{alpaca_server.base_url}/api/v1/telescope/0/rightascension", timeout=5)
+    session.close()
+
+    histogram = instrumentation.histogram('alpaca.get.telescope.rightascension')
+    assert histogram.count == 3
+    assert histogram.min >= 0.05
+    request = requests.Request('GET', 'https://archive.stsci.edu/cgi-bin/dss_search?r=1').prepare()
+    assert request_metric(request, 'archive.stsci.edu') == 'dss.download'
+
+
+def test_loop_lag_probe_reports_stall(qapp):
+    instrumentation = Instrumentation({'enabled': True})
+    probe = EventLoopLagProbe(instrumentation, interval_ms=20, warning=0.2)
+    stalls = []
+    probe.stalled.connect(stalls.append)
+    probe.start()
+    QTimer.singleShot(50, lambda: time.sleep(0.3))
+    loop = QEventLoop()
+    QTimer.singleShot(600, loop.quit)
+    loop.exec_()
+    probe.stop()
+    assert stalls and stalls[0] >= 0.2
+    assert instrumentation.histogram('qt.loop_lag').count > 5
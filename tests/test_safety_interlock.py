@@ -0,0 +1,110 @@
+"""
+安全联锁：对 Alpaca 桩服务器的端到端触发时间，UPS 市电故障按 status_bits[0]（b7）判断
+"""
+import time
+
+import pytest
+
+from src.services.alpaca_registry import AlpacaClientRegistry
+from src.services.command_executor import CommandExecutor, DeviceCommand
+from src.services.polling_engine import PollingMonitor
+from src.services.safety_interlock import SafetyCommandPath, SafetyInterlock, SafetyRule, safety_settings
+from src.services.state_store import StateStore, connect_sources
+
+
+def device_config(server):
+    return {
+        'ObservingConditions': {'enabled': True, 'api_url': server.base_url,
+                                'endpoints': ['rainrate', 'windgust', 'humidity', 'temperature']},
+        'dome': {'enabled': True, 'api_url': server.base_url, 'endpoints': ['azimuth', 'shutter_status']},
+        'covercalibrator': {'enabled': True, 'api_url': server.base_url, 'endpoints': ['coverstate']},
+    }
+
+
+@pytest.fixture
+def safety(qapp, alpaca_server):
+    config = {'devices': device_config(alpaca_server), 'polling': {'cycle_deadline': 0.3}}
+    registry = AlpacaClientRegistry(config)
+    store = StateStore()
+    monitor = PollingMonitor(config=config)
+    executor = CommandExecutor(registry=registry, polling_engine=monitor.engine)
+    settings = safety_settings({'retry_interval': 0.1, 'command_timeout': 5.0})
+    interlock = SafetyInterlock(settings, executor, monitor.engine, registry=AlpacaClientRegistry(config))
+    interlock.attach(store).guard(executor).start()
+    monitor.engine.set_safety_fields(interlock.watched_fields())
+    connect_sources(store, monitor=monitor)
+    yield monitor, executor, interlock
+    monitor.stop()
+    monitor.wait(3000)
+    interlock.stop()
+    executor.shutdown(wait=True)
+    registry.close_all()
+
+
+def wait_for(predicate, timeout):
+    deadline = time.perf_counter() + timeout
+    while not predicate() and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_rain_closes_shutter_and_cover_within_one_second(alpaca_server, safety):
+    monitor, executor, interlock = safety
+    alpaca_server.set_value('dome', 'shutterstatus', 0)
+    alpaca_server.set_value('covercalibrator', 'coverstate', 3)
+    monitor.start()
+    assert wait_for(lambda: monitor.engine.snapshots['ObservingConditions'].get('rainrate') == 0.0, 3.0)
+    assert interlock.is_safe()
+
+    start = time.perf_counter()
+    alpaca_server.set_value('observingconditions', 'rainrate', 2.5)
+    assert wait_for(lambda: alpaca_server.get_value('dome', 'shutterstatus') in (1, 3), 2.0)
+    assert wait_for(lambda: alpaca_server.get_value('covercalibrator', 'coverstate') in (1, 2), 2.0)
+    assert time.perf_counter() - start < 1.0
+    assert 'rain' in interlock.active_rules()
+
+    result = executor.submit(DeviceCommand('dome', 'openshutter')).result(timeout=1.0)
+    assert not result['success']
+    assert 'rain' in result['error']
+
+
+def test_safety_fields_polled_at_safety_interval(safety):
+    monitor, _executor, _interlock = safety
+    engine = monitor.engine
+    dome = next(target for target in engine.targets if target.device_key == 'dome')
+    weather = next(target for target in engine.targets if target.device_key == 'ObservingConditions')
+    assert engine.interval_for(dome, 'shutter_status', fast=False) == engine.intervals['safety']
+    assert engine.interval_for(dome, 'azimuth', fast=False) == engine.intervals['fast_idle']
+    assert engine.interval_for(weather, 'temperature', fast=False) == engine.intervals['normal']
+
+
+def test_mains_failure_keyed_on_utility_fail_bit():
+    rule = next(SafetyRule.from_dict(data) for data in safety_settings()['rules'] if data['name'] == 'mains_failure')
+    assert rule.unsafe(rule.select([1, 0, 0, 0, 0, 0, 0, 0]))
+    # b3（后备式 UPS）、b0（蜂鸣器）不表示市电故障
+    assert not rule.unsafe(rule.select([0, 0, 0, 0, 1, 0, 0, 1]))
+    assert rule.select([]) is None
+
+
+def test_close_command_sent_to_configured_device_number(alpaca_server):
+    alpaca_server.set_value('dome', 'shutterstatus', 0)
+    alpaca_server.set_value('dome', 'shutterstatus', 0, device_number=1)
+    alpaca_server.set_value('covercalibrator', 'coverstate', 3, device_number=2)
+    config = {'devices': {'dome': {'api_url': alpaca_server.base_url, 'device_number': 1},
+                          'covercalibrator': {'api_url': alpaca_server.base_url, 'device_number': 2}}}
+    registry = AlpacaClientRegistry(config)
+    results = {}
+    path = SafetyCommandPath(safety_settings({'retry_interval': 0.1, 'command_timeout': 5.0}), registry,
+                             on_finished=results.__setitem__)
+    try:
+        assert path.execute('close_shutter', 'rain', time.perf_counter())
+        assert path.execute('close_cover', 'rain', time.perf_counter())
+        assert wait_for(lambda: len(results) == 2, 5.0)
+        assert results['close_shutter']['success'] and results['close_cover']['success']
+        assert alpaca_server.get_value('dome', 'shutterstatus', device_number=1) == 1
+        assert alpaca_server.get_value('covercalibrator', 'coverstate', device_number=2) == 1
+        # 0 号设备未被操作
+        assert alpaca_server.get_value('dome', 'shutterstatus') == 0
+    finally:
+        path.close()
+        registry.close_all()
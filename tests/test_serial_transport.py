@@ -0,0 +1,124 @@
+"""
+串口设备解码（Megatec Q1 状态字节按 b7..b0 的字符顺序），以及经伪终端模拟设备的收发；
+配置了串口的设备默认由 SerialTransport 读取
+"""
+import sys
+import time
+
+import pytest
+from PyQt5.QtCore import Qt
+
+from src.services import serial_transport
+from src.services.serial_transport import MegatecUpsProtocol, SerialTransport, transport_devices
+
+pty_only = pytest.mark.skipif(sys.platform == 'win32', reason='伪终端模拟设备仅支持 Linux/macOS')
+
+
+class FakeConfig:
+    def __init__(self, devices):
+        self.devices = devices
+
+    def get(self, path, default=None):
+        return self.devices.get(path.split('.', 1)[1], default)
+
+
+def test_configured_serial_devices_use_transport(monkeypatch):
+    devices = {'cooler': {'enabled': True, 'api_url': 'serial', 'port': 'COM20'}}
+    monkeypatch.setattr(serial_transport, 'get_config_service', lambda: FakeConfig(devices))
+    assert transport_devices() == ['cooler']
+    # telemetry_server.serial_devices 中的设备总是打开
+    assert transport_devices(['ups', 'cooler']) == ['cooler', 'ups']
+
+    devices['cooler']['transport'] = False
+    assert transport_devices() == []
+    devices['ups'] = {'enabled': True, 'port': '/dev/ttyUSB1'}
+    devices['cooler'] = {'enabled': False, 'port': 'COM20'}
+    assert transport_devices() == ['ups']
+
+
+def q1_frame(status_byte, battery_voltage=13.2):
+    return f"(230.0 230.0 229.8 012 50.0 {battery_voltage:04.2f} 30.0 {status_byte}\r".encode('ascii')
+
+
+@pytest.mark.parametrize('status_byte, state', [
+    ('00000000', '市电正常'),
+    ('00001000', '市电正常'),     # b3：后备式 UPS，市电正常
+    ('00000001', '市电正常'),     # b0：蜂鸣器开启
+    ('10000000', '电池供电'),     # b7：市电故障
+    ('11001000', '电池供电'),     # 后备式 UPS 市电故障且电池电量低
+    ('00100000', '旁路供电'),     # b5：旁路/升降压
+    ('00010000', '故障'),         # b4：UPS 故障
+])
+def test_megatec_status_bits(status_byte, state):
+    protocol = MegatecUpsProtocol()
+    buffer = bytearray(q1_frame(status_byte) + b'(')
+    frame = protocol.extract_frame(buffer)
+    assert buffer == bytearray(b'(')
+    status = protocol.decode_status(frame)
+    assert status['status'] == state
+    assert status['status_bits'][0] == int(status_byte[0])
+    assert status['input_voltage'] == 230.0
+    assert status['load'] == 12
+    assert status['battery'] == MegatecUpsProtocol.battery_percentage(13.2)
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.perf_counter() + timeout
+    while not predicate() and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+@pytest.fixture
+def transport(qapp):
+    transport = SerialTransport()
+    events = {'read': [], 'changed': [], 'error': []}
+    transport.status_read.connect(lambda device, status: events['read'].append((device, status)),
+                                  Qt.DirectConnection)
+    transport.status_changed.connect(lambda device, status: events['changed'].append((device, status)),
+                                     Qt.DirectConnection)
+    transport.device_error.connect(lambda device, error: events['error'].append((device, error)),
+                                   Qt.DirectConnection)
+    transport.events = events
+    yield transport
+    transport.shutdown()
+
+
+@pty_only
+def test_ups_status_over_pty(transport):
+    from src.simulators.serial_device import FakeSerialDevice
+    with FakeSerialDevice('ups') as device:
+        assert transport.open_device('ups', device.port, poll_interval=0.05, timeout=0.5)
+        changed = transport.events['changed']
+        assert wait_until(lambda: changed)
+        assert changed[0][1]['status'] == '市电正常'
+        assert changed[0][1]['input_voltage'] == 230.0
+
+        # 状态不变时每次读数仍经 status_read 送出，status_changed 不重复
+        assert wait_until(lambda: len(transport.events['read']) >= 3)
+        assert len(changed) == 1
+
+        device.set_state(status_bits='10000000')
+        assert wait_until(lambda: changed[-1][1]['status'] == '电池供电')
+        assert changed[-1][1]['status_bits'][0] == 1
+
+
+@pty_only
+def test_silent_device_does_not_block_other_port(transport):
+    from src.simulators.serial_device import FakeSerialDevice
+    with FakeSerialDevice('cooler') as cooler, FakeSerialDevice('ups') as ups:
+        cooler.silent = True
+        assert transport.open_device('cooler', cooler.port, poll_interval=0.05, timeout=0.3)
+        assert transport.open_device('ups', ups.port, poll_interval=0.05, timeout=0.3)
+
+        # 水冷机不应答：只报告一次错误，UPS 照常按节拍读取
+        assert wait_until(lambda: transport.events['error'])
+        assert transport.events['error'][0][0] == 'cooler'
+        def ups_reads():
+            return [status for device, status in transport.events['read'] if device == 'ups']
+        assert wait_until(lambda: len(ups_reads()) >= 5, timeout=2.0)
+        assert len(transport.events['error']) == 1
+
+        cooler.silent = False
+        assert wait_until(lambda: transport.last_status('cooler') is not None)
+        assert transport.last_status('cooler')['temperature'] == 18.5
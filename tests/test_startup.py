@@ -0,0 +1,139 @@
+"""
+分阶段启动：窗口先显示，设备缓存、设备搜索和串口枚举在首次绘制后于后台完成，结束时写入启动报告
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from PyQt5.QtCore import QEventLoop, QObject, QTimer, pyqtSignal
+from PyQt5.QtWidgets import QWidget
+
+from src.services import startup
+from src.services.startup import BackgroundTasks, StagedStartup, StartupProfiler, find_regressions, startup_settings
+
+CACHED = {'DeviceName': 'Cached Mount', 'DeviceType': 'Telescope', 'DeviceNumber': 0,
+          'ServerUrl': 'http://192.168.1.20:11111'}
+LIVE = {'DeviceName': 'Live Dome', 'DeviceType': 'Dome', 'DeviceNumber': 0,
+        'ServerUrl': 'http://192.168.1.30:11111'}
+
+
+class FakeDiscovery(QObject):
+    """缓存立即返回、实时搜索较慢的设备发现服务"""
+
+    devices_found = pyqtSignal(str, list)
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+    def load_cache(self):
+        return OrderedDict([(CACHED['ServerUrl'], [CACHED])])
+
+    def discover(self):
+        self.release.wait(5.0)
+        return [LIVE]
+
+
+class Window(QWidget):
+    """只记录连接菜单内容的主窗口替身"""
+
+    def __init__(self):
+        super().__init__()
+        self.menus = []
+
+    def init_connect_menu(self, devices):
+        self.menus.append([device['DeviceName'] for device in devices])
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.perf_counter() + timeout
+    while not predicate() and time.perf_counter() < deadline:
+        loop = QEventLoop()
+        QTimer.singleShot(10, loop.quit)
+        loop.exec_()
+    return predicate()
+
+
+def test_background_tasks_report_on_ui_thread(qapp):
+    tasks = BackgroundTasks(profiler=StartupProfiler())
+    gate = threading.Event()
+    finished, failed, threads = [], [], []
+    tasks.task_finished.connect(lambda name, result: (finished.append((name, result)),
+                                                      threads.append(threading.current_thread())))
+    tasks.task_failed.connect(lambda name, error: failed.append((name, error)))
+    done = []
+    tasks.all_finished.connect(lambda: done.append(True))
+
+    assert tasks.submit('slow', lambda: gate.wait(5.0) and 42)
+    assert not tasks.submit('slow', lambda: 0)
+    assert tasks.submit('broken', lambda: 1 / 0)
+    assert wait_until(lambda: failed)
+    assert not done
+    gate.set()
+    assert wait_until(lambda: done)
+    assert finished == [('slow', 42)]
+    assert failed[0][0] == 'broken'
+    assert threads == [threading.main_thread()]
+    assert tasks.profiler.tasks['broken']['ok'] is False
+    tasks.shutdown()
+
+
+def test_cached_devices_shown_before_discovery(qapp, tmp_path, monkeypatch):
+    monkeypatch.setattr(startup, 'list_serial_ports', lambda: ['/dev/ttyUSB0'])
+    monkeypatch.setattr(startup, 'warm_ephemeris', lambda: None)
+    discovery = FakeDiscovery()
+    window = Window()
+    settings = {'report_path': str(tmp_path / 'startup_report.json'),
+                'history_path': str(tmp_path / 'startup_history.jsonl'),
+                'preload': [], 'defer_timers_ms': 0}
+    staged = StagedStartup(window, profiler=StartupProfiler(), settings=settings, discovery=discovery)
+    reports = []
+    staged.ready.connect(reports.append)
+    deferred = []
+    staged.defer(lambda: deferred.append(True))
+
+    staged.begin()
+    window.show()
+    try:
+        # 首次绘制后才开始后台任务；缓存中的设备在搜索完成之前先显示
+        assert wait_until(lambda: any('Cached Mount' in menu for menu in window.menus))
+        assert 'first_paint' in staged.profiler.marks
+        assert wait_until(lambda: deferred)
+        assert not reports
+
+        discovery.release.set()
+        assert wait_until(lambda: reports)
+        assert 'Live Dome' in window.menus[-1]
+        assert 'Cached Mount' not in window.menus[-1]
+        assert 'ASCOM CoverCalibrator Simulator' in window.menus[-1]
+        assert staged.serial_ports == ['/dev/ttyUSB0']
+    finally:
+        discovery.release.set()
+        staged.shutdown()
+        window.close()
+
+    report = reports[0]
+    phases = report['phases']
+    assert phases['first_paint'] <= phases['interactive'] <= phases['cached_devices'] <= phases['ready']
+    assert set(report['background']) >= {'device_cache', 'alpaca_devices', 'serial_ports', 'ephemeris'}
+    with open(settings['report_path'], encoding='utf-8') as f:
+        assert json.load(f)['phases'] == phases
+    with open(settings['history_path'], encoding='utf-8') as f:
+        assert len(f.readlines()) == 1
+
+
+def test_regression_against_history():
+    settings = startup_settings({'history_size': 5})
+    history = [{'time_to_first_paint': 1.0, 'import_total': 0.5}] * 5
+    imports = [{'module': 'src.ui.main_window', 'cumulative': 0.3, 'self': 0.1}]
+    previous = {'imports': imports}
+    report = {'time_to_first_paint': 1.1, 'import_total': 0.5, 'imports': imports}
+    assert find_regressions(report, previous, history, settings) == []
+
+    report = {'time_to_first_paint': 2.0, 'import_total': 0.5,
+              'imports': [{'module': 'src.ui.main_window', 'cumulative': 0.9, 'self': 0.1}]}
+    regressions = find_regressions(report, previous, history, settings)
+    assert len(regressions) == 2
+    assert regressions[0].startswith('首次绘制')
+    assert 'src.ui.main_window' in regressions[1]
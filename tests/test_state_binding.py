@@ -0,0 +1,80 @@
+"""
+状态总线接入：天窗状态统一使用 shutter_status，水冷机只在串口推送时停止强制刷新，
+轮询线程已发布的设备不再由主窗口的状态更新方法重复发布
+"""
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+from src.services.state_store import StateStore, connect_sources
+from src.ui.state_binding import install_state_binding, stop_cooler_refresh
+
+
+class Transport:
+    def __init__(self, *open_devices):
+        self.open_devices = set(open_devices)
+
+    def is_open(self, device_key):
+        return device_key in self.open_devices
+
+
+def make_window():
+    window = QObject()
+    window.cooler_refresh_timer = QTimer(window)
+    window.cooler_refresh_timer.start(5000)
+    return window
+
+
+def test_cooler_refresh_kept_without_transport(qapp):
+    window = make_window()
+    assert not stop_cooler_refresh(window, None)
+    assert not stop_cooler_refresh(window, Transport('ups'))
+    assert window.cooler_refresh_timer.isActive()
+
+
+def test_cooler_refresh_stopped_when_transport_reads_cooler(qapp):
+    window = make_window()
+    assert stop_cooler_refresh(window, Transport('cooler', 'ups'))
+    assert not window.cooler_refresh_timer.isActive()
+
+
+def test_dome_shutter_status_is_typed(qapp):
+    store = StateStore()
+    store.publish('dome', {'shutter_status': '1', 'azimuth': '120.5'})
+    assert store.get('dome', 'shutter_status') == 1
+    assert store.get('dome', 'azimuth') == 120.5
+
+
+class Monitor(QObject):
+    snapshot_updated = pyqtSignal(str, dict)
+
+
+class Window:
+    def __init__(self, store):
+        self._state_store = store
+        self.shown = []
+
+    def update_dome_status(self, status):
+        self.shown.append(status)
+
+    def update_coordinates(self, ra, dec, alt, az):
+        self.shown.append((ra, dec, alt, az))
+
+
+def test_polled_devices_have_a_single_publisher(qapp):
+    store = StateStore(coalesce_ms=0)
+    published = []
+    store.add_listener(lambda device, values, timestamp: published.append((device, dict(values))))
+    monitor = Monitor()
+    connect_sources(store, monitor=monitor)
+    window = install_state_binding(type('PatchedWindow', (Window,), {}))(store)
+
+    # 轮询线程发布之前，界面收到的状态照常发布（例如远程模式下没有本地数据源）
+    window.update_coordinates(1.0, 2.0, 30.0, 40.0)
+    assert [device for device, _ in published] == ['telescope']
+
+    monitor.snapshot_updated.emit('dome', {'shutter_status': 0, 'azimuth': 90.0})
+    window.update_dome_status({'shutter_status': 0, 'azimuth': 90.0})
+    monitor.snapshot_updated.emit('telescope', {'rightascension': 1.5, 'declination': 2.0})
+    window.update_coordinates(1.5, 2.0, 30.0, 40.0)
+    assert [device for device, _ in published] == ['telescope', 'dome', 'telescope']
+    assert len(window.shown) == 3
+    assert store.get('dome', 'shutter_status') == 0
@@ -0,0 +1,66 @@
+"""
+遥测服务：/state 返回状态中心的最新快照，WebSocket 先推送完整快照、之后只推送变化的字段
+"""
+import json
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import pytest
+
+from src.services.state_store import StateStore
+from src.services.telemetry_server import API_PREFIX, OP_TEXT, TelemetryServer, WebSocketClient
+
+
+@pytest.fixture
+def served(qapp):
+    store = StateStore(coalesce_ms=0)
+    server = TelemetryServer(store, {'host': '127.0.0.1', 'port': 0, 'ping_interval': 60}).start()
+    yield store, server
+    server.stop()
+
+
+def get_json(url):
+    with urlopen(url, timeout=5) as response:
+        return json.loads(response.read())
+
+
+def test_state_endpoint(served):
+    store, server = served
+    store.publish('dome', {'azimuth': 120.5, 'shutter_status': 0})
+    store.publish('ObservingConditions', {'windspeed': 3.0})
+    store.flush()
+
+    state = get_json(f"{server.base_url}{API_PREFIX}/state?devices=dome")
+    assert state['type'] == 'state'
+    assert list(state['devices']) == ['dome']
+    assert state['devices']['dome']['values'] == {'azimuth': 120.5, 'shutter_status': 0}
+
+    dome = get_json(f"{server.base_url}{API_PREFIX}/state/dome")
+    assert dome['device'] == 'dome' and dome['values']['azimuth'] == 120.5
+    with pytest.raises(HTTPError) as error:
+        urlopen(f"{server.base_url}{API_PREFIX}/state/rotator", timeout=5)
+    assert error.value.code == 404
+
+
+def test_websocket_change_feed(served):
+    store, server = served
+    store.publish('dome', {'azimuth': 120.5, 'shutter_status': 0})
+    store.flush()
+
+    client = WebSocketClient(f"{server.stream_url}?devices=dome")
+    try:
+        opcode, payload = client.receive()
+        state = json.loads(payload)
+        assert opcode == OP_TEXT and state['type'] == 'state'
+        assert state['devices']['dome']['values']['azimuth'] == 120.5
+
+        # 未订阅的设备不推送；订阅设备只推送变化的字段
+        store.publish('ObservingConditions', {'windspeed': 3.0})
+        store.publish('dome', {'azimuth': 121.0, 'shutter_status': 0})
+        store.flush()
+        update = json.loads(client.receive()[1])
+        assert update['type'] == 'update' and update['device'] == 'dome'
+        assert update['values'] == {'azimuth': 121.0}
+        assert update['seq'] > state['seq']
+    finally:
+        client.close()
@@ -0,0 +1,45 @@
+"""
+时序存储：读数只经状态中心记录一次；清理过期段前关闭内存映射
+"""
+import os
+
+from src.services.state_store import StateStore
+from src.services.telemetry_store import TelemetryStore, connect_state_store
+
+
+def make_store(tmp_path):
+    return TelemetryStore(root=str(tmp_path / 'telemetry'), flush_interval=60, fsync_interval=0, autostart=False)
+
+
+def test_state_store_publishes_are_recorded_once(qapp, tmp_path):
+    telemetry = make_store(tmp_path)
+    store = StateStore(coalesce_ms=0)
+    remove = connect_state_store(store, telemetry)
+
+    store.publish('ObservingConditions', {'windspeed': 3.5, 'humidity': 40.0}, timestamp=1000.0)
+    store.publish('ObservingConditions', {'windspeed': 4.0, 'humidity': 40.0}, timestamp=1001.0)
+    store.publish('ObservingConditions', {'windspeed': 4.0, 'shutter': 'open'}, timestamp=1002.0)
+    remove()
+    store.publish('ObservingConditions', {'windspeed': 5.0}, timestamp=1003.0)
+
+    windspeed = telemetry.query('ObservingConditions.windspeed', 0, 2000, tier='raw')
+    humidity = telemetry.query('ObservingConditions.humidity', 0, 2000, tier='raw')
+    assert list(windspeed['t']) == [1000.0, 1001.0, 1002.0]
+    assert list(windspeed['v']) == [3.5, 4.0, 4.0]
+    assert list(humidity['t']) == [1000.0, 1001.0]
+    telemetry.close()
+
+
+def test_prune_closes_memory_maps(tmp_path):
+    telemetry = make_store(tmp_path)
+    telemetry.record('ups.battery_voltage', 13.2, t=1000.0)
+    telemetry.flush(now=1000.0)
+    assert len(telemetry.query('ups.battery_voltage', 0, 2000, tier='raw')['v']) == 1
+    path = telemetry._segment_path('raw', 'ups.battery_voltage', 0.0)
+    mappings = [records._mmap for key, records in telemetry._maps.items() if key[0] == path]
+    assert mappings and not mappings[0].closed
+
+    telemetry.flush(now=1000.0 + 2 * 86400)
+    assert mappings[0].closed
+    assert not os.path.exists(path)
+    telemetry.close()
@@ -0,0 +1,88 @@
+"""
+设备通信记录：记录真实请求和响应（不含 ClientID），回放服务器按记录时刻应答同样的读数和失败
+"""
+import gzip
+
+import pytest
+import requests
+
+from src.services.traffic_recorder import TrafficRecorder, read_recording, start_recording, stop_recording
+from src.simulators.replay_server import ReplayHarness
+
+
+def test_records_alpaca_requests(alpaca_server, tmp_path):
+    path = str(tmp_path / 'traffic.jsonl.gz')
+    alpaca_server.set_value('telescope', 'rightascension', 5.5)
+    recorder = start_recording({'serial': False, 'label': 'test'}, path=path)
+    try:
+        base = f"{alpaca_server.base_url}/api/v1"
+        requests.get(f"{base}/telescope/0/rightascension", params={'ClientID': 1}, timeout=5)
+        requests.put(f"{base}/dome/0/openshutter", data={'ClientID': 1, 'ClientTransactionID': 7}, timeout=5)
+        requests.get(f"{alpaca_server.base_url}/setup", timeout=5)
+    finally:
+        stop_recording(recorder)
+    # 停止之后的请求不再记录
+    requests.get(f"{alpaca_server.base_url}/api/v1/telescope/0/declination", timeout=5)
+
+    header, events = read_recording(path)
+    events = list(events)
+    assert header['format'] == 'tianyu-traffic' and header['label'] == 'test'
+    assert [(event['m'], event['u'].rsplit('/', 1)[-1]) for event in events] == [
+        ('GET', 'rightascension'), ('PUT', 'openshutter')]
+    assert events[0]['u'] == f"{alpaca_server.base_url}/api/v1/telescope/0/rightascension"
+    assert events[0]['s'] == 200 and events[0]['r']['Value'] == 5.5
+    assert 'f' not in events[1]
+    assert events[0]['t'] <= events[1]['t']
+
+
+def write_recording(path, events):
+    """按给定时刻写一个记录文件"""
+    recorder = TrafficRecorder(path).start()
+    for t, method, url, extra in events:
+        recorder.record_http(method, url, {}, recorder._origin + t, 0.01, **extra)
+    recorder.stop()
+
+
+def test_replay_answers_by_recorded_time(tmp_path):
+    path = str(tmp_path / 'night.jsonl.gz')
+    url = 'http://192.168.1.20:11111/api/v1/telescope/0/rightascension'
+    dome = 'http://192.168.1.20:11111/api/v1/dome/0/shutterstatus'
+    ok = {'ErrorNumber': 0, 'ErrorMessage': ''}
+    write_recording(path, [
+        (1.0, 'GET', url, {'status': 200, 'body': dict(ok, Value=5.5)}),
+        (1.0, 'GET', dome, {'status': 200, 'body': dict(ok, Value=0)}),
+        (10.0, 'GET', url, {'status': 200, 'body': dict(ok, Value=6.25)}),
+        (10.0, 'GET', dome, {'error': 'ConnectionError: Connection reset by peer'}),
+    ])
+
+    def read(harness, endpoint):
+        response = requests.get(f"{harness.base_url}/api/v1/{endpoint}", timeout=5)
+        return response.json()['Value']
+
+    # speed=0 时回放时钟停在 start，结果与运行快慢无关
+    with ReplayHarness(path, speed=0, start=2.0, serial=False) as harness:
+        assert read(harness, 'telescope/0/rightascension') == 5.5
+        assert read(harness, 'dome/0/shutterstatus') == 0
+    with ReplayHarness(path, speed=0, start=12.0, serial=False) as harness:
+        assert read(harness, 'telescope/0/rightascension') == 6.25
+        with pytest.raises(requests.ConnectionError):
+            read(harness, 'dome/0/shutterstatus')
+        assert harness.server.replay_counts['replayed'] == 1
+
+
+def test_truncated_recording_reads_complete_lines(tmp_path):
+    path = str(tmp_path / 'night.jsonl.gz')
+    url = 'http://192.168.1.20:11111/api/v1/telescope/0/rightascension'
+    write_recording(path, [(float(t), 'GET', url, {'status': 200, 'body': {'Value': t}}) for t in range(2000)])
+    with open(path, 'rb') as f:
+        data = f.read()
+    truncated = str(tmp_path / 'truncated.jsonl.gz')
+    with open(truncated, 'wb') as f:
+        f.write(data[:len(data) // 2])
+
+    _, events = read_recording(truncated)
+    values = [event['r']['Value'] for event in events]
+    assert 0 < len(values) < 2000
+    assert values == list(range(len(values)))
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        assert len(f.readlines()) == 2001
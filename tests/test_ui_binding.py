@@ -0,0 +1,49 @@
+"""
+差异更新层：同一标签提交前的多次设置合并，文本和样式类没有变化时不修改控件
+"""
+from PyQt5.QtWidgets import QLabel
+
+from src.ui.ui_binding import StatusBinder, render_focuser
+
+
+class Pair:
+    def __init__(self):
+        self.value_label = QLabel()
+        self.writes = 0
+
+    def set_value(self, text):
+        self.writes += 1
+        self.value_label.setText(text)
+
+
+def test_unchanged_labels_are_skipped(qapp):
+    binder = StatusBinder(auto_commit=False)
+    pairs = {'position': Pair(), 'temperature': Pair(), 'moving': Pair()}
+    status = {'position': 1200, 'maxstep': 60000, 'temperature': 4.5, 'ismoving': False}
+
+    binder.apply(pairs, render_focuser(status))
+    assert binder.commit() == 3
+    assert pairs['position'].value_label.text() == '1200/60000'
+    assert pairs['moving'].value_label.property('class') == 'medium-text status-success'
+
+    # 相同的状态再来一轮：文本和样式都跳过
+    binder.apply(pairs, render_focuser(status))
+    assert binder.commit() == 0
+    assert binder.stats['text_skipped'] == 3
+    assert binder.stats['style_skipped'] == 1
+    assert all(pair.writes == 1 for pair in pairs.values())
+
+    # 一轮中同一标签设置两次只写入最后一次；只变化的标签被修改
+    binder.apply(pairs, render_focuser(dict(status, position=1300)))
+    binder.set(pairs['position'], '1400/60000')
+    assert binder.commit() == 1
+    assert binder.stats['coalesced'] == 1
+    assert pairs['position'].value_label.text() == '1400/60000'
+    assert pairs['position'].writes == 2
+
+    # 其他代码直接修改了控件时，下一次提交照常写回
+    pairs['temperature'].value_label.setText('--')
+    binder.apply(pairs, render_focuser(dict(status, position=1400)))
+    assert binder.commit() == 1
+    assert pairs['temperature'].value_label.text() == '4.50°C'
+    assert 0 < binder.skipped_ratio() < 1